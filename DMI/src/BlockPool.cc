@@ -0,0 +1,242 @@
+//
+//% $Id$
+//
+//
+// Copyright (C) 2002-2007
+// The MeqTree Foundation &
+// ASTRON (Netherlands Foundation for Research in Astronomy)
+// P.O.Box 2, 7990 AA Dwingeloo, The Netherlands
+//
+// This program is free software; you can redistribute it and/or modify
+// it under the terms of the GNU General Public License as published by
+// the Free Software Foundation; either version 2 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+// GNU General Public License for more details.
+//
+// You should have received a copy of the GNU General Public License
+// along with this program; if not, see <http://www.gnu.org/licenses/>,
+// or write to the Free Software Foundation, Inc.,
+// 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+//
+
+#include "BlockPool.h"
+#include <DMI/DMI.h>
+#include <TimBase/Thread.h>
+#include <stdlib.h>
+#include <new>
+#include <set>
+#include <vector>
+#include <atomic>
+
+namespace DMI
+{
+
+// Size classes: class 0 holds blocks of up to 2^MinShift bytes. Above that,
+// each power of two is split into four classes. Blocks larger than
+// 2^MaxShift bytes are not pooled.
+enum
+{
+  MinShift   = 6,
+  MaxShift   = 26,
+  NumClasses = 1 + (MaxShift-MinShift)*4
+};
+
+static inline int sizeClass (size_t size)
+{
+  if( size <= (size_t(1)<<MinShift) )
+    return 0;
+  size_t n = size-1;
+  int p = (sizeof(unsigned long)*8-1) - __builtin_clzl(n);
+  if( p >= MaxShift )
+    return -1;
+  return 1 + (p-MinShift)*4 + int((n>>(p-2))&3);
+}
+
+static inline size_t classSize (int ic)
+{
+  if( !ic )
+    return size_t(1)<<MinShift;
+  int p = MinShift + (ic-1)/4;
+  return (size_t(1)<<p) + (size_t((ic-1)%4+1)<<(p-2));
+}
+
+// counters are only ever modified by their own thread, but read by
+// getStats() from any thread
+typedef std::atomic<unsigned long> Counter;
+
+static inline void bump (Counter &c)
+{ c.store(c.load(std::memory_order_relaxed)+1,std::memory_order_relaxed); }
+
+static std::atomic<size_t> limit_(0);
+static std::atomic<size_t> pooled_bytes_(0);
+static std::atomic<size_t> peak_bytes_(0);
+
+struct ThreadCache
+{
+    std::vector<void*> lists[NumClasses];
+    Counter allocated,reused,released,freed;
+
+    ThreadCache ()
+    : allocated(0),reused(0),released(0),freed(0)
+    {}
+
+    // returns blocks to the heap, starting from the largest class, until
+    // nbytes have been freed or the cache is empty
+    void trim (size_t nbytes)
+    {
+      for( int ic=NumClasses-1; ic>=0 && nbytes; ic-- )
+      {
+        size_t sz = classSize(ic);
+        while( !lists[ic].empty() && nbytes )
+        {
+          free(lists[ic].back());
+          lists[ic].pop_back();
+          pooled_bytes_ -= sz;
+          bump(freed);
+          nbytes = nbytes > sz ? nbytes-sz : 0;
+        }
+      }
+    }
+};
+
+// all live caches, plus counters of caches of threads that have exited
+static Thread::Mutex registry_mutex_;
+static std::set<ThreadCache*> *registry_ = 0;
+static BlockPool::Stats retired_;
+
+// The cache pointer is a plain thread_local so that blocks released during
+// static destruction (after the thread's cache is gone) can still go
+// straight to the heap. The owner object frees the cache on thread exit.
+static thread_local ThreadCache *tcache_ = 0;
+static thread_local bool tcache_gone_ = false;
+
+namespace
+{
+  struct ThreadCacheOwner
+  {
+    ~ThreadCacheOwner ()
+    {
+      ThreadCache *tc = tcache_;
+      if( !tc )
+        return;
+      tcache_ = 0;
+      tcache_gone_ = true;
+      tc->trim(~size_t(0));
+      Thread::Mutex::Lock lock(registry_mutex_);
+      registry_->erase(tc);
+      retired_.allocated += tc->allocated;
+      retired_.reused    += tc->reused;
+      retired_.released  += tc->released;
+      retired_.freed     += tc->freed;
+      delete tc;
+    }
+  };
+  thread_local ThreadCacheOwner tcache_owner_;
+}
+
+static ThreadCache * threadCache ()
+{
+  if( !tcache_ && !tcache_gone_ )
+  {
+    // touch the owner so that its destructor is registered for this thread
+    (void)&tcache_owner_;
+    ThreadCache *tc = new ThreadCache;
+    Thread::Mutex::Lock lock(registry_mutex_);
+    if( !registry_ )
+      registry_ = new std::set<ThreadCache*>;
+    registry_->insert(tc);
+    tcache_ = tc;
+  }
+  return tcache_;
+}
+
+void * BlockPool::allocate (size_t size)
+{
+  ThreadCache *tc = limit_ ? threadCache() : tcache_;
+  int ic = sizeClass(size);
+  if( tc )
+  {
+    bump(tc->allocated);
+    if( ic >= 0 && !tc->lists[ic].empty() )
+    {
+      void *block = tc->lists[ic].back();
+      tc->lists[ic].pop_back();
+      pooled_bytes_ -= classSize(ic);
+      bump(tc->reused);
+      return block;
+    }
+  }
+  // allocate the full class size, so that the block may be reused for
+  // anything in the same class
+  void *block = malloc(ic >= 0 ? classSize(ic) : size);
+  if( !block )
+    throw std::bad_alloc();
+  return block;
+}
+
+void BlockPool::release (void *block,size_t size)
+{
+  ThreadCache *tc = limit_ ? threadCache() : tcache_;
+  int ic = sizeClass(size);
+  if( tc )
+  {
+    bump(tc->released);
+    if( ic >= 0 )
+    {
+      size_t sz = classSize(ic);
+      size_t limit = limit_;
+      // make room by dropping our own blocks, largest first
+      size_t nb = pooled_bytes_ + sz;
+      if( nb > limit )
+        tc->trim(nb - limit);
+      if( pooled_bytes_ + sz <= limit )
+      {
+        tc->lists[ic].push_back(block);
+        nb = pooled_bytes_ += sz;
+        size_t peak = peak_bytes_;
+        while( nb > peak && !peak_bytes_.compare_exchange_weak(peak,nb) );
+        return;
+      }
+    }
+    bump(tc->freed);
+  }
+  free(block);
+}
+
+void BlockPool::setLimit (size_t bytes)
+{
+  limit_ = bytes;
+  ThreadCache *tc = tcache_;
+  if( tc && pooled_bytes_ > bytes )
+    tc->trim(pooled_bytes_ - bytes);
+}
+
+size_t BlockPool::limit ()
+{
+  return limit_;
+}
+
+void BlockPool::getStats (Stats &st)
+{
+  Thread::Mutex::Lock lock(registry_mutex_);
+  st = retired_;
+  if( registry_ )
+    for( std::set<ThreadCache*>::const_iterator iter = registry_->begin();
+         iter != registry_->end(); iter++ )
+    {
+      const ThreadCache &tc = **iter;
+      st.allocated += tc.allocated;
+      st.reused    += tc.reused;
+      st.released  += tc.released;
+      st.freed     += tc.freed;
+    }
+  st.bytes = pooled_bytes_;
+  st.peak_bytes = peak_bytes_;
+  st.limit = limit_;
+}
+
+}; // namespace DMI
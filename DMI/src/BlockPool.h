@@ -0,0 +1,82 @@
+//
+//% $Id$
+//
+//
+// Copyright (C) 2002-2007
+// The MeqTree Foundation &
+// ASTRON (Netherlands Foundation for Research in Astronomy)
+// P.O.Box 2, 7990 AA Dwingeloo, The Netherlands
+//
+// This program is free software; you can redistribute it and/or modify
+// it under the terms of the GNU General Public License as published by
+// the Free Software Foundation; either version 2 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+// GNU General Public License for more details.
+//
+// You should have received a copy of the GNU General Public License
+// along with this program; if not, see <http://www.gnu.org/licenses/>,
+// or write to the Free Software Foundation, Inc.,
+// 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+//
+
+#ifndef DMI_BlockPool_h
+#define DMI_BlockPool_h 1
+
+#include <stddef.h>
+
+namespace DMI
+{
+
+//##Documentation
+//## BlockPool recycles the memory blocks behind SmartBlocks (and hence
+//## NumArrays and Vells). Released blocks are kept on per-thread free lists,
+//## one list per size class, and handed out again for the next allocation
+//## of the same class. Size classes are spaced four per power of two, so
+//## same-shaped arrays always reuse each other's blocks. The total size of
+//## blocks kept on free lists (across all threads) is capped by a limit;
+//## blocks released beyond the limit go back to the heap. A limit of 0 (the
+//## default) disables pooling.
+class BlockPool
+{
+  public:
+    //##Documentation
+    //## pool statistics, returned by getStats()
+    typedef struct
+    {
+      double allocated;   //## number of blocks allocated
+      double reused;      //## of which, taken from a free list
+      double released;    //## number of blocks released
+      double freed;       //## number of blocks returned to the heap
+      double bytes;       //## bytes currently kept on free lists
+      double peak_bytes;  //## peak value of the above
+      double limit;       //## current limit on bytes kept on free lists
+    } Stats;
+
+    //##Documentation
+    //## Returns a block of at least size bytes. Blocks must be released via
+    //## release(), with the same size.
+    static void * allocate (size_t size);
+
+    //##Documentation
+    //## Puts a block on the calling thread's free list, or frees it if the
+    //## pool is over its limit.
+    static void release (void *block,size_t size);
+
+    //##Documentation
+    //## Sets the limit on bytes kept on free lists. The calling thread's
+    //## free list is trimmed at once. A thread can only touch its own list,
+    //## so other threads trim theirs when they next release a block while
+    //## the pool is over the limit. Until then, their blocks stay pooled.
+    static void setLimit (size_t bytes);
+
+    static size_t limit ();
+
+    static void getStats (Stats &st);
+};
+
+}; // namespace DMI
+#endif
@@ -521,6 +521,16 @@ int DMI::NumArray::fromBlock (BlockSet& set)
   return 1;
 }
 
+void DMI::NumArray::attachBlock (const BlockRef &block)
+{
+  FailWhen(!block.valid(),"can't attach invalid block");
+  // a block obtained from dataBlock() is in the same format as one
+  // produced by toBlock(), so just let fromBlock() take a COW copy of it
+  BlockSet set;
+  set.push(block);
+  NumArray::fromBlock(set);
+}
+
 //##ModelId=3DB949AE03C5
 int DMI::NumArray::toBlock (BlockSet& set) const
 {
@@ -405,8 +405,30 @@ public:
   { return itsArrayData; }
   
     //##ModelId=400E4D68038A
-  void * getDataPtr () 
+  void * getDataPtr ()
   { Thread::Mutex::Lock lock(mutex()); makeWritable(); return itsArrayData; }
+
+  // True if the array data is held contiguously in our own data block
+  // (i.e. this is not a reference to a slice of another array, and not a
+  // string array). Only such arrays can share their block via dataBlock().
+  bool hasOwnBlock () const
+  { return itsArrayValid && itsScaType != Tpstring &&
+           itsArrayData == itsData->cdata() + itsDataOffset; }
+
+  // Returns ref to the underlying data block. The block holds a header,
+  // followed by the array data at offset dataOffset(). Holding a copy of
+  // this ref keeps the data alive, and makes the block copy-on-write:
+  // the next write to this array will then privatize the block.
+  const BlockRef & dataBlock () const
+  { return itsData; }
+
+  size_t dataOffset () const
+  { return itsDataOffset; }
+
+  // Makes the array use a data block obtained from dataBlock() of
+  // another array, without copying the data. The block is shared
+  // copy-on-write.
+  void attachBlock (const BlockRef &block);
   
   // Return the object type (TpNumArray).
     //##ModelId=3DB949AE03BE
@@ -469,6 +491,13 @@ protected:
     //##ModelId=3DB949AE03DA
   virtual int get (const HIID& id,ContentInfo &info,bool nonconst,int flags) const;
 
+  // Marks the data as directly writable, so that makeWritable() will not
+  // privatize the data block even if it is shared. Used by subclasses that
+  // take over the storage of an array that is known to be a dead temporary.
+  // Reset by any subsequent assignment or copy.
+  void setWritableRef ()
+  { itsWritableRef = true; }
+
 private:
   // Initialize internal shape and create array using the given shape.
   // flags: DMI::NOZERO to skip init of array
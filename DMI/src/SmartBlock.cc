@@ -25,19 +25,20 @@
 //
 
 #include "SmartBlock.h"
+#include "BlockPool.h"
 
 namespace DMI
 {
 
 SmartBlock::SmartBlock()
-  : block(0),datasize(0),shmid(0),delete_block(false)
+  : block(0),datasize(0),shmid(0),delete_block(false),pooled_block(false)
 {
   dprintf(2)("default constructor\n");
 }
 
 //##ModelId=3BFE299902D7
 SmartBlock::SmartBlock (void* data, size_t size, int flags)
-  : block(0),datasize(0),shmid(0),delete_block(false)
+  : block(0),datasize(0),shmid(0),delete_block(false),pooled_block(false)
 {
   dprintf(2)("constructor(data=%p,size=%d,fl=%x)\n",data,size,flags);
   init(data,size,flags,0);
@@ -45,15 +46,15 @@ SmartBlock::SmartBlock (void* data, size_t size, int flags)
 
 //##ModelId=3BFA4FCA0387
 SmartBlock::SmartBlock (size_t size, int flags)
-  : block(0),datasize(0),shmid(0),delete_block(false)
+  : block(0),datasize(0),shmid(0),delete_block(false),pooled_block(false)
 {
   dprintf(2)("constructor(size=%d,fl=%x)\n",size,flags);
-  init( new char[size],size,flags|DMI::ANON,0 );
+  initPooled(BlockPool::allocate(size),size,flags);
 }
 
 //##ModelId=3BFE303F0022
 SmartBlock::SmartBlock (size_t size, int shm_flags, int flags)
-  : block(0),datasize(0),shmid(0),delete_block(false)
+  : block(0),datasize(0),shmid(0),delete_block(false),pooled_block(false)
 {
   dprintf(2)("constructor(size=%d,shmfl=%x,fl=%x)",size,shm_flags,flags);
   init(0,size,flags|DMI::SHMEM,shm_flags);
@@ -61,7 +62,7 @@ SmartBlock::SmartBlock (size_t size, int shm_flags, int flags)
 
 //##ModelId=3DB934E50248
 SmartBlock::SmartBlock (const SmartBlock &other, int flags)
-  : CountedRefTarget(),block(0),datasize(0),shmid(0),delete_block(false)
+  : CountedRefTarget(),block(0),datasize(0),shmid(0),delete_block(false),pooled_block(false)
 {
   dprintf(2)("copy constructor(%s,%x)\n",other.debug(),flags);
   FailWhen( !(flags&DMI::CLONE),"must use DMI::CLONE to copy");
@@ -87,8 +88,7 @@ SmartBlock & SmartBlock::operator=(const SmartBlock &right)
     // clone the block
     if( !right.size() )
       return *this;
-    block = new char[ datasize = right.size() ];
-    delete_block = true;
+    initPooled(BlockPool::allocate(right.size()),right.size(),0);
     memcpy(block,*right,datasize);
   }
   return *this;
@@ -106,6 +106,7 @@ void SmartBlock::init (void* data, size_t size, int flags, int /*shm_flags*/)
   block = static_cast<char*>(data);
   datasize = size;
   delete_block = (flags&DMI::ANON)!=0;
+  pooled_block = false;
   shmid = 0;
   if( flags&DMI::ZERO )
     memset(block,0,datasize);
@@ -119,7 +120,7 @@ void SmartBlock::resize (size_t newsize, int flags)
   if( !block || !datasize )
   {
     if( newsize )
-      init( new char[newsize],newsize,flags|DMI::ANON,0 );
+      initPooled(BlockPool::allocate(newsize),newsize,flags);
   }
   else
   {
@@ -127,7 +128,7 @@ void SmartBlock::resize (size_t newsize, int flags)
     char *newblock = 0;
     if( newsize )
     {
-      newblock = new char[newsize];
+      newblock = static_cast<char*>(BlockPool::allocate(newsize));
       memcpy(newblock,block,std::min(datasize,newsize));
     // pad with 0 if needed
       if( newsize > datasize && flags&DMI::ZERO )
@@ -135,17 +136,29 @@ void SmartBlock::resize (size_t newsize, int flags)
     // get rid of old block
     }
     destroy();
-    init( newblock,newsize,flags|DMI::ANON,0 );
+    if( newblock )
+      initPooled(newblock,newsize,flags);
   }
 }
 
+void SmartBlock::initPooled (void *data,size_t size,int flags)
+{
+  init(data,size,flags|DMI::ANON,0);
+  pooled_block = true;
+}
+
 //##ModelId=3C1E0D8D0391
 void SmartBlock::destroy ()
 {
   dprintf(2)("%s: destroying\n",debug());
   if( block && delete_block )
-    delete [] static_cast<char*>(block); 
-  block=0; datasize=0; shmid=0;
+  {
+    if( pooled_block )
+      BlockPool::release(block,datasize);
+    else
+      delete [] static_cast<char*>(block);
+  }
+  block=0; datasize=0; shmid=0; pooled_block=false;
 }
 
 //##ModelId=3BFE23B501F4
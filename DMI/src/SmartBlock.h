@@ -151,6 +151,10 @@ class SmartBlock : public CountedRefTarget
     //##ModelId=3DB934E802CD
       SmartBlock & operator=(const SmartBlock &right);
 
+      //##Documentation
+      //## init()s with a block obtained from BlockPool::allocate()
+      void initPooled (void *data,size_t size,int flags);
+
   private:
     // Data Members for Class Attributes
 
@@ -166,6 +170,10 @@ class SmartBlock : public CountedRefTarget
       //##ModelId=3BFE1E930399
       bool delete_block;
 
+      //##Documentation
+      //## true if block came from the BlockPool
+      bool pooled_block;
+
 };
 
 DefineRefTypes(SmartBlock,BlockRef);
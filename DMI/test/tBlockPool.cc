@@ -0,0 +1,88 @@
+//
+//% $Id$ 
+//
+//
+// Copyright (C) 2002-2007
+// The MeqTree Foundation & 
+// ASTRON (Netherlands Foundation for Research in Astronomy)
+// P.O.Box 2, 7990 AA Dwingeloo, The Netherlands
+//
+// This program is free software; you can redistribute it and/or modify
+// it under the terms of the GNU General Public License as published by
+// the Free Software Foundation; either version 2 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+// GNU General Public License for more details.
+//
+// You should have received a copy of the GNU General Public License
+// along with this program; if not, see <http://www.gnu.org/licenses/>,
+// or write to the Free Software Foundation, Inc., 
+// 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+//
+
+#include <DMI/AID-DMI.h>
+#include <DMI/TID-DMI.h>
+#include <DMI/NumArray.h>
+#include <DMI/BlockPool.h>
+
+using namespace DebugDefault;
+using namespace DMI;
+
+static int nfail = 0;
+
+#define check(expr) \
+  if( !(expr) ) { cout<<"FAILED: " #expr "\n"; nfail++; }
+
+int main ( int argc,const char *argv[] )
+{
+  Debug::initLevels(argc,argv);
+  BlockPool::Stats st0,st1;
+
+  cout<<"======================= testing reuse of same-shaped arrays\n";
+  BlockPool::setLimit(16*1024*1024);
+  BlockPool::getStats(st0);
+  for( int i=0; i<100; i++ )
+  {
+    ObjRef ref;
+    ref <<= new DMI::NumArray(Tpdouble,LoShape(100,100));
+  }
+  BlockPool::getStats(st1);
+  cout<<"allocated "<<st1.allocated-st0.allocated<<" reused "<<st1.reused-st0.reused<<endl;
+  check( st1.allocated-st0.allocated >= 100 );
+  check( st1.reused-st0.reused >= 99 );
+  check( st1.bytes > 0 && st1.bytes <= st1.limit );
+
+  cout<<"======================= testing limit\n";
+  BlockPool::setLimit(1024*1024);
+  BlockPool::getStats(st0);
+  {
+    // 4 x 800K blocks: only one fits
+    ObjRef ref[4];
+    for( int i=0; i<4; i++ )
+      ref[i] <<= new DMI::NumArray(Tpdouble,LoShape(100,1000));
+  }
+  BlockPool::getStats(st1);
+  cout<<"released "<<st1.released-st0.released<<" freed "<<st1.freed-st0.freed<<endl;
+  check( st1.freed-st0.freed == 3 );
+  check( st1.bytes <= 1024*1024 );
+
+  cout<<"======================= testing disabled pool\n";
+  BlockPool::setLimit(0);
+  BlockPool::getStats(st1);
+  check( st1.bytes == 0 );
+  {
+    ObjRef ref;
+    ref <<= new DMI::NumArray(Tpdouble,LoShape(100,100));
+  }
+  BlockPool::getStats(st1);
+  check( st1.bytes == 0 );
+
+  if( nfail )
+    cout<<"======================= "<<nfail<<" checks failed\n";
+  else
+    cout<<"======================= all checks passed\n";
+  return nfail ? 1 : 0;
+}
@@ -146,6 +146,7 @@ DMI::BObj * __construct_MeqSpline (int n) { return n>0 ? new Meq::Spline [n] : n
         AtomicID::registerId(-1342,"Last")+
         AtomicID::registerId(-1337,"Override")+
         AtomicID::registerId(-1529,"Policy")+
+        AtomicID::registerId(-1791,"Precision")+
         AtomicID::registerId(-1556,"Discover")+
         AtomicID::registerId(-1555,"Spids")+
         AtomicID::registerId(-1216,"Map")+
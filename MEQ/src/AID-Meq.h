@@ -768,6 +768,11 @@ const int AidPolling_int = -1603;
 const DMI::AtomicID AidPositive(-1671);           // from /home/mevius/LOFAR/Timba/MEQ/src/MeqVocabulary.h:43
 const int AidPositive_int = -1671;
 #endif
+#ifndef _defined_id_AidPrecision
+#define _defined_id_AidPrecision 1
+const DMI::AtomicID AidPrecision(-1791);          // from Node.h:45
+const int AidPrecision_int = -1791;
+#endif
 #ifndef _defined_id_AidPrevious
 #define _defined_id_AidPrevious 1
 const DMI::AtomicID AidPrevious(-1586);           // from /home/mevius/LOFAR/Timba/MEQ/src/MeqVocabulary.h:39
@@ -33,6 +33,7 @@ static DMI::Container::Register reg(TpMeqCells,true);
 
 //##ModelId=3F86886E02C1
 Cells::Cells ()
+  : content_hash_(0)
 {
   shape_.reserve(Axis::MaxAxis);
   defined_.reserve(Axis::MaxAxis);
@@ -46,7 +47,7 @@ Cells::~Cells()
 
 //##ModelId=3F86886E02C8
 Cells::Cells (const DMI::Record &other,int flags,int depth)
-: DMI::Record()
+: DMI::Record(),content_hash_(0)
 {
   shape_.reserve(Axis::MaxAxis);
   defined_.reserve(Axis::MaxAxis);
@@ -85,6 +86,7 @@ void Cells::setDomain (const Domain *pdom,int flags)
   defined_.reserve(Axis::MaxAxis);
   shape_.clear();
   defined_.clear();
+  content_hash_ = 0;
   domain_.attach(pdom,flags);
   Record::addField(FDomain,domain_.ref_cast<BObj>(),DMI::REPLACE|Record::PROTECT);
 }
@@ -215,6 +217,8 @@ Cells::Cells (const Cells &other,const int ops[Axis::MaxAxis],const int args[Axi
 void Cells::setAxisShape (int iaxis,int num)
 {
   Thread::Mutex::Lock lock(mutex());
+  // grid is about to change, so drop the hash
+  content_hash_ = 0;
   int sz = shape_.size();
   if( iaxis >= sz )
   {
@@ -398,6 +402,7 @@ void Cells::validateContent (bool)
   defined_.reserve(Axis::MaxAxis);
   shape_.clear();
   defined_.clear();
+  content_hash_ = 0;
   try
   {
     Hook hdom   = (*this)[FDomain],
@@ -568,6 +573,37 @@ bool Cells::operator== (const Cells& that) const
   return true;
 }
 
+uint64_t Cells::contentHash () const
+{
+  Thread::Mutex::Lock lock(mutex());
+  if( content_hash_ )
+    return content_hash_;
+  // FNV-1a over shape, cell centers and cell sizes of every defined axis
+  uint64_t hash = 14695981039346656037ULL;
+  for( int i=0; i<Axis::MaxAxis; i++ )
+  {
+    int np = ncells(i);
+    if( !np )
+      continue;
+    const unsigned char *p0 = reinterpret_cast<const unsigned char*>(&i);
+    const unsigned char *p1 = reinterpret_cast<const unsigned char*>(&np);
+    for( uint k=0; k<sizeof(int); k++ )
+    {
+      hash = (hash^p0[k])*1099511628211ULL;
+      hash = (hash^p1[k])*1099511628211ULL;
+    }
+    for( int j=0; j<np; j++ )
+    {
+      double x[2] = { grid_[i](j),cell_size_[i](j) };
+      const unsigned char *px = reinterpret_cast<const unsigned char*>(x);
+      for( uint k=0; k<sizeof(x); k++ )
+        hash = (hash^px[k])*1099511628211ULL;
+    }
+  }
+  // 0 is reserved for "not computed"
+  return content_hash_ = hash ? hash : 1;
+}
+
 //##ModelId=400E5305000E
 void Cells::show (std::ostream& os) const
 {
@@ -32,6 +32,7 @@
 #include <TimBase/Lorrays.h>
 #include <MEQ/MeqVocabulary.h>
 #include <ostream>
+#include <stdint.h>
 
 #pragma aidgroup Meq
 #pragma types #Meq::Cells
@@ -225,6 +226,10 @@ public:
   bool operator!= (const Cells& that) const
     { return !(*this == that); }
 
+  // returns a hash of the cell centers and sizes. Computed on first use,
+  // and recomputed after the cells have been changed
+  uint64_t contentHash () const;
+
   // print to stream
     //##ModelId=400E5305000E
   void show (std::ostream&) const;
@@ -270,6 +275,9 @@ private:
   LoVec_double  cell_size_[Axis::MaxAxis];
   LoVec_int     seg_start_[Axis::MaxAxis];
   LoVec_int     seg_end_  [Axis::MaxAxis];
+  
+  // cached result of contentHash(), 0 if not yet computed
+  mutable uint64_t content_hash_;
 };
 
 } //namespace Meq
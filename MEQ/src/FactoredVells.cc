@@ -0,0 +1,151 @@
+//
+//% $Id$
+//
+//
+// Copyright (C) 2002-2007
+// The MeqTree Foundation &
+// ASTRON (Netherlands Foundation for Research in Astronomy)
+// P.O.Box 2, 7990 AA Dwingeloo, The Netherlands
+//
+// This program is free software; you can redistribute it and/or modify
+// it under the terms of the GNU General Public License as published by
+// the Free Software Foundation; either version 2 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+// GNU General Public License for more details.
+//
+// You should have received a copy of the GNU General Public License
+// along with this program; if not, see <http://www.gnu.org/licenses/>,
+// or write to the Free Software Foundation, Inc.,
+// 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+//
+
+#include "FactoredVells.h"
+#include "VellsSlicer.h"
+#include <string.h>
+
+namespace Meq
+{
+
+FactoredVells::FactoredVells (Operation op)
+  : op_(op)
+{}
+
+int FactoredVells::variableAxes (const Vells &vells)
+{
+  int mask = 0;
+  for( int i=0; i<vells.rank(); i++ )
+    if( vells.extent(i) > 1 )
+      mask |= 1<<i;
+  return mask;
+}
+
+void FactoredVells::add (const Vells &factor,VellsFlagType flagmask)
+{
+  if( flagmask && factor.hasDataFlags() )
+    Vells::mergeFlags(flags_,factor.dataFlags(),flagmask);
+  Axis::mergeShape(shape_,factor.shape());
+  // combine with any factors that vary along the same axes
+  Vells value = factor;
+  int mask = variableAxes(factor);
+  for( int i=factors_.size()-1; i>=0; i-- )
+    if( factor_axes_[i]&mask || !(factor_axes_[i]|mask) )
+    {
+      value = combine(factors_[i],value);
+      mask |= factor_axes_[i];
+      factors_.erase(factors_.begin()+i);
+      factor_axes_.erase(factor_axes_.begin()+i);
+    }
+  factors_.push_back(value);
+  factor_axes_.push_back(mask);
+}
+
+Vells FactoredVells::expand (double scale) const
+{
+  if( factors_.empty() )
+    return Vells();
+  // for a product, apply the scale to the smallest factor
+  uint iscale = 0;
+  if( op_ == PRODUCT )
+    for( uint i=1; i<factors_.size(); i++ )
+      if( factors_[i].nelements() < factors_[iscale].nelements() )
+        iscale = i;
+  Vells result = op_ == PRODUCT && scale != 1 ? factors_[iscale]*scale : factors_[iscale];
+  for( uint i=0; i<factors_.size(); i++ )
+    if( i != iscale )
+      result = combine(result,factors_[i]);
+  if( op_ == SUM && scale != 1 )
+    result *= scale;
+  if( flags_.valid() )
+    result.setDataFlags(flags_);
+  return result;
+}
+
+Vells FactoredVells::reduceFactor (const Vells &factor,int mask)
+{
+  int axes[Axis::MaxAxis];
+  int naxes = 0;
+  for( int i=0; i<factor.rank(); i++ )
+    if( mask&(1<<i) )
+      axes[naxes++] = i;
+  // nothing to reduce
+  if( !naxes )
+    return factor;
+  // reducing along all variable axes gives a scalar
+  if( !(variableAxes(factor)&~mask) )
+    return VellsMath::mean(factor,0);
+  // else take the mean of every slice, as ReductionFunction::apply() does
+  ConstVellsSlicer0 slicer(factor,axes,naxes);
+  Vells result(factor,slicer.nonSlicedShape(),false);
+  char * ptr = static_cast<char*>(result.getDataPtr());
+  size_t size = result.elementSize();
+  for( ; slicer.valid(); slicer.incr(),ptr+=size )
+  {
+    Vells mean = VellsMath::mean(slicer.vells(),0);
+    memcpy(ptr,mean.getConstDataPtr(),size);
+  }
+  return result;
+}
+
+Vells FactoredVells::mean (const std::vector<int> &axes) const
+{
+  if( factors_.empty() )
+    return Vells();
+  int mask = 0;
+  if( axes.empty() )
+    mask = ~0;
+  else
+    for( uint i=0; i<axes.size(); i++ )
+      mask |= 1<<axes[i];
+  // the mean of a product of factors with no common axes is the product of
+  // their means, and the mean of a sum is the sum of the means
+  Vells result = reduceFactor(factors_[0],factor_axes_[0]&mask);
+  for( uint i=1; i<factors_.size(); i++ )
+    result = combine(result,reduceFactor(factors_[i],factor_axes_[i]&mask));
+  return result;
+}
+
+Vells FactoredVells::sum (const std::vector<int> &axes,const LoShape &shape) const
+{
+  Vells result = mean(axes);
+  if( result.isNull() )
+    return result;
+  // the sum is the mean times the number of points summed over. Like 
+  // VellsMath::sum(), count every point of the full shape, except along
+  // the non-reduced axes of the result.
+  int mask = 0;
+  for( uint i=0; i<axes.size(); i++ )
+    mask |= 1<<axes[i];
+  int npoints = 1;
+  for( uint i=0; i<shape.size(); i++ )
+    if( axes.empty() || i >= shape_.size() || shape_[i] <= 1 || mask&(1<<i) )
+      npoints *= shape[i];
+  if( npoints != 1 )
+    result *= double(npoints);
+  return result;
+}
+
+} // namespace Meq
@@ -0,0 +1,104 @@
+//#  FactoredVells.h: lazily broadcast product or sum of Vells
+//#
+//#  Copyright (C) 2002-2007
+//#  ASTRON (Netherlands Foundation for Research in Astronomy)
+//#  and The MeqTree Foundation
+//#  P.O.Box 2, 7990 AA Dwingeloo, The Netherlands, seg@astron.nl
+//#
+//#  This program is free software; you can redistribute it and/or modify
+//#  it under the terms of the GNU General Public License as published by
+//#  the Free Software Foundation; either version 2 of the License, or
+//#  (at your option) any later version.
+//#
+//#  This program is distributed in the hope that it will be useful,
+//#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+//#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+//#  GNU General Public License for more details.
+//#
+//#  You should have received a copy of the GNU General Public License
+//#  along with this program; if not, write to the Free Software
+//#  Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+//#
+//#  $Id$
+#ifndef MEQ_SRC_FACTOREDVELLS_H_HEADER_INCLUDED
+#define MEQ_SRC_FACTOREDVELLS_H_HEADER_INCLUDED
+
+#include <MEQ/Vells.h>
+#include <vector>
+
+namespace Meq
+{
+using namespace DMI;
+
+//## A FactoredVells represents the elementwise product (or sum) of a number
+//## of Vells, without expanding it into a full array. E.g. a freq-only
+//## bandpass times a time-only gain is held as the two original vectors,
+//## rather than as a time x freq grid. Factors that vary along a common
+//## axis are combined as they are added, so the remaining factors always
+//## vary along disjoint sets of axes. Means and sums along any axes can
+//## then be computed factor by factor, and only the (smaller) reduced
+//## result is ever expanded.
+class FactoredVells
+{
+  public:
+    typedef enum
+    {
+      PRODUCT = 0,
+      SUM     = 1
+    } Operation;
+
+    FactoredVells (Operation op = PRODUCT);
+
+    Operation operation () const
+    { return op_; }
+
+    //## adds a factor. If flagmask is non-0, the factor's data flags (if
+    //## any) are masked and merged into the flags of the expanded value.
+    void add (const Vells &factor,VellsFlagType flagmask = 0);
+
+    int numFactors () const
+    { return factors_.size(); }
+
+    const Vells & factor (int i) const
+    { return factors_[i]; }
+
+    //## shape of the expanded Vells
+    const LoShape & shape () const
+    { return shape_; }
+
+    //## true if any of the factors had data flags
+    bool hasDataFlags () const
+    { return flags_.valid(); }
+
+    //## returns the full Vells times scale, with merged data flags attached
+    Vells expand (double scale = 1.) const;
+
+    //## returns the mean of the expanded Vells along the given axes (all
+    //## axes if empty), in the same shape as a ReductionFunction would.
+    //## Flags are ignored, so this should only be used if !hasDataFlags().
+    Vells mean (const std::vector<int> &axes) const;
+
+    //## same for the sum, with shape giving the full shape of the operand
+    //## (see VellsMath::sum())
+    Vells sum (const std::vector<int> &axes,const LoShape &shape) const;
+
+    //## returns bitmask of axes along which vells is not constant
+    static int variableAxes (const Vells &vells);
+
+  private:
+    Vells combine (const Vells &a,const Vells &b) const
+    { return op_ == PRODUCT ? a*b : a+b; }
+
+    //## mean of a single factor along the axes in mask
+    static Vells reduceFactor (const Vells &factor,int mask);
+
+    Operation          op_;
+    std::vector<Vells> factors_;
+    std::vector<int>   factor_axes_;  // variable axes of each factor
+    LoShape            shape_;
+    Vells::Ref         flags_;
+};
+
+} // namespace Meq
+
+#endif
@@ -23,6 +23,7 @@
 
 #include <MEQ/FastParmTable.h>
 #include <MEQ/Polc.h>
+#include <MEQ/MTPool.h>
 
 #ifdef HAVE_FASTPARMTABLE
 
@@ -34,13 +35,90 @@
 #include <sys/stat.h>
 #include <string.h>
 #include <errno.h>
+#include <math.h>
+#include <algorithm>
+#include <atomic>
 
 namespace Meq 
 {
 
+static void decomposeKey (const FastParmTable::datum &key,string &name,int &domain_index)
+{
+  // decomposes a key into a funklet name and a domain index
+  int *pdom = reinterpret_cast<int*>(key.dptr);
+  domain_index = *pdom;
+  name.assign(reinterpret_cast<char*>(pdom+1));
+}
+
+// table statistics, see FastParmTable::Stats
+typedef std::atomic<unsigned long> Counter;
+static Counter reads_(0),read_waits_(0),writes_(0),write_waits_(0),
+               depot_locks_(0),depot_waits_(0),
+               batches_(0),batch_funklets_(0),max_batch_(0),queued_(0);
+
+// the write queue is flushed early once it holds this much data
+static const size_t MaxQueuedBytes = 64<<20;
+
+FastParmTable::ReadLock::ReadLock (const FastParmTable &table)
+  : plock_(&table.state_lock_)
+{
+  if( pthread_rwlock_tryrdlock(plock_) )
+  {
+    read_waits_++;
+    pthread_rwlock_rdlock(plock_);
+  }
+  reads_++;
+}
+
+FastParmTable::WriteLock::WriteLock (const FastParmTable &table)
+  : plock_(&table.state_lock_)
+{
+  if( pthread_rwlock_trywrlock(plock_) )
+  {
+    write_waits_++;
+    pthread_rwlock_wrlock(plock_);
+  }
+  writes_++;
+}
+
+FastParmTable::DepotLock::DepotLock (const FastParmTable &table,bool lock)
+  : pmutex_(lock ? &table.mutex_ : 0)
+{
+  if( pmutex_ )
+  {
+    if( pmutex_->trylock() )
+    {
+      depot_waits_++;
+      pmutex_->lock();
+    }
+    depot_locks_++;
+  }
+}
+
+void FastParmTable::getStats (Stats &st)
+{
+  st.reads          = reads_;
+  st.read_waits     = read_waits_;
+  st.writes         = writes_;
+  st.write_waits    = write_waits_;
+  st.depot_locks    = depot_locks_;
+  st.depot_waits    = depot_waits_;
+  st.batches        = batches_;
+  st.batch_funklets = batch_funklets_;
+  st.max_batch      = max_batch_;
+  st.queued         = queued_;
+}
+
+bool FastParmTable::writeBehind ()
+{
+  return MTPool::num_threads() > 1;
+}
+
 FastParmTable::FastParmTable (const string& tablename,bool write,bool)
- : table_name_(tablename),writing_(write),fdomains_(0),fdb_(0)
+ : table_name_(tablename),writing_(write),fdomains_(0),fdb_(0),
+   queued_bytes_(0),domains_written_(0)
 {
+  pthread_rwlock_init(&state_lock_,0);
   prev_key.dptr = 0;
   dpiter_initialized_ = false;
   struct stat stat_buf;
@@ -83,6 +161,9 @@ FastParmTable::FastParmTable (const string& tablename,bool write,bool)
       Throw("error reading '%s/domains'");
   }
   dprintf(1)("read %d domains\n",ndom);
+  domains_written_ = ndom;
+  for( int i=0; i<ndom; i++ )
+    domain_index_.add(i,domain_list_[i]);
   // just in case, seek to new domain position
   fseek(fdomains_,ndom*sizeof(DomainEntry),SEEK_SET);
   // create/open funklet database
@@ -112,16 +193,31 @@ FastParmTable::FastParmTable (const string& tablename,bool write,bool)
     fdomains_ = 0;
     throwDepot("can't open '%s/funklets'");
   }
+  loadFunkletMap();
 }
 
 FastParmTable::~FastParmTable()
 {
+  // commit anything still waiting in the write queue
+  if( !write_queue_.empty() || domains_written_ < int(domain_list_.size()) )
+  {
+    try
+    {
+      flush();
+    }
+    catch( std::exception &exc )
+    {
+      cerr<<"Error flushing "<<table_name_<<": "<<exc.what()<<endl;
+    }
+    queued_ -= write_queue_.size();
+  }
   if( fdomains_ )
     fclose(fdomains_);
   if( fdb_ )
     dpclose(fdb_);
   if( prev_key.dptr )
     free(prev_key.dptr);
+  pthread_rwlock_destroy(&state_lock_);
 }
 
 void FastParmTable::openForWriting ()
@@ -135,7 +231,7 @@ void FastParmTable::openForWriting ()
   fdomains_ = fopen(domains_file_.c_str(),"a+b");
   if( !fdomains_ )
     throwErrno("can't reopen '%s/domains' for writing");
-  fseek(fdomains_,domain_list_.size()*sizeof(DomainEntry),SEEK_SET);
+  fseek(fdomains_,domains_written_*sizeof(DomainEntry),SEEK_SET);
   // reopen the funklet database
   if( fdb_ )
     dpclose(fdb_);
@@ -152,14 +248,146 @@ void FastParmTable::openForWriting ()
 
 void FastParmTable::flush ()
 {
-  Thread::Mutex::Lock lock(mutex_);
+  DepotLock dlock(*this);
   openForWriting();
+  WriteQueue queue;
+  {
+    WriteLock lock(*this);
+    writeDomains();
+    queue.swap(write_queue_);
+    queued_bytes_ = 0;
+  }
+  // The depot stays locked until all funklets are written, so a reader 
+  // that has missed a funklet in the queue will wait to find it in the 
+  // depot. Depot has no transactions, so the batch is committed as a
+  // series of puts followed by one sync.
+  if( !queue.empty() )
+  {
+    unsigned long nfunk = queue.size();
+    queued_ -= nfunk;
+    for( WriteQueue::const_iterator iter = queue.begin(); iter != queue.end(); iter++ )
+      if( !dpput(fdb_,iter->first.data(),iter->first.length(),
+                 iter->second->cdata(),iter->second->size(),DP_DOVER) )
+        throwDepot("error writing to '%s/funklets'");
+    batches_++;
+    batch_funklets_ += nfunk;
+    unsigned long max = max_batch_;
+    while( nfunk > max && !max_batch_.compare_exchange_weak(max,nfunk) );
+    dprintf(2)("committed %lu queued funklets\n",nfunk);
+  }
   if( fdomains_ )
     fflush(fdomains_);
   if( fdb_ )
     dpsync(fdb_);
 }
 
+void FastParmTable::writeDomains ()
+{
+  int ndom = domain_list_.size();
+  if( domains_written_ < ndom )
+  {
+    int nnew = ndom - domains_written_;
+    if( fwrite(&(domain_list_[domains_written_]),sizeof(DomainEntry),nnew,fdomains_) != uint(nnew) )
+      throwErrno("error writing to '%s/domains'");
+    domains_written_ = ndom;
+  }
+}
+
+bool FastParmTable::unqueue (const string &key)
+{
+  WriteQueue::iterator iter = write_queue_.find(key);
+  if( iter == write_queue_.end() )
+    return false;
+  queued_bytes_ -= iter->second->size();
+  write_queue_.erase(iter);
+  queued_--;
+  return true;
+}
+
+void FastParmTable::loadFunkletMap ()
+{
+  funklet_map_.clear();
+  if( !dpiterinit(fdb_) )
+    throwDepot("error initializing key iterator on '%s/funklets'");
+  datum key;
+  string name;
+  int domain_index;
+  int nfunk = 0;
+  while( (key.dptr = dpiternext(fdb_,&key.dsize)) != 0 )
+  {
+    if( key.dsize > int(sizeof(int)) )
+    {
+      decomposeKey(key,name,domain_index);
+      markFunklet(name,domain_index,true);
+      nfunk++;
+    }
+    free(key.dptr);
+  }
+  dprintf(1)("found %d funklets for %d parms\n",nfunk,int(funklet_map_.size()));
+}
+
+void FastParmTable::markFunklet (const string &parmName,int domain_index,bool exists)
+{
+  if( domain_index < 0 )
+    return;
+  if( !exists )
+  {
+    FunkletMap::iterator iter = funklet_map_.find(parmName);
+    if( iter != funklet_map_.end() && domain_index < int(iter->second.size()) )
+      iter->second[domain_index] = false;
+    return;
+  }
+  std::vector<bool> &flags = funklet_map_[parmName];
+  if( domain_index >= int(flags.size()) )
+    flags.resize(std::max(domain_index+1,int(domain_list_.size())));
+  flags[domain_index] = true;
+}
+
+bool FastParmTable::hasFunklet (const string &parmName,int domain_index)
+{
+  ReadLock lock(*this);
+  FunkletMap::const_iterator iter = funklet_map_.find(parmName);
+  return iter != funklet_map_.end() && domain_index >= 0 &&
+         domain_index < int(iter->second.size()) && iter->second[domain_index];
+}
+
+int FastParmTable::findDomain (const Domain &domain,int dbid) const
+{
+  // first check domain indicated by funklet's dbid
+  if( dbid >= 0 && dbid < int(domain_list_.size()) && 
+      domain_list_[dbid].match(domain) )
+    return dbid;
+  // A domain of zero width overlaps nothing, so it can't be found via the
+  // index. Look through the whole list, but backwards (since newer domains
+  // are likely to be towards the end).
+  for( int i=0; i<2; i++ )
+    if( domain.isDefined(i) && domain.start(i) >= domain.end(i) )
+    {
+      for( int idom=int(domain_list_.size())-1; idom>=0; idom-- )
+        if( domain_list_[idom].match(domain) )
+          return idom;
+      return -1;
+    }
+  // else any match is among the overlapping domains
+  std::vector<int> indices;
+  domain_index_.query(indices,domain);
+  for( int i=int(indices.size())-1; i>=0; i-- )
+    if( domain_list_[indices[i]].match(domain) )
+      return indices[i];
+  return -1;
+}
+
+void FastParmTable::makeDomains (const std::vector<int> &indices)
+{
+  WriteLock lock(*this);
+  for( uint i=0; i<indices.size(); i++ )
+  {
+    Domain::Ref &ref = domain_ref_list_[indices[i]];
+    if( !ref.valid() )
+      domain_list_[indices[i]].makeDomain(ref);
+  }
+}
+
 void FastParmTable::throwErrno (const string &message)
 {
   int errno0 = errno;
@@ -192,254 +420,346 @@ void FastParmTable::makeKey (char *key,const string& name,int domain_index)
   key[keySize(name)-1] = 0;
 }
 
-int FastParmTable::getFunklet (Funklet::Ref &ref,const char *kbuf,int ksiz,int domain_index)
+void FastParmTable::encodeFunklet (BlockRef &bref,const Funklet &funklet)
 {
-  datum db_data;
-  db_data.dptr = dpget(fdb_,kbuf,ksiz,0,-1,&db_data.dsize);
-  if( !db_data.dptr )
+  const Polc *polc = dynamic_cast<const Polc*>(&funklet);
+  // 0-degree polcs just have their c00 stored
+  if( polc && polc->isConstant() )
   {
-    // check for real errors
-    if( dpecode != DP_ENOITEM )
-      throwDepot("error reading '%s/funklets'");
-    // else just return 0 indicating no such funklet
-    return 0;
+    double c00 = polc->getCoeff0();
+    bref <<= new SmartBlock(sizeof(c00));
+    memcpy(bref().data(),&c00,sizeof(c00));
+    return;
   }
-  // use a try-block to deallocate db_data.dptr on any exception
-  try
+  BlockSet bset;
+  funklet.toBlock(bset);
+  // work out required size of data block
+  size_t totsize = (bset.size()+1)*sizeof(size_t);
+  for( BlockSet::const_iterator iter = bset.begin(); iter != bset.end(); iter++ )
+    totsize += (*iter)->size();
+  // allocate block
+  bref <<= new SmartBlock(totsize);
+  // store header info (# blocks and block sizes)
+  size_t *pdata = bref().pdata<size_t>();
+  *pdata = bset.size();
+  pdata++;
+  // pdata points to start of block size array, cdata points to start of data area
+  char *cdata = reinterpret_cast<char*>(pdata+bset.size());
+  // fill both from the blockset
+  for( BlockSet::const_iterator iter = bset.begin(); iter != bset.end(); iter++,pdata++ )
   {
-    // shortcut for 0-deg polcs -- only c00 is stored
-    if( db_data.dsize == sizeof(double) )
-    {
-      double c00 = *reinterpret_cast<double*>(db_data.dptr);
-      Polc *polc = new Polc(c00,defaultPolcPerturbation,defaultPolcWeight,-1);
-      ref <<= polc;
-      const Domain *pdom;
-      if( domain_ref_list_[domain_index].valid() )
-        pdom = domain_ref_list_[domain_index].deref_p();
-      else
-        pdom = &( domain_list_[domain_index].makeDomain(domain_ref_list_[domain_index]) );
-      polc->setDomain(*pdom);
-      polc->setDbId(domain_index);
-      free(db_data.dptr);
-      db_data.dptr = 0;
-      return 1;
-    }
-    // generic funklet stored as blockset
-    else
+    size_t sz = *pdata = (*iter)->size();
+    memcpy(cdata,(*iter)->data(),sz);
+    cdata += sz;
+  }
+}
+
+void FastParmTable::decodeFunklet (Funklet::Ref &ref,const char *data,int size,
+                                   int domain_index,const Domain &domain)
+{
+  // shortcut for 0-deg polcs -- only c00 is stored
+  if( size == sizeof(double) )
+  {
+    double c00 = *reinterpret_cast<const double*>(data);
+    Polc *polc = new Polc(c00,defaultPolcPerturbation,defaultPolcWeight,-1);
+    ref <<= polc;
+    polc->setDomain(domain);
+    polc->setDbId(domain_index);
+    return;
+  }
+  // generic funklet stored as blockset
+  const size_t *dptr = reinterpret_cast<const size_t*>(data);
+  int nblocks = dptr[0];
+  const size_t *block_sizes = dptr+1;
+  // check for data size sanity
+  size_t totsize = sizeof(size_t)*(nblocks+1);
+  if( size < int(totsize) )
+    Throw1("malformed funklet block in database");
+  // check for exact size
+  for( int i=0; i<nblocks; i++ )
+    totsize += block_sizes[i];
+  if( size != int(totsize) )
+    Throw1("malformed funklet block in database");
+  // now allocate blocks and copy data to them
+  const char *dataptr = reinterpret_cast<const char*>(block_sizes+nblocks);
+  BlockSet bset;
+  for( int i=0; i<nblocks; i++ )
+  {
+    SmartBlock *block = new SmartBlock(block_sizes[i]);
+    bset.pushNew().attach(block);
+    memcpy(block->data(),dataptr,block_sizes[i]);
+    dataptr += block_sizes[i];
+  }
+  // create funklet from blockset
+  ref.copy(DynamicTypeManager::construct(0,bset));
+}
+
+int FastParmTable::getFunklet (Funklet::Ref &ref,const char *kbuf,int ksiz,int domain_index,
+                               const BlockRef &queued,const Domain &domain)
+{
+  if( queued.valid() )
+  {
+    decodeFunklet(ref,queued->cdata(),queued->size(),domain_index,domain);
+    return 1;
+  }
+  datum db_data;
+  {
+    DepotLock lock(*this);
+    db_data.dptr = dpget(fdb_,kbuf,ksiz,0,-1,&db_data.dsize);
+    if( !db_data.dptr )
     {
-      // make funklet from the data block
-      size_t *dptr = reinterpret_cast<size_t*>(db_data.dptr);
-      int nblocks = dptr[0];
-      size_t *block_sizes = dptr+1;
-      // check for data size sanity
-      size_t totsize = sizeof(size_t)*(nblocks+1);
-      if( db_data.dsize < int(totsize) )
-        Throw("malformed funklet block in database");
-      // check for exact size
-      for( int i=0; i<nblocks; i++ )
-        totsize += block_sizes[i];
-      if( db_data.dsize != int(totsize) )
-        Throw("malformed funklet block in database");
-      // now allocate blocks and copy data to them
-      char *dataptr = reinterpret_cast<char*>(block_sizes+nblocks);
-      BlockSet bset;
-      for( int i=0; i<nblocks; i++ )
-      {
-        SmartBlock *block = new SmartBlock(block_sizes[i]);
-        bset.pushNew().attach(block);
-        memcpy(block->data(),dataptr,block_sizes[i]);
-        dataptr += block_sizes[i];
-      }
-      // free data buffer
-      free(db_data.dptr);
-      db_data.dptr = 0;
-      // create funklet from blockset
-      ref.copy(DynamicTypeManager::construct(0,bset));
+      // check for real errors
+      if( dpecode != DP_ENOITEM )
+        throwDepot("error reading '%s/funklets'");
+      // else just return 0 indicating no such funklet
+      return 0;
     }
-    return 1;
+  }
+  // decode outside the lock, and deallocate db_data.dptr on any exception
+  try
+  {
+    decodeFunklet(ref,db_data.dptr,db_data.dsize,domain_index,domain);
   }
   catch(...)
   {
-    if( db_data.dptr )
-      free(db_data.dptr);
+    free(db_data.dptr);
     throw;
   }
+  free(db_data.dptr);
   return 1;
 }
 
 int FastParmTable::getFunklet (Funklet::Ref &ref,const string& parmName,int domain_index)
 {
-  Thread::Mutex::Lock lock(mutex_);
   size_t keysize = keySize(parmName);
   char key[keysize];
   makeKey(key,parmName,domain_index);
-  return getFunklet(ref,key,keysize,domain_index);
+  bool have_domain;
+  {
+    ReadLock lock(*this);
+    if( domain_index < 0 || domain_index >= int(domain_list_.size()) )
+      return 0;
+    have_domain = domain_ref_list_[domain_index].valid();
+  }
+  if( !have_domain )
+    makeDomains(std::vector<int>(1,domain_index));
+  Domain::Ref domref;
+  BlockRef queued;
+  {
+    ReadLock lock(*this);
+    domref = domain_ref_list_[domain_index];
+    WriteQueue::const_iterator iter = write_queue_.find(string(key,keysize));
+    if( iter != write_queue_.end() )
+      queued = iter->second;
+  }
+  return getFunklet(ref,key,keysize,domain_index,queued,*domref);
 }
 
 int FastParmTable::getFunklets (vector<Funklet::Ref> &funklets,const string& parmName,const Domain& domain)
 {
-  Thread::Mutex::Lock lock(mutex_);
   dprintf(2)("getFunklets() for '%s' domain %lf,%lf %lf,%lf\n",parmName.c_str(),
                 domain.start(0),domain.end(0),domain.start(1),domain.end(1));
-  if( domain_list_.empty() )
+  // find all overlapping domains for which a funklet exists
+  std::vector<int> indices;
+  int nfunk = 0;
+  bool have_domains = true;
+  {
+    ReadLock lock(*this);
+    FunkletMap::const_iterator iflags = funklet_map_.find(parmName);
+    if( iflags == funklet_map_.end() )
+      return 0;
+    const std::vector<bool> &exists = iflags->second;
+    domain_index_.query(indices,domain);
+    for( uint i=0; i<indices.size(); i++ )
+    {
+      int idom = indices[i];
+      if( idom < int(exists.size()) && exists[idom] && 
+          domain_list_[idom].overlaps(domain) )
+      {
+        indices[nfunk++] = idom;
+        have_domains &= domain_ref_list_[idom].valid();
+      }
+    }
+  }
+  dprintf(2)("%d matching funklets found\n",nfunk);
+  // ok, now load list of corresponding funklets
+  if( !nfunk )
     return 0;
+  indices.resize(nfunk);
+  if( !have_domains )
+    makeDomains(indices);
   // build up funklet database key
   int keysize = keySize(parmName);
   char key[keysize];
   makeKey(key,parmName,0);
   int *key_dom = reinterpret_cast<int*>(key);
-  // find all overlapping domains in domain list, and set a flag
-  // if a funklet exists for them
-  domain_match_.resize(domain_list_.size());
-  int nfunk = 0;
-  for( uint i=0; i<domain_list_.size(); i++ )
-    if( domain_list_[i].overlaps(domain) )
+  // get domain objects and queued funklets, the rest is read from the
+  // depot without holding the state lock
+  std::vector<Domain::Ref> domains(nfunk);
+  std::vector<BlockRef> queued(nfunk);
+  {
+    ReadLock lock(*this);
+    for( int i=0; i<nfunk; i++ )
     {
-      *key_dom = i;
-      domain_match_[i] = dpvsiz(fdb_,key,keysize) >= 0;
-      if( domain_match_[i] )
-        nfunk++;
+      domains[i] = domain_ref_list_[indices[i]];
+      if( !write_queue_.empty() )
+      {
+        *key_dom = indices[i];
+        WriteQueue::const_iterator iter = write_queue_.find(string(key,keysize));
+        if( iter != write_queue_.end() )
+          queued[i] = iter->second;
+      }
     }
-    else
-      domain_match_[i] = false;
-  dprintf(2)("%d matching funklets found\n",nfunk);
-  // ok, now load list of corresponding funklets
-  if( !nfunk )
-    return 0;
+  }
   funklets.resize(nfunk);
   int ifunk = 0;
-  for( uint i=0; i<domain_list_.size(); i++ )
-    if( domain_match_[i] )
+  for( int i=0; i<nfunk; i++ )
+  {
+    *key_dom = indices[i];
+    if( !getFunklet(funklets[ifunk],key,keysize,indices[i],queued[i],*domains[i]) )
+      continue;
+    if( Debug(3) )
     {
-      *key_dom = i;
-      getFunklet(funklets[ifunk],key,keysize,i);
-      if( Debug(3) )
-      {
-        const Funklet &funk = *funklets[ifunk];
-        dprintf(3)("funklet %d, c00 is %lf, domain %lf,%lf %lf,%lf\n",ifunk,
-              funk.getCoeff0(),
-              funk.domain().start(0),funk.domain().end(0),
-              funk.domain().start(1),funk.domain().end(1));
-      }
-      ifunk++;
+      const Funklet &funk = *funklets[ifunk];
+      dprintf(3)("funklet %d, c00 is %lf, domain %lf,%lf %lf,%lf\n",ifunk,
+            funk.getCoeff0(),
+            funk.domain().start(0),funk.domain().end(0),
+            funk.domain().start(1),funk.domain().end(1));
     }
+    ifunk++;
+  }
   funklets.resize(ifunk);
   return ifunk;
 }
 
+int FastParmTable::getNames (std::vector<string> &names)
+{
+  names.clear();
+  ReadLock lock(*this);
+  for( FunkletMap::const_iterator iter = funklet_map_.begin(); iter != funklet_map_.end(); iter++ )
+    if( std::find(iter->second.begin(),iter->second.end(),true) != iter->second.end() )
+      names.push_back(iter->first);
+  return names.size();
+}
+
 Funklet::DbId FastParmTable::putCoeff (const string& parmName, const Funklet& funklet,
                                        bool)
 {
-  Thread::Mutex::Lock lock(mutex_);
-  openForWriting();
-  // search for domain in domain list
   dprintf(2)("putCoeff() for %s, c00 is %lf, domain %lf,%lf %lf,%lf\n",
         parmName.c_str(),funklet.getCoeff0(),
         funklet.domain().start(0),funklet.domain().end(0),
         funklet.domain().start(1),funklet.domain().end(1));
+  // serialize the funklet before taking any locks
+  // NB: this is the place to check for domain_is_key, but I won't bother just now
+  BlockRef bref;
+  encodeFunklet(bref,funklet);
+  // when not queueing, the depot stays locked until the funklet is written
+  bool queue = writeBehind();
+  DepotLock dlock(*this,!queue);
+  if( !queue )
+    openForWriting();
   const Domain &domain = funklet.domain(); 
-  int dom_id = -1;
-  if( !domain_list_.empty() )
-  {
-    // first check domain indicated by funklet's dbid
-    int dbid = funklet.getDbId();
-    if( dbid >= 0 && dbid < int(domain_list_.size()) && 
-        domain_list_[dbid].match(domain) )
-      dom_id = dbid;
-    // else just look through whole list, but backwards
-    // (since newer domains are likely to be towards the end)
-    else
-      for( int i=int(domain_list_.size())-1; i>=0; i-- )
-        if( domain_list_[i].match(domain) )
-        {
-          dom_id = i;
-          break;
-        }
-  }
-  dprintf(2)("matched domain #%d\n",dom_id);
-  // if no such domain, we have to store a new one
-  if( dom_id < 0 )
-  {
-    dom_id = domain_list_.size();
-    // make new domain entry and write it out first. If that succeeds,
-    // add it to list 
-    DomainEntry de(domain);
-    if( fwrite(&de,sizeof(DomainEntry),1,fdomains_) != 1 )
-      throwErrno("error writing to '%s/domains'");
-    domain_list_.reserve((dom_id/1024+1)*1024); // keep sizing up in large chunks
-    domain_list_.resize(dom_id+1);
-    domain_list_[dom_id] = de;
-    domain_ref_list_.reserve((dom_id/1024+1)*1024); // keep sizing up in large chunks
-    domain_ref_list_.resize(dom_id+1);
-    domain_ref_list_[dom_id].attach(domain);
-    dprintf(2)("created new domain %d\n",dom_id);
-  }
-  // build up funklet database key
   int keysize = keySize(parmName);
   char key[keysize];
-  makeKey(key,parmName,dom_id);
-  // now store the funklet
-  const Polc *polc = dynamic_cast<const Polc*>(&funklet);
-  // 0-degree polcs just have their c00 stored
-  if( polc && polc->isConstant() )
-  {
-    double c00 = polc->getCoeff0();
-    if( !dpput(fdb_,key,keysize,reinterpret_cast<const char*>(&c00),sizeof(c00),DP_DOVER) )
-      throwDepot("error writing to '%s/funklets'");
-  }
-  else
+  int dom_id;
+  bool flush_queue = false;
   {
-    BlockSet bset;
-    funklet.toBlock(bset);
-    // work out required size of data block
-    size_t totsize = (bset.size()+1)*sizeof(size_t);
-    for( BlockSet::const_iterator iter = bset.begin(); iter != bset.end(); iter++ )
-      totsize += (*iter)->size();
-    // allocate block
-    BlockRef bref(new SmartBlock(totsize));
-    // store header info (# blocks and block sizes)
-    size_t *pdata = bref().pdata<size_t>();
-    *pdata = bset.size();
-    pdata++;
-    // pdata points to start of block size array, cdata points to start of data area
-    char *cdata = reinterpret_cast<char*>(pdata+bset.size());
-    // fill both from the blockset
-    for( BlockSet::const_iterator iter = bset.begin(); iter != bset.end(); iter++,pdata++ )
+    WriteLock lock(*this);
+    // search for domain in domain list
+    dom_id = findDomain(domain,funklet.getDbId());
+    dprintf(2)("matched domain #%d\n",dom_id);
+    // if no such domain, we have to store a new one
+    if( dom_id < 0 )
     {
-      size_t sz = *pdata = (*iter)->size();
-      memcpy(cdata,(*iter)->data(),sz);
-      cdata += sz;
+      dom_id = domain_list_.size();
+      // the new domain entry is written out below, or by flush()
+      DomainEntry de(domain);
+      domain_list_.reserve((dom_id/1024+1)*1024); // keep sizing up in large chunks
+      domain_list_.resize(dom_id+1);
+      domain_list_[dom_id] = de;
+      domain_ref_list_.reserve((dom_id/1024+1)*1024); // keep sizing up in large chunks
+      domain_ref_list_.resize(dom_id+1);
+      domain_ref_list_[dom_id].attach(domain);
+      domain_index_.add(dom_id,de);
+      dprintf(2)("created new domain %d\n",dom_id);
     }
-    // store block in database
-    // NB: this is the place to check for domain_is_key, but I won't bother just now
-    datum db_data = { bref().cdata(),bref().size() };
-    if( !dpput(fdb_,key,keysize,bref().cdata(),bref().size(),DP_DOVER) )
+    makeKey(key,parmName,dom_id);
+    if( queue )
+    {
+      // a later put of the same funklet replaces the queued one
+      BlockRef &qref = write_queue_[string(key,keysize)];
+      if( qref.valid() )
+        queued_bytes_ -= qref->size();
+      else
+        queued_++;
+      qref = bref;
+      queued_bytes_ += bref->size();
+      flush_queue = queued_bytes_ > MaxQueuedBytes;
+    }
+    else
+    {
+      writeDomains();
+      // any queued copy of the funklet is stale now
+      unqueue(string(key,keysize));
+    }
+    markFunklet(parmName,dom_id,true);
+  }
+  // now store the funklet
+  if( !queue )
+  {
+    if( !dpput(fdb_,key,keysize,bref->cdata(),bref->size(),DP_DOVER) )
       throwDepot("error writing to '%s/funklets'");
   }
+  else if( flush_queue )
+    flush();
   return dom_id; 
 }
 
 void FastParmTable::deleteFunklet (const string &parmName,int domain_index)
 {
-  Thread::Mutex::Lock lock(mutex_);
+  DepotLock dlock(*this);
   openForWriting();
   int keysize = keySize(parmName);
   char key[keysize];
   makeKey(key,parmName,domain_index);
-  datum db_key = { key,keysize };
-  if( !dpout(fdb_,key,keysize) )
+  bool queued;
+  {
+    WriteLock lock(*this);
+    queued = unqueue(string(key,keysize));
+    markFunklet(parmName,domain_index,false);
+  }
+  // a funklet that was only queued is not in the depot yet
+  if( !dpout(fdb_,key,keysize) && !( queued && dpecode == DP_ENOITEM ) )
     throwDepot("error deleting funklet '"+parmName+"'");
 }
 
 void FastParmTable::deleteAllFunklets (const string &parmName)
 {
-  Thread::Mutex::Lock lock(mutex_);
+  DepotLock dlock(*this);
   openForWriting();
+  int ndom;
+  {
+    WriteLock lock(*this);
+    // drop queued funklets of this parm
+    for( WriteQueue::iterator iter = write_queue_.begin(); iter != write_queue_.end(); )
+    {
+      if( parmName == iter->first.c_str()+sizeof(int) )
+      {
+        queued_bytes_ -= iter->second->size();
+        write_queue_.erase(iter++);
+        queued_--;
+      }
+      else
+        iter++;
+    }
+    funklet_map_.erase(parmName);
+    ndom = domain_list_.size();
+  }
   int keysize = keySize(parmName);
   char key[keysize];
   makeKey(key,parmName,0);
   int *pdom = reinterpret_cast<int*>(key);
-  for( int idom=0; idom<int(domain_list_.size()); idom++ )
+  for( int idom=0; idom<ndom; idom++ )
   {
     *pdom = idom;
     if( !dpout(fdb_,key,keysize) )
@@ -450,17 +770,17 @@ void FastParmTable::deleteAllFunklets (const string &parmName)
   }
 }
 
-static void decomposeKey (const FastParmTable::datum &key,string &name,int &domain_index)
-{
-  // decomposes a key into a funklet name and a domain index
-  int *pdom = reinterpret_cast<int*>(key.dptr);
-  domain_index = *pdom;
-  name.assign(reinterpret_cast<char*>(pdom+1));
-}
-
 bool FastParmTable::firstFunklet (string &name,int &domain_index)
 {
   Thread::Mutex::Lock lock(mutex_);
+  // iteration goes over the depot, so commit any queued funklets first
+  bool have_queue;
+  {
+    ReadLock rlock(*this);
+    have_queue = !write_queue_.empty();
+  }
+  if( have_queue )
+    flush();
   // get first DB key, return false if None
   if( !dpiterinit(fdb_) )
     throwDepot("error initializing key iterator");
@@ -486,6 +806,101 @@ bool FastParmTable::nextFunklet (string &name,int &domain_index)
   return true;
 }
 
+FastParmTable::DomainIndex::DomainIndex ()
+{}
+
+void FastParmTable::DomainIndex::add (int index,const DomainEntry &entry)
+{
+  Item item;
+  for( int i=0; i<2; i++ )
+  {
+    if( entry.isDefined(i) )
+    {
+      item.start[i] = entry.start(i);
+      item.end[i]   = entry.end(i);
+    }
+    else
+    {
+      item.start[i] = -HUGE_VAL;
+      item.end[i]   = HUGE_VAL;
+    }
+  }
+  item.index = index;
+  pending_.push_back(item);
+  // a rebuild is O(n), so grow the pending list with the tree, to keep
+  // the cost per added domain constant
+  if( pending_.size() > 256 + items_.size()/64 )
+    rebuild();
+}
+
+void FastParmTable::DomainIndex::rebuild ()
+{
+  std::sort(pending_.begin(),pending_.end(),itemLess);
+  int n0 = items_.size();
+  items_.insert(items_.end(),pending_.begin(),pending_.end());
+  std::inplace_merge(items_.begin(),items_.begin()+n0,items_.end(),itemLess);
+  pending_.clear();
+  boxes_.resize(items_.size());
+  if( !items_.empty() )
+    makeBox(0,items_.size());
+}
+
+const FastParmTable::DomainIndex::Item & FastParmTable::DomainIndex::makeBox (int lo,int hi)
+{
+  int mid = (lo+hi)/2;
+  Item &box = boxes_[mid];
+  box = items_[mid];
+  if( lo < mid )
+    extend(box,makeBox(lo,mid));
+  if( mid+1 < hi )
+    extend(box,makeBox(mid+1,hi));
+  return box;
+}
+
+void FastParmTable::DomainIndex::queryTree (std::vector<int> &indices,const Item &q,int lo,int hi) const
+{
+  while( lo < hi )
+  {
+    int mid = (lo+hi)/2;
+    if( !overlaps(boxes_[mid],q) )
+      return;
+    queryTree(indices,q,lo,mid);
+    const Item &item = items_[mid];
+    if( overlaps(item,q) )
+      indices.push_back(item.index);
+    // items are sorted by start time, so if this one starts after the 
+    // query, so does everything to the right of it
+    if( item.start[0] >= q.end[0] )
+      return;
+    lo = mid+1;
+  }
+}
+
+void FastParmTable::DomainIndex::query (std::vector<int> &indices,const Domain &dom) const
+{
+  Item q;
+  for( int i=0; i<2; i++ )
+  {
+    if( dom.isDefined(i) )
+    {
+      q.start[i] = dom.start(i);
+      q.end[i]   = dom.end(i);
+    }
+    else
+    {
+      q.start[i] = -HUGE_VAL;
+      q.end[i]   = HUGE_VAL;
+    }
+  }
+  indices.clear();
+  if( !items_.empty() )
+    queryTree(indices,q,0,items_.size());
+  for( uint i=0; i<pending_.size(); i++ )
+    if( overlaps(pending_[i],q) )
+      indices.push_back(pending_[i].index);
+  std::sort(indices.begin(),indices.end());
+}
+
 FastParmTable::DomainEntry::DomainEntry ()
 { memset(defined,0,sizeof(defined)); }
 
@@ -496,11 +911,11 @@ FastParmTable::DomainEntry::DomainEntry (const Domain &dom)
     defined[i] = dom.isDefined(i);
     if( defined[i] )
     {
-      start[i] = dom.start(i);
-      end[i]   = dom.end(i);
+      start_[i] = dom.start(i);
+      end_[i]   = dom.end(i);
     }
     else
-      start[i] = end[i] = 0;
+      start_[i] = end_[i] = 0;
   }
 }
 
@@ -512,8 +927,8 @@ bool FastParmTable::DomainEntry::match (const Domain &dom) const
     if( defined[i] != dom.isDefined(i) )
       return false;
     if( defined[i] &&
-        ( fabs(start[i]-dom.start(i)) > 1e-16 ||
-          fabs(end[i]-dom.end(i)) > 1e-16 ) )
+        ( fabs(start_[i]-dom.start(i)) > 1e-16 ||
+          fabs(end_[i]-dom.end(i)) > 1e-16 ) )
       return false;
   }
   return true;
@@ -526,8 +941,8 @@ bool FastParmTable::DomainEntry::overlaps (const Domain &dom) const
   {
     if( defined[i] && dom.isDefined(i) )
     {
-      if( start[i] >= dom.end(i) ||
-          end[i] <= dom.start(i)  )
+      if( start_[i] >= dom.end(i) ||
+          end_[i] <= dom.start(i)  )
         return false;
     }
   }
@@ -539,7 +954,7 @@ const Domain & FastParmTable::DomainEntry::makeDomain (Domain::Ref &domref) cons
   Domain &dom = domref <<= new Domain;
   for( int i=0; i<Axis::MaxAxis; i++ )
     if( defined[i] )
-      dom.defineAxis(i,start[i],end[i]);
+      dom.defineAxis(i,start_[i],end_[i]);
   return dom;
 }
 
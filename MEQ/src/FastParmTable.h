@@ -34,13 +34,41 @@
 #ifdef HAVE_FASTPARMTABLE 
 
 #include <MEQ/ParmTable.h>
+#include <DMI/SmartBlock.h>
+#include <pthread.h>
+#include <algorithm>
+#include <map>
 
 namespace Meq {
 
 //##ModelId=3F86886E01E4
+//## Concurrency: the in-memory state of the table (domain list and index,
+//## funklet bitmaps, write queue) is guarded by a reader/writer lock, so
+//## that Parms can look up funklets in parallel. The depot itself is not
+//## thread-safe, so reads and writes of the depot are serialized by the
+//## table mutex. When running multithreaded, putCoeff() does not write to
+//## the depot, but serializes the funklet into a write queue, where later
+//## puts of the same funklet replace earlier ones. The queue is committed
+//## by flush() in one batch followed by a single sync. Lookups check the
+//## queue first, so queued funklets are visible at once.
 class FastParmTable : public ParmTable
 {
 public:
+  // table statistics, summed over all tables, returned by getStats()
+  typedef struct
+  {
+    double reads;          // number of read locks taken on table state
+    double read_waits;     // of which, had to wait for a writer
+    double writes;         // number of write locks taken on table state
+    double write_waits;    // of which, had to wait
+    double depot_locks;    // number of times the depot was locked
+    double depot_waits;    // of which, had to wait for another thread
+    double batches;        // number of write batches committed by flush()
+    double batch_funklets; // total number of funklets in the above
+    double max_batch;      // number of funklets in the largest batch
+    double queued;         // number of funklets currently queued
+  } Stats;
+  
   // this is a binary structure used to represent a domain in the domain index
   class DomainEntry
   {
@@ -57,12 +85,75 @@ public:
       // makes a Meq::Domain object from the domain entry, attaches to ref
       const Domain & makeDomain (Domain::Ref &domref) const;
       
+      bool isDefined (int i) const
+      { return defined[i]; }
+      double start (int i) const
+      { return start_[i]; }
+      double end (int i) const
+      { return end_[i]; }
+      
     private:
       bool   defined[Axis::MaxAxis];
-      double start[Axis::MaxAxis];
-      double end[Axis::MaxAxis];
+      double start_[Axis::MaxAxis];
+      double end_[Axis::MaxAxis];
   };
   typedef std::vector<DomainEntry> DomainList;
+  
+  // In-memory index of the domain list, for overlap queries in time and
+  // frequency. Domains are kept sorted by start time in an implicit
+  // balanced tree, where every node holds the time x freq bounding box of
+  // its subtree, so a query only descends into subtrees whose box overlaps
+  // the query domain. Domains added since the last rebuild are kept in a
+  // short unsorted list, which is merged into the tree once it grows past
+  // a fraction of the tree size. An undefined axis overlaps everything.
+  class DomainIndex
+  {
+    public:
+      DomainIndex ();
+      
+      // adds domain entry with the given index
+      void add (int index,const DomainEntry &entry);
+      
+      // fills indices with the (ascending) indices of all domains that 
+      // overlap dom in time and frequency. Other axes are not checked.
+      void query (std::vector<int> &indices,const Domain &dom) const;
+      
+      int size () const
+      { return items_.size() + pending_.size(); }
+      
+    private:
+      typedef struct 
+      {
+        double start[2],end[2];
+        int index;
+      } Item;
+      
+      static bool itemLess (const Item &a,const Item &b)
+      { return a.start[0] < b.start[0]; }
+      
+      static bool overlaps (const Item &item,const Item &q)
+      { return item.start[0] < q.end[0] && item.end[0] > q.start[0] &&
+               item.start[1] < q.end[1] && item.end[1] > q.start[1]; }
+      
+      static void extend (Item &box,const Item &item)
+      { for( int i=0; i<2; i++ ) 
+        {
+          box.start[i] = std::min(box.start[i],item.start[i]);
+          box.end[i]   = std::max(box.end[i],item.end[i]);
+        }
+      }
+      
+      // merges pending items into the tree, and recomputes bounding boxes
+      void rebuild ();
+      // computes bounding box of subtree [lo,hi), stores it in boxes_[mid]
+      const Item & makeBox (int lo,int hi);
+      void queryTree (std::vector<int> &indices,const Item &q,int lo,int hi) const;
+      
+      std::vector<Item> items_;     // sorted by start time
+      std::vector<Item> boxes_;     // bounding boxes of subtrees
+      std::vector<Item> pending_;   // items added since last rebuild
+  };
+  
   typedef std::vector<Domain::Ref> DomainObjectList;
   typedef struct { char *dptr; int dsize; } datum;
   
@@ -85,6 +176,8 @@ public:
   // If domain_is_key, checks that domain is unique
     //##ModelId=3F86886F02C8
   Funklet::DbId putCoeff (const string& parmName, const Funklet& funklet,bool domain_is_key=false);
+
+  int getNames (std::vector<string> &names);
   
   
   // Get the name of the CasaParmTable.
@@ -92,7 +185,10 @@ public:
   const string& name() const
   { return table_name_; }
 
+  // commits queued funklets and syncs the table to disk
   void flush ();
+  
+  static void getStats (Stats &st);
 
 // helper methods
   int getFunklet (Funklet::Ref &ref,const string& parmName,int domain_id);
@@ -103,6 +199,9 @@ public:
   const DomainList & domainList () const
   { return domain_list_; }
   
+  // returns True if a funklet for the given parm and domain exists
+  bool hasFunklet (const string &parmName,int domain_index);
+  
 // this iterates over funklets in the database
 // call this first to initiazize the iterator.
   bool firstFunklet (string &name,int &domain_index);
@@ -116,9 +215,42 @@ public:
   { return mutex_; }
   
 private:
+  // guards for the state lock, counting contention
+  class ReadLock
+  {
+    public:
+      ReadLock (const FastParmTable &table);
+      ~ReadLock ()
+      { pthread_rwlock_unlock(plock_); }
+    private:
+      pthread_rwlock_t *plock_;
+  };
+  class WriteLock
+  {
+    public:
+      WriteLock (const FastParmTable &table);
+      ~WriteLock ()
+      { pthread_rwlock_unlock(plock_); }
+    private:
+      pthread_rwlock_t *plock_;
+  };
+  // guard for the depot mutex, counting contention. If lock is false,
+  // the mutex is not taken.
+  class DepotLock
+  {
+    public:
+      DepotLock (const FastParmTable &table,bool lock=true);
+      ~DepotLock ()
+      { if( pmutex_ ) pmutex_->unlock(); }
+    private:
+      const Thread::Mutex *pmutex_;
+  };
 
   std::string table_name_;
+  // held for depot and domains file I/O. Always taken before state_lock_.
   Thread::Mutex mutex_;
+  // guards in-memory state
+  mutable pthread_rwlock_t state_lock_;
   
   bool writing_;
   
@@ -131,7 +263,39 @@ private:
   // list of known domains
   DomainList domain_list_;
   DomainObjectList domain_ref_list_;
-  std::vector<bool>        domain_match_;
+  // overlap index of the above
+  DomainIndex domain_index_;
+  
+  // funklet existence bitmaps: for every parm, a flag per domain index 
+  // telling if the funklet exists. This is built from the depot keys at
+  // open time, and kept up to date by putCoeff() and deleteFunklet(), so
+  // that queries need not go to the depot to check for funklets.
+  typedef std::map<string,std::vector<bool> > FunkletMap;
+  FunkletMap funklet_map_;
+  
+  // scans depot keys and fills funklet_map_
+  void loadFunkletMap ();
+  // sets or clears the existence flag of a funklet
+  void markFunklet (const string &parmName,int domain_index,bool exists);
+  
+  // write queue: serialized funklets waiting for flush(), by depot key
+  typedef std::map<string,BlockRef> WriteQueue;
+  WriteQueue write_queue_;
+  size_t queued_bytes_;
+  // domains [0,domains_written_) are in the domains file, the rest
+  // are waiting for flush()
+  int domains_written_;
+  
+  // true if putCoeff() should go through the write queue
+  static bool writeBehind ();
+  // removes funklet from write queue, returns true if it was there
+  bool unqueue (const string &key);
+  // writes new domains to the domains file. Needs mutex_ and the state lock.
+  void writeDomains ();
+  // finds domain in domain list, returns -1 if not found. dbid is tried first.
+  int findDomain (const Domain &domain,int dbid) const;
+  // makes sure domain objects exist for the given domain indices
+  void makeDomains (const std::vector<int> &indices);
   
 
   // this is used by first/nextFunklet
@@ -141,8 +305,15 @@ private:
   // reopens table for writing, if it's not open for writing yet
   void openForWriting ();
   
-  // internal function, gets funklet with given DB key
-  int getFunklet (Funklet::Ref &ref,const char *kbuf,int ksiz,int domain_index);
+  // internal function, gets funklet with given DB key. If queued is valid,
+  // the funklet is taken from there rather than from the depot.
+  int getFunklet (Funklet::Ref &ref,const char *kbuf,int ksiz,int domain_index,
+                  const BlockRef &queued,const Domain &domain);
+  // serializes funklet into a data block, in depot format
+  static void encodeFunklet (BlockRef &bref,const Funklet &funklet);
+  // makes funklet from a data block in depot format
+  static void decodeFunklet (Funklet::Ref &ref,const char *data,int size,
+                             int domain_index,const Domain &domain);
   
   // helper function, returns DB key size, given a parmname
   int keySize (const string &name)
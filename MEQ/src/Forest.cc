@@ -23,9 +23,14 @@
 
 #include "Forest.h"
 #include "MeqVocabulary.h"
+#include "MTPool.h"
+#include "VellsKernels.h"
+#include "FastParmTable.h"
+#include <DMI/BlockPool.h>
 #include <DMI/DynamicTypeManager.h>
 #include <DMI/List.h>
 #include <DMI/Timestamp.h>
+#include <algorithm>
 
 // pull in registry
 static int dum = aidRegistry_Meq();
@@ -46,6 +51,25 @@ const HIID FProfilingEnabled = AidProfiling|AidEnabled;
 const HIID FCwd = AidCwd;
 const HIID FLogFileName = AidLog|AidFile|AidName;
 const HIID FLogAppend = AidLog|AidAppend;
+// size of forest-wide result cache, in MB (0 to disable)
+const HIID FCacheSize = AidCache|AidSize;
+// multithreading stats (see MTPool::Brigade::Stats)
+const HIID FMTStats = AidMT|AidStats;
+// keep child work orders on the same worker thread across requests
+const HIID FMTTiling = AidMT|AidTiling;
+// list of CPUs to pin worker threads to (empty to unpin)
+const HIID FMTCPU = AidMT|AidCPU;
+// memory kept for reuse by Vells/NumArray storage, in MB (0 to disable)
+const HIID FVellsCacheSize = AidVells|AidCache|AidSize;
+// memory pool stats (see DMI::BlockPool::Stats), in profiling_stats
+const HIID FVellsStats = AidVells;
+// parm table stats (see FastParmTable::Stats), in profiling_stats
+const HIID FParmTableStats = AidParm|AidTable;
+// let functions write their output into child result storage, if the
+// child result is not referenced elsewhere
+const HIID FUseChildVells = AidUse|AidChild|AidVells;
+
+const double DefaultVellsCacheSize = 256;
 
 
 //##ModelId=3F60697A00ED
@@ -71,11 +95,16 @@ Forest::Forest ()
   wstate()[FNumInitErrors] = num_init_errors = 0;
   // default cache policy
   cache_policy_ = Node::CACHE_SMART;
+  cache_depth_ = 1;
+  cache_max_size_ = 0;
   log_policy_ = Node::LOG_NOTHING;
   log_append_ = false;
   log_filename_ = "meqlog.mql";
   profiling_enabled_ = true;
+  use_child_vells_ = true;
+  precision_ = VellsKernels::DOUBLE;
   abort_flag_ = false;
+  DMI::BlockPool::setLimit(size_t(DefaultVellsCacheSize*1024*1024));
 
   // init the state record
   initDefaultState();
@@ -88,6 +117,7 @@ void Forest::clear ()
   nodes.resize(1);
   name_map.clear();
   num_valid_nodes = 0;
+  result_cache_.clear();
   logger_.close();
   Axis::resetDefaultMap();
 }
@@ -369,6 +399,13 @@ void Forest::initDefaultState ()
   st[FDebugLevel] = debug_level_;
   st[FSymdeps] <<= symdeps().toRecord();
   st[FCachePolicy] = cache_policy_;
+  st[FCacheDepth] = cache_depth_;
+  st[FCacheMaxSize] = cache_max_size_;
+  st[FCacheSize] = 0;
+  st[FMTTiling] = false;
+  st[FVellsCacheSize] = DefaultVellsCacheSize;
+  st[FUseChildVells] = use_child_vells_;
+  st[FPrecision] = "double";
   st[FProfilingEnabled] = profiling_enabled_;
   st[FBreakpoint] = breakpoints;
   st[FBreakpointSingleShot] = breakpoints_ss;
@@ -380,6 +417,39 @@ DMI::Record::Ref Forest::state () const
   // update axis map
   staterec_()[FAxisMap] = Axis::getAxisRecords();
   staterec_()[FAxisList] = Axis::getAxisIds();
+  // update result cache stats
+  DMI::Vec &stats = staterec_()[FCacheStats].replace() <<=
+      new DMI::Vec(Tpdouble,sizeof(ResultCache::Stats)/sizeof(double));
+  result_cache_.fillStats(stats);
+  // update thread pool stats
+  if( MTPool::enabled() )
+  {
+    DMI::Vec &mtstats = staterec_()[FMTStats].replace() <<=
+        new DMI::Vec(Tpdouble,sizeof(MTPool::Brigade::Stats)/sizeof(double));
+    MTPool::brigade().fillStats(mtstats);
+  }
+  // update memory pool stats. The profiling stats record is kept, and only
+  // its fields are replaced.
+  DMI::BlockPool::Stats bpstats;
+  DMI::BlockPool::getStats(bpstats);
+  if( !staterec_->hasField(FProfilingStats) )
+    staterec_()[FProfilingStats] <<= new DMI::Record;
+  DMI::Record &profstats = staterec_()[FProfilingStats].as_wr<DMI::Record>();
+  DMI::Vec &bpvec = profstats[FVellsStats].replace() <<=
+      new DMI::Vec(Tpdouble,sizeof(DMI::BlockPool::Stats)/sizeof(double));
+  const double *pst = reinterpret_cast<const double *>(&bpstats);
+  for( uint i=0; i<sizeof(DMI::BlockPool::Stats)/sizeof(double); i++ )
+    bpvec[i] = pst[i];
+#ifdef HAVE_FASTPARMTABLE
+  // update parm table stats
+  FastParmTable::Stats ptstats;
+  FastParmTable::getStats(ptstats);
+  DMI::Vec &ptvec = profstats[FParmTableStats].replace() <<=
+      new DMI::Vec(Tpdouble,sizeof(FastParmTable::Stats)/sizeof(double));
+  pst = reinterpret_cast<const double *>(&ptstats);
+  for( uint i=0; i<sizeof(FastParmTable::Stats)/sizeof(double); i++ )
+    ptvec[i] = pst[i];
+#endif
   return staterec_.copy();
 }
 
@@ -401,6 +471,36 @@ void Forest::setStateImpl (DMI::Record::Ref &rec)
     rec[FAxisMap] = Axis::getAxisRecords();
   }
   rec[FCachePolicy].get(cache_policy_);
+  rec[FCacheDepth].get(cache_depth_);
+  rec[FCacheMaxSize].get(cache_max_size_);
+  double cache_size;
+  if( rec[FCacheSize].get(cache_size) )
+    result_cache_.setBudget(size_t(std::max(cache_size,0.)*1024*1024));
+  bool mt_tiling;
+  if( rec[FMTTiling].get(mt_tiling) && MTPool::enabled() )
+    MTPool::brigade().setTileAffinity(mt_tiling);
+  std::vector<int> mt_cpus;
+  if( rec[FMTCPU].get_vector(mt_cpus) && MTPool::enabled() )
+    MTPool::brigade().setCpuAffinity(mt_cpus);
+  double vells_cache_size;
+  if( rec[FVellsCacheSize].get(vells_cache_size) )
+    DMI::BlockPool::setLimit(size_t(std::max(vells_cache_size,0.)*1024*1024));
+  rec[FUseChildVells].get(use_child_vells_);
+  string precision;
+  if( rec[FPrecision].get(precision) )
+  {
+    int prec = Node::precisionFromString(precision);
+    FailWhen(prec<0,"forest "+FPrecision.toString()+" must be \"double\" or \"single\"");
+    // cached results may have been computed at the old precision
+    if( prec != precision_ )
+    {
+      result_cache_.clear();
+      for( uint i=0; i<nodes.size(); i++ )
+        if( nodes[i].valid() )
+          nodes[i]().clearCache(false);
+    }
+    precision_ = prec;
+  }
   rec[FLogPolicy].get(log_policy_);
   rec[FLogFileName].get(log_filename_);
   rec[FLogAppend].get(log_append_);
@@ -27,6 +27,7 @@
 #include <MEQ/SymdepMap.h>
 #include <MEQ/Request.h>
 #include <MEQ/MeqVocabulary.h>
+#include <MEQ/ResultCache.h>
 #include <DMI/HashMap.h>
 #include <DMI/BOIO.h>
 #include <vector>
@@ -149,6 +150,26 @@ class Forest
     void setCachePolicy (int pol)
     { cache_policy_ = pol; }
 
+    // returns the default evaluation precision for nodes that neither have
+    // a setting of their own nor inherit one from a parent
+    // (VellsKernels::DOUBLE or SINGLE)
+    int precision () const
+    { return precision_; }
+
+    // returns the default number of results kept in node caches
+    int cacheDepth () const
+    { return cache_depth_; }
+
+    // returns the default memory limit of older results in node caches,
+    // in MB (<=0 for no limit)
+    double cacheMaxSize () const
+    { return cache_max_size_; }
+
+    // returns the forest-wide result cache (see ResultCache.h). This is
+    // enabled by setting a non-0 cache_size (in MB) in the forest state.
+    ResultCache & resultCache ()
+    { return result_cache_; }
+
     // returns or sets the default log policy
     int logPolicy () const
     { return log_policy_; }
@@ -169,6 +190,11 @@ class Forest
     void enableProfiling (bool enable)
     { profiling_enabled_ = enable; }
 
+    // if true, functions may evaluate in-place, reusing the storage of
+    // child results that are not referenced elsewhere
+    bool useChildVells () const
+    { return use_child_vells_; }
+
     Thread::Condition & stopFlagCond ()
     { return stop_flag_cond_; }
 
@@ -342,6 +368,16 @@ class Forest
     // default cache policy for nodes
     int cache_policy_;
 
+    // default evaluation precision for nodes
+    int precision_;
+
+    // default cache depth and memory limit for nodes
+    int cache_depth_;
+    double cache_max_size_;
+
+    // result cache shared by all nodes
+    ResultCache result_cache_;
+
     // default log policy for nodes (see Meq::Node::LOG_POLICY for enums)
     int log_policy_;
         
@@ -359,6 +395,9 @@ class Forest
 
     // is profiling enabled?
     bool profiling_enabled_;
+
+    // is in-place evaluation enabled?
+    bool use_child_vells_;
 };
 
 } // namespace Meq
@@ -24,6 +24,7 @@
 #include "Function.h"
 #include "Request.h"
 #include "MeqVocabulary.h"
+#include "Forest.h"
 
 namespace Meq {
 
@@ -35,6 +36,7 @@ Function::Function(int nchildren,const HIID *labels,int nmandatory)
     enable_flags_(true),force_integrated_(false)
 {
   allow_missing_data_ = false;
+  allow_in_place_ = false;
 //  setAutoResample(RESAMPLE_FAIL);
 }
 
@@ -48,6 +50,45 @@ void Function::allowMissingData ()
   children().setMissingDataPolicy(AidIgnore);
 }
 
+void Function::allowInPlace ()
+{
+  allow_in_place_ = true;
+}
+
+void Function::allowSharedResults ()
+{
+  shareable_results_ = true;
+}
+
+void Function::markTempValues (vector<const Vells*> &temps,int iplane,int nplanes,
+                               const std::vector<Result::Ref> &childres,
+                               vector<const VellSet*> &child_vs,
+                               vector<const Vells*> &values)
+{
+  for( uint i=0; i<values.size(); i++ )
+  {
+    // we must hold the only ref to the child result. Since nobody else
+    // can see it, it is safe to write to it
+    if( !values[i] || !childres[i].isOnlyRef() || !childres[i].isDirectlyWritable() )
+      continue;
+    Result &chres = const_cast<Result::Ref &>(childres[i]).dewr();
+    // a rank-0 child's value is reused for every plane
+    if( !chres.tensorRank() && nplanes>1 )
+      continue;
+    // this will privatize the vellset and value if they are shared with
+    // other results, in which case the data block will not be ours alone
+    VellSet &vs = chres.vellSetWr(chres.tensorRank() ? iplane : 0);
+    const Vells &val = vs.getValueWr();
+    if( val.hasOwnBlock() && val.dataBlock().isOnlyRef() )
+    {
+      child_vs[i] = &vs;
+      values[i] = &val;
+      val.setTemp();
+      temps.push_back(&val);
+    }
+  }
+}
+
 //##ModelId=400E53070274
 TypeId Function::objectType() const
 {
@@ -208,6 +249,8 @@ int Function::getResult (Result::Ref &resref,
     // continue evaluation only if no fails popped up
     if( !vellset.isFail() )
     {
+      // child values marked for reuse by evaluate()
+      vector<const Vells*> temps;
       // catch exceptions during evaluation and stuff them into fails
       try
       {
@@ -222,7 +265,11 @@ int Function::getResult (Result::Ref &resref,
         evaluateFlags(flagref,request,res_shape,child_vs);
         if( flagref.valid() )
           vellset.setDataFlags(flagref);
-        // Evaluate the main value.
+        // Evaluate the main value. If there are no perturbed values to
+        // evaluate, child values are not needed afterwards, so evaluate()
+        // may reuse their storage.
+        if( allow_in_place_ && spids.empty() && forest().useChildVells() )
+          markTempValues(temps,iplane,nplanes,childres,child_vs,values);
         vellset.setValue(evaluate(request,res_shape,values));
         // Evaluate all perturbed values.
         vector<vector<const Vells*> > pert_values(npertsets);
@@ -290,6 +337,9 @@ int Function::getResult (Result::Ref &resref,
       {
         MakeFailVellSet(vellset,"uknown exception in Function::getResult");
       }
+      // clear temp marks that evaluate() did not use up
+      for( uint i=0; i<temps.size(); i++ )
+        temps[i]->setTemp(false);
     } // endif( !vellset.isFail() )
     // count the # of fails
     if( vellset.isFail() )
@@ -56,6 +56,20 @@ public:
 protected:
   // may be called if the Node can support missing data (see evaluate() below)
   void allowMissingData ();
+
+  // may be called if the Node's evaluate() reads each child value only
+  // once, and computes its result element by element via Vells math. The
+  // result may then be written into the storage of a child value, provided
+  // nothing else refers to the child result (see Vells::setTemp()). This is
+  // only done for the main value, and only if there are no perturbed values
+  // to compute. Can be disabled forest-wide via the use_child_vells field.
+  void allowInPlace ();
+
+  // may be called if the Node's result depends on nothing but its
+  // definition, its children and the request (i.e. it keeps no state
+  // between requests, and doesn't generate random values), so that
+  // identical nodes may share results via the forest result cache
+  void allowSharedResults ();
     
   // Evaluate the value for the given request. The output shape is
   // passed in as the shape argument (usually taken from first child, rest
@@ -108,6 +122,15 @@ private:
 //  vector<Node*> itsChildren;
 
   bool allow_missing_data_;
+
+  bool allow_in_place_;
+
+  // marks child values that evaluate() may overwrite as temps, and
+  // returns them in temps
+  void markTempValues (vector<const Vells*> &temps,int iplane,int nplanes,
+                       const std::vector<Result::Ref> &childres,
+                       vector<const VellSet*> &child_vs,
+                       vector<const Vells*> &values);
     
   bool force_integrated_;
   
@@ -24,6 +24,9 @@
 //
 
 #include "MTPool.h"
+#include <string.h>
+#include <pthread.h>
+#include <sched.h>
 #include <vector>
 
 namespace Meq
@@ -62,6 +65,8 @@ void stop  ()
 
 
 Brigade::Brigade (int nwork,int max_busy,Thread::Mutex::Lock *plock)
+  : queues_(MAX_QUEUES),nqueues_(1),nqueued_(0),nthr_(MAX_DEPTH),nidle_(0),
+    tile_affinity_(false)
 {
   workers_.reserve(128);
   Thread::Mutex::Lock lock;
@@ -70,38 +75,87 @@ Brigade::Brigade (int nwork,int max_busy,Thread::Mutex::Lock *plock)
   plock->relock(cond());
   brigade_id_ = max_brigade_id_++;
   max_busy_ = max_busy;
-  nthr_.resize(100,0);
   nidle_ = nwork;
   // spawn worker threads
   for( int i=0; i<nwork; i++ )
+    launchWorker(newWorker(IDLE));
+  pid_ = getpid();
+}
+
+// inits new worker entry, assigning it a queue
+// we're expected to hold a lock on cond()
+WorkerData & Brigade::newWorker (int state)
+{
+  workers_.push_back(WorkerData());
+  WorkerData &wd = workers_.back();
+  wd.state = state;
+  wd.brigade = this;
+  wd.launched_by_us = false;
+  int iq = nqueues_++;
+  wd.iqueue = iq < MAX_QUEUES ? iq : 1 + iq%(int(MAX_QUEUES)-1);
+  wd.num_orders = wd.num_stolen = 0;
+  wd.num_affine = wd.num_nonaffine = 0;
+  return wd;
+}
+
+// we're expected to hold a lock on cond()
+void Brigade::launchWorker (WorkerData &wd)
+{
+  wd.launched_by_us = true;
+  wd.thread_id = Thread::create(startWorker,&wd);
+  if( !cpus_.empty() )
+    pinWorker(wd,workers_.size()-1);
+}
+
+// CPU affinity is only supported on Linux: elsewhere, setCpuAffinity()
+// logs a message and ignores the CPU list, so cpus_ stays empty and
+// pinWorker() is never called
+void Brigade::pinWorker (WorkerData &wd,int iworker)
+{
+#ifdef __linux__
+  cpu_set_t cpuset;
+  CPU_ZERO(&cpuset);
+  if( cpus_.empty() )
   {
-    workers_.push_back(WorkerData());
-    WorkerData &wd = workers_.back();
-    wd.state = IDLE;
-    wd.brigade = this;
-    wd.thread_id = Thread::create(startWorker,&wd);
+    for( int i=0; i<CPU_SETSIZE; i++ )
+      CPU_SET(i,&cpuset);
   }
-  pid_ = getpid();
+  else
+    CPU_SET(cpus_[iworker%cpus_.size()],&cpuset);
+  int err = pthread_setaffinity_np(wd.thread_id.id(),sizeof(cpuset),&cpuset);
+  if( err )
+  {
+    dprintf(0)("failed to set CPU affinity of worker %d: %s\n",iworker,strerror(err));
+  }
+#endif
+}
+
+void Brigade::setCpuAffinity (const std::vector<int> &cpus)
+{
+#ifndef __linux__
+  if( !cpus.empty() )
+  {
+    dprintf(0)("CPU affinity is not supported on this platform, ignoring CPU list\n");
+  }
+  return;
+#endif
+  Thread::Mutex::Lock lock(cond());
+  cpus_ = cpus;
+  for( uint i=0; i<workers_.size(); i++ )
+    if( workers_[i].launched_by_us )
+      pinWorker(workers_[i],i);
 }
 
 // adds thread to brigade
 void Brigade::join (int state,int depth)
 {
   Thread::Mutex::Lock lock(cond());
-  workers_.push_back(WorkerData());
-  WorkerData &wd = workers_.back();
-  wd.state = state;
+  WorkerData &wd = newWorker(state);
   if( state == IDLE )
     nidle_++;
   else
-  {
-    if( nthr_.size() >= uint(depth) )
-      nthr_.resize(depth+100,0);
-    nthr_[depth]++;
-  }
-  wd.brigade = this;
+    nthr(depth)++;
   wd.thread_id = Thread::self();
-  wd.launched_by_us = false;
   context_pointer_.set(&wd);
   cdebug1(1)<<sdebug(1)+" joined brigade\n";
 }
@@ -109,14 +163,13 @@ void Brigade::join (int state,int depth)
 // returns brigade label
 string Brigade::sdebug (int detail)
 {
-  Thread::Mutex::Lock lock(cond());
   using Debug::ssprintf;
   string s;
   if( detail>=0 )
     s = ssprintf("%d B%dT%d",pid_,brigade_id_,Thread::getThreadNum(Thread::self())+1);
   if( detail>=0 || detail==-1 )
   {
-    Debug::appendf(s,"q:%d",wo_queue_.size());
+    Debug::appendf(s,"q:%d",int(nqueued_));
   }
   return s;
 }
@@ -125,7 +178,6 @@ string Brigade::sdebug (int detail)
 void * Brigade::startWorker (void *pwd)
 {
   WorkerData & wd = *static_cast<WorkerData*>(pwd);
-  wd.launched_by_us = true;
   // store per-thread context
   context_pointer_.set(pwd);
   // enable immediate cancellation
@@ -134,37 +186,75 @@ void * Brigade::startWorker (void *pwd)
   return wd.brigade->workerLoop();
 }
 
+int Brigade::currentQueue () const
+{
+  const WorkerData *pwd = static_cast<const WorkerData*>(context_pointer_.get());
+  return pwd && pwd->brigade == this ? pwd->iqueue : 0;
+}
+
+int Brigade::placeWorkOrder (AbstractWorkOrder *wo)
+{
+  int iq = currentQueue();
+  // in tile affinity mode, orders go to the thread that took them last time
+  if( tile_affinity_ && wo->affinity() >= 0 &&
+      wo->affinity() < std::min(int(nqueues_),int(MAX_QUEUES)) )
+    iq = wo->affinity();
+  WorkQueue &queue = queues_[iq];
+  Thread::Mutex::Lock lock(queue.mutex);
+  // queue is LIFO so orders are pushed in the front
+  queue.orders.push_front(wo);
+  nqueued_++;
+  return iq;
+}
+
 // wakes up one worker thread. If no worker threads are idle, launches a new thread
-// we're expected to hold a lock on cond()
-void Brigade::awakenWorker ()
+void Brigade::awakenWorker (int iq)
 {
-  if( wo_queue_.empty() )
+  if( !nqueued_ )
     return;
-  const AbstractWorkOrder &wo = *(wo_queue_.front());
-  int depth = wo.depth();
+  // look at the order we placed last, if any
+  int depth = -1;
+  {
+    WorkQueue &queue = queues_[iq >= 0 ? iq : currentQueue()];
+    Thread::Mutex::Lock lock(queue.mutex);
+    if( !queue.orders.empty() )
+      depth = queue.orders.front()->depth();
+  }
   // allow at most max_busy_ threads at any tree depth
-  if( nthr_[depth] >= max_busy_ )
+  if( depth >= 0 && nthr(depth) >= max_busy_ )
+  {
+    dprintf(1)("awakenWorker(), depth %d, %d threads already running, no action\n",
+               depth,int(nthr(depth)));
+    return;
+  }
+  // if the orders are on other threads' queues, only wake idle threads
+  // to steal them: the owners will see to them otherwise
+  if( depth < 0 && !nidle_ )
+    return;
+  // in tile affinity mode, orders are likely to be queued for particular
+  // threads, so wake up all idle threads to look at their own queues
+  if( tile_affinity_ && nidle_ )
   {
-    dprintf(1)("awakenWorker(), queue %s, %d threads already running, no action\n",
-               wo.sdebug().c_str(),nthr_[depth]);
+    Thread::Mutex::Lock lock(cond());
+    dprintf(2)("awakenWorker() depth %d, awakening all workers\n",depth);
+    cond().broadcast();
     return;
   }
+  Thread::Mutex::Lock lock(cond());
   // if there are no idle threads, start a new worker
   if( !nidle_ )
   {
-    dprintf(1)("awakenWorker() queue %s, %d threads running but none idle, creating new worker\n",
-               wo.sdebug().c_str(),nthr_[depth]);
-    workers_.push_back(WorkerData());
-    WorkerData &wd = workers_.back();
+    if( depth < 0 )
+      return;
+    dprintf(1)("awakenWorker() depth %d, %d threads running but none idle, creating new worker\n",
+               depth,int(nthr(depth)));
     nidle_++;
-    wd.state = IDLE;
-    wd.brigade = this;
-    wd.thread_id = Thread::create(startWorker,&wd);
+    launchWorker(newWorker(IDLE));
   }
   // else simply awaken an idle worker
   else
   {
-    dprintf(2)("awakenWorker() queue %s, awakening a worker\n",wo.sdebug().c_str());
+    dprintf(2)("awakenWorker() depth %d, awakening a worker\n",depth);
     cond().signal();
   }
 }
@@ -177,13 +267,10 @@ void * Brigade::workerLoop ()
   cdebug1(0)<<sdebug(1)+" started worker thread\n";
   while( true )
   {
-    Thread::Mutex::Lock lock;
     // check for cancellation
     Thread::testCancel();
-    // wait on the queue condition for a work order to show up
-    lock.relock(cond());
+    // wait for a work order to show up
     AbstractWorkOrder *wo = getWorkOrder(true);
-    lock.release();
     // execute order if any
     if( wo )
     {
@@ -198,113 +285,180 @@ void * Brigade::workerLoop ()
   }
   return 0;
 }
-// gets a AbstractWorkOrder from the brigade queue
-// assume we have a lock on cond()
+
+AbstractWorkOrder * Brigade::takeWorkOrder (WorkQueue &queue,bool front,int mindepth,bool busy)
+{
+  Thread::Mutex::Lock lock(queue.mutex);
+  if( queue.orders.empty() )
+    return 0;
+  AbstractWorkOrder *pwo = front ? queue.orders.front() : queue.orders.back();
+  int depth = pwo->depth();
+  if( depth < mindepth )
+    return 0;
+  // check that not too many threads are busy at this depth. A thread that
+  // is already busy (i.e. waiting on its children) may go one over the limit.
+  std::atomic<int> &n = nthr(depth);
+  int n0 = n;
+  do
+  {
+    if( n0 >= max_busy_ + (busy?1:0) )
+    {
+      dprintf(2)("nthr_[%d]=%d, not taking WO\n",depth,n0);
+      return 0;
+    }
+  }
+  while( !n.compare_exchange_weak(n0,n0+1) );
+  if( front )
+    queue.orders.pop_front();
+  else
+    queue.orders.pop_back();
+  nqueued_--;
+  return pwo;
+}
+
+AbstractWorkOrder * Brigade::findWorkOrder (WorkerData &wd,int mindepth)
+{
+  if( !nqueued_ )
+    return 0;
+  bool busy = wd.state != IDLE;
+  AbstractWorkOrder *pwo = takeWorkOrder(queues_[wd.iqueue],true,mindepth,busy);
+  if( pwo )
+    return pwo;
+  // steal from other queues, starting with the next one along so that
+  // thieves spread out
+  int nq = std::min(int(nqueues_),int(MAX_QUEUES));
+  for( int i=1; i<nq; i++ )
+  {
+    pwo = takeWorkOrder(queues_[(wd.iqueue+i)%nq],false,mindepth,busy);
+    if( pwo )
+    {
+      wd.num_stolen++;
+      return pwo;
+    }
+  }
+  return 0;
+}
+
+// gets a AbstractWorkOrder from the brigade queues
 AbstractWorkOrder * Brigade::getWorkOrder (bool wait,int mindepth)
 {
   WorkerData &wd = workerData();
-  while( true )
+  Thread::Mutex::Lock lock;
+  AbstractWorkOrder *pwo = findWorkOrder(wd,mindepth);
+  if( !pwo )
   {
-    // check the WO queue
-    if( wo_queue_.empty() )
+    if( !wait )
+      return 0;
+    // Sleep until something happens to the queues. Placed orders are always
+    // followed by an awakenWorker() call, and finished orders free up a busy
+    // slot in finishWithWorkOrder(). Both check nidle_ and signal while holding
+    // cond(), and finishWithWorkOrder() also decrements nthr() under cond().
+    // We hold cond() from looking at the queues and bumping nidle_ until we
+    // wait, so neither can slip in between and leave us sleeping.
+    lock.relock(cond());
+    while( !(pwo = findWorkOrder(wd,mindepth)) )
     {
-      if( !wait )
-        return 0;
       // idle this thread if it wasn't idle
       if( wd.state != IDLE )
       {
         wd.state = IDLE;
         ++nidle_;
-        dprintf(1)("no WOs queued, %d threads now idle\n",nidle_);
+        dprintf(1)("no WOs available, %d threads now idle\n",int(nidle_));
       }
-      // sleep until something happens to queue
+      wd.idle_timer.start();
       cond().wait();
+      wd.idle_timer.stop();
     }
-    else  // else we have an order on the queue
+  }
+  // unidle ourselves
+  if( wd.state == IDLE )
+  {
+    lock.relock(cond());
+    if( nidle_ <=0 )
     {
-      AbstractWorkOrder *pwo = wo_queue_.front();
-      int depth = pwo->depth();
-      dprintf(2)("head of WO queue is %s\n",pwo->sdebug().c_str());
-      if( depth < mindepth )
-      {
-        dprintf(2)("mindepth is %d, so returning 0\n",mindepth);
-        return 0;
-      }
-      // first case is us waking up from idle
-      if( wd.state == IDLE )
-      {
-        // check that not too many threads are busy at this depth, go back to sleep if so
-        if( nthr_[depth] >= max_busy_ )
-        {
-          if( !wait )
-            return 0;
-          dprintf(2)("nthr_[%d]=%d, going back to sleep\n",depth,nthr_[depth]);
-          cond().wait();
-          continue;
-        }
-        // else unidle ourselves
-        if( nidle_ <=0 )
-        {
-          dprintf(0)("worker is going idle->busy, but nidle_=%d\n",nidle_);
-        }
-        else
-          --nidle_;
-        wd.state = BUSY;
-      }
-      // second case: we're still counted as busy, so see if we should grab another WO
-      else if( wd.state == BUSY )
-      {
-        // if too many threads are busy, idle ourselves and go to sleep
-        if( nthr_[depth] > max_busy_ )
-        {
-          if( !wait )
-            return 0;
-          dprintf(2)("nthr_[%d]=%d, going to sleep\n",depth,nthr_[depth]);
-          wd.state = IDLE;
-          ++nidle_;
-          cond().wait();
-          continue;
-        }
-        // else go on to process the order
-      }
-      else
-      {
-        Throw("unexpected thread state in getWorkOrder()");
-      }
-      wo_queue_.pop_front();
-      ++nthr_[depth];
-      cdebug1(2)<<sdebug(1)+" got queued order\n";
-      // if there's more stuff on the queue, can we wake up another thread?
-      awakenWorker();
-      return pwo;
+      dprintf(0)("worker is going idle->busy, but nidle_=%d\n",int(nidle_));
     }
+    else
+      --nidle_;
+    wd.state = BUSY;
   }
+  lock.release();
+  pwo->queue_ = wd.iqueue;
+  wd.num_orders++;
+  if( pwo->affinity() >= 0 )
+  {
+    if( pwo->affinity() == wd.iqueue )
+      wd.num_affine++;
+    else
+      wd.num_nonaffine++;
+  }
+  cdebug1(2)<<sdebug(1)+" got queued order\n";
+  // if there's more stuff on the queue, can we wake up another thread?
+  awakenWorker();
+  return pwo;
 }
 
 void Brigade::finishWithWorkOrder (AbstractWorkOrder *wo)
 {
-  Thread::Mutex::Lock lock(cond());
   int depth = wo->depth();
-  if( nthr_[depth] <=0 )
+  delete wo;
+  // The decrement and the test below must happen under cond(). Otherwise an
+  // idle-bound worker could find the order held back by the old count, and
+  // we could then test nidle_ before it has gone idle: nobody would signal it.
+  Thread::Mutex::Lock lock(cond());
+  std::atomic<int> &n = nthr(depth);
+  if( n <=0 )
   {
-    dprintf(0)("finished with WO, but nthr_[%d]=%d\n",depth,nthr_[depth]);
+    dprintf(0)("finished with WO, but nthr_[%d]=%d\n",depth,int(n));
   }
   else
-    --nthr_[depth];
-  delete wo;
+    --n;
+  // orders may have been held back because too many threads were busy,
+  // so let an idle thread have another look
+  if( nqueued_ && nidle_ )
+    cond().signal();
 }
 
 void Brigade::clearQueue (const NodeNursery &client)
+{
+  for( int iq=0; iq<std::min(int(nqueues_),int(MAX_QUEUES)); iq++ )
+  {
+    WorkQueue &queue = queues_[iq];
+    Thread::Mutex::Lock lock(queue.mutex);
+    for( WorkOrderQueue::iterator iter = queue.orders.begin(); iter != queue.orders.end(); )
+    {
+      WorkOrder *wo = dynamic_cast<WorkOrder*>(*iter);
+      if( wo && &(wo->clientref) == &client )
+      {
+        delete wo;
+        iter = queue.orders.erase(iter);
+        nqueued_--;
+      }
+      else
+        ++iter;
+    }
+  }
+}
+
+void Brigade::fillStats (DMI::Vec &vec)
 {
   Thread::Mutex::Lock lock(cond());
-  for( WorkOrderQueue::iterator iter = wo_queue_.begin(); iter != wo_queue_.end(); )
+  Stats st;
+  memset(&st,0,sizeof(st));
+  const double scale = 1e-6/LOFAR::NSTimer::cpuSpeedInMHz();
+  st.threads = workers_.size();
+  for( uint i=0; i<workers_.size(); i++ )
   {
-    WorkOrder *wo = dynamic_cast<WorkOrder*>(*iter);
-    if( wo && &(wo->clientref) == &client )
-      wo_queue_.erase(iter++);
-    else
-      ++iter;
+    const WorkerData &wd = workers_[i];
+    st.orders += wd.num_orders;
+    st.stolen += wd.num_stolen;
+    st.idle   += wd.idle_timer.totalTime()*scale;
+    st.affine += wd.num_affine;
+    st.nonaffine += wd.num_nonaffine;
   }
+  const double *pst = reinterpret_cast<const double *>(&st);
+  for( uint i=0; i<sizeof(Stats)/sizeof(double); i++ )
+    vec[i] = pst[i];
 }
 
 // marks thread as blocked or unblocked
@@ -353,6 +507,8 @@ void WorkOrder::execute (Brigade &brigade)
   NodeFace &node = noderef();
   const Request &req = *reqref;
   cdebug1(1)<<brigade.sdebug(1)+" executing "+sdebug(1)+" on node "+node.name()+"\n";
+  // the child inherits the precision of the node that placed the order
+  VellsKernels::PrecisionGuard precision_guard(precision,VellsKernels::subtree_precision_);
   // note that this will block if node is already being executed
   retcode = node.execute(resref,req,depth());
   cdebug1(1)<<brigade.sdebug(1)+" finished "+sdebug(1)+" on node "+node.name()+"\n";
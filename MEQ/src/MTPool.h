@@ -28,6 +28,11 @@
 #include <TimBase/Thread/Condition.h>
 #include <TimBase/Timer.h>
 #include <MEQ/NodeNursery.h>
+#include <MEQ/VellsKernels.h>
+#include <DMI/Vec.h>
+#include <algorithm>
+#include <atomic>
+#include <deque>
 #include <list>
 
 namespace Meq
@@ -57,8 +62,8 @@ namespace Meq
     class AbstractWorkOrder
     {
       public:
-        AbstractWorkOrder (int depth1)
-        : depth_(depth1)
+        AbstractWorkOrder (int depth1,int affinity=-1)
+        : depth_(depth1),affinity_(affinity),queue_(-1)
         {}
 
         // executes the WO.
@@ -70,11 +75,23 @@ namespace Meq
         int depth () const
         { return depth_; }
 
+        // queue of the thread that should preferably execute the WO, or -1
+        int affinity () const
+        { return affinity_; }
+
+        // queue of the thread that has taken the WO, or -1 if still queued
+        int queue () const
+        { return queue_; }
+
         virtual string sdebug (int=0) const
         { return ""; }
 
       protected:
         int depth_;
+        int affinity_;
+        int queue_;
+
+        friend class Brigade;
     };
 
     // An WorkOrder makes an execute() call on a node
@@ -86,13 +103,14 @@ namespace Meq
 
         // creates an "EXECUTE" workorder
         WorkOrder (NodeNursery &client,Callback cb,NodeFace &child,int i,
-                   const Request &req,int depth1)
-        : AbstractWorkOrder(depth1),
+                   const Request &req,int depth1,int affinity=-1)
+        : AbstractWorkOrder(depth1,affinity),
           clientref(client),
           callback(cb),
           noderef(child,DMI::SHARED),
           ichild(i),
-          reqref(req)
+          reqref(req),
+          precision(VellsKernels::subtreePrecision())
         {}
 
         virtual void execute (Brigade &brig);      // runs the work order.
@@ -105,6 +123,7 @@ namespace Meq
         NodeFace::Ref noderef;  // which node to execute
         int ichild;             // child number of node to execute
         Request::Ref reqref;    // request to execute
+        int precision;          // precision setting inherited from the client
 
         Result::Ref resref;     // result of request (when completed)
         int retcode;            // return code (when completed)
@@ -119,12 +138,48 @@ namespace Meq
       Brigade       *brigade;
       Thread::ThrID  thread_id;
       bool           launched_by_us;
+      int            iqueue;       // index of thread's own WO queue
+      LOFAR::NSTimer idle_timer;   // time spent waiting for WOs
+      int            num_orders;   // number of WOs taken
+      int            num_stolen;   // of which, taken from other threads' queues
+      int            num_affine;   // number of WOs taken by their preferred thread
+      int            num_nonaffine;  // number of WOs taken by another thread
     } WorkerData;
 
-    // a brigate is a set of worker threads sharing a WO queue
+    // A brigade is a set of worker threads sharing out WOs. Every thread has
+    // its own WO queue. Threads place orders at the front of their own queue
+    // and take them from there (so the queue works LIFO for its owner). A
+    // thread with an empty queue steals orders from the back of other
+    // queues. This way threads only contend for the brigade mutex when
+    // going idle or being woken up.
+    // In tile affinity mode, a WO for a node that was polled before is
+    // placed on the queue of the thread that executed the node last time,
+    // so that successive requests for the same subtree tend to run on the
+    // same thread (and touch memory cached by the same core). Threads
+    // can still steal such WOs when idle.
     class Brigade
     {
       public:
+        // brigade statistics, returned by fillStats() as a vector of doubles
+        typedef struct
+        {
+          double threads;   // number of threads in brigade
+          double orders;    // number of WOs taken by threads
+          double stolen;    // of which, taken from other threads' queues
+          double idle;      // total time spent by threads waiting for WOs, in seconds
+          double affine;    // number of WOs taken by the thread that executed them last time
+          double nonaffine; // number of WOs taken by a different thread
+        } Stats;
+
+        typedef enum
+        {
+          // max number of WO queues. Threads beyond this number share queues.
+          MAX_QUEUES  = 128,
+          // max tree depth for which busy threads are counted separately.
+          // Depths of MAX_DEPTH-1 and beyond share a single counter (see nthr())
+          MAX_DEPTH   = 1024
+        } Limits;
+
         Brigade (int nwork,int maxbusy,Thread::Mutex::Lock *plock=0);
 
         int id () const
@@ -137,28 +192,22 @@ namespace Meq
         // if state is BUSY, a depth needs to be supplied (normally 0)
         void join (int state,int depth);
 
-        // puts a new work order on the brigade's queue.
-        // !!! The caller must obtain a lock on cond() before calling this.
+        // puts a new work order on the current thread's queue, or in tile
+        // affinity mode, on the queue of the thread that took it last time.
         // Ownership of order object is transferred to the queue.
-        inline void placeWorkOrder (AbstractWorkOrder *wo)
-        {
-          // queue is LIFO so orders are pushed in the front
-          wo_queue_.push_front(wo);
-          // resize vector of thread counters if needed
-          if( wo->depth() >= int(nthr_.size()) )
-            nthr_.resize(wo->depth()+100,0);
-        }
+        // Returns the index of the queue used.
+        // Callers should call awakenWorker() once they have placed their orders.
+        int placeWorkOrder (AbstractWorkOrder *wo);
 
-        // Clears the brigade's work order queue of WorkOrders associated with the
+        // Clears the brigade's work order queues of WorkOrders associated with the
         // given NodeNursery
         void clearQueue (const NodeNursery &client);
 
-        // gets next work order from the queue.
-        // !!! The caller must obtain a lock on cond() before calling this.
-        // If head of queue has a WO with a depth>=mindepth, returns the WO.
-        // If head of queue has a WO with a depth<mindepth, returns 0.
-        // If queue is empty OR too many threads are busy and wait=false, returns 0.
-        // If queue is empty and wait=true, marks thread as idle and
+        // gets next work order, from the head of our own queue or, failing
+        // that, from the tail of another thread's queue.
+        // Only WOs with a depth>=mindepth are considered.
+        // If no WO is available OR too many threads are busy and wait=false, returns 0.
+        // If no WO is available and wait=true, marks thread as idle and
         // waits for an order indefinitely.
         // The work order will have its nodelock set, so WorkOrder::execute()
         // may be called immediately.
@@ -169,16 +218,30 @@ namespace Meq
         // finishes with work order, deallocates object
         void finishWithWorkOrder (AbstractWorkOrder *wo);
 
-        // checks if queue is empty
-        // !!! The caller must obtain a lock on cond() before calling this.
+        // checks if all queues are empty
         bool queueEmpty () const
-        { return wo_queue_.empty(); }
+        { return !nqueued_; }
+
+        // wakes up a worker thread if there are orders on the given queue
+        // (normally the one returned by the last placeWorkOrder() call), or
+        // on the current thread's queue if iq<0.
+        // If no idle workers are available, and not too many workers are
+        // already running, spawns a new worker thread.
+        void awakenWorker (int iq=-1);
+
+        // fills in brigade statistics
+        void fillStats (DMI::Vec &vec);
+
+        // enables or disables tile affinity mode
+        void setTileAffinity (bool enable)
+        { tile_affinity_ = enable; }
+
+        bool tileAffinity () const
+        { return tile_affinity_; }
 
-        // wakes up a worker thread. If no idle workers are available,
-        // and not too many workers are already running (or always_spawn is true),
-        // spawns a new worker thread.
-        // !!! The caller must obtain a lock on cond() before calling this.
-        void awakenWorker ();
+        // pins worker threads to the given CPUs (round-robin). An empty
+        // vector unpins them. Only supported on Linux, a no-op elsewhere.
+        void setCpuAffinity (const std::vector<int> &cpus);
 
         // marks current thread as blocked/unblocked
         void markAsBlocked   (const string &where,WorkerData &wd);
@@ -213,6 +276,42 @@ namespace Meq
         // static method to start a worker thread
         static void * startWorker (void *brigade);
 
+        // typedef for a thread's WO queue
+        typedef std::deque<AbstractWorkOrder *> WorkOrderQueue;
+        typedef struct
+        {
+          Thread::Mutex  mutex;
+          WorkOrderQueue orders;
+        } WorkQueue;
+
+        // inits a new WorkerData object at the back of workers_
+        WorkerData & newWorker (int state);
+
+        // launches a worker thread for new WorkerData object
+        void launchWorker (WorkerData &wd);
+
+        // pins worker thread to CPU according to cpus_
+        void pinWorker (WorkerData &wd,int iworker);
+
+        // returns index of current thread's WO queue (0 for threads that
+        // are not in the brigade)
+        int currentQueue () const;
+
+        // takes WO from the front or back of a queue, if it is at least
+        // mindepth deep, and not too many threads are busy at its depth
+        AbstractWorkOrder * takeWorkOrder (WorkQueue &queue,bool front,int mindepth,bool busy);
+
+        // looks for a WO on our queue, then on other queues
+        AbstractWorkOrder * findWorkOrder (WorkerData &wd,int mindepth);
+
+        // number of busy threads at the given tree depth. Depths of 
+        // MAX_DEPTH-1 and beyond are folded into one counter, so max_busy_
+        // applies to all of those depths together rather than to each one.
+        // Trees that deep are not expected, and folding only makes the
+        // limit stricter there.
+        std::atomic<int> & nthr (int depth)
+        { return nthr_[std::min(depth,int(MAX_DEPTH)-1)]; }
+
         int brigade_id_; // brigade id
 
         // max number of busy threads
@@ -225,18 +324,27 @@ namespace Meq
         Thread::Condition cond_;
           // brigade idle/busy condition variable & mutex
         Thread::Condition busy_cond_;
-          // work order queue
-        typedef std::list<AbstractWorkOrder *> WorkOrderQueue;
-        WorkOrderQueue wo_queue_;
+          // work order queues. Queue 0 is used by threads outside the brigade.
+        std::vector<WorkQueue> queues_;
+          // number of queues in use
+        std::atomic<int> nqueues_;
+          // total number of WOs in all queues
+        std::atomic<int> nqueued_;
 
       // worker threads
         std::vector<WorkerData> workers_;
 
         // number of busy threads per each tree depth
-        std::vector<int> nthr_;
+        std::vector<std::atomic<int> > nthr_;
 
         // number of idle threads
-        int nidle_;
+        std::atomic<int> nidle_;
+
+        // tile affinity mode
+        bool tile_affinity_;
+
+        // CPUs to pin worker threads to, empty for no pinning
+        std::vector<int> cpus_;
 
           // thread key used to hold context structure for each thread
         static Thread::Key context_pointer_;
@@ -0,0 +1,685 @@
+//# MappedParmTable.cc: read-only parm table in a memory-mapped file
+//#
+//# Copyright (C) 2002-2007
+//# ASTRON (Netherlands Foundation for Research in Astronomy)
+//# and The MeqTree Foundation
+//# P.O.Box 2, 7990 AA Dwingeloo, The Netherlands, seg@astron.nl
+//#
+//# This program is free software; you can redistribute it and/or modify
+//# it under the terms of the GNU General Public License as published by
+//# the Free Software Foundation; either version 2 of the License, or
+//# (at your option) any later version.
+//#
+//# This program is distributed in the hope that it will be useful,
+//# but WITHOUT ANY WARRANTY; without even the implied warranty of
+//# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+//# GNU General Public License for more details.
+//#
+//# You should have received a copy of the GNU General Public License
+//# along with this program; if not, write to the Free Software
+//# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+//#
+//# $Id$
+
+#include <MEQ/MappedParmTable.h>
+#include <MEQ/Polc.h>
+#include <TimBase/Debug.h>
+#include <DMI/BlockSet.h>
+#include <DMI/DynamicTypeManager.h>
+#include <DMI/NumArray.h>
+#include <sys/types.h>
+#include <sys/stat.h>
+#include <sys/mman.h>
+#include <fcntl.h>
+#include <unistd.h>
+#include <stdio.h>
+#include <string.h>
+#include <errno.h>
+#include <math.h>
+#include <algorithm>
+#include <map>
+
+namespace Meq
+{
+
+static const char FileMagic[8] = "MEQMMEP";
+static const int FileVersion = 1;
+
+typedef MappedParmTable::FileHeader FileHeader;
+typedef MappedParmTable::DomainRecord DomainRecord;
+typedef MappedParmTable::ParmRecord ParmRecord;
+typedef MappedParmTable::FunkletRecord FunkletRecord;
+
+static inline int64_t align8 (int64_t offset)
+{ return (offset+7)/8*8; }
+
+// true if [offset,offset+size) lies within a file of the given size
+static inline bool inFile (int64_t offset,int64_t size,int64_t filesize)
+{
+  return offset >= 0 && size >= 0 && offset <= filesize && size <= filesize-offset;
+}
+
+// computes the size in bytes of a coefficient array of the given rank
+// and shape. Returns false if the shape is invalid or the size exceeds
+// limit.
+static bool coeffSize (int64_t &nbytes,int rank,const int32_t shape[2],int64_t limit)
+{
+  if( rank < 0 || rank > 2 )
+    return false;
+  nbytes = sizeof(double);
+  for( int i=0; i<rank; i++ )
+  {
+    if( shape[i] < 0 || ( shape[i] && nbytes > limit/shape[i] ) )
+      return false;
+    nbytes *= shape[i];
+  }
+  return nbytes <= limit;
+}
+
+// checks the evenly spaced coefficients of a parm record, if any
+static bool validCoeffs (const ParmRecord &parm,int64_t filesize)
+{
+  if( parm.rank < 0 || !parm.nfunk )
+    return true;
+  int64_t nbytes;
+  if( !coeffSize(nbytes,parm.rank,parm.shape,filesize) ||
+      parm.coeff < 0 || parm.coeff > filesize || parm.coeff_stride < 0 ||
+      ( parm.coeff_stride && int64_t(parm.nfunk-1) > filesize/parm.coeff_stride ) )
+    return false;
+  // coefficients of the last funklet must be in the file
+  return inFile(parm.coeff + (parm.nfunk-1)*parm.coeff_stride,nbytes,filesize);
+}
+
+static void throwErrno (const string &message,const string &filename)
+{
+  int errno0 = errno;
+  Throw(Debug::ssprintf("%s: %s (errno=%d)",
+        Debug::ssprintf(message.c_str(),filename.c_str()).c_str(),strerror(errno0),errno0));
+}
+
+// Files stay mapped for the life of the process, since funklets handed
+// out by a table may outlive it. Mappings are keyed on the identity and
+// modification time of the file, so that reopening an unchanged file
+// reuses the mapping, while a re-exported file is mapped anew.
+typedef struct
+{
+  dev_t dev;
+  ino_t ino;
+  time_t mtime;
+  off_t size;
+} FileId;
+
+static bool operator < (const FileId &a,const FileId &b)
+{
+  if( a.dev != b.dev )
+    return a.dev < b.dev;
+  if( a.ino != b.ino )
+    return a.ino < b.ino;
+  if( a.mtime != b.mtime )
+    return a.mtime < b.mtime;
+  return a.size < b.size;
+}
+
+static Thread::Mutex mappings_mutex_;
+static std::map<FileId,const char *> mappings_;
+
+static const char * mapFile (const string &filename)
+{
+  int fd = open(filename.c_str(),O_RDONLY);
+  if( fd < 0 )
+    throwErrno("can't open %s",filename);
+  struct stat st;
+  if( fstat(fd,&st) < 0 )
+  {
+    close(fd);
+    throwErrno("can't stat %s",filename);
+  }
+  FileId id;
+  memset(&id,0,sizeof(id));
+  id.dev = st.st_dev;
+  id.ino = st.st_ino;
+  id.mtime = st.st_mtime;
+  id.size = st.st_size;
+  Thread::Mutex::Lock lock(mappings_mutex_);
+  std::map<FileId,const char *>::const_iterator iter = mappings_.find(id);
+  if( iter != mappings_.end() )
+  {
+    close(fd);
+    return iter->second;
+  }
+  if( st.st_size < off_t(sizeof(FileHeader)) )
+  {
+    close(fd);
+    Throw(filename+": not a mapped parmtable (file too short)");
+  }
+  void *data = mmap(0,st.st_size,PROT_READ,MAP_SHARED,fd,0);
+  close(fd);
+  if( data == MAP_FAILED )
+    throwErrno("can't map %s",filename);
+  return mappings_[id] = static_cast<const char *>(data);
+}
+
+MappedParmTable::MappedParmTable (const string &filename)
+  : name_(filename)
+{
+  data_ = mapFile(filename);
+  header_ = reinterpret_cast<const FileHeader *>(data_);
+  const FileHeader &hdr = *header_;
+  if( memcmp(hdr.magic,FileMagic,sizeof(FileMagic)) )
+    Throw(filename+": not a mapped parmtable");
+  if( hdr.version != FileVersion )
+    Throw(Debug::ssprintf("%s: unsupported mapped parmtable version %d",filename.c_str(),hdr.version));
+  if( hdr.naxes != Axis::MaxAxis )
+    Throw(Debug::ssprintf("%s: table has %d axes, expected %d",filename.c_str(),hdr.naxes,Axis::MaxAxis));
+  struct stat st;
+  if( stat(filename.c_str(),&st) < 0 )
+    throwErrno("can't stat %s",filename);
+  if( hdr.size != int64_t(st.st_size) || hdr.ndomains < 0 || hdr.nparms < 0 ||
+      !inFile(hdr.domains,hdr.ndomains*int64_t(sizeof(DomainRecord)),hdr.size) ||
+      !inFile(hdr.parms,hdr.nparms*int64_t(sizeof(ParmRecord)),hdr.size) )
+    Throw(filename+": mapped parmtable is truncated or corrupt");
+  // a grid must have a cell for every domain
+  if( hdr.grid_ntime > 0 &&
+      ( hdr.grid_nfreq <= 0 ||
+        int64_t(hdr.grid_ntime)*hdr.grid_nfreq != hdr.ndomains ||
+        !inFile(hdr.grid,2*(int64_t(hdr.grid_ntime)+hdr.grid_nfreq)*int64_t(sizeof(double)),hdr.size) ) )
+    Throw(filename+": mapped parmtable has a corrupt domain grid");
+  domains_ = reinterpret_cast<const DomainRecord *>(data_ + hdr.domains);
+  grid_    = reinterpret_cast<const double *>(data_ + hdr.grid);
+  parms_   = reinterpret_cast<const ParmRecord *>(data_ + hdr.parms);
+  // parm records are few, so they are checked up front. Funklet records
+  // are checked as they are used, see checkFunkletRecord()
+  for( int i=0; i<hdr.nparms; i++ )
+  {
+    const ParmRecord &parm = parms_[i];
+    if( !inFile(parm.name,1,hdr.size) ||
+        !memchr(data_+parm.name,0,hdr.size-parm.name) ||
+        parm.nfunk < 0 ||
+        !inFile(parm.funklets,parm.nfunk*int64_t(sizeof(FunkletRecord)),hdr.size) ||
+        !validCoeffs(parm,hdr.size) )
+      Throw(Debug::ssprintf("%s: mapped parmtable has a corrupt record for parm %d",filename.c_str(),i));
+  }
+  domain_refs_.resize(hdr.ndomains);
+  dprintf(1)("mapped %d parms, %d domains\n",hdr.nparms,hdr.ndomains);
+}
+
+MappedParmTable::~MappedParmTable ()
+{
+}
+
+const ParmRecord * MappedParmTable::findParm (const string &name) const
+{
+  // parm records are sorted by name
+  int i0 = 0, i1 = header_->nparms;
+  while( i0 < i1 )
+  {
+    int i = (i0+i1)/2;
+    int cmp = strcmp(name.c_str(),parmName(parms_[i]));
+    if( !cmp )
+      return parms_ + i;
+    else if( cmp < 0 )
+      i1 = i;
+    else
+      i0 = i+1;
+  }
+  return 0;
+}
+
+static bool overlaps (const DomainRecord &rec,const Domain &dom)
+{
+  for( int i=0; i<Axis::MaxAxis; i++ )
+    if( dom.isDefined(i) &&
+        ( rec.start[i] >= dom.end(i) || rec.end[i] <= dom.start(i) ) )
+      return false;
+  return true;
+}
+
+void MappedParmTable::findDomains (std::vector<int> &indices,const Domain &dom) const
+{
+  indices.clear();
+  const FileHeader &hdr = *header_;
+  double t0 = dom.isDefined(Axis::TIME) ? dom.start(Axis::TIME) : -HUGE_VAL;
+  double t1 = dom.isDefined(Axis::TIME) ? dom.end(Axis::TIME) : HUGE_VAL;
+  if( hdr.grid_ntime > 0 )
+  {
+    // grid cells are sorted and disjoint, so the overlapping ones are
+    // found by binary search along each axis
+    int nt = hdr.grid_ntime, nf = hdr.grid_nfreq;
+    const double *tstart = grid_, *tend = tstart + nt,
+                 *fstart = tend + nt, *fend = fstart + nf;
+    double f0 = dom.isDefined(Axis::FREQ) ? dom.start(Axis::FREQ) : -HUGE_VAL;
+    double f1 = dom.isDefined(Axis::FREQ) ? dom.end(Axis::FREQ) : HUGE_VAL;
+    int it0 = std::upper_bound(tend,tend+nt,t0) - tend;
+    int it1 = std::lower_bound(tstart,tstart+nt,t1) - tstart;
+    int if0 = std::upper_bound(fend,fend+nf,f0) - fend;
+    int if1 = std::lower_bound(fstart,fstart+nf,f1) - fstart;
+    for( int it=it0; it<it1; it++ )
+      for( int ifr=if0; ifr<if1; ifr++ )
+      {
+        int idom = it*nf + ifr;
+        if( overlaps(domains_[idom],dom) )
+          indices.push_back(idom);
+      }
+  }
+  else
+  {
+    // domains are sorted by start time, so only those starting in
+    // [t0-max_time_width,t1) can overlap
+    double tmin = t0 - hdr.max_time_width;
+    int i0 = 0, i1 = hdr.ndomains;
+    while( i0 < i1 )
+    {
+      int i = (i0+i1)/2;
+      if( domains_[i].start[Axis::TIME] < tmin )
+        i0 = i+1;
+      else
+        i1 = i;
+    }
+    for( int idom=i0; idom<hdr.ndomains && domains_[idom].start[Axis::TIME] < t1; idom++ )
+      if( overlaps(domains_[idom],dom) )
+        indices.push_back(idom);
+  }
+}
+
+void MappedParmTable::getDomain (Domain::Ref &ref,int domain_index)
+{
+  Thread::Mutex::Lock lock(mutex_);
+  Domain::Ref &domref = domain_refs_[domain_index];
+  if( !domref.valid() )
+  {
+    const DomainRecord &rec = domains_[domain_index];
+    Domain &dom = domref <<= new Domain;
+    for( int i=0; i<Axis::MaxAxis; i++ )
+      if( rec.defined&(1<<i) )
+        dom.defineAxis(i,rec.start[i],rec.end[i]);
+  }
+  ref = domref;
+}
+
+void MappedParmTable::checkFunkletRecord (const FunkletRecord &rec) const
+{
+  const FileHeader &hdr = *header_;
+  bool ok = rec.domain >= 0 && rec.domain < hdr.ndomains &&
+            inFile(rec.block,rec.block_size,hdr.size);
+  if( ok && rec.type == PolcBlock )
+  {
+    // coefficients must lie within the block
+    int64_t nbytes;
+    ok = coeffSize(nbytes,rec.rank,rec.shape,rec.block_size) &&
+         rec.coeff >= rec.block &&
+         inFile(rec.coeff-rec.block,nbytes,rec.block_size);
+  }
+  else if( ok && rec.type == FunkletBlock )
+  {
+    // block count and block sizes, followed by the blocks, must all lie
+    // within the block
+    const int64_t *dptr = reinterpret_cast<const int64_t *>(data_+rec.block);
+    int64_t nblocks = rec.block_size >= int64_t(sizeof(int64_t)) ? dptr[0] : -1;
+    ok = nblocks >= 0 && nblocks < rec.block_size/int64_t(sizeof(int64_t));
+    int64_t used = (nblocks+1)*sizeof(int64_t);
+    for( int64_t i=0; ok && i<nblocks; i++ )
+    {
+      ok = inFile(used,dptr[i+1],rec.block_size);
+      used += dptr[i+1];
+    }
+  }
+  else
+    ok = false;
+  if( !ok )
+    Throw(Debug::ssprintf("%s: mapped parmtable has a corrupt funklet record at offset %lld",
+          name_.c_str(),(long long)(reinterpret_cast<const char *>(&rec)-data_)));
+}
+
+void MappedParmTable::makeFunklet (Funklet::Ref &ref,const FunkletRecord &rec)
+{
+  checkFunkletRecord(rec);
+  if( rec.type == PolcBlock )
+  {
+    // The coefficient array uses the mapped block directly. The block is
+    // attached read-only, so writing to the coefficients privatizes it.
+    BlockRef bref;
+    bref <<= static_cast<const SmartBlock *>(
+        new SmartBlock(const_cast<char *>(data_+rec.block),rec.block_size));
+    DMI::NumArray *parr = new DMI::NumArray;
+    parr->attachBlock(bref);
+    Polc *polc = new Polc(parr,rec.axis,rec.offset,rec.scale,rec.perturbation,rec.weight);
+    ref <<= polc;
+  }
+  else
+  {
+    // generic funklet stored as blockset
+    const int64_t *dptr = reinterpret_cast<const int64_t *>(data_+rec.block);
+    int nblocks = dptr[0];
+    const int64_t *block_sizes = dptr+1;
+    const char *dataptr = reinterpret_cast<const char *>(block_sizes+nblocks);
+    BlockSet bset;
+    for( int i=0; i<nblocks; i++ )
+    {
+      SmartBlock *block = new SmartBlock(block_sizes[i]);
+      bset.pushNew().attach(block);
+      memcpy(block->data(),dataptr,block_sizes[i]);
+      dataptr += block_sizes[i];
+    }
+    ref.copy(DynamicTypeManager::construct(0,bset));
+  }
+  Domain::Ref domref;
+  getDomain(domref,rec.domain);
+  ref().setDomain(*domref);
+  ref().setDbId(rec.domain);
+}
+
+int MappedParmTable::getFunklets (vector<Funklet::Ref> &funklets,const string &parmName,const Domain &domain)
+{
+  dprintf(2)("getFunklets() for '%s' domain %lf,%lf %lf,%lf\n",parmName.c_str(),
+                domain.start(0),domain.end(0),domain.start(1),domain.end(1));
+  funklets.clear();
+  const ParmRecord *parm = findParm(parmName);
+  if( !parm )
+    return 0;
+  std::vector<int> indices;
+  findDomains(indices,domain);
+  // funklet records are sorted by domain index, as are the indices
+  const FunkletRecord *rec = funkletRecords(*parm),
+                      *recend = rec + parm->nfunk;
+  for( uint i=0; i<indices.size() && rec<recend; i++ )
+  {
+    int idom = indices[i];
+    while( rec < recend && rec->domain < idom )
+      rec++;
+    for( ; rec < recend && rec->domain == idom; rec++ )
+    {
+      funklets.push_back(Funklet::Ref());
+      makeFunklet(funklets.back(),*rec);
+    }
+  }
+  dprintf(2)("%d matching funklets found\n",int(funklets.size()));
+  return funklets.size();
+}
+
+Funklet::DbId MappedParmTable::putCoeff (const string &,const Funklet &,bool)
+{
+  Throw(name_+": mapped parmtables are read-only");
+}
+
+int MappedParmTable::getNames (std::vector<string> &names)
+{
+  names.resize(header_->nparms);
+  for( int i=0; i<header_->nparms; i++ )
+    names[i] = parmName(parms_[i]);
+  return names.size();
+}
+
+// -----------------------------------------------------------------------
+// exportTable()
+
+// sort order of domain records: by start time, then by start frequency
+static bool domainLess (const DomainRecord &a,const DomainRecord &b)
+{
+  if( a.start[Axis::TIME] != b.start[Axis::TIME] )
+    return a.start[Axis::TIME] < b.start[Axis::TIME];
+  if( a.start[Axis::FREQ] != b.start[Axis::FREQ] )
+    return a.start[Axis::FREQ] < b.start[Axis::FREQ];
+  return memcmp(&a,&b,sizeof(DomainRecord)) < 0;
+}
+
+static bool domainEqual (const DomainRecord &a,const DomainRecord &b)
+{
+  return !memcmp(&a,&b,sizeof(DomainRecord));
+}
+
+static void makeDomainRecord (DomainRecord &rec,const Domain &dom)
+{
+  memset(&rec,0,sizeof(rec));
+  for( int i=0; i<Axis::MaxAxis; i++ )
+  {
+    if( dom.isDefined(i) )
+    {
+      rec.defined |= 1<<i;
+      rec.start[i] = dom.start(i);
+      rec.end[i] = dom.end(i);
+    }
+    else
+    {
+      rec.start[i] = -HUGE_VAL;
+      rec.end[i] = HUGE_VAL;
+    }
+  }
+}
+
+// Checks if sorted domains form a time x frequency grid. If so, fills in
+// the distinct time and frequency cells and returns true.
+static bool findGrid (std::vector<double> &tcells,std::vector<double> &fcells,
+                      const std::vector<DomainRecord> &domains)
+{
+  const int T = Axis::TIME, F = Axis::FREQ;
+  int ndom = domains.size();
+  if( !ndom )
+    return false;
+  // first row of the grid gives the frequency cells
+  int nf = 0;
+  while( nf < ndom && domains[nf].start[T] == domains[0].start[T] )
+    nf++;
+  if( ndom%nf )
+    return false;
+  int nt = ndom/nf;
+  tcells.resize(2*nt);
+  fcells.resize(2*nf);
+  for( int ifr=0; ifr<nf; ifr++ )
+  {
+    fcells[ifr] = domains[ifr].start[F];
+    fcells[nf+ifr] = domains[ifr].end[F];
+  }
+  for( int it=0; it<nt; it++ )
+  {
+    tcells[it] = domains[it*nf].start[T];
+    tcells[nt+it] = domains[it*nf].end[T];
+  }
+  // cells must be disjoint, and all domains must be the cross product
+  // of a time cell and a frequency cell
+  for( int ifr=1; ifr<nf; ifr++ )
+    if( fcells[ifr] < fcells[nf+ifr-1] )
+      return false;
+  for( int it=1; it<nt; it++ )
+    if( tcells[it] < tcells[nt+it-1] )
+      return false;
+  for( int it=0; it<nt; it++ )
+    for( int ifr=0; ifr<nf; ifr++ )
+    {
+      const DomainRecord &rec = domains[it*nf+ifr];
+      if( rec.defined != ((1<<T)|(1<<F)) ||
+          rec.start[T] != tcells[it] || rec.end[T] != tcells[nt+it] ||
+          rec.start[F] != fcells[ifr] || rec.end[F] != fcells[nf+ifr] )
+        return false;
+    }
+  return true;
+}
+
+// appends data to buffer, returns its offset. Data is aligned on 8 bytes.
+static int64_t append (std::vector<char> &buf,const void *data,size_t size)
+{
+  int64_t offset = buf.size();
+  buf.resize(align8(offset+size));
+  memcpy(&buf[offset],data,size);
+  return offset;
+}
+
+// appends data blocks of a funklet to the buffer, fills in funklet record
+static void appendFunklet (std::vector<char> &buf,FunkletRecord &rec,const Funklet &funklet)
+{
+  const Polc *polc = dynamic_cast<const Polc *>(&funklet);
+  if( polc && funklet.objectType() == TpMeqPolc && funklet.rank() <= 2 &&
+      polc->coeff().elementType() == Tpdouble )
+  {
+    rec.type = MappedParmTable::PolcBlock;
+    for( int i=0; i<2; i++ )
+    {
+      bool def = i < funklet.rank();
+      rec.axis[i]   = def ? funklet.getAxis(i) : defaultPolcAxes[i];
+      rec.offset[i] = def ? funklet.getOffset(i) : defaultPolcOffset[i];
+      rec.scale[i]  = def ? funklet.getScale(i) : defaultPolcScale[i];
+    }
+    rec.perturbation = funklet.getPerturbation();
+    rec.weight = funklet.getWeight();
+    // store the NumArray block of the coefficients as is, so that
+    // it can be attached to on reading
+    BlockSet bset;
+    polc->coeff().toBlock(bset);
+    FailWhen(bset.size() != 1,"unexpected coefficient block count");
+    const BlockRef &block = bset.front();
+    rec.block = append(buf,block->data(),block->size());
+    rec.block_size = block->size();
+    DMI::NumArray arr;
+    arr.attachBlock(block);
+    rec.coeff = rec.block + arr.dataOffset();
+    rec.rank = arr.rank();
+    for( int i=0; i<2; i++ )
+      rec.shape[i] = i < rec.rank ? arr.shape()[i] : 0;
+  }
+  else
+  {
+    rec.type = MappedParmTable::FunkletBlock;
+    rec.rank = -1;
+    BlockSet bset;
+    funklet.toBlock(bset);
+    std::vector<int64_t> hdr(1,bset.size());
+    for( BlockSet::const_iterator iter = bset.begin(); iter != bset.end(); iter++ )
+      hdr.push_back((*iter)->size());
+    rec.block = buf.size();
+    append(buf,&hdr[0],hdr.size()*sizeof(int64_t));
+    for( BlockSet::const_iterator iter = bset.begin(); iter != bset.end(); iter++ )
+    {
+      size_t sz = (*iter)->size(), offset = buf.size();
+      buf.resize(offset+sz);
+      memcpy(&buf[offset],(*iter)->data(),sz);
+    }
+    rec.block_size = buf.size() - rec.block;
+    buf.resize(align8(buf.size()));
+    rec.coeff = 0;
+  }
+}
+
+void MappedParmTable::exportTable (const string &filename,ParmTable &source)
+{
+  std::vector<string> names;
+  if( source.getNames(names) < 0 )
+    Throw1(source.name()+": table does not support listing its parms, can't export it");
+  std::sort(names.begin(),names.end());
+  names.erase(std::unique(names.begin(),names.end()),names.end());
+  int nparms = names.size();
+  // read all funklets
+  Domain all(-HUGE_VAL,HUGE_VAL,-HUGE_VAL,HUGE_VAL);
+  std::vector<std::vector<Funklet::Ref> > funklets(nparms);
+  std::vector<std::vector<DomainRecord> > funkdoms(nparms);
+  std::vector<DomainRecord> domains;
+  for( int ip=0; ip<nparms; ip++ )
+  {
+    source.getFunklets(funklets[ip],names[ip],all);
+    funkdoms[ip].resize(funklets[ip].size());
+    for( uint i=0; i<funklets[ip].size(); i++ )
+    {
+      makeDomainRecord(funkdoms[ip][i],funklets[ip][i]->domain());
+      domains.push_back(funkdoms[ip][i]);
+    }
+  }
+  std::sort(domains.begin(),domains.end(),domainLess);
+  domains.erase(std::unique(domains.begin(),domains.end(),domainEqual),domains.end());
+  int ndom = domains.size();
+  // fill in header
+  FileHeader hdr;
+  memset(&hdr,0,sizeof(hdr));
+  memcpy(hdr.magic,FileMagic,sizeof(FileMagic));
+  hdr.version = FileVersion;
+  hdr.naxes = Axis::MaxAxis;
+  hdr.ndomains = ndom;
+  hdr.nparms = nparms;
+  for( int i=0; i<ndom; i++ )
+    hdr.max_time_width = std::max(hdr.max_time_width,
+                           domains[i].end[Axis::TIME]-domains[i].start[Axis::TIME]);
+  std::vector<double> tcells,fcells;
+  bool grid = findGrid(tcells,fcells,domains);
+  std::vector<char> buf;
+  append(buf,&hdr,sizeof(hdr));
+  hdr.domains = buf.size();
+  if( ndom )
+    append(buf,&domains[0],ndom*sizeof(DomainRecord));
+  if( grid )
+  {
+    hdr.grid_ntime = tcells.size()/2;
+    hdr.grid_nfreq = fcells.size()/2;
+    hdr.grid = append(buf,&tcells[0],tcells.size()*sizeof(double));
+    append(buf,&fcells[0],fcells.size()*sizeof(double));
+  }
+  hdr.parms = buf.size();
+  buf.resize(hdr.parms + nparms*sizeof(ParmRecord));
+  std::vector<ParmRecord> parms(nparms);
+  for( int ip=0; ip<nparms; ip++ )
+  {
+    ParmRecord &parm = parms[ip];
+    memset(&parm,0,sizeof(parm));
+    parm.name = append(buf,names[ip].c_str(),names[ip].length()+1);
+    int nfunk = parm.nfunk = funklets[ip].size();
+    // order funklets by domain index
+    std::vector<FunkletRecord> recs(nfunk);
+    std::vector<std::pair<int,int> > order(nfunk);
+    for( int i=0; i<nfunk; i++ )
+    {
+      int idom = std::lower_bound(domains.begin(),domains.end(),funkdoms[ip][i],domainLess) - domains.begin();
+      order[i] = std::make_pair(idom,i);
+    }
+    std::sort(order.begin(),order.end());
+    parm.funklets = buf.size();
+    buf.resize(parm.funklets + nfunk*sizeof(FunkletRecord));
+    for( int i=0; i<nfunk; i++ )
+    {
+      FunkletRecord &rec = recs[i];
+      memset(&rec,0,sizeof(rec));
+      rec.domain = order[i].first;
+      appendFunklet(buf,rec,*funklets[ip][order[i].second]);
+    }
+    // if all coefficient arrays have the same shape, they are evenly spaced
+    parm.rank = nfunk ? recs[0].rank : -1;
+    for( int i=0; i<nfunk && parm.rank >= 0; i++ )
+      if( recs[i].type != PolcBlock || recs[i].rank != recs[0].rank ||
+          recs[i].shape[0] != recs[0].shape[0] || recs[i].shape[1] != recs[0].shape[1] )
+        parm.rank = -1;
+    if( parm.rank >= 0 )
+    {
+      parm.shape[0] = recs[0].shape[0];
+      parm.shape[1] = recs[0].shape[1];
+      parm.coeff = recs[0].coeff;
+      parm.coeff_stride = align8(recs[0].block_size);
+    }
+    if( nfunk )
+      memcpy(&buf[parm.funklets],&recs[0],nfunk*sizeof(FunkletRecord));
+    funklets[ip].clear();
+  }
+  if( nparms )
+    memcpy(&buf[hdr.parms],&parms[0],nparms*sizeof(ParmRecord));
+  hdr.size = buf.size();
+  memcpy(&buf[0],&hdr,sizeof(hdr));
+  // write to temporary file and rename into place
+  string tmpname = filename + Debug::ssprintf(".tmp%d",int(getpid()));
+  FILE *fp = fopen(tmpname.c_str(),"wb");
+  if( !fp )
+    throwErrno("can't create %s",tmpname);
+  bool ok = fwrite(&buf[0],1,buf.size(),fp) == buf.size();
+  ok = !fclose(fp) && ok;
+  if( !ok )
+  {
+    int errno0 = errno;
+    unlink(tmpname.c_str());
+    errno = errno0;
+    throwErrno("error writing %s",tmpname);
+  }
+  if( rename(tmpname.c_str(),filename.c_str()) < 0 )
+  {
+    int errno0 = errno;
+    unlink(tmpname.c_str());
+    errno = errno0;
+    throwErrno("can't rename to %s",filename);
+  }
+  dprintf1(1)("exported %d parms, %d domains%s to %s\n",nparms,ndom,
+             grid?" (grid)":"",filename.c_str());
+}
+
+} // namespace Meq
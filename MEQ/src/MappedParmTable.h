@@ -0,0 +1,200 @@
+//# MappedParmTable.h: read-only parm table in a memory-mapped file
+//#
+//# Copyright (C) 2002-2007
+//# ASTRON (Netherlands Foundation for Research in Astronomy)
+//# and The MeqTree Foundation
+//# P.O.Box 2, 7990 AA Dwingeloo, The Netherlands, seg@astron.nl
+//#
+//# This program is free software; you can redistribute it and/or modify
+//# it under the terms of the GNU General Public License as published by
+//# the Free Software Foundation; either version 2 of the License, or
+//# (at your option) any later version.
+//#
+//# This program is distributed in the hope that it will be useful,
+//# but WITHOUT ANY WARRANTY; without even the implied warranty of
+//# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+//# GNU General Public License for more details.
+//#
+//# You should have received a copy of the GNU General Public License
+//# along with this program; if not, write to the Free Software
+//# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+//#
+//# $Id$
+
+#ifndef MEQ_MAPPEDPARMTABLE_H
+#define MEQ_MAPPEDPARMTABLE_H
+
+#include <MEQ/ParmTable.h>
+#include <MEQ/Axis.h>
+#include <TimBase/Thread/Mutex.h>
+#include <stdint.h>
+#include <vector>
+
+namespace Meq {
+
+//## MappedParmTable is a read-only parm table kept in a single memory-mapped
+//## file, for applying precomputed solutions. The file is laid out by
+//## column: the funklet records of each parm form one contiguous run,
+//## in order of domain index, followed by the coefficients of the parm's
+//## polcs. Coefficients are stored as ready-made NumArray data blocks, so
+//## the funklets returned by getFunklets() refer to the file directly,
+//## and nothing is copied or deserialized. Funklets of other types are
+//## stored in serialized form.
+//##
+//## Domains are sorted by start time and frequency. When they form a
+//## regular time x frequency grid (as tiled solutions do), the domains
+//## overlapping a request are found by binary search along the grid axes.
+//## Otherwise the sorted start times are searched.
+//##
+//## Since funklets point into the mapping, a file stays mapped for the
+//## life of the process. Reopening an unchanged file reuses its mapping.
+//## Files are written by exportTable(), from any table that can list its
+//## parms.
+class MappedParmTable : public ParmTable
+{
+public:
+  // File layout. All offsets are from the start of the file. All sections
+  // are 8-byte aligned.
+  typedef struct
+  {
+    char    magic[8];       // "MEQMMEP", 0-terminated
+    int32_t version;
+    int32_t naxes;          // number of axes in domain records
+    int32_t ndomains;
+    int32_t nparms;
+    int32_t grid_ntime;     // if >0, the domains form a time x freq grid,
+    int32_t grid_nfreq;     // with domain index = itime*grid_nfreq + ifreq
+    int64_t domains;        // offset of DomainRecord[ndomains]
+    int64_t grid;           // offset of grid cells: start[ntime], end[ntime],
+                            // then start[nfreq], end[nfreq]
+    int64_t parms;          // offset of ParmRecord[nparms], sorted by name
+    int64_t size;           // file size
+    double  max_time_width; // widest domain in time
+  } FileHeader;
+
+  typedef struct
+  {
+    int32_t defined;        // bitmask of defined axes
+    int32_t pad;
+    double  start[Axis::MaxAxis];   // undefined axes are stored as
+    double  end[Axis::MaxAxis];     // -HUGE_VAL to HUGE_VAL
+  } DomainRecord;
+
+  typedef struct
+  {
+    int64_t name;           // offset of 0-terminated parm name
+    int32_t nfunk;
+    int32_t rank;           // if all funklets are polcs with the same
+    int32_t shape[2];       // coefficient shape, its rank and shape, else -1
+    int32_t pad;
+    int64_t funklets;       // offset of FunkletRecord[nfunk]
+    int64_t coeff;          // offset of the coefficients of the first funklet
+    int64_t coeff_stride;   // distance between the coefficients of
+                            // successive funklets if rank>=0, else 0
+  } ParmRecord;
+
+  // funklet types
+  typedef enum { PolcBlock=0, FunkletBlock=1 } FunkletType;
+
+  typedef struct
+  {
+    int32_t domain;         // domain index
+    int32_t type;           // PolcBlock: block is a NumArray of coefficients
+                            // FunkletBlock: block is a serialized funklet
+    int32_t rank;           // polcs: rank and shape of coefficient array
+    int32_t shape[2];
+    int32_t axis[2];        // polcs: axes of variability, offsets and scales
+    int32_t pad;
+    double  offset[2];
+    double  scale[2];
+    double  perturbation;
+    double  weight;
+    int64_t block;          // offset of data block
+    int64_t block_size;
+    int64_t coeff;          // polcs: offset of first coefficient
+  } FunkletRecord;
+
+  // Opens a table file
+  explicit MappedParmTable (const string &filename);
+
+  virtual ~MappedParmTable ();
+
+  // Get the funklets of the given parm overlapping the given domain.
+  // Returns # of funklets in vector
+  int getFunklets (vector<Funklet::Ref> &funklets,const string &parmName,const Domain &domain);
+
+  // tables are read-only, so this throws an exception
+  Funklet::DbId putCoeff (const string &parmName,const Funklet &funklet,bool domain_is_key=false);
+
+  int getNames (std::vector<string> &names);
+
+  const string & name () const
+  { return name_; }
+
+// direct access to table contents
+  const FileHeader & header () const
+  { return *header_; }
+
+  int numDomains () const
+  { return header_->ndomains; }
+
+  const DomainRecord & domainRecord (int i) const
+  { return domains_[i]; }
+
+  int numParms () const
+  { return header_->nparms; }
+
+  const ParmRecord & parmRecord (int i) const
+  { return parms_[i]; }
+
+  const char * parmName (const ParmRecord &parm) const
+  { return data_ + parm.name; }
+
+  // returns record of named parm, or 0 if not in table
+  const ParmRecord * findParm (const string &name) const;
+
+  const FunkletRecord * funkletRecords (const ParmRecord &parm) const
+  { return reinterpret_cast<const FunkletRecord *>(data_ + parm.funklets); }
+
+  // returns pointer to data at given offset into file
+  const char * data (int64_t offset) const
+  { return data_ + offset; }
+
+  // fills indices with the (ascending) indices of all domains that
+  // overlap dom in time and frequency. Other axes are not checked.
+  void findDomains (std::vector<int> &indices,const Domain &dom) const;
+
+  // gets domain object of the given domain index
+  void getDomain (Domain::Ref &ref,int domain_index);
+
+  // checks that a funklet record is consistent with the file: domain
+  // index, data block and coefficient offsets. Throws an exception if
+  // not. Records are checked on use rather than on opening the table,
+  // since that would read every page of the file.
+  void checkFunkletRecord (const FunkletRecord &rec) const;
+
+  // makes funklet from a funklet record
+  void makeFunklet (Funklet::Ref &ref,const FunkletRecord &rec);
+
+  // Writes all funklets of the source table to a new table file. The file
+  // is written under a temporary name and then renamed, so tables that
+  // have the old file mapped are not disturbed.
+  static void exportTable (const string &filename,ParmTable &source);
+
+private:
+  string name_;
+
+  const char *data_;
+  const FileHeader *header_;
+  const DomainRecord *domains_;
+  const double *grid_;
+  const ParmRecord *parms_;
+
+  // domain objects, created on first use
+  std::vector<Domain::Ref> domain_refs_;
+  Thread::Mutex mutex_;
+};
+
+} // namespace Meq
+
+#endif
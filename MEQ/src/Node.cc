@@ -26,6 +26,7 @@
 #include "ResampleMachine.h"
 #include "MeqVocabulary.h"
 #include "MTPool.h"
+#include "VellsKernels.h"
 #include <DMI/BlockSet.h>
 #include <DMI/Record.h>
 #include <DMI/Vec.h>
@@ -86,11 +87,18 @@ Node::Node (int nchildren,const HIID *labels,int nmandatory)
   breakpoints_ = breakpoints_ss_ = 0;
   publishing_level_ = 0;
   cache_policy_ = 0;
+  cache_depth_ = 0;
+  cache_max_size_ = 0;
+  cache_slots_size_ = 0;
   log_policy_ = 0;
+  precision_ = -1;
+  double_precision_only_ = false;
   cache_.is_valid = false;
   cache_.rescode = 0;
   cache_.last_clear_cache_marker_ = 0;
   has_state_dep_ = false;
+  shareable_results_ = false;
+  definition_hash_ = content_hash_ = 0;
   // init cache stats
   {
     DMI::Record &rec = cache_stats_ <<= new DMI::Record;
@@ -103,6 +111,9 @@ Node::Node (int nchildren,const HIID *labels,int nmandatory)
     pcs_new_   = reinterpret_cast<CacheStats*>(vec_new[HIID()].as_wp<int>());
     pcparents_ = reinterpret_cast<CacheParentInfo*>(vec_par[HIID()].as_wp<int>());
     pcrescode_ = ( rec[FResultCode] <<= new DMI::Vec(Tpint,-1) )[HIID()].as_wp<int>();
+    pcslothits_ = ( rec[FSlotHits] <<= new DMI::Vec(Tpint,MAX_CACHE_DEPTH) )[HIID()].as_wp<int>();
+    prcs_ = reinterpret_cast<ResultCacheStats*>
+        ((rec[FResultCache] <<= new DMI::Vec(Tpdouble,sizeof(ResultCacheStats)/sizeof(double)))[HIID()].as_wp<double>());
   }
   // init profiling stats
   {
@@ -308,10 +319,26 @@ void Node::setStateImpl (DMI::Record::Ref &rec,bool initializing)
   // set the caching policy
   rec[FCachePolicy].get(cache_policy_,initializing);
   rec[FCacheNumActiveParents].get(pcparents_->nact,initializing);
+  // older results are dropped when the cache depth changes
+  bool depth_changed = rec[FCacheDepth].get(cache_depth_,initializing);
+  if( rec[FCacheMaxSize].get(cache_max_size_,initializing) || depth_changed )
+    clearCacheSlots();
 
   // set the logging policy
   rec[FLogPolicy].get(log_policy_,initializing);
 
+  // set the evaluation precision
+  string precision;
+  if( rec[FPrecision].get(precision,initializing) )
+  {
+    int prec = precisionFromString(precision);
+    // cached results of this node and of the children that inherit its
+    // setting may have been computed at the old precision
+    if( !initializing && prec != precision_ )
+      clearCache(true);
+    precision_ = prec;
+  }
+
   // active symdeps
   SymdepMap::DepSet active_symdeps;
   if( initializing )
@@ -401,7 +428,12 @@ void Node::setState (DMI::Record::Ref &rec)
   }
   // success: merge record into state record
   if( !initializing )
+  {
     wstate().merge(rec,true);
+    // our definition no longer matches the init record, so stop sharing results
+    if( definition_hash_ )
+      invalidateContentHash(true);
+  }
   // make sure nodes upstream get themselves a state dependency
   propagateStateDependency();
 }
@@ -486,6 +518,7 @@ void Node::clearCache (bool recursive,long marker) throw()
     return;
   cache_.last_clear_cache_marker_ = marker;
   cache_.clear();
+  clearCacheSlots();
   if( control_status_ & CS_CACHED )
     setControlStatus(control_status_&~CS_CACHED,recursive); // sync if recursive
   if( recursive )
@@ -493,6 +526,8 @@ void Node::clearCache (bool recursive,long marker) throw()
     // in recursive mode, also clear stats
     memset(pcs_total_,0,sizeof(CacheStats));
     memset(pcs_new_,0,sizeof(CacheStats));
+    memset(prcs_,0,sizeof(ResultCacheStats));
+    memset(pcslothits_,0,MAX_CACHE_DEPTH*sizeof(int));
     for( int i=0; i<children().numChildren(); i++ )
       if( children().isChildValid(i) )
         children().getChild(i).clearCache(true,marker);
@@ -501,14 +536,187 @@ void Node::clearCache (bool recursive,long marker) throw()
   }
 }
 
+int Node::cacheDepth () const
+{
+  int depth = cache_depth_ ? cache_depth_ : forest_->cacheDepth();
+  return std::max(1,std::min(depth,int(MAX_CACHE_DEPTH)));
+}
+
+size_t Node::cacheMaxSize () const
+{
+  double size = cache_max_size_ ? cache_max_size_ : forest_->cacheMaxSize();
+  return size > 0 ? size_t(size*1024*1024) : 0;
+}
+
+void Node::clearCacheSlots ()
+{
+  cache_slots_.clear();
+  cache_slots_size_ = 0;
+}
+
+void Node::retireCache ()
+{
+  Thread::Mutex::Lock lock(execCond());
+  int depth = cacheDepth();
+  // fails and results with empty request IDs can never be matched, so
+  // are not worth keeping
+  if( depth > 1 && cache_.valid() && !(cache_.rescode&RES_FAIL) && !cache_.rqid.empty() )
+  {
+    CacheSlot slot;
+    slot.result  = cache_.result;
+    slot.rqid    = cache_.rqid;
+    slot.rescode = cache_.rescode;
+    slot.size    = ResultCache::resultSize(*cache_.result);
+    cache_slots_.push_front(slot);
+    cache_slots_size_ += slot.size;
+    // drop oldest results to stay within depth and memory limits
+    size_t maxsize = cacheMaxSize();
+    while( !cache_slots_.empty() &&
+           ( int(cache_slots_.size()) > depth-1 || ( maxsize && cache_slots_size_ > maxsize ) ) )
+    {
+      cache_slots_size_ -= cache_slots_.back().size;
+      cache_slots_.pop_back();
+    }
+  }
+  cache_.last_clear_cache_marker_ = 0;
+  cache_.clear();
+  if( control_status_ & CS_CACHED )
+    setControlStatus(control_status_&~CS_CACHED);
+}
+
+int Node::findCacheSlot (const Request &req)
+{
+  const RequestId &rqid = req.id();
+  if( rqid.empty() || cache_slots_.empty() )
+    return 0;
+  int islot = 1;
+  for( CacheSlotList::iterator iter = cache_slots_.begin(); iter != cache_slots_.end(); iter++,islot++ )
+  {
+    if( has_state_dep_ )
+      iter->rescode |= symdeps().getMask(FState);
+    if( RqId::diffMask(rqid,iter->rqid)&iter->rescode )
+      continue;
+    // match: swap with the current result
+    CacheSlot slot = *iter;
+    cache_slots_size_ -= slot.size;
+    cache_slots_.erase(iter);
+    retireCache();
+    cache_.result  = slot.result;
+    cache_.rqid    = slot.rqid;
+    cache_.rescode = slot.rescode;
+    cache_.is_valid = true;
+    control_status_ |= CS_CACHED;
+    cdebug(4)<<"found result for "<<slot.rqid<<" in cache slot "<<islot<<endl;
+    return islot;
+  }
+  return 0;
+}
+
 // static FILE *flog = fopen("cache.log","w");
 
+int Node::precisionFromString (const string &str)
+{
+  if( str.empty() )
+    return -1;
+  else if( str == "double" )
+    return VellsKernels::DOUBLE;
+  else if( str == "single" )
+    return VellsKernels::SINGLE;
+  Throw("illegal "+FPrecision.toString()+" setting '"+str+"', expecting \"double\", \"single\" or \"\"");
+}
+
+int Node::subtreePrecision () const
+{
+  if( precision_ >= 0 )
+    return precision_;
+  int inherited = VellsKernels::subtreePrecision();
+  return inherited >= 0 ? inherited : forest_->precision();
+}
+
+int Node::evalPrecision (const Request &req) const
+{
+  if( double_precision_only_ || req.evalMode() > 0 )
+    return VellsKernels::DOUBLE;
+  return subtreePrecision();
+}
+
+uint64_t Node::definitionHash (const DMI::Record &initrec) const
+{
+  // drop fields that differ between otherwise identical nodes. Children
+  // are accounted for by contentHash() instead.
+  DMI::Record rec(initrec);
+  rec.removeField(FName,true);
+  rec.removeField(FNodeIndex,true);
+  rec.removeField(FNodeDescription,true);
+  rec.removeField(FChildren,true);
+  rec.removeField(FStepChildren,true);
+  rec.removeField(FParents,true);
+  BlockSet set;
+  rec.toBlock(set);
+  uint64_t hash = ResultCache::hashString(ResultCache::HashSeed,className());
+  for( BlockSet::const_iterator iter = set.begin(); iter != set.end(); iter++ )
+    hash = ResultCache::hashBytes(hash,(*iter)->data(),(*iter)->size());
+  return hash ? hash : 1;
+}
+
+uint64_t Node::contentHash ()
+{
+  if( content_hash_ )
+    return content_hash_;
+  uint64_t hash;
+  // results not shared: hash is unique to this node
+  if( !definition_hash_ )
+    hash = ResultCache::hashString(ResultCache::HashSeed,"node:"+name());
+  else
+  {
+    hash = definition_hash_;
+    for( int i=0; i<children().numChildren(); i++ )
+    {
+      uint64_t chhash = 0;
+      if( children().isChildValid(i) )
+      {
+        NodeFace &child = children().getChild(i);
+        Node *pchild = dynamic_cast<Node*>(&child);
+        chhash = pchild ? pchild->contentHash()
+                        : ResultCache::hashString(ResultCache::HashSeed,"node:"+child.name());
+      }
+      hash = ResultCache::hashBytes(hash,&chhash,sizeof(chhash));
+    }
+  }
+  return content_hash_ = hash ? hash : 1;
+}
+
+void Node::invalidateContentHash (bool definition_changed)
+{
+  if( definition_changed )
+    definition_hash_ = 0;
+  content_hash_ = 0;
+  // parent hashes include ours
+  for( int i=0; i<numParents(); i++ )
+  {
+    Node *pparent = dynamic_cast<Node*>(&getParent(i));
+    if( pparent && pparent->content_hash_ )
+      pparent->invalidateContentHash(false);
+  }
+}
+
+bool Node::useResultCache (const Request &req) const
+{
+  // riders may change node state, and stepchildren must be polled,
+  // so neither can be short-circuited by the cache
+  return definition_hash_ && forest_->resultCache().enabled() &&
+         req.hasCells() && !req.hasRider() && req.evalMode() >= 0 &&
+         !stepchildren().numChildren();
+}
+
 //##ModelId=400E531A021A
 bool Node::getCachedResult (int &retcode,Result::Ref &ref,const Request &req)
 {
   // Thread::Mutex::Lock lock(cache_.mutex);
+  // cache slot of matching result, if this is not the current one
+  int islot = 0;
   // no cache -- return false
-  if( !cache_.valid() )
+  if( !cache_.valid() && !(islot = findCacheSlot(req)) )
   {
     pcs_total_->none++;
     if( new_request_ )
@@ -571,11 +779,18 @@ bool Node::getCachedResult (int &retcode,Result::Ref &ref,const Request &req)
     else
       match = false;
   }
+  // (4) look for a match among older results
+  if( !match && !islot && (islot = findCacheSlot(req)) )
+  {
+    ref = cache_.result;
+    match = true;
+  }
   // finally, do we have a match?
   if( match )
   {
     cdebug(4)<<"cache hit"<<endl;
     pcs_total_->hits++;
+    pcslothits_[islot]++;
     if( new_request_ )
       pcs_new_->hits++;
 //     fprintf(flog,"%s: reusing cache, cache cells are %x, req cells are %x\n",
@@ -596,8 +811,8 @@ bool Node::getCachedResult (int &retcode,Result::Ref &ref,const Request &req)
   if( new_request_ )
     pcs_new_->miss++;
 //  fprintf(flog,"%s: cache missed\n",name().c_str());
-  // no match -- clear cache and return
-  clearCache(false);
+  // no match -- clear cache (keeping the result if we have a deep cache) and return
+  retireCache();
   return false;
 }
 
@@ -699,8 +914,15 @@ int Node::cacheResult (const Result::Ref &ref,const Request &req,int retcode)
       st.replace(FCache,cache_.record());
       postEvent(EvNodeResult,stateref);
     }
-    // now quietly clear cache
-    clearCache(false);
+    // now quietly clear cache. A deep cache keeps the result in an
+    // older slot, since interleaved requests may come back to it
+    if( actual_cache_policy_ > CACHE_NEVER && cacheDepth() > 1 )
+    {
+      cache_.set(ref,req,retcode&~RES_UPDATED);
+      retireCache();
+    }
+    else
+      clearCache(false);
   }
   return retcode;
 }
@@ -756,7 +978,7 @@ void Node::holdCache (bool hold) throw()
       ( actual_cache_policy_ <= CACHE_MINIMAL || !pcparents_->nhold ) )
   {
     cdebug(3)<<"clearing cache\n";
-    clearCache(false);
+    retireCache();
   }
 }
 
@@ -1017,6 +1239,25 @@ int Node::execute (Result::Ref &ref,const Request &req,int depth) throw()
       setExecState(CS_ES_IDLE,control_status_|CS_RES_EMPTY);
       return exitExecute(ret);
     }
+    // check the forest-wide result cache: a node with the same definition
+    // and children may have computed this result already
+    bool use_result_cache = useResultCache(req);
+    if( use_result_cache )
+    {
+      stage = "checking forest result cache";
+      int code;
+      if( forest().resultCache().lookup(ref,code,contentHash(),req) )
+      {
+        cdebug(3)<<"  forest result cache hit, code "<<ssprintf("0x%x",code)<<endl;
+        prcs_->hits++;
+        prcs_->bytes_saved += ResultCache::resultSize(*ref);
+        lock.relock(execCond());
+        int ret = cacheResult(ref,req,code) | RES_UPDATED;
+        setExecState(CS_ES_IDLE,control_status_|CS_RES_OK);
+        return exitExecute(ret);
+      }
+      prcs_->miss++;
+    }
     // clear the retcode if the request has cells, children code + getResult()
     // will be considered the real result
     Cells::Ref rescells;
@@ -1025,6 +1266,9 @@ int Node::execute (Result::Ref &ref,const Request &req,int depth) throw()
       // rescells.attach(req.cells());
       retcode = 0;
     }
+    // children without a precision setting of their own inherit ours
+    VellsKernels::PrecisionGuard subtree_precision_guard(subtreePrecision(),
+                                              VellsKernels::subtree_precision_);
     // Pass request on to children and accumulate their results
     int result_status; // result status, this will be placed into our control_status
     stage = "polling children";
@@ -1076,6 +1320,7 @@ int Node::execute (Result::Ref &ref,const Request &req,int depth) throw()
         stage = "getting result";
         cdebug(3)<<"  calling getResult(): cells are "<<req.cells();
         timers_.getresult.start();
+        VellsKernels::PrecisionGuard precision_guard(evalPrecision(req));
         int code = getResult(ref,child_results_,req,new_request_);
         timers_.getresult.stop();
         // default dependency mask added to return code
@@ -1146,6 +1391,15 @@ int Node::execute (Result::Ref &ref,const Request &req,int depth) throw()
       timers().getresult.stop();
     if( timers().children.isRunning() )
       timers().children.stop();
+    // share the result with identical nodes
+    if( use_result_cache && result_status == CS_RES_OK && !has_state_dep_ &&
+        !(retcode&(RES_FAIL|RES_MISSING|RES_WAIT|RES_ABORT)) )
+    {
+      int code = retcode&~RES_UPDATED;
+      if( !(code&RES_IGNORE_TYPE) )
+        code |= RequestType::DEPMASK_TYPE;
+      forest().resultCache().store(contentHash(),req,ref,code);
+    }
     // cache & return accumulated return code
     lock.relock(execCond());
     int ret = cacheResult(ref,req,retcode) | RES_UPDATED;
@@ -35,6 +35,7 @@
 #include <MEQ/Cells.h>
 #include <MEQ/AID-Meq.h>
 #include <MEQ/TID-Meq.h>
+#include <list>
 #include <map>
 #include <vector>
 
@@ -46,7 +47,7 @@
 #pragma aid Cache Policy Stats All New Requests Parents Num Active Description
 #pragma aid Profiling Stats Total Children Get Result Ticks Per Second CPU MHz
 #pragma aid Poll Polling Order MT Propagate Child Fails Message Error Data
-#pragma aid Parent Indices Is Internal Publishing Level Recursive Log
+#pragma aid Parent Indices Is Internal Publishing Level Recursive Log Precision
 
 
 // forward declaration of MeqPython stuff -- only here to enable the
@@ -96,15 +97,29 @@ const HIID FCache     = AidCache; // top level subrecord
 const HIID FCachePolicy     = AidCache|AidPolicy;
 // if non-0, overrides the default parent count when making caching decisions
 const HIID FCacheNumActiveParents = AidCache|AidNum|AidActive|AidParents;
+// number of recent results kept in cache (0: use forest default)
+const HIID FCacheDepth      = AidCache|AidDepth;
+// memory limit for results kept beyond the current one, in MB
+// (0: use forest default; <0: no limit)
+const HIID FCacheMaxSize    = AidCache|AidMax|AidSize;
 // cache stats record
 const HIID FCacheStats      = AidCache|AidStats;
   // and its fields
   const HIID FAllRequests     = AidAll|AidRequests;
   const HIID FNewRequests     = AidNew|AidRequests;
   const HIID FParents         = AidParents;
+  // per-node stats of the forest-wide result cache
+  const HIID FResultCache     = AidResult|AidCache;
+  // cache hits by slot (0 is the current result, 1 the previous one, etc.)
+  const HIID FSlotHits        = AidDepth;
 
 const HIID FLogPolicy     = AidLog|AidPolicy;
 
+// evaluation precision: "double", "single", or "" to inherit it from the
+// parent node (or the forest default, at the root of a tree)
+// (see VellsKernels.h)
+const HIID FPrecision     = AidPrecision;
+
 
 // profiling stats record
 const HIID FProfilingStats      = AidProfiling|AidStats;
@@ -243,6 +258,12 @@ class Node : public NodeFace
       CACHE_ALWAYS     =  20     //## always cache
     } CachePolicy;
 
+    //## max number of results that a node can keep in its cache
+    typedef enum
+    {
+      MAX_CACHE_DEPTH  =  16
+    } CacheDepth;
+
     //## logging policies
     typedef enum
     {
@@ -330,6 +351,23 @@ class Node : public NodeFace
     void disableAutoResample ()
     { disable_auto_resample_ = true; auto_resample_ = RESAMPLE_NONE; }
 
+    //## converts a precision setting ("double", "single" or "") into
+    //## VellsKernels::DOUBLE or SINGLE, or -1 for "" (use default)
+    static int precisionFromString (const string &str);
+
+    //## precision setting that applies to this node and is passed on to
+    //## children without a setting of their own: the node's own setting,
+    //## else the one inherited from the parent executing it, else the
+    //## forest default. A child shared between parents of different
+    //## precisions is evaluated (and cached) at the precision of whichever
+    //## parent polls it first, so such children should get a setting
+    //## of their own.
+    int subtreePrecision () const;
+
+    //## precision that getResult() runs at for this request. Perturbed
+    //## evaluations (for the solver) are always done in double.
+    int evalPrecision (const Request &req) const;
+
     //====== NodeFace methods
     //## Access to node state
     //## Each node has a state record. Some extra rapidly-changing info
@@ -470,9 +508,24 @@ class Node : public NodeFace
     int cachePolicy () const
     { return cache_policy_; }
 
+    //## Returns a hash of the node's definition (class and init record) and,
+    //## recursively, of its children. Nodes with identical subtrees have
+    //## the same hash, and share results via the forest-wide result cache
+    //## (see ResultCache.h). Nodes that do not allow shared results
+    //## (see shareable_results_ below) get a hash that is unique to them.
+    uint64_t contentHash ();
+
     void setCachePolicy (int policy)
     { cache_policy_ = policy; }
 
+    //## number of recent results kept in cache (forest default if not set
+    //## for this node), between 1 and MAX_CACHE_DEPTH
+    int cacheDepth () const;
+
+    //## memory limit for results kept beyond the current one, in bytes
+    //## (0 for no limit)
+    size_t cacheMaxSize () const;
+
     int logPolicy () const
     { return log_policy_; }
 
@@ -724,10 +777,33 @@ class Node : public NodeFace
     //## this flag is set inside Node::execute() to prevent reentrancy
     bool executing_;
 
+    //## flag: the node's result depends only on its definition, its children
+    //## and the request, so identical nodes can share results via the
+    //## forest-wide result cache. Subclasses set this in their constructor
+    //## (Function subclasses via Function::allowSharedResults()).
+    bool shareable_results_;
+
+    //## flag: the node always evaluates in double precision, whatever the
+    //## forest or node precision setting is. Subclasses that compare or fit
+    //## data (Condeq, Solver) set this in their constructor.
+    bool double_precision_only_;
+
     //## condition variable used to signal when executing_ is cleared.
     Thread::Condition exec_cond_;
 
   private:
+    //## hashes the definition of the node, i.e. its class and init record,
+    //## minus the fields that differ between otherwise identical nodes
+    uint64_t definitionHash (const DMI::Record &initrec) const;
+
+    //## drops the content hash of the node and its parents, so that they
+    //## are recomputed. If definition_changed is true, the node also stops
+    //## sharing results (this is called when node state is changed).
+    void invalidateContentHash (bool definition_changed);
+
+    //## true if the forest-wide result cache may be used for this request
+    bool useResultCache (const Request &req) const;
+
     //## sets up nursery objects based on the child_indices_ and stepchild_indices_
     //## vectors which are populated by init() or reinit(). Called
     //## from resolveLinks(), and also when loading the node from a file.
@@ -768,9 +844,18 @@ class Node : public NodeFace
     //## cache policy setting
     int cache_policy_;
 
+    //## number of results kept in cache, 0 for forest default
+    int cache_depth_;
+    //## memory limit of older results, in MB, 0 for forest default
+    double cache_max_size_;
+
     //## log policy setting
     int log_policy_;
 
+    //## precision setting (VellsKernels::DOUBLE or SINGLE), -1 to inherit
+    //## from the parent or forest (see subtreePrecision())
+    int precision_;
+
     //## flag: cache should be made explicitly dependent on "State". This
     //## flag is "dropped" on us from child nodes when their state changes, and is
     //## primarily meant as a kludge against the Solver-ReqSeq conundrum.
@@ -980,6 +1065,33 @@ class Node : public NodeFace
 
     Cache cache_;
 
+    //## older results kept when cacheDepth()>1, most recent first. When the
+    //## current result is dropped from the cache it is moved here; a
+    //## request that matches one of these results brings it back as the
+    //## current result.
+    typedef struct
+    {
+      Result::Ref result;
+      RequestId   rqid;
+      int         rescode;
+      size_t      size;
+    } CacheSlot;
+    typedef std::list<CacheSlot> CacheSlotList;
+    CacheSlotList cache_slots_;
+    //## total size of results in cache_slots_
+    size_t cache_slots_size_;
+
+    //## looks for an older result matching the request. On a match, makes
+    //## it the current result and returns its slot number, else returns 0.
+    int findCacheSlot (const Request &req);
+
+    //## drops the current result from the cache. If cacheDepth()>1, the
+    //## result is kept in cache_slots_.
+    void retireCache ();
+
+    //## drops all older results
+    void clearCacheSlots ();
+
     //## flag: release cache when all parents allow it
     bool parents_release_cache_;
 
@@ -1008,6 +1120,21 @@ class Node : public NodeFace
     CacheParentInfo * pcparents_;
     //## another copy of the result code goes here
     int * pcrescode_;
+    //## cache hits by slot, MAX_CACHE_DEPTH entries
+    int * pcslothits_;
+
+    //## hash of node definition, 0 if node does not share results
+    uint64_t definition_hash_;
+    //## cached result of contentHash(), 0 if not yet computed
+    uint64_t content_hash_;
+    //## forest-wide result cache stats for this node
+    typedef struct
+    {
+      double hits;        //## results found in forest cache
+      double miss;        //## results not found in forest cache
+      double bytes_saved; //## total size of results found
+    } ResultCacheStats;
+    ResultCacheStats * prcs_;
 
     //## profiling stats
     DMI::Record::Ref profile_stats_;
@@ -57,6 +57,7 @@ void NodeNursery::init (int num_children,const std::string &name)
   child_enabled_.resize(num_children);
   child_enabled_.assign(num_children,false);
   child_retcodes_.resize(num_children);
+  mt.child_affinity_.assign(num_children,-1);
 
   // setup default polling order
   child_poll_order_.resize(num_children);
@@ -163,12 +164,9 @@ AtomicID NodeNursery::validatePolicy (AtomicID policy)
 }
 
 
-// Checks if an MT poll is possible, returns brigade if it is. Sets
-// a lock on the brigade's cond() mutex/variable.
+// Checks if an MT poll is possible, returns brigade if it is.
 // If MT is not possible (i.e. must poll serially in same thread), returns 0.
-// As a side effect, inits mt.old_brigade_ if the current thread
-// switches brigades.
-MTPool::Brigade * NodeNursery::mt_checkBrigadeAvailability (Thread::Mutex::Lock &lock,const Request &req)
+MTPool::Brigade * NodeNursery::mt_checkBrigadeAvailability (const Request &req)
 {
   // completely disabled, or only one child to poll anyway,
   // or is a service request and we have requested serialization
@@ -177,9 +175,7 @@ MTPool::Brigade * NodeNursery::mt_checkBrigadeAvailability (Thread::Mutex::Lock
     return mt.cur_brigade_ = 0;
   else
   {
-    mt.cur_brigade_ = &( MTPool::brigade() );
-    lock.relock(mt.cur_brigade_->cond());
-    return mt.cur_brigade_;
+    return mt.cur_brigade_ = &( MTPool::brigade() );
   }
 }
 
@@ -188,9 +184,8 @@ int NodeNursery::startAsyncPoll (const Request &req,int depth)
   FailWhen(async_poll_in_progress_ || background_poll_in_progress_,"another poll is already in progress");
   int numchildren = 0; // number of children to poll (accounting for disabled children)
   polling_depth_ = depth;
-  Thread::Mutex::Lock lock;
   // multithreaded version
-  if( mt_checkBrigadeAvailability(lock,req) )
+  if( mt_checkBrigadeAvailability(req) )
   {
     mt.polling_ = true;
     mt.child_retcount_ = 0;
@@ -200,20 +195,21 @@ int NodeNursery::startAsyncPoll (const Request &req,int depth)
     cdebug(1)<<endl<<"T"<<std::hex<<Thread::self()<<std::dec<<" node "<<name()<<
             "placing async WOs for "<<numChildren()<<" child nodes "<<endl;
     // since later orders are executed sooner, we put the stepchild orders first
+    int iq = -1; // queue of last order placed
     for( int i=numChildren()-1; i>=0; i-- )
     {
       int ichild = child_poll_order_[i];
       if( isChildEnabled(ichild) )
       {
-        mt.cur_brigade_->placeWorkOrder(new MTPool::WorkOrder(
-            *this,&NodeNursery::mt_receiveAsyncChildResult,getChild(ichild),ichild,req,depth));
+        iq = mt.cur_brigade_->placeWorkOrder(new MTPool::WorkOrder(
+            *this,&NodeNursery::mt_receiveAsyncChildResult,getChild(ichild),ichild,req,depth,mt.child_affinity_[ichild]));
         numchildren++;
       }
       else
         child_retcodes_[ichild] = 0;
     }
     mt.numchildren_ = numchildren;
-    mt.cur_brigade_->awakenWorker();
+    mt.cur_brigade_->awakenWorker(iq);
   }
   else
   {
@@ -244,6 +240,7 @@ void NodeNursery::mt_receiveAsyncChildResult (int ichild,MTPool::WorkOrder &res)
   qres.ichild = ichild;
   qres.resref.xfer(res.resref);
   qres.retcode = child_retcodes_[ichild] = res.retcode;
+  mt.child_affinity_[ichild] = res.queue();
   // add time to profiling timer
   timer().add(res.timer);
   // wake parent thread since it may be waiting for a child result
@@ -262,6 +259,7 @@ void NodeNursery::mt_receiveBackgroundResult (int ichild,MTPool::WorkOrder &res)
   Thread::Mutex::Lock lock(mt.child_poll_cond_);
   res.resref.detach(); // discard result straight off but do store the return code
   child_retcodes_[ichild] = res.retcode;
+  mt.child_affinity_[ichild] = res.queue();
   // add time to profiling timer
   timer().add(res.timer);
   // if last result, broadcast it to wake parent thread, since it may be
@@ -283,12 +281,10 @@ void NodeNursery::mt_abortPoll ()
 {
   if( !mt.cur_brigade_ )
     return;
-  Thread::Mutex::Lock lock(mt.cur_brigade_->cond());
   mt.abandon_ = true;
   mt.polling_ = false;
   // clear out orders placed by us
   mt.cur_brigade_->clearQueue(*this);
-  lock.release();
   // clean up (leaving brigade if needed)
   mt_cleanupAfterPoll();
 }
@@ -303,14 +299,12 @@ void NodeNursery::mt_waitForEndOfPoll ()
   while( mt.child_retcount_ < mt.numchildren_ && !mt.abandon_ )
   {
     // else grab a work order for ourselves
-    Thread::Mutex::Lock lock2(mt.cur_brigade_->cond());
     MTPool::AbstractWorkOrder *wo = mt.cur_brigade_->getWorkOrder(false,polling_depth_); // wait=false
     // if there's nothing on the queue, then we have to wait for all worker
     // threads to finish and deliver a result, so just go to sleep
     if( !wo )
     {
       MTPool::Brigade::markThreadAsBlocked(name());
-      lock2.release();
       becomeIdle();
       mt.child_poll_cond_.wait();
       MTPool::Brigade::markThreadAsUnblocked(name());
@@ -318,7 +312,6 @@ void NodeNursery::mt_waitForEndOfPoll ()
       // once woken, go back to top of loop to see what we have received
       continue;
     }
-    lock2.release();
     // ok, we have a work order -- release child results lock and go on to
     // fill it
     lock.release();
@@ -370,7 +363,6 @@ int NodeNursery::awaitChildResult (int &rescode,Result::Ref &resref,const Reques
       }
       // no result on queue, so we can grab a work order from the brigade queue
       lock.release();
-      Thread::Mutex::Lock lock2(mt.cur_brigade_->cond());
       MTPool::AbstractWorkOrder *wo = mt.cur_brigade_->getWorkOrder(false,polling_depth_); // wait=false
       // if there's nothing on the queue, then we have to wait for all worker
       // threads to finish and deliver a result, so just go to sleep
@@ -381,17 +373,13 @@ int NodeNursery::awaitChildResult (int &rescode,Result::Ref &resref,const Reques
         {
           MTPool::Brigade::markThreadAsBlocked(name());
           becomeIdle();
-          lock2.release();
           mt.child_poll_cond_.wait();
           becomeBusy();
           MTPool::Brigade::markThreadAsUnblocked(name());
         }
-        else
-          lock2.release();
         // once woken, go back to top of loop to see what we have received
         continue;
       }
-      lock2.release();
       // ok, we have a work order -- release child results lock and go on to
       // fill it
       lock.release();
@@ -438,6 +426,7 @@ void NodeNursery::mt_receiveSyncChildResult (int ichild,MTPool::WorkOrder &res)
   // store result in child result queue
   (*mt.pchildres_)[ichild].xfer(res.resref);
   child_cumul_retcode_ |= child_retcodes_[ichild] = res.retcode;
+  mt.child_affinity_[ichild] = res.queue();
   // register a fail if received
   if( res.retcode&NodeFace::RES_FAIL )
   {
@@ -465,7 +454,6 @@ void NodeNursery::mt_receiveSyncChildResult (int ichild,MTPool::WorkOrder &res)
   if( mt.abandon_ )
   {
     lock.release();
-    lock.relock(mt.cur_brigade_->cond());
     mt.cur_brigade_->clearQueue(*this);
   }
 }
@@ -485,8 +473,7 @@ int NodeNursery::syncPoll (Result::Ref &resref,std::vector<Result::Ref> &childre
     child_fails_.resize(0);
     polling_depth_ = depth;
     // multithreaded poll
-    Thread::Mutex::Lock lock;
-    if( mt_checkBrigadeAvailability(lock,req) )
+    if( mt_checkBrigadeAvailability(req) )
     {
       cdebug(1)<<endl<<"T"<<std::hex<<Thread::self()<<std::dec<<" node "<<name()<<
               "placing WOs for "<<numChildren()<<" child nodes"<<endl;
@@ -502,7 +489,7 @@ int NodeNursery::syncPoll (Result::Ref &resref,std::vector<Result::Ref> &childre
         if( isChildEnabled(ichild) )
         {
           mt.cur_brigade_->placeWorkOrder(new MTPool::WorkOrder(
-              *this,&NodeNursery::mt_receiveSyncChildResult,getChild(ichild),ichild,req,depth));
+              *this,&NodeNursery::mt_receiveSyncChildResult,getChild(ichild),ichild,req,depth,mt.child_affinity_[ichild]));
           mt.numchildren_++;
         }
         else
@@ -511,16 +498,12 @@ int NodeNursery::syncPoll (Result::Ref &resref,std::vector<Result::Ref> &childre
       // no more WOs -- sleep until all children have returned
       while( true )
       {
-        // at this point we hold a lock on the brigade queue
         // get a WO back from the queue since we'll be executing it ourselves
         MTPool::AbstractWorkOrder *wo = mt.cur_brigade_->getWorkOrder(false,polling_depth_); // wait=false
-        // release queue lock and go on to fill WO for first child
-        lock.release();
         if( wo )
         {
           wo->execute(*mt.cur_brigade_);
           mt.cur_brigade_->finishWithWorkOrder(wo);
-          lock.relock(mt.cur_brigade_->cond());
           continue;
         }
         // null from queue means either no more work orders, or too many busy threads busy
@@ -536,10 +519,7 @@ int NodeNursery::syncPoll (Result::Ref &resref,std::vector<Result::Ref> &childre
         }
         else
           break;
-        lock2.release();
-        lock.relock(mt.cur_brigade_->cond());
       }
-      lock.release();
       // finish up
       mt_cleanupAfterPoll();
     }
@@ -621,10 +601,9 @@ int NodeNursery::syncPoll (Result::Ref &resref,std::vector<Result::Ref> &childre
 void NodeNursery::backgroundPoll (const Request &req,int depth)
 {
   FailWhen(async_poll_in_progress_ || background_poll_in_progress_,"another poll is already in progress");
-  Thread::Mutex::Lock lock;
   polling_depth_ = depth;
   // multithreaded version
-  if( mt_checkBrigadeAvailability(lock,req) )
+  if( mt_checkBrigadeAvailability(req) )
   {
     background_poll_in_progress_ = true;
     mt.polling_ = true;
@@ -639,21 +618,21 @@ void NodeNursery::backgroundPoll (const Request &req,int depth)
 //      mt.cur_brigade_->placeWorkOrder(new MTPool::WorkOrder(
 //          *this,&Node::mt_receiveStepchildResult,getStepChild(i),i,req));
     // since later orders are executed sooner, we put the stepchild orders first
+    int iq = -1; // queue of last order placed
     for( int i=numChildren()-1; i>=0; i-- )
     {
       int ichild = child_poll_order_[i];
       if( isChildEnabled(i) )
       {
-        mt.cur_brigade_->placeWorkOrder(new MTPool::WorkOrder(
-            *this,&NodeNursery::mt_receiveBackgroundResult,getChild(ichild),ichild,req,depth));
+        iq = mt.cur_brigade_->placeWorkOrder(new MTPool::WorkOrder(
+            *this,&NodeNursery::mt_receiveBackgroundResult,getChild(ichild),ichild,req,depth,mt.child_affinity_[ichild]));
         mt.numchildren_++;
       }
       else
         child_retcodes_[ichild] = 0;
     }
     // wake up some worker threads in brigade
-    mt.cur_brigade_->awakenWorker();
-    lock.release();
+    mt.cur_brigade_->awakenWorker(iq);
   }
   // single-threaded version
   else
@@ -344,7 +344,7 @@ class NodeNursery
     //## Checks if poll can be done in mt mode. If yes, sets
     //## mt.cur_brigade_ to the current brigade, and returns this value
     //## if not, returns 0.
-    MTPool::Brigade * mt_checkBrigadeAvailability (Thread::Mutex::Lock &lock,const Request &req);
+    MTPool::Brigade * mt_checkBrigadeAvailability (const Request &req);
 
     //## callbacks to deliver child results in MT mode
     void mt_receiveAsyncChildResult (int ichild,MTPool::WorkOrder &res);
@@ -432,6 +432,9 @@ class NodeNursery
       bool polling_;
       //## true if poll is being abandoned (in AbandonCollect mode)
       bool abandon_;
+      //## per-child brigade queue that executed the child's last work order,
+      //## -1 if none. Used as the affinity of the next work order.
+      std::vector<int> child_affinity_;
     } mt;
 
     //## pointer to abort flag, if set
@@ -224,6 +224,12 @@ void Node::attachInitRecord (DMI::Record::Ref &initrec, Forest* frst)
   // xfer the state record, deref for writing
   DMI::Record &strec = staterec_.xfer(initrec).dewr();
 
+  // hash the node definition for the forest-wide result cache. This needs
+  // the init record as it came in, so has to be done here, whether or not
+  // the cache is enabled yet.
+  content_hash_ = 0;
+  definition_hash_ = shareable_results_ ? definitionHash(strec) : 0;
+
   strec[FInternalInitIndex] = internal_init_index_ = -1;
   
   // Check children specification
@@ -313,6 +319,9 @@ void Node::reattachInitRecord (DMI::Record::Ref &initrec, Forest* frst)
   // xfer & COW the state record -- we don't want anyone
   // changing it under us
   DMI::Record &rec = staterec_.xfer(initrec).dewr();
+
+  // a saved state record is no longer a definition, so don't share results
+  content_hash_ = definition_hash_ = 0;
   
   // set control state
   control_status_ = rec[FControlStatus].as<int>();
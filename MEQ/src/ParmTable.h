@@ -66,6 +66,11 @@ public:
   virtual int getInitCoeff (Funklet::Ref &,const string&)
   { return 0; }
 
+  // Gets the names of all parms in the table.
+  // Returns # of names, or -1 if the table can't list its parms.
+  virtual int getNames (std::vector<string> &)
+  { return -1; }
+
     //##ModelId=3F95060D0388
   virtual const string& name() const  =0;
 
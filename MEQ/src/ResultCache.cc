@@ -0,0 +1,177 @@
+//
+//% $Id$
+//
+//
+// Copyright (C) 2002-2007
+// The MeqTree Foundation &
+// ASTRON (Netherlands Foundation for Research in Astronomy)
+// P.O.Box 2, 7990 AA Dwingeloo, The Netherlands
+//
+// This program is free software; you can redistribute it and/or modify
+// it under the terms of the GNU General Public License as published by
+// the Free Software Foundation; either version 2 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+// GNU General Public License for more details.
+//
+// You should have received a copy of the GNU General Public License
+// along with this program; if not, see <http://www.gnu.org/licenses/>,
+// or write to the Free Software Foundation, Inc.,
+// 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+//
+
+#include "ResultCache.h"
+#include "VellSet.h"
+#include <string.h>
+
+namespace Meq
+{
+
+ResultCache::ResultCache ()
+  : budget_(0),bytes_(0)
+{
+  memset(&stats_,0,sizeof(stats_));
+}
+
+static size_t vellsSize (const Vells &vells)
+{
+  if( !vells.valid() )
+    return 0;
+  return vells.nelements()*vells.elementSize();
+}
+
+size_t ResultCache::resultSize (const Result &res)
+{
+  size_t size = sizeof(Result);
+  for( int i=0; i<res.numVellSets(); i++ )
+  {
+    const VellSet &vs = res.vellSet(i);
+    if( vs.hasValue() )
+      size += vellsSize(vs.getValue());
+    for( int iset=0; iset<vs.numPertSets(); iset++ )
+      for( int j=0; j<vs.numSpids(); j++ )
+        size += vellsSize(vs.getPerturbedValue(j,iset));
+  }
+  return size;
+}
+
+void ResultCache::setBudget (size_t bytes)
+{
+  Thread::Mutex::Lock lock(mutex_);
+  budget_ = bytes;
+  if( budget_ )
+    evict();
+  else
+  {
+    entries_.clear();
+    index_.clear();
+    bytes_ = 0;
+  }
+}
+
+void ResultCache::clear ()
+{
+  Thread::Mutex::Lock lock(mutex_);
+  entries_.clear();
+  index_.clear();
+  bytes_ = 0;
+}
+
+void ResultCache::remove (EntryIndex::iterator iter)
+{
+  bytes_ -= iter->second->size;
+  entries_.erase(iter->second);
+  index_.erase(iter);
+}
+
+// drops least recently used entries until we're within budget
+void ResultCache::evict ()
+{
+  while( bytes_ > budget_ && !entries_.empty() )
+  {
+    const Entry &entry = entries_.back();
+    std::pair<EntryIndex::iterator,EntryIndex::iterator> range = index_.equal_range(entry.key);
+    for( EntryIndex::iterator iter = range.first; iter != range.second; iter++ )
+      if( &(*iter->second) == &entry )
+      {
+        remove(iter);
+        break;
+      }
+    stats_.evicted++;
+  }
+}
+
+bool ResultCache::lookup (Result::Ref &ref,int &rescode,uint64_t content_hash,const Request &req)
+{
+  const RequestId &rqid = req.id();
+  if( rqid.empty() )
+    return false;
+  Key key(content_hash,req.hasCells() ? req.cells().contentHash() : 0);
+  Thread::Mutex::Lock lock(mutex_);
+  std::pair<EntryIndex::iterator,EntryIndex::iterator> range = index_.equal_range(key);
+  for( EntryIndex::iterator iter = range.first; iter != range.second; iter++ )
+  {
+    Entry &entry = *iter->second;
+    // same rule as the per-node cache: match if rqids agree on everything
+    // the result depends on
+    if( !(RqId::diffMask(rqid,entry.rqid)&entry.rescode) )
+    {
+      ref = entry.result;
+      rescode = entry.rescode;
+      stats_.hits++;
+      stats_.bytes_saved += entry.size;
+      // move to front of LRU list
+      entries_.splice(entries_.begin(),entries_,iter->second);
+      return true;
+    }
+  }
+  stats_.miss++;
+  return false;
+}
+
+void ResultCache::store (uint64_t content_hash,const Request &req,const Result::Ref &ref,int rescode)
+{
+  const RequestId &rqid = req.id();
+  if( rqid.empty() || !ref.valid() )
+    return;
+  size_t size = resultSize(*ref);
+  Key key(content_hash,req.hasCells() ? req.cells().contentHash() : 0);
+  Thread::Mutex::Lock lock(mutex_);
+  if( size > budget_ )
+    return;
+  // a result for the same request replaces the old one
+  std::pair<EntryIndex::iterator,EntryIndex::iterator> range = index_.equal_range(key);
+  for( EntryIndex::iterator iter = range.first; iter != range.second; iter++ )
+    if( iter->second->rqid == rqid )
+    {
+      remove(iter);
+      break;
+    }
+  Entry entry;
+  entry.key = key;
+  entry.rqid = rqid;
+  entry.rescode = rescode;
+  entry.result = ref;
+  entry.size = size;
+  entries_.push_front(entry);
+  index_.insert(std::make_pair(key,entries_.begin()));
+  bytes_ += size;
+  stats_.stored++;
+  evict();
+}
+
+void ResultCache::fillStats (DMI::Vec &vec) const
+{
+  Thread::Mutex::Lock lock(mutex_);
+  Stats st = stats_;
+  st.entries = entries_.size();
+  st.bytes = bytes_;
+  const double *pst = reinterpret_cast<const double *>(&st);
+  for( uint i=0; i<sizeof(Stats)/sizeof(double); i++ )
+    vec[i] = pst[i];
+}
+
+} // namespace Meq
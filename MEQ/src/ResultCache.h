@@ -0,0 +1,136 @@
+//#  ResultCache.h: forest-wide cache of node results
+//#
+//#  Copyright (C) 2002-2007
+//#  ASTRON (Netherlands Foundation for Research in Astronomy)
+//#  and The MeqTree Foundation
+//#  P.O.Box 2, 7990 AA Dwingeloo, The Netherlands, seg@astron.nl
+//#
+//#  This program is free software; you can redistribute it and/or modify
+//#  it under the terms of the GNU General Public License as published by
+//#  the Free Software Foundation; either version 2 of the License, or
+//#  (at your option) any later version.
+//#
+//#  This program is distributed in the hope that it will be useful,
+//#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+//#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+//#  GNU General Public License for more details.
+//#
+//#  You should have received a copy of the GNU General Public License
+//#  along with this program; if not, write to the Free Software
+//#  Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+//#
+//#  $Id$
+#ifndef MEQ_SRC_RESULTCACHE_H_HEADER_INCLUDED
+#define MEQ_SRC_RESULTCACHE_H_HEADER_INCLUDED
+
+#include <MEQ/Result.h>
+#include <MEQ/Request.h>
+#include <MEQ/RequestId.h>
+#include <DMI/Vec.h>
+#include <TimBase/Thread/Mutex.h>
+#include <stdint.h>
+#include <list>
+#include <map>
+
+namespace Meq
+{
+using namespace DMI;
+
+//## The ResultCache holds results of nodes keyed on the node's content hash
+//## (see Node::contentHash()) and the hash of the request cells. Nodes with
+//## identical definitions and identical children (e.g. per-baseline copies
+//## of the same station subtree) thus share results. Cached results are
+//## matched against request IDs using their dependency masks, in the same
+//## way as the per-node cache does. The cache has a memory budget; least
+//## recently used results are evicted when this is exceeded. A budget of 0
+//## disables the cache.
+class ResultCache
+{
+  public:
+    //## cache statistics, returned by fillStats() as a vector of doubles
+    typedef struct
+    {
+      double hits;        //## number of results found in cache
+      double miss;        //## number of lookups that found nothing
+      double stored;      //## number of results stored
+      double evicted;     //## number of results evicted to stay within budget
+      double entries;     //## current number of results in cache
+      double bytes;       //## current memory use
+      double bytes_saved; //## total size of results reused from cache
+    } Stats;
+
+    ResultCache ();
+
+    //## sets memory budget, in bytes. Evicts results as needed. 0 disables
+    //## the cache and drops all results.
+    void setBudget (size_t bytes);
+
+    size_t budget () const
+    { return budget_; }
+
+    bool enabled () const
+    { return budget_ > 0; }
+
+    //## looks for a result of node content_hash that is valid for this
+    //## request. On a hit, attaches the result to ref, sets rescode to the
+    //## cached result code, and returns true.
+    bool lookup (Result::Ref &ref,int &rescode,uint64_t content_hash,const Request &req);
+
+    //## stores a result. rescode is the result code, its dependency mask
+    //## determines which later requests the result will match.
+    void store (uint64_t content_hash,const Request &req,const Result::Ref &ref,int rescode);
+
+    //## drops all cached results
+    void clear ();
+
+    //## fills in current statistics
+    void fillStats (DMI::Vec &vec) const;
+
+    //## approximate memory taken up by a result
+    static size_t resultSize (const Result &res);
+
+    //## FNV-1a hashing helpers
+    static const uint64_t HashSeed = 14695981039346656037ULL;
+
+    static uint64_t hashBytes (uint64_t hash,const void *data,size_t size)
+    {
+      const unsigned char *p = static_cast<const unsigned char *>(data);
+      for( size_t i=0; i<size; i++ )
+        hash = (hash^p[i])*1099511628211ULL;
+      return hash;
+    }
+
+    static uint64_t hashString (uint64_t hash,const std::string &str)
+    { return hashBytes(hash,str.data(),str.length()); }
+
+  private:
+    typedef std::pair<uint64_t,uint64_t> Key; // node hash, cells hash
+
+    typedef struct
+    {
+      Key         key;
+      RequestId   rqid;
+      int         rescode;
+      Result::Ref result;
+      size_t      size;
+    } Entry;
+
+    // entries in LRU order, most recently used first
+    typedef std::list<Entry> EntryList;
+    typedef std::multimap<Key,EntryList::iterator> EntryIndex;
+
+    void remove (EntryIndex::iterator iter);
+    void evict ();
+
+    EntryList   entries_;
+    EntryIndex  index_;
+    size_t      budget_;
+    size_t      bytes_;
+    Stats       stats_;
+
+    mutable Thread::Mutex mutex_;
+};
+
+} // namespace Meq
+
+#endif
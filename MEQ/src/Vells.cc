@@ -23,6 +23,7 @@
 
 // #define MEQVELLS_SKIP_FUNCTIONS 1
 #include <MEQ/Vells.h>
+#include <MEQ/VellsKernels.h>
 #include <TimBase/Debug.h>
 #include <DMI/Global-Registry.h>
 #include <cmath>
@@ -137,6 +138,12 @@ Vells::Vells (const Vells &that,int flags,int depth)
 : NumArray(that,flags,depth,TpMeqVells)
 {
   dataflags_.copy(that.dataflags_);
+  // a shallow copy of a temp takes over its storage for writing
+  if( that.is_temp_ && !(flags&DMI::DEEP) )
+  {
+    that.is_temp_ = false;
+    setWritableRef();
+  }
 }
 
 //##ModelId=3F868870023B
@@ -146,6 +153,11 @@ Vells& Vells::operator= (const Vells& other)
   {
     NumArray::operator = (other);
     dataflags_ = other.dataflags_;
+    if( other.is_temp_ )
+    {
+      other.is_temp_ = false;
+      setWritableRef();
+    }
   }
   return *this;
 }
@@ -227,24 +239,17 @@ void Vells::zeroData ()
 //
 
 //##ModelId=400E5356019D
-inline bool Vells::tryReference (const Vells &)
+inline bool Vells::tryReference (const Vells &other,TypeId type,const LoShape &shape)
 {
-// disable for now: figure out how this plays with COWs later
-//   // the 'other' array can be reused if it's a temp, it has the
-//   // same size and type, and it's writable
-//   if( other.isTemp() &&
-//       other.array_.valid() &&
-//       elementType() == other.elementType() &&
-//       shape() == other.shape() )
-//   {
-//     // if other is not directly writable, no point in reusing it
-//     if( !other.array_.isDirectlyWritable() )
-//       return false;
-//     array_ = other.array_;
-//     storage_ = other.storage_;
-//     return true;
-//   }
-  return false;
+  // the 'other' array can be reused if it's a temp and has the same size
+  // and type. We then share its data block, and write to it directly,
+  // bypassing copy-on-write
+  if( !other.is_temp_ || other.elementType() != type || other.shape() != shape )
+    return false;
+  other.is_temp_ = false;
+  NumArray::operator = (other);
+  setWritableRef();
+  return true;
 }
 
 // helper function used to figure out type of result
@@ -270,9 +275,10 @@ Vells::Vells (const Vells &other,int flags,const std::string &opname)
   FailWhen(flags&VF_FLAGTYPE && !other.isFlags(),
       opname + "() can only be used with a flags Meq::Vells");
   // determine shape
-  if( !tryReference(other) )
-    NumArray::init( getResultType(flags,other.isComplex()),
-        flags&VF_SCALAR ? LoShape(1) : other.shape(),DMI::NOZERO);
+  TypeId type = getResultType(flags,other.isComplex());
+  LoShape shp = flags&VF_SCALAR ? LoShape(1) : other.shape();
+  if( !tryReference(other,type,shp) )
+    NumArray::init(type,shp,DMI::NOZERO);
 }
 
 // // constructor for a temp vells in a unary reduction expression
@@ -434,8 +440,9 @@ Vells::Vells (const Vells &a,const Vells &b,int flags,
     computeStrides(shp,strides,a.shape(),b.shape(),opname);
   // now, if we're still congruent with the a or b, and it's
   // a temporary, then we can reuse its storage. Else allocate new
-  if( !( tryReference(a) || tryReference(b) ) )
-    NumArray::init(getResultType(flags,a.isComplex() || b.isComplex()),shp,DMI::NOZERO);
+  TypeId type = getResultType(flags,a.isComplex() || b.isComplex());
+  if( !( tryReference(a,type,shp) || tryReference(b,type,shp) ) )
+    NumArray::init(type,shp,DMI::NOZERO);
 }
 
 // Determines if other Vells can be applied to us in-place (i.e. += and such).
@@ -662,6 +669,37 @@ inline double arg (const double x)
 #endif
 
 
+// -----------------------------------------------------------------------
+// contiguous kernels
+// When all operands have the same shape as the result, Vells math calls
+// array_FUNCNAME(), array_binary_FUNCNAME() or array_inplace_FUNCNAME() 
+// on the raw arrays. Generic templates for these (plain loops) are defined
+// along with each operation below; the overloads here route the common
+// cases to the vectorised kernels in VellsKernels.h.
+// -----------------------------------------------------------------------
+#define defineArrayKernel1(FUNCNAME,KERNEL,T) \
+  static inline void array_##FUNCNAME (T *py,const T *px,int n) \
+  { Meq::VellsKernels::KERNEL(py,px,n); }
+#define defineArrayKernel2(FUNCNAME,KERNEL,T) \
+  static inline void array_binary_##FUNCNAME (T *py,const T *pa,const T *pb,int n) \
+  { Meq::VellsKernels::KERNEL(py,pa,pb,n); }
+#define defineArrayKernelInPlace(FUNCNAME,KERNEL,T) \
+  static inline void array_inplace_##FUNCNAME (T *py,const T *px,int n) \
+  { Meq::VellsKernels::KERNEL(py,py,px,n); }
+
+defineArrayKernel1(exp,exp,double);
+defineArrayKernel1(exp,exp,dcomplex);
+defineArrayKernel1(sin,sin,double);
+defineArrayKernel1(cos,cos,double);
+defineArrayKernel2(ADD,add,double);
+defineArrayKernel2(ADD,add,dcomplex);
+defineArrayKernel2(MUL,mul,double);
+defineArrayKernel2(MUL,mul,dcomplex);
+defineArrayKernelInPlace(ADD1,add,double);
+defineArrayKernelInPlace(ADD1,add,dcomplex);
+defineArrayKernelInPlace(MUL1,mul,double);
+defineArrayKernelInPlace(MUL1,mul,dcomplex);
+
 // -----------------------------------------------------------------------
 // definitions for unary operators
 // defined for all types, preserves type
@@ -669,13 +707,21 @@ inline double arg (const double x)
 // defines a templated implementation of an unary function
 //    y = FUNC(x)
 #define defineUnaryOperTemplate(FUNC,FUNCNAME,dum) \
+  template<class TY,class TX> \
+  static inline void array_##FUNCNAME (TY *py,const TX *px,int n) \
+  { for( int i=0; i<n; i++ ) \
+      py[i] = FUNC(px[i]); \
+  } \
   template<class TY,class TX> \
   static void implement_##FUNCNAME (Meq::Vells &y,const Meq::Vells &x) \
   { const TX *px = x.getStorage(Type2Type<TX>()); \
     TY *py = y.begin(Type2Type<TY>()), \
        *py_end = y.end(Type2Type<TY>());  \
-    for( ; py < py_end; px++,py++ ) \
-      *py = FUNC(*px); \
+    if( Meq::VellsKernels::enabled() ) \
+      array_##FUNCNAME(py,px,y.nelements()); \
+    else \
+      for( ; py < py_end; px++,py++ ) \
+        *py = FUNC(*px); \
   }
 
 #define implementUnaryOperator(OPER,OPERNAME,x) \
@@ -932,6 +978,11 @@ Meq::Vells::UnaryRdFuncWSPtr Meq::Vells::unifunc_nelements_lut[VELLS_LUT_SIZE] =
 // defines a templated implementation of a binary function
 //    y = FUNC(a,b)
 #define defineBinaryFuncTemplate(FUNC,FUNCNAME,dum) \
+  template<class TY,class TA,class TB> \
+  static inline void array_binary_##FUNCNAME (TY *py,const TA *pa,const TB *pb,int n) \
+  { for( int i=0; i<n; i++ ) \
+      py[i] = FUNC(pa[i],pb[i]); \
+  } \
   template<class TY,class TA,class TB> \
   static void implement_binary_##FUNCNAME (Meq::Vells &y,\
                   const Meq::Vells &a,const Meq::Vells &b,\
@@ -941,6 +992,9 @@ Meq::Vells::UnaryRdFuncWSPtr Meq::Vells::unifunc_nelements_lut[VELLS_LUT_SIZE] =
     const TB *pb = b.getStorage(Type2Type<TB>()); \
     if( a.isScalar() && b.isScalar() ) \
       *py = FUNC(*pa,*pb); \
+    else if( Meq::VellsKernels::enabled() && \
+             a.shape() == y.shape() && b.shape() == y.shape() ) \
+      array_binary_##FUNCNAME(py,pa,pb,y.nelements()); \
     else { \
       Meq::Vells::DimCounter counter(y);  \
       Meq::Vells::ConstStridedIterator<TA> ia(pa,strides[0]); \
@@ -1069,6 +1123,11 @@ DoForAllBinaryFlagOperators(implementBinaryFlagOperator,);
 // this version only called when the variability of y is >= that of x,
 // (otherwise remapped to y = y + x, see declarations in Vells.h)
 #define defineInPlaceOperTemplate(OPER,OPERNAME,dum) \
+  template<class TOut,class TX> \
+  static inline void array_inplace_##OPERNAME (TOut *py,const TX *px,int n) \
+  { for( int i=0; i<n; i++ ) \
+      py[i] OPER##= px[i]; \
+  } \
   template<class TOut,class TY,class TX> \
   static void implement_binary_##OPERNAME##_inplace (Meq::Vells &y,\
                   const Meq::Vells &x,\
@@ -1077,6 +1136,8 @@ DoForAllBinaryFlagOperators(implementBinaryFlagOperator,);
     const TX *px = x.getStorage(Type2Type<TX>()); \
     if( y.isScalar() && x.isScalar() ) \
       *py OPER##= *px; \
+    else if( Meq::VellsKernels::enabled() && x.shape() == y.shape() ) \
+      array_inplace_##OPERNAME(py,px,y.nelements()); \
     else { \
       Meq::Vells::DimCounter counter(y);  \
       Meq::Vells::ConstStridedIterator<TX> ix(px,strides_x); \
@@ -1200,7 +1261,32 @@ Meq::Vells::BinaryOperPtr Meq::Vells::binfunc_tocomplex_lut[VELLS_LUT_SIZE][VELL
 // polreptocomplex()
 #define polar(x,y) (x)*exp(make_dcomplex(0,y))
 // define standard template (will only be invoked for real arguments)
-defineBinaryFuncTemplate(polar,polar,);
+defineBinaryFuncTemplate(polar,polar_strided,);
+// contiguous phases, with a scalar or same-shaped modulus, go to the
+// kernel. Its name is parenthesised to keep the macro above out of the way.
+template<class TY,class TA,class TB>
+static void implement_binary_polar (Meq::Vells &y,
+                const Meq::Vells &a,const Meq::Vells &b,
+                const Meq::Vells::Strides strides[2])
+{
+  if( Meq::VellsKernels::enabled() && !b.isScalar() && b.shape() == y.shape() )
+  {
+    TY *py = y.getStorage(Type2Type<TY>());
+    const TA *pa = a.getStorage(Type2Type<TA>());
+    const TB *pb = b.getStorage(Type2Type<TB>());
+    if( a.isScalar() )
+    {
+      (Meq::VellsKernels::polar)(py,*pa,pb,y.nelements());
+      return;
+    }
+    else if( a.shape() == y.shape() )
+    {
+      (Meq::VellsKernels::polar)(py,pa,pb,y.nelements());
+      return;
+    }
+  }
+  implement_binary_polar_strided<TY,TA,TB>(y,a,b,strides);
+}
 // error function for complex arguments
 defineErrorFunc2(error_binary_polar,"polar() can only be applied to two real Meq::Vells");
 // LUT
@@ -337,6 +337,18 @@ public:
   void clearDataFlags ()
   { dataflags_.detach(); }
 
+  // A temp Vells donates its storage to the next Vells that is computed
+  // from it (or copied from it), provided type and shape match. The
+  // donation happens at most once; the donor's contents are then
+  // overwritten by the computation, so a Vells may only be marked as temp
+  // if it holds the only reference to its data block (see hasOwnBlock()
+  // and dataBlock()), and nothing is going to read it again.
+  bool isTemp () const
+  { return is_temp_; }
+
+  void setTemp (bool temp=true) const
+  { is_temp_ = temp; }
+
   static int extent (const Vells::Shape &shp,uint idim)
   { return idim < shp.size() ? shp[idim] : 1; }
 
@@ -790,6 +802,8 @@ private:
 
   Vells::Ref  dataflags_;
 
+  mutable bool is_temp_ = false;
+
   static VellsFlagType null_flag_;
   static Shape null_flag_shape_;
 
@@ -840,7 +854,7 @@ private:
 
   // helper functions for these two constructors
     //##ModelId=400E5356019D
-  bool tryReference (const Vells &other);
+  bool tryReference (const Vells &other,TypeId type,const LoShape &shape);
 
   static TypeId getResultType (int flags,bool arg_is_complex);
 
@@ -0,0 +1,319 @@
+//
+//% $Id$ 
+//
+//
+// Copyright (C) 2002-2007
+// The MeqTree Foundation & 
+// ASTRON (Netherlands Foundation for Research in Astronomy)
+// P.O.Box 2, 7990 AA Dwingeloo, The Netherlands
+//
+// This program is free software; you can redistribute it and/or modify
+// it under the terms of the GNU General Public License as published by
+// the Free Software Foundation; either version 2 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+// GNU General Public License for more details.
+//
+// You should have received a copy of the GNU General Public License
+// along with this program; if not, see <http://www.gnu.org/licenses/>,
+// or write to the Free Software Foundation, Inc., 
+// 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+//
+
+#include "VellsKernels.h"
+#include <cmath>
+#include <complex>
+#include <algorithm>
+
+// The SIMD versions of exp(), sin() and cos() (and of their float variants)
+// in libmvec are declared by glibc's <math.h> only under -ffast-math.
+// Declare them here, so that the vectoriser can use them without relaxing
+// floating-point semantics elsewhere.
+#ifdef HAVE_LIBMVEC
+extern "C"
+{
+  double exp (double) __attribute__((simd("notinbranch")));
+  double sin (double) __attribute__((simd("notinbranch")));
+  double cos (double) __attribute__((simd("notinbranch")));
+  float expf (float) __attribute__((simd("notinbranch")));
+  float sinf (float) __attribute__((simd("notinbranch")));
+  float cosf (float) __attribute__((simd("notinbranch")));
+}
+#endif
+
+// builds AVX2 and baseline versions of a kernel, selected at load time
+#if defined(__GNUC__) && !defined(__clang__) && defined(__x86_64__)
+  #define VELLS_KERNEL __attribute__((target_clones("avx2","default")))
+#else
+  #define VELLS_KERNEL
+#endif
+
+// asserts that loop iterations are independent. The output may be the same
+// array as an input, but since every element is only read by the same
+// iteration that writes it, this is not a dependency.
+#define VELLS_SIMD_LOOP _Pragma("omp simd")
+
+// helpers must be inlined into the kernels, to be built for the same target
+#if defined(__GNUC__)
+  #define VELLS_INLINE static inline __attribute__((always_inline))
+#else
+  #define VELLS_INLINE static inline
+#endif
+
+namespace Meq
+{
+
+namespace VellsKernels
+{
+
+bool enabled_ = true;
+
+thread_local int precision_ = DOUBLE;
+thread_local int subtree_precision_ = -1;
+
+void setEnabled (bool enable)
+{
+  enabled_ = enable;
+}
+
+// complex arrays are processed as interleaved (re,im) pairs of doubles
+static inline double * reim (dcomplex *x)
+{ return reinterpret_cast<double *>(x); }
+
+static inline const double * reim (const dcomplex *x)
+{ return reinterpret_cast<const double *>(x); }
+
+VELLS_KERNEL void add (double *y,const double *a,const double *b,int n)
+{
+  VELLS_SIMD_LOOP
+  for( int i=0; i<n; i++ )
+    y[i] = a[i] + b[i];
+}
+
+VELLS_KERNEL void add (dcomplex *y,const dcomplex *a,const dcomplex *b,int n)
+{
+  add(reim(y),reim(a),reim(b),2*n);
+}
+
+VELLS_KERNEL void mul (double *y,const double *a,const double *b,int n)
+{
+  VELLS_SIMD_LOOP
+  for( int i=0; i<n; i++ )
+    y[i] = a[i] * b[i];
+}
+
+// The textbook formula. Unlike the compiler's complex multiply, this does
+// not try to recover infinite results from NaN products (C99 Annex G), but
+// that check is what prevents the compiler from vectorising the loop.
+VELLS_KERNEL void mul (dcomplex *y,const dcomplex *a,const dcomplex *b,int n)
+{
+  double *py = reim(y);
+  const double *pa = reim(a), *pb = reim(b);
+  VELLS_SIMD_LOOP
+  for( int i=0; i<n; i++ )
+  {
+    double ar = pa[2*i], ai = pa[2*i+1], br = pb[2*i], bi = pb[2*i+1];
+    py[2*i]   = ar*br - ai*bi;
+    py[2*i+1] = ar*bi + ai*br;
+  }
+}
+
+// Single-precision evaluation: values are converted to float in blocks,
+// put through the float function, and converted back.
+const int BlockSize = 256;
+
+// inputs to float exp() must stay below this, or the result overflows
+const double MaxSingleExp = 80;
+
+// reduces a phase to [-pi,pi]. This is done in double, so that large
+// phases do not lose precision when converted to float. Rounding is done
+// by adding and subtracting 1.5*2^52, since floor() and friends are not
+// vectorised for baseline SSE2. (Beyond 2^51 turns the phase is not
+// reduced, but it has no meaningful fractional part there anyway.)
+VELLS_INLINE double reducePhase (double x)
+{
+  const double TwoPi = 6.283185307179586;
+  const double Round = 6755399441055744.0;
+  double turns = (x*(1/TwoPi) + Round) - Round;
+  return x - TwoPi*turns;
+}
+
+VELLS_INLINE bool singleExpSafe (const double *x,int n)
+{
+  bool safe = true;
+  for( int i=0; i<n; i++ )
+    safe &= std::fabs(x[i]) < MaxSingleExp;
+  return safe;
+}
+
+VELLS_INLINE void expBlock (double *y,const double *x,int nb)
+{
+  if( precision_ == SINGLE && singleExpSafe(x,nb) )
+  {
+    float f[BlockSize];
+    VELLS_SIMD_LOOP
+    for( int i=0; i<nb; i++ )
+      f[i] = x[i];
+    VELLS_SIMD_LOOP
+    for( int i=0; i<nb; i++ )
+      f[i] = ::expf(f[i]);
+    VELLS_SIMD_LOOP
+    for( int i=0; i<nb; i++ )
+      y[i] = f[i];
+  }
+  else
+  {
+    VELLS_SIMD_LOOP
+    for( int i=0; i<nb; i++ )
+      y[i] = ::exp(x[i]);
+  }
+}
+
+// c = cos(x), s = sin(x), for a block of phases. Stride is a template
+// parameter, so that loops over the imaginary parts of complex arrays are
+// still vectorised. Either of c or s may be 0.
+template<int Stride>
+VELLS_INLINE void cosSinBlock (double *c,double *s,const double *x,int nb)
+{
+  if( precision_ == SINGLE )
+  {
+    float f[BlockSize], g[BlockSize];
+    VELLS_SIMD_LOOP
+    for( int i=0; i<nb; i++ )
+      f[i] = reducePhase(x[i*Stride]);
+    if( c )
+    {
+      VELLS_SIMD_LOOP
+      for( int i=0; i<nb; i++ )
+        g[i] = ::cosf(f[i]);
+      VELLS_SIMD_LOOP
+      for( int i=0; i<nb; i++ )
+        c[i] = g[i];
+    }
+    if( s )
+    {
+      VELLS_SIMD_LOOP
+      for( int i=0; i<nb; i++ )
+        g[i] = ::sinf(f[i]);
+      VELLS_SIMD_LOOP
+      for( int i=0; i<nb; i++ )
+        s[i] = g[i];
+    }
+  }
+  else
+  {
+    if( c )
+    {
+      VELLS_SIMD_LOOP
+      for( int i=0; i<nb; i++ )
+        c[i] = ::cos(x[i*Stride]);
+    }
+    if( s )
+    {
+      VELLS_SIMD_LOOP
+      for( int i=0; i<nb; i++ )
+        s[i] = ::sin(x[i*Stride]);
+    }
+  }
+}
+
+VELLS_KERNEL void exp (double *y,const double *x,int n)
+{
+  for( int i0=0; i0<n; i0+=BlockSize )
+    expBlock(y+i0,x+i0,std::min(BlockSize,n-i0));
+}
+
+// exp(a+ib) = exp(a)*(cos(b)+i*sin(b)). This overflows where cexp() would
+// not (for a slightly above the overflow threshold and small b), and gives
+// NaNs for infinite inputs, so blocks containing such values are done with
+// the library function instead.
+VELLS_KERNEL void exp (dcomplex *y,const dcomplex *x,int n)
+{
+  // work in blocks, splitting real and imaginary parts into separate
+  // arrays so that each function is applied to a contiguous array
+  double ea[BlockSize], cb[BlockSize], sb[BlockSize];
+  double *py = reim(y);
+  const double *px = reim(x);
+  for( int i0=0; i0<n; i0+=BlockSize )
+  {
+    int nb = std::min(BlockSize,n-i0);
+    const double *pxb = px + 2*i0;
+    double *pyb = py + 2*i0;
+    bool safe = true;
+    for( int i=0; i<nb; i++ )
+      safe &= std::fabs(pxb[2*i]) < 700 && std::isfinite(pxb[2*i+1]);
+    if( !safe )
+    {
+      for( int i=0; i<nb; i++ )
+        y[i0+i] = std::exp(x[i0+i]);
+      continue;
+    }
+    VELLS_SIMD_LOOP
+    for( int i=0; i<nb; i++ )
+      ea[i] = pxb[2*i];
+    expBlock(ea,ea,nb);
+    cosSinBlock<2>(cb,sb,pxb+1,nb);
+    VELLS_SIMD_LOOP
+    for( int i=0; i<nb; i++ )
+    {
+      pyb[2*i]   = ea[i]*cb[i];
+      pyb[2*i+1] = ea[i]*sb[i];
+    }
+  }
+}
+
+VELLS_KERNEL void sin (double *y,const double *x,int n)
+{
+  for( int i0=0; i0<n; i0+=BlockSize )
+    cosSinBlock<1>(0,y+i0,x+i0,std::min(BlockSize,n-i0));
+}
+
+VELLS_KERNEL void cos (double *y,const double *x,int n)
+{
+  for( int i0=0; i0<n; i0+=BlockSize )
+    cosSinBlock<1>(y+i0,0,x+i0,std::min(BlockSize,n-i0));
+}
+
+VELLS_KERNEL void polar (dcomplex *y,const double *a,const double *b,int n)
+{
+  double cb[BlockSize], sb[BlockSize];
+  double *py = reim(y);
+  for( int i0=0; i0<n; i0+=BlockSize )
+  {
+    int nb = std::min(BlockSize,n-i0);
+    cosSinBlock<1>(cb,sb,b+i0,nb);
+    const double *pab = a + i0;
+    double *pyb = py + 2*i0;
+    VELLS_SIMD_LOOP
+    for( int i=0; i<nb; i++ )
+    {
+      pyb[2*i]   = pab[i]*cb[i];
+      pyb[2*i+1] = pab[i]*sb[i];
+    }
+  }
+}
+
+VELLS_KERNEL void polar (dcomplex *y,double a,const double *b,int n)
+{
+  double cb[BlockSize], sb[BlockSize];
+  double *py = reim(y);
+  for( int i0=0; i0<n; i0+=BlockSize )
+  {
+    int nb = std::min(BlockSize,n-i0);
+    cosSinBlock<1>(cb,sb,b+i0,nb);
+    double *pyb = py + 2*i0;
+    VELLS_SIMD_LOOP
+    for( int i=0; i<nb; i++ )
+    {
+      pyb[2*i]   = a*cb[i];
+      pyb[2*i+1] = a*sb[i];
+    }
+  }
+}
+
+};
+
+} // namespace Meq
@@ -0,0 +1,134 @@
+//
+//% $Id$ 
+//
+//
+// Copyright (C) 2002-2007
+// The MeqTree Foundation & 
+// ASTRON (Netherlands Foundation for Research in Astronomy)
+// P.O.Box 2, 7990 AA Dwingeloo, The Netherlands
+//
+// This program is free software; you can redistribute it and/or modify
+// it under the terms of the GNU General Public License as published by
+// the Free Software Foundation; either version 2 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+// GNU General Public License for more details.
+//
+// You should have received a copy of the GNU General Public License
+// along with this program; if not, see <http://www.gnu.org/licenses/>,
+// or write to the Free Software Foundation, Inc., 
+// 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+//
+
+#ifndef MEQ_VELLSKERNELS_H
+#define MEQ_VELLSKERNELS_H
+
+#include <TimBase/LofarTypes.h>
+
+namespace Meq
+{
+
+// Contiguous array kernels for the most common Vells operations. Vells math
+// uses these when all operands have the same shape as the result, so that
+// no strided iteration is needed. The kernels are written so that the
+// compiler can vectorise them. On x86-64 they are built for both AVX2 and
+// baseline SSE2, and the right version is picked at load time. Where glibc's
+// vector math library (libmvec) is available, exp, sin and cos are computed
+// by its SIMD routines, which are accurate to within 4 ulp rather than the
+// 1 ulp of scalar libm. The kernels can be switched off at runtime, which
+// makes Vells math fall back to the generic strided code.
+//
+// The transcendental kernels (exp, sin, cos and polar) can also be run in
+// single precision, selected per thread via setPrecision(). This only
+// changes how the functions are computed, not how Vells are stored: inputs
+// and outputs are still double, so memory use and memory traffic stay the
+// same. The gain is in the arithmetic: twice as many values fit in a SIMD
+// register, and the float routines need fewer terms. Phases are reduced to
+// [-pi,pi] in double before conversion, so the absolute error of sin, cos
+// and polar does not grow with the size of the phase, and stays at around
+// 1e-7. Blocks of values that are out of range for float (exp of more than
+// 80) are done in double. Node::execute() sets the precision according to
+// the forest or node "precision" setting.
+//
+// y may be the same array as any of the inputs (but may not overlap them
+// otherwise).
+namespace VellsKernels
+{
+  extern bool enabled_;
+
+  // enables or disables the kernels
+  void setEnabled (bool enable);
+
+  inline bool enabled ()
+  { return enabled_; }
+
+  typedef enum
+  {
+    DOUBLE = 0,
+    SINGLE = 1
+  } Precision;
+
+  extern thread_local int precision_;
+
+  // precision setting inherited by nodes that the calling thread executes
+  // on behalf of a parent, or -1 outside of any node (see
+  // Node::evalPrecision()). MTPool work orders carry it over to the
+  // worker thread.
+  extern thread_local int subtree_precision_;
+
+  // sets the precision of the calling thread's transcendental kernels
+  inline void setPrecision (int prec)
+  { precision_ = prec; }
+
+  inline int precision ()
+  { return precision_; }
+
+  inline int subtreePrecision ()
+  { return subtree_precision_; }
+
+  // sets one of the calling thread's precisions (the kernel precision by
+  // default) for the lifetime of the object, and restores the previous one
+  // afterwards
+  class PrecisionGuard
+  {
+    public:
+      PrecisionGuard (int prec,int &var = precision_)
+      : var_(var),prev_(var)
+      { var_ = prec; }
+
+      ~PrecisionGuard ()
+      { var_ = prev_; }
+
+    private:
+      int &var_;
+      int prev_;
+  };
+
+  // y = a + b
+  void add (double *y,const double *a,const double *b,int n);
+  void add (dcomplex *y,const dcomplex *a,const dcomplex *b,int n);
+
+  // y = a * b
+  void mul (double *y,const double *a,const double *b,int n);
+  void mul (dcomplex *y,const dcomplex *a,const dcomplex *b,int n);
+
+  // y = exp(x)
+  void exp (double *y,const double *x,int n);
+  void exp (dcomplex *y,const dcomplex *x,int n);
+
+  // y = sin(x), y = cos(x)
+  void sin (double *y,const double *x,int n);
+  void cos (double *y,const double *x,int n);
+
+  // y = a*exp(i*b). Note that Vells.cc defines polar() as a macro, so
+  // the name must be parenthesised there.
+  void polar (dcomplex *y,const double *a,const double *b,int n);
+  void polar (dcomplex *y,double a,const double *b,int n);
+};
+
+} // namespace Meq
+
+#endif
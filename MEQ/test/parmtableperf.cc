@@ -0,0 +1,150 @@
+//
+//% $Id$ 
+//
+//
+// Copyright (C) 2002-2007
+// The MeqTree Foundation & 
+// ASTRON (Netherlands Foundation for Research in Astronomy)
+// P.O.Box 2, 7990 AA Dwingeloo, The Netherlands
+//
+// This program is free software; you can redistribute it and/or modify
+// it under the terms of the GNU General Public License as published by
+// the Free Software Foundation; either version 2 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+// GNU General Public License for more details.
+//
+// You should have received a copy of the GNU General Public License
+// along with this program; if not, see <http://www.gnu.org/licenses/>,
+// or write to the Free Software Foundation, Inc., 
+// 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+
+// Times FastParmTable::getFunklets() on tables of 1k, 10k and 100k 
+// solution domains (time slots x 4 frequency bands, with a funklet for
+// two parms in every domain). Each lookup asks for a tile of 16 time slots
+// over all bands, as a Parm node does when initialising. For reference, 
+// also times a bare linear scan of the domain list, which is what every
+// lookup cost before the domain index (not counting the depot accesses).
+// Usage: parmtableperf [seconds_per_test]
+
+#include <TimBase/Stopwatch.h>
+#include <MEQ/FastParmTable.h>
+#include <MEQ/Polc.h>
+#include <stdlib.h>
+
+#ifdef HAVE_FASTPARMTABLE
+        
+using namespace LOFAR;
+using namespace DMI;
+using namespace DebugDefault;
+using namespace Meq;
+
+const int NumBands = 4;
+const int TileSize = 16;
+
+static void runTest (const string &dir,int ndom,double seconds)
+{
+  string tablename = dir + Debug::ssprintf("/test%d.fmep",ndom);
+  int ntime = ndom/NumBands;
+  // fill table
+  {
+    FastParmTable table(tablename,true,true);
+    for( int it=0; it<ntime; it++ )
+      for( int ib=0; ib<NumBands; ib++ )
+      {
+        Polc polc(it+.1*ib);
+        polc.setDomain(Domain(it,it+1,1e+8*(ib+1),1e+8*(ib+2)));
+        polc.setDbId(table.putCoeff("a",polc));
+        table.putCoeff("b",polc);
+      }
+    table.flush();
+  }
+  // time lookups on freshly opened table
+  FastParmTable table(tablename);
+  vector<Funklet::Ref> funklets;
+  long long nlookup = 0,nfound = 0;
+  double rate,rate_missing,rate_scan;
+  {
+    Stopwatch watch(seconds);
+    for( int it=0; !watch.fired(); it = (it+TileSize)%(ntime-TileSize) )
+    {
+      Domain dom(it,it+TileSize,1e+8,1e+8*(NumBands+1));
+      nfound += table.getFunklets(funklets,"a",dom);
+      nlookup++;
+    }
+    rate = nlookup/watch.delta().real();
+  }
+  // lookups of a parm that is not in the table
+  {
+    long long nmissing = 0;
+    Stopwatch watch(seconds);
+    for( int it=0; !watch.fired(); it = (it+TileSize)%(ntime-TileSize) )
+    {
+      Domain dom(it,it+TileSize,1e+8,1e+8*(NumBands+1));
+      table.getFunklets(funklets,"c",dom);
+      nmissing++;
+    }
+    rate_missing = nmissing/watch.delta().real();
+  }
+  // bare linear scan of the domain list
+  {
+    const FastParmTable::DomainList &domlist = table.domainList();
+    long long nscan = 0,noverlap = 0;
+    Stopwatch watch(seconds);
+    for( int it=0; !watch.fired(); it = (it+TileSize)%(ntime-TileSize) )
+    {
+      Domain dom(it,it+TileSize,1e+8,1e+8*(NumBands+1));
+      for( uint i=0; i<domlist.size(); i++ )
+        if( domlist[i].overlaps(dom) )
+          noverlap++;
+      nscan++;
+    }
+    rate_scan = nscan/watch.delta().real();
+  }
+  cout<<"  "<<ndom<<"\t"<<rate<<"\t"<<double(nfound)/std::max(nlookup,1LL)<<"\t"
+      <<rate_missing<<"\t"<<rate_scan<<endl;
+}
+
+int main ( int argc,const char *argv[] )
+{
+  Debug::getDebugContext().setLevel(0);
+  CountedRefBase::getDebugContext().setLevel(0);
+  
+  double seconds = argc>1 ? atof(argv[1]) : 1.;
+  
+  char dirname[] = "/tmp/parmtableperfXXXXXX";
+  if( !mkdtemp(dirname) )
+  {
+    cerr<<"can't create temporary directory\n";
+    return 1;
+  }
+  int retval = 0;
+  try 
+  {
+    cout<<"domains, lookups/s, funklets/lookup, lookups/s of missing parm, linear scans/s\n";
+    runTest(dirname,1000,seconds);
+    runTest(dirname,10000,seconds);
+    runTest(dirname,100000,seconds);
+  }
+  catch( std::exception &err ) 
+  {
+    cerr<<"\nCaught exception:\n"<<err.what()<<endl;
+    retval = 1;
+  }
+  system((string("rm -rf ")+dirname).c_str());
+  return retval;
+}
+
+#else
+
+int main ()
+{
+  cerr<<"FastParmTable not available (no QDBM)\n";
+  return 0;
+}
+
+#endif
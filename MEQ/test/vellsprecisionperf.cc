@@ -0,0 +1,119 @@
+//
+//% $Id$ 
+//
+//
+// Copyright (C) 2002-2007
+// The MeqTree Foundation & 
+// ASTRON (Netherlands Foundation for Research in Astronomy)
+// P.O.Box 2, 7990 AA Dwingeloo, The Netherlands
+//
+// This program is free software; you can redistribute it and/or modify
+// it under the terms of the GNU General Public License as published by
+// the Free Software Foundation; either version 2 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+// GNU General Public License for more details.
+//
+// You should have received a copy of the GNU General Public License
+// along with this program; if not, see <http://www.gnu.org/licenses/>,
+// or write to the Free Software Foundation, Inc., 
+// 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+
+// Compares single- and double-precision evaluation of the transcendental
+// Vells kernels (see MEQ/VellsKernels.h), on time x freq grids of 64x64 up
+// to 4096x4096. For each operation, prints the rate in both precisions,
+// the speedup, and the largest difference between the single- and
+// double-precision results, relative to the largest double-precision
+// magnitude. The PHASE tests mimic VisPhaseShift and PSVTensor, which
+// compute polar(1,phase) for phases of up to thousands of radians.
+// Usage: vellsprecisionperf [max_size] [seconds_per_test]
+
+#include <TimBase/Stopwatch.h>
+#include <MEQ/Vells.h>
+#include <MEQ/VellsKernels.h>
+#include <stdlib.h>
+        
+using namespace LOFAR;
+using namespace DMI;
+using namespace DebugDefault;
+using namespace Meq;
+using namespace VellsMath;
+
+// fills a real grid with values in [-4,4]
+static Vells makeReal (int nt,int nf)
+{
+  Vells v(0.,LoShape(nt,nf),false);
+  double *p = v.realStorage();
+  for( int i=0; i<nt*nf; i++ )
+    p[i] = 8.*(i%997)/997.-4.;
+  return v;
+}
+
+// fills a complex grid with values in [-4,4]+i[-4,4]
+static Vells makeComplex (int nt,int nf)
+{
+  Vells v(make_dcomplex(0.,0.),LoShape(nt,nf),false);
+  dcomplex *p = v.complexStorage();
+  for( int i=0; i<nt*nf; i++ )
+    p[i] = make_dcomplex(8.*(i%997)/997.-4.,8.*(i%991)/991.-4.);
+  return v;
+}
+
+#define RUNTEST(NAME,EXPR) \
+  { \
+    double rate[2]; \
+    Vells res[2]; \
+    for( int prec=0; prec<2; prec++ ) \
+    { \
+      VellsKernels::setPrecision(prec ? VellsKernels::SINGLE : VellsKernels::DOUBLE); \
+      long long ndone = 0; \
+      Stopwatch watch(seconds); \
+      while( !watch.fired() ) \
+      { \
+        res[prec] = EXPR; \
+        ndone += nt*nf; \
+      } \
+      rate[prec] = ndone/watch.delta().real(); \
+    } \
+    VellsKernels::setPrecision(VellsKernels::DOUBLE); \
+    double err = max(abs(res[1]-res[0])).as<double>()/max(abs(res[0])).as<double>(); \
+    cout<<"  "<<NAME<<"\t"<<nt<<"x"<<nf<<"\t"<<rate[0]/1e+6<<"\t" \
+        <<rate[1]/1e+6<<"\t"<<rate[1]/rate[0]<<"\t"<<err<<endl; \
+  }
+
+int main ( int argc,const char *argv[] )
+{
+  Debug::getDebugContext().setLevel(0);
+  CountedRefBase::getDebugContext().setLevel(0);
+  
+  int max_size = argc>1 ? atoi(argv[1]) : 4096;
+  double seconds = argc>2 ? atof(argv[2]) : 1.;
+  
+  try 
+  {
+    cout<<"Mels/s in double, in single, speedup, and max relative difference\n";
+    for( int nt=64; nt<=max_size; nt*=4 )
+    {
+      int nf = nt;
+      Vells ra = makeReal(nt,nf),rb = makeReal(nt,nf)*1000.;
+      Vells ca = makeComplex(nt,nf);
+      RUNTEST("EXP",exp(ra));
+      RUNTEST("CEXP",exp(ca));
+      RUNTEST("SIN",sin(ra));
+      RUNTEST("COS",cos(ra));
+      RUNTEST("POLAR",polar(ra,rb));
+      RUNTEST("PHASE",polar(1.,rb));
+    }
+  }
+  catch( std::exception &err ) 
+  {
+    cerr<<"\nCaught exception:\n"<<err.what()<<endl;
+    return 1;
+  }
+
+  return 0;
+}
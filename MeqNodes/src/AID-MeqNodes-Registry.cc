@@ -76,6 +76,8 @@ DMI::BObj * __construct_MeqFMod (int n) { return n>0 ? new Meq::FMod [n] : new M
 DMI::BObj * __construct_MeqFreq (int n) { return n>0 ? new Meq::Freq [n] : new Meq::Freq; }
 #include "Functional.h"
 DMI::BObj * __construct_MeqFunctional (int n) { return n>0 ? new Meq::Functional [n] : new Meq::Functional; }
+#include "FusedFunction.h"
+DMI::BObj * __construct_MeqFusedFunction (int n) { return n>0 ? new Meq::FusedFunction [n] : new Meq::FusedFunction; }
 #include "GaussNoise.h"
 DMI::BObj * __construct_MeqGaussNoise (int n) { return n>0 ? new Meq::GaussNoise [n] : new Meq::GaussNoise; }
 #include "Grid.h"
@@ -408,6 +410,9 @@ DMI::BObj * __construct_MeqZeroFlagger (int n) { return n>0 ? new Meq::ZeroFlagg
         AtomicID::registerId(-1673,"MeqFunctional")+
         TypeInfoReg::addToRegistry(-1673,TypeInfo(TypeInfo::DYNAMIC,0))+
         DynamicTypeManager::addToRegistry(-1673,__construct_MeqFunctional)+
+        AtomicID::registerId(-1790,"MeqFusedFunction")+
+        TypeInfoReg::addToRegistry(-1790,TypeInfo(TypeInfo::DYNAMIC,0))+
+        DynamicTypeManager::addToRegistry(-1790,__construct_MeqFusedFunction)+
         AtomicID::registerId(-1449,"MeqGaussNoise")+
         TypeInfoReg::addToRegistry(-1449,TypeInfo(TypeInfo::DYNAMIC,0))+
         DynamicTypeManager::addToRegistry(-1449,__construct_MeqGaussNoise)+
@@ -659,6 +664,8 @@ DMI::BObj * __construct_MeqZeroFlagger (int n) { return n>0 ? new Meq::ZeroFlagg
         AtomicID::registerId(-1525,"Solution")+
         AtomicID::registerId(-1736,"Flush")+
         AtomicID::registerId(-1735,"Tables")+
+        AtomicID::registerId(-1792,"Timing")+
+        AtomicID::registerId(-1793,"Accumulate")+
         AtomicID::registerId(-1458,"MeqSqr")+
         TypeInfoReg::addToRegistry(-1458,TypeInfo(TypeInfo::DYNAMIC,0))+
         DynamicTypeManager::addToRegistry(-1458,__construct_MeqSqr)+
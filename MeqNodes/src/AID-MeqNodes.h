@@ -8,6 +8,11 @@
       // should be called somewhere in order to link in the registry
       int aidRegistry_MeqNodes ();
 
+#ifndef _defined_id_AidAccumulate
+#define _defined_id_AidAccumulate 1
+const DMI::AtomicID AidAccumulate(-1793);         // from Solver.h:40
+const int AidAccumulate_int = -1793;
+#endif
 #ifndef _defined_id_AidAll
 #define _defined_id_AidAll 1
 const DMI::AtomicID AidAll(-1286);                // from /home/oms/LOFAR/Timba/MEQ/src/MeqVocabulary.h:38
@@ -583,6 +588,11 @@ const int AidMeqFreq_int = -1420;
 const DMI::AtomicID AidMeqFunctional(-1673);      // from /home/mevius/LOFAR/Timba/MeqNodes/src/Functional.h:33
 const int AidMeqFunctional_int = -1673;
 #endif
+#ifndef _defined_id_AidMeqFusedFunction
+#define _defined_id_AidMeqFusedFunction 1
+const DMI::AtomicID AidMeqFusedFunction(-1790);   // from FusedFunction.h:31
+const int AidMeqFusedFunction_int = -1790;
+#endif
 #ifndef _defined_id_AidMeqGaussNoise
 #define _defined_id_AidMeqGaussNoise 1
 const DMI::AtomicID AidMeqGaussNoise(-1449);      // from /home/oms/LOFAR/Timba/MeqNodes/src/GaussNoise.h:31
@@ -1320,6 +1330,11 @@ const int AidTilings_int = -1632;
 const DMI::AtomicID AidTime(-1126);               // from /home/oms/LOFAR/Timba/VisCube/src/VisVocabulary.h:26
 const int AidTime_int = -1126;
 #endif
+#ifndef _defined_id_AidTiming
+#define _defined_id_AidTiming 1
+const DMI::AtomicID AidTiming(-1792);             // from Solver.h:40
+const int AidTiming_int = -1792;
+#endif
 #ifndef _defined_id_AidTop
 #define _defined_id_AidTop 1
 const DMI::AtomicID AidTop(-1400);                // from /home/oms/LOFAR/Timba/MeqNodes/src/DataCollect.h:30
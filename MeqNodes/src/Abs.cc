@@ -30,7 +30,10 @@ namespace Meq {
 
 //##ModelId=400E53550241
 Abs::Abs()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E53550242
 Abs::~Abs()
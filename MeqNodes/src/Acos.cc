@@ -30,7 +30,10 @@ namespace Meq {
 
 //##ModelId=400E53550241
 Acos::Acos()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E53550242
 Acos::~Acos()
@@ -30,6 +30,8 @@ namespace Meq {
 Add::Add()
 {
   allowMissingData();
+  allowInPlace();
+  allowSharedResults();
 }
 
 //##ModelId=3F86886E0293
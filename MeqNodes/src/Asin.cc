@@ -30,7 +30,10 @@ namespace Meq {
 
 //##ModelId=400E53550241
 Asin::Asin()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E53550242
 Asin::~Asin()
@@ -30,7 +30,10 @@ namespace Meq {
 
 //##ModelId=400E53550241
 Atan::Atan()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E53550242
 Atan::~Atan()
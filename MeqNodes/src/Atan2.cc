@@ -31,7 +31,10 @@ namespace Meq {
 
 
 Atan2::Atan2()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 Atan2::~Atan2()
 {}
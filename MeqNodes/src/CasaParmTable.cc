@@ -49,6 +49,7 @@
 #include <casacore/casa/Utilities/GenSort.h>
 #include <casacore/casa/BasicMath/Math.h>
 #include <TimBase/BlitzToAips.h>
+#include <set>
 
 using namespace casacore;
 using namespace DebugMeq;
@@ -256,6 +257,19 @@ int CasaParmTable::getFunklets (vector<Funklet::Ref> &funklets,
   return funklets.size();
 }
 
+int CasaParmTable::getNames (std::vector<string> &names)
+{
+  Thread::Mutex::Lock lock(theirMutex());
+  names.clear();
+  if( !Table::isReadable(itsTable.tableName()) )
+    return 0;
+  TableLocker locker(itsTable, FileLocker::Read);
+  Vector<String> nameCol = ROScalarColumn<String>(itsTable,ColName).getColumn();
+  std::set<string> nameset(nameCol.begin(),nameCol.end());
+  names.assign(nameset.begin(),nameset.end());
+  return names.size();
+}
+
 //##ModelId=3F86886F02C3
 int CasaParmTable::getInitCoeff (Funklet::Ref &funkletref,const string& parmName)
 {
@@ -61,6 +61,9 @@ public:
     //##ModelId=3F86886F02C3
   int getInitCoeff (Funklet::Ref &funklet,const string& parmName);
 
+  // Gets the names of all parms in the table.
+  int getNames (std::vector<string> &names);
+
   // Put the coefficients for the given funklet and domain.
   // Returns the DbId of the funklet.
   // If domain_is_key, checks that domain is unique
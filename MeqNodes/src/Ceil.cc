@@ -30,7 +30,10 @@ namespace Meq {
 
 //##ModelId=400E530500C3
 Ceil::Ceil()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E530500C4
 Ceil::~Ceil()
@@ -40,6 +40,7 @@ Condeq::Condeq()
 {
   children().setMissingDataPolicy(AidAbandonPropagate);
   setAutoResample(RESAMPLE_FAIL); // children must return the same cells
+  double_precision_only_ = true;  // residuals are always formed in double
 }
 
 //##ModelId=400E53050060
@@ -30,7 +30,10 @@ namespace Meq {
 
 //##ModelId=400E53050072
 Conj::Conj()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E53050073
 Conj::~Conj()
@@ -31,7 +31,10 @@ namespace Meq {
 
 //##ModelId=400E530500C3
 Cos::Cos()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E530500C4
 Cos::~Cos()
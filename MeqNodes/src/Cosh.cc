@@ -31,7 +31,10 @@ namespace Meq {
 
 //##ModelId=400E530500C3
 Cosh::Cosh()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E530500C4
 Cosh::~Cosh()
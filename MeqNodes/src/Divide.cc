@@ -32,7 +32,10 @@ namespace Meq {
 
 //##ModelId=400E530500D3
 Divide::Divide()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E530500D4
 Divide::~Divide()
@@ -31,7 +31,10 @@ namespace Meq {
 
 //##ModelId=400E53050139
 Exp::Exp()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E5305013A
 Exp::~Exp()
@@ -32,7 +32,10 @@ namespace Meq {
 
 //##ModelId=400E530500D3
 FMod::FMod()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E530500D4
 FMod::~FMod()
@@ -30,7 +30,10 @@ namespace Meq {
 
 //##ModelId=400E53550241
 Fabs::Fabs()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E53550242
 Fabs::~Fabs()
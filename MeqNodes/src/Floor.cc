@@ -30,7 +30,10 @@ namespace Meq {
 
 //##ModelId=400E530500C3
 Floor::Floor()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E530500C4
 Floor::~Floor()
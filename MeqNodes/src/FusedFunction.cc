@@ -0,0 +1,737 @@
+//# FusedFunction.cc: evaluates a chain of elementwise functions in one pass
+//#
+//# Copyright (C) 2002-2007
+//# ASTRON (Netherlands Foundation for Research in Astronomy)
+//# and The MeqTree Foundation
+//# P.O.Box 2, 7990 AA Dwingeloo, The Netherlands, seg@astron.nl
+//#
+//# This program is free software; you can redistribute it and/or modify
+//# it under the terms of the GNU General Public License as published by
+//# the Free Software Foundation; either version 2 of the License, or
+//# (at your option) any later version.
+//#
+//# This program is distributed in the hope that it will be useful,
+//# but WITHOUT ANY WARRANTY; without even the implied warranty of
+//# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+//# GNU General Public License for more details.
+//#
+//# You should have received a copy of the GNU General Public License
+//# along with this program; if not, write to the Free Software
+//# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+//#
+//# $Id$
+
+#include <MeqNodes/FusedFunction.h>
+#include <MeqNodes/AID-MeqNodes.h>
+#include <MEQ/MeqVocabulary.h>
+#include <complex>
+#include <cmath>
+
+namespace Meq {
+
+// dcomplex data is accessed as std::complex, which has the same layout
+typedef std::complex<double> cplx;
+
+// number of elements evaluated at a time. Intermediate values for one
+// chunk stay in cache
+const int Chunk = 256;
+
+namespace FusedOps
+{
+  typedef enum
+  {
+    Child = 0,
+    Add,Multiply,Subtract,Divide,Negate,Invert,
+    Sin,Cos,Tan,Sinh,Cosh,Tanh,Exp,Log,Sqrt,
+    Pow2,Pow3,Pow4,Pow5,Pow6,Pow7,Pow8,Conj,
+    Asin,Acos,Atan,Ceil,Floor,
+    Abs,Arg,Real,Imag,
+    ToComplex,Polar,Atan2,FMod,Pow
+  } Opcode;
+
+  // how the result type depends on the argument types
+  typedef enum
+  {
+    SAME,         // unary, result has type of argument
+    REAL,         // unary, result is real
+    REALONLY,     // unary, argument must be real
+    PROMOTE,      // binary, result is complex if any argument is
+    MAKECOMPLEX,  // binary, arguments must be real, result is complex
+    REAL2         // binary, arguments must be real
+  } TypeRule;
+
+  typedef struct
+  {
+    const char *classname;
+    Opcode      op;
+    int         nargs;  // 0 for n-ary operations
+    TypeRule    rule;
+  } OpInfo;
+
+  const OpInfo ops[] =
+  {
+    { "MeqAdd",       Add,        0, PROMOTE },
+    { "MeqMultiply",  Multiply,   0, PROMOTE },
+    { "MeqSubtract",  Subtract,   0, PROMOTE },
+    { "MeqDivide",    Divide,     2, PROMOTE },
+    { "MeqPow",       Pow,        2, PROMOTE },
+    { "MeqToComplex", ToComplex,  2, MAKECOMPLEX },
+    { "MeqPolar",     Polar,      2, MAKECOMPLEX },
+    { "MeqAtan2",     Atan2,      2, REAL2 },
+    { "MeqFMod",      FMod,       2, REAL2 },
+    { "MeqNegate",    Negate,     1, SAME },
+    { "MeqInvert",    Invert,     1, SAME },
+    { "MeqSin",       Sin,        1, SAME },
+    { "MeqCos",       Cos,        1, SAME },
+    { "MeqTan",       Tan,        1, SAME },
+    { "MeqSinh",      Sinh,       1, SAME },
+    { "MeqCosh",      Cosh,       1, SAME },
+    { "MeqTanh",      Tanh,       1, SAME },
+    { "MeqExp",       Exp,        1, SAME },
+    { "MeqLog",       Log,        1, SAME },
+    { "MeqSqrt",      Sqrt,       1, SAME },
+    { "MeqSqr",       Pow2,       1, SAME },
+    { "MeqPow2",      Pow2,       1, SAME },
+    { "MeqPow3",      Pow3,       1, SAME },
+    { "MeqPow4",      Pow4,       1, SAME },
+    { "MeqPow5",      Pow5,       1, SAME },
+    { "MeqPow6",      Pow6,       1, SAME },
+    { "MeqPow7",      Pow7,       1, SAME },
+    { "MeqPow8",      Pow8,       1, SAME },
+    { "MeqConj",      Conj,       1, SAME },
+    { "MeqAsin",      Asin,       1, REALONLY },
+    { "MeqAcos",      Acos,       1, REALONLY },
+    { "MeqAtan",      Atan,       1, REALONLY },
+    { "MeqCeil",      Ceil,       1, REALONLY },
+    { "MeqFloor",     Floor,      1, REALONLY },
+    { "MeqAbs",       Abs,        1, REAL },
+    { "MeqFabs",      Abs,        1, REAL },
+    { "MeqArg",       Arg,        1, REAL },
+    { "MeqReal",      Real,       1, REAL },
+    { "MeqImag",      Imag,       1, REAL }
+  };
+
+  const OpInfo * find (const string &classname)
+  {
+    for( uint i=0; i<sizeof(ops)/sizeof(ops[0]); i++ )
+      if( classname == ops[i].classname )
+        return &ops[i];
+    return 0;
+  }
+
+  const OpInfo * find (int op)
+  {
+    for( uint i=0; i<sizeof(ops)/sizeof(ops[0]); i++ )
+      if( op == ops[i].op )
+        return &ops[i];
+    return 0;
+  }
+
+  // MeqAdd and MeqMultiply skip arguments with missing data (i.e. treat
+  // them as 0 and 1), other operations have missing data if any argument
+  // does
+  inline bool skipsMissing (int op)
+  { return op == Add || op == Multiply; }
+
+  template<class T> inline T pow2 (T x) { return x*x; }
+  template<class T> inline T pow3 (T x) { return x*x*x; }
+  template<class T> inline T pow4 (T x) { T t1 = x*x; return t1*t1; }
+  template<class T> inline T pow5 (T x) { T t1 = x*x; return t1*t1*x; }
+  template<class T> inline T pow6 (T x) { T t1 = x*x*x; return t1*t1; }
+  template<class T> inline T pow7 (T x) { T t1 = x*x; return t1*t1*t1*x; }
+  template<class T> inline T pow8 (T x) { T t1 = x*x, t2=t1*t1; return t2*t2; }
+
+  inline double conj (double x) { return x; }
+  inline cplx   conj (const cplx &x) { return std::conj(x); }
+
+  // returns true if result of operation is complex, given the argument
+  // types (cb is ignored for unary ops), or throws an exception if the
+  // operation can't be applied
+  inline bool resultType (const OpInfo &info,bool ca,bool cb)
+  {
+    switch( info.rule )
+    {
+      case SAME:        return ca;
+      case REAL:        return false;
+      case REALONLY:    FailWhen(ca,info.classname+string(" can only be applied to a real value"));
+                        return false;
+      case PROMOTE:     return ca || cb;
+      case MAKECOMPLEX:
+      case REAL2:       FailWhen(ca || cb,info.classname+string(" can only be applied to real values"));
+                        return info.rule == MAKECOMPLEX;
+    }
+    return false;
+  }
+
+  // a value on the evaluation stack: points to one chunk of real or
+  // complex data
+  typedef struct
+  {
+    const double *r;
+    const cplx   *c;
+  } Slot;
+
+  // Helpers applying a function to one chunk. Arguments are taken from
+  // slot a (and b), the result is written to ro or co (the chunk buffers of
+  // a's stack level), and a is repointed to it. ca and cb tell whether the
+  // arguments are complex.
+
+  // unary, result has type of argument
+  template<class F>
+  inline void unarySame (Slot &a,bool ca,double *ro,cplx *co,int n,F f)
+  {
+    if( ca )
+    {
+      for( int i=0; i<n; i++ )
+        co[i] = f(a.c[i]);
+      a.c = co;
+    }
+    else
+    {
+      for( int i=0; i<n; i++ )
+        ro[i] = f(a.r[i]);
+      a.r = ro;
+    }
+  }
+
+  // unary, result is real
+  template<class F>
+  inline void unaryReal (Slot &a,bool ca,double *ro,int n,F f)
+  {
+    if( ca )
+      for( int i=0; i<n; i++ )
+        ro[i] = f(a.c[i]);
+    else
+      for( int i=0; i<n; i++ )
+        ro[i] = f(a.r[i]);
+    a.r = ro;
+  }
+
+  // unary, argument and result are real
+  template<class F>
+  inline void unaryRealOnly (Slot &a,double *ro,int n,F f)
+  {
+    for( int i=0; i<n; i++ )
+      ro[i] = f(a.r[i]);
+    a.r = ro;
+  }
+
+  // binary, result is complex if any argument is
+  template<class F>
+  inline void binaryPromote (Slot &a,bool ca,const Slot &b,bool cb,
+                             double *ro,cplx *co,int n,F f)
+  {
+    if( ca && cb )
+      for( int i=0; i<n; i++ )
+        co[i] = f(a.c[i],b.c[i]);
+    else if( ca )
+      for( int i=0; i<n; i++ )
+        co[i] = f(a.c[i],b.r[i]);
+    else if( cb )
+      for( int i=0; i<n; i++ )
+        co[i] = f(a.r[i],b.c[i]);
+    else
+    {
+      for( int i=0; i<n; i++ )
+        ro[i] = f(a.r[i],b.r[i]);
+      a.r = ro;
+      return;
+    }
+    a.c = co;
+  }
+
+  // binary, arguments are real, result is complex
+  template<class F>
+  inline void binaryToComplex (Slot &a,const Slot &b,cplx *co,int n,F f)
+  {
+    for( int i=0; i<n; i++ )
+      co[i] = f(a.r[i],b.r[i]);
+    a.c = co;
+  }
+
+  // binary, arguments and result are real
+  template<class F>
+  inline void binaryRealOnly (Slot &a,const Slot &b,double *ro,int n,F f)
+  {
+    for( int i=0; i<n; i++ )
+      ro[i] = f(a.r[i],b.r[i]);
+    a.r = ro;
+  }
+};
+
+using namespace FusedOps;
+
+FusedFunction::FusedFunction()
+: max_depth_(0)
+{
+  // missing children are handled by evaluate(), see skipsMissing()
+  allowMissingData();
+  allowSharedResults();
+}
+
+FusedFunction::~FusedFunction()
+{}
+
+void FusedFunction::setStateImpl (DMI::Record::Ref &rec,bool initializing)
+{
+  Function::setStateImpl(rec,initializing);
+  bool changed = rec[FFunctionClass].get_vector(classes_,initializing);
+  changed |= rec[FChildIndex].get_vector(child_index_,initializing);
+  changed |= rec[FNumChildren].get_vector(num_children_,initializing);
+  if( changed )
+    compile(classes_,child_index_,num_children_);
+}
+
+void FusedFunction::compile (const vector<string> &classes,
+                             const vector<int> &child_index,
+                             const vector<int> &num_children)
+{
+  FailWhen(classes.size() != child_index.size() || classes.size() != num_children.size(),
+      "fields "+FFunctionClass.toString()+", "+FChildIndex.toString()+" and "+
+      FNumChildren.toString()+" must have the same length");
+  vector<Instruction> program;
+  int depth = 0, max_depth = 0;
+  for( uint i=0; i<classes.size(); i++ )
+  {
+    Instruction instr;
+    if( classes[i].empty() )
+    {
+      FailWhen(child_index[i]<0,
+          ssprintf("element %d of the fused expression: illegal child index %d",i,child_index[i]));
+      instr.op = Child;
+      instr.arg = child_index[i];
+      program.push_back(instr);
+      max_depth = std::max(max_depth,++depth);
+      continue;
+    }
+    const OpInfo *info = FusedOps::find(classes[i]);
+    int nargs = num_children[i];
+    FailWhen(!info,ssprintf("element %d of the fused expression: class %s can't be fused",
+        i,classes[i].c_str()));
+    FailWhen(nargs<1 || ( info->nargs && nargs != info->nargs ) || nargs>depth,
+        ssprintf("element %d of the fused expression: illegal number of children %d",i,nargs));
+    instr.op = info->op;
+    // n-ary operations fold their arguments left to right. A single
+    // argument is passed through as is.
+    if( nargs > 1 || info->nargs )
+    {
+      instr.op = info->op;
+      instr.arg = nargs;
+      program.push_back(instr);
+    }
+    depth -= nargs-1;
+  }
+  FailWhen(depth != 1,"fused expression is incomplete");
+  program_ = program;
+  max_depth_ = max_depth;
+}
+
+// Works out which children contribute to the fused expression, given
+// which are missing and which are null, following the missing-data rules
+// of the unfused nodes (see skipsMissing()). As in Multiply::evaluateFlags(),
+// a MeqMultiply drops all flags if one of its children is null; only
+// inputs of the chain are checked for this, since intermediate results
+// are never null. Returns false if the expression as a whole is missing,
+// else sets contrib[i] if the flags of child i go into the result.
+bool FusedFunction::findContributors (vector<bool> &contrib,
+        const vector<bool> &missing,const vector<bool> &null) const
+{
+  int nch = missing.size();
+  // for every stack level: the contributing children, whether the value 
+  // is missing, and the child it comes from (or -1 if computed)
+  vector<vector<bool> > stack;
+  vector<bool> miss;
+  vector<int> source;
+  for( uint i=0; i<program_.size(); i++ )
+  {
+    const Instruction &instr = program_[i];
+    if( instr.op == Child )
+    {
+      FailWhen(instr.arg >= nch,ssprintf("fused expression refers to child %d, but node has only %d",
+          instr.arg,nch));
+      stack.push_back(vector<bool>(nch,false));
+      stack.back()[instr.arg] = !missing[instr.arg];
+      miss.push_back(missing[instr.arg]);
+      source.push_back(instr.arg);
+      continue;
+    }
+    int sp = stack.size() - instr.arg;
+    bool skip = skipsMissing(instr.op);
+    bool out_miss = skip, drop_flags = false;
+    vector<bool> out(nch,false);
+    for( int k=sp; k<int(stack.size()); k++ )
+    {
+      out_miss = skip ? out_miss && miss[k] : out_miss || miss[k];
+      if( miss[k] )
+        continue;
+      for( int ich=0; ich<nch; ich++ )
+        if( stack[k][ich] )
+          out[ich] = true;
+      if( instr.op == Multiply && source[k] >= 0 && null[source[k]] )
+        drop_flags = true;
+    }
+    if( drop_flags )
+      out.assign(nch,false);
+    stack.resize(sp+1);
+    miss.resize(sp+1);
+    source.resize(sp+1);
+    stack[sp] = out;
+    miss[sp] = out_miss;
+    source[sp] = -1;
+  }
+  if( miss.empty() || miss[0] )
+    return false;
+  contrib = stack[0];
+  return true;
+}
+
+// fills in the missing and null status of each child's vellset for the
+// given plane, the same way as Function::getResult() picks them
+static void childStatus (vector<bool> &missing,vector<bool> &null,
+                         const std::vector<Result::Ref> &childres,int iplane)
+{
+  int nch = childres.size();
+  missing.assign(nch,true);
+  null.assign(nch,false);
+  for( int i=0; i<nch; i++ )
+  {
+    const Result &chres = *childres[i];
+    if( !chres.numVellSets() )
+      continue;
+    const VellSet &vs = chres.vellSet( chres.tensorRank()>0 ? iplane : 0 );
+    if( !vs.isFail() && vs.hasValue() )
+    {
+      missing[i] = false;
+      null[i] = vs.isNull();
+    }
+  }
+}
+
+int FusedFunction::getResult (Result::Ref &resref,
+                              const std::vector<Result::Ref> &childres,
+                              const Request &request,bool newreq)
+{
+  int code = Function::getResult(resref,childres,request,newreq);
+  if( code&(RES_FAIL|RES_MISSING) )
+    return code;
+  // Function::getResult() only returns missing data when all children are
+  // missing. The fused expression can be missing with only some of them
+  // missing (e.g. a Sin of a missing child), in which case evaluate()
+  // returns a dummy value, and the plane is made empty here.
+  Result &result = resref();
+  int nplanes = result.numVellSets(), nmissing = 0;
+  vector<bool> missing,null,contrib;
+  for( int iplane=0; iplane<nplanes; iplane++ )
+  {
+    const VellSet &vs = result.vellSet(iplane);
+    if( vs.isFail() )
+      continue;
+    if( !vs.hasValue() )
+      nmissing++;
+    else
+    {
+      childStatus(missing,null,childres,iplane);
+      if( !findContributors(contrib,missing,null) )
+      {
+        result.setNewVellSet(iplane,0,0);
+        nmissing++;
+      }
+    }
+  }
+  return nmissing == nplanes ? RES_MISSING : code;
+}
+
+void FusedFunction::evaluateFlags (Vells::Ref &out,const Request &,const LoShape &,
+                                   const vector<const VellSet *> &pvs)
+{
+  // only children that contribute to the result pass on their flags
+  int nch = pvs.size();
+  vector<bool> missing(nch),null(nch),contrib;
+  for( int i=0; i<nch; i++ )
+  {
+    missing[i] = !pvs[i];
+    null[i] = pvs[i] && pvs[i]->isNull();
+  }
+  if( !findContributors(contrib,missing,null) )
+    return;
+  for( int i=0; i<nch; i++ )
+    if( contrib[i] && pvs[i]->hasDataFlags() )
+      Vells::mergeFlags(out,pvs[i]->dataFlags(),flagmask_[i]);
+}
+
+Vells FusedFunction::evaluate (const Request&,const LoShape &,
+                               const vector<const Vells*>& values0)
+{
+  FailWhen(program_.empty(),"fused expression not specified");
+  int nch = values0.size();
+  // null values (e.g. the product of a MeqMultiply with a null factor) 
+  // stand for 0, as they do in Vells arithmetic. Missing values are never
+  // used, they only stand in for the shape computation below
+  const Vells zero(0.);
+  vector<const Vells*> values(values0);
+  vector<bool> missing(nch);
+  // figure out output shape, and strides of each child relative to it
+  const Vells::Shape *shapes[nch];
+  Vells::Strides strides[nch];
+  for( int i=0; i<nch; i++ )
+  {
+    missing[i] = !values[i];
+    if( missing[i] )
+      values[i] = &zero;
+    else if( !values[i]->isReal() && !values[i]->isComplex() )
+    {
+      FailWhen(!values[i]->isNull(),ssprintf("child %d: value must be real or complex",i));
+      values[i] = &zero;
+    }
+    shapes[i] = &(values[i]->shape());
+  }
+  Vells::Shape outshape;
+  Vells::computeStrides(outshape,strides,nch,shapes,"fused expression");
+  // check that the argument types are valid, and work out result type.
+  // Missing arguments are skipped or make the result missing, see 
+  // skipsMissing()
+  int nprog = program_.size();
+  bool cx_stack[max_depth_];
+  bool miss_stack[max_depth_];
+  int sp = 0;
+  for( int i=0; i<nprog; i++ )
+  {
+    const Instruction &instr = program_[i];
+    if( instr.op == Child )
+    {
+      FailWhen(instr.arg >= nch,ssprintf("fused expression refers to child %d, but node has only %d",
+          instr.arg,nch));
+      miss_stack[sp] = missing[instr.arg];
+      cx_stack[sp++] = values[instr.arg]->isComplex();
+      continue;
+    }
+    const OpInfo &info = *FusedOps::find(instr.op);
+    sp -= instr.arg;
+    bool &ca = cx_stack[sp];
+    bool &ma = miss_stack[sp];
+    if( skipsMissing(instr.op) )
+    {
+      // fold the arguments that are present
+      for( int k=0; k<instr.arg; k++ )
+      {
+        if( miss_stack[sp+k] )
+          continue;
+        ca = ma ? cx_stack[sp+k] : resultType(info,ca,cx_stack[sp+k]);
+        ma = false;
+      }
+    }
+    else
+    {
+      for( int k=1; k<instr.arg; k++ )
+        ma = ma || miss_stack[sp+k];
+      if( !ma )
+      {
+        ca = resultType(info,ca,instr.arg>1 ? cx_stack[sp+1] : false);
+        for( int k=2; k<instr.arg; k++ )
+          ca = resultType(info,ca,cx_stack[sp+k]);
+      }
+    }
+    sp++;
+  }
+  // the expression as a whole is missing: getResult() discards the value
+  if( miss_stack[0] )
+    return Vells();
+  bool cx_out = cx_stack[0];
+  Vells result = cx_out ? Vells(dcomplex(0),outshape,false) : Vells(0.,outshape,false);
+  int nel = result.nelements();
+  // children with the same shape as the output are read directly,
+  // others are gathered into buffers, one chunk at a time
+  vector<const double *> rptr(nch,0);
+  vector<const cplx *> cptr(nch,0);
+  vector<int> gathered;
+  for( int i=0; i<nch; i++ )
+  {
+    if( values[i]->isComplex() )
+      cptr[i] = reinterpret_cast<const cplx *>(values[i]->begin<dcomplex>());
+    else
+      rptr[i] = values[i]->begin<double>();
+    if( values[i]->shape() != outshape )
+      gathered.push_back(i);
+  }
+  int ngath = gathered.size();
+  vector<double> rbuf((max_depth_+ngath)*Chunk);
+  vector<cplx> cbuf((max_depth_+ngath)*Chunk);
+  double *rstack = &rbuf[0], *rgath = rstack + max_depth_*Chunk;
+  cplx *cstack = &cbuf[0], *cgath = cstack + max_depth_*Chunk;
+  Vells::DimCounter counter(outshape);
+  vector<Slot> child_slot(nch);
+  Slot stack[max_depth_];
+  for( int i0=0; i0<nel; i0+=Chunk )
+  {
+    int n = std::min(Chunk,nel-i0);
+    for( int i=0; i<nch; i++ )
+    {
+      child_slot[i].r = rptr[i] ? rptr[i]+i0 : 0;
+      child_slot[i].c = cptr[i] ? cptr[i]+i0 : 0;
+    }
+    // gather broadcast children, advancing their pointers along with
+    // the output counter
+    if( ngath )
+    {
+      for( int k=0; k<n; k++ )
+      {
+        for( int j=0; j<ngath; j++ )
+        {
+          int ich = gathered[j];
+          if( rptr[ich] )
+            rgath[j*Chunk+k] = *rptr[ich];
+          else
+            cgath[j*Chunk+k] = *cptr[ich];
+        }
+        int ndim = counter.incr();
+        for( int j=0; j<ngath; j++ )
+        {
+          int ich = gathered[j];
+          for( int idim=0; idim<ndim; idim++ )
+          {
+            if( rptr[ich] )
+              rptr[ich] += strides[ich][idim];
+            else
+              cptr[ich] += strides[ich][idim];
+          }
+        }
+      }
+      for( int j=0; j<ngath; j++ )
+      {
+        child_slot[gathered[j]].r = rgath + j*Chunk;
+        child_slot[gathered[j]].c = cgath + j*Chunk;
+      }
+    }
+    // run the program over this chunk. Results replace the first
+    // argument on the stack, and go into that level's chunk buffers
+    sp = 0;
+    for( int i=0; i<nprog; i++ )
+    {
+      int op = program_[i].op;
+      if( op == Child )
+      {
+        stack[sp] = child_slot[program_[i].arg];
+        miss_stack[sp] = missing[program_[i].arg];
+        cx_stack[sp++] = values[program_[i].arg]->isComplex();
+        continue;
+      }
+      const OpInfo &info = *FusedOps::find(op);
+      int nargs = program_[i].arg;
+      sp -= nargs;
+      Slot &a = stack[sp];
+      bool &ca = cx_stack[sp];
+      bool &ma = miss_stack[sp];
+      double *ro = rstack + sp*Chunk;
+      cplx *co = cstack + sp*Chunk;
+      if( skipsMissing(op) )
+      {
+        // fold the arguments that are present into the first of them
+        int first = 0;
+        while( first < nargs && miss_stack[sp+first] )
+          first++;
+        if( first == nargs )
+        {
+          sp++;
+          continue;
+        }
+        if( first )
+        {
+          // move it down to this level's buffers, as the level it is
+          // on will be reused
+          const Slot &b = stack[sp+first];
+          ca = cx_stack[sp+first];
+          if( ca )
+            a.c = std::copy(b.c,b.c+n,co) - n;
+          else
+            a.r = std::copy(b.r,b.r+n,ro) - n;
+          ma = false;
+        }
+        for( int k=first+1; k<nargs; k++ )
+        {
+          if( miss_stack[sp+k] )
+            continue;
+          const Slot &b = stack[sp+k];
+          bool cb = cx_stack[sp+k];
+          if( op == Add )
+            binaryPromote(a,ca,b,cb,ro,co,n,[](auto x,auto y){ return x+y; });
+          else
+            binaryPromote(a,ca,b,cb,ro,co,n,[](auto x,auto y){ return x*y; });
+          ca = resultType(info,ca,cb);
+        }
+        sp++;
+        continue;
+      }
+      // any missing argument makes the result missing
+      for( int k=1; k<nargs; k++ )
+        ma = ma || miss_stack[sp+k];
+      if( ma )
+      {
+        sp++;
+        continue;
+      }
+      if( nargs == 1 )
+      {
+        switch( op )
+        {
+          case Negate:    unarySame(a,ca,ro,co,n,[](auto x){ return -x; }); break;
+          case Invert:    unarySame(a,ca,ro,co,n,[](auto x){ return 1./x; }); break;
+          case Sin:       unarySame(a,ca,ro,co,n,[](auto x){ return std::sin(x); }); break;
+          case Cos:       unarySame(a,ca,ro,co,n,[](auto x){ return std::cos(x); }); break;
+          case Tan:       unarySame(a,ca,ro,co,n,[](auto x){ return std::tan(x); }); break;
+          case Sinh:      unarySame(a,ca,ro,co,n,[](auto x){ return std::sinh(x); }); break;
+          case Cosh:      unarySame(a,ca,ro,co,n,[](auto x){ return std::cosh(x); }); break;
+          case Tanh:      unarySame(a,ca,ro,co,n,[](auto x){ return std::tanh(x); }); break;
+          case Exp:       unarySame(a,ca,ro,co,n,[](auto x){ return std::exp(x); }); break;
+          case Log:       unarySame(a,ca,ro,co,n,[](auto x){ return std::log(x); }); break;
+          case Sqrt:      unarySame(a,ca,ro,co,n,[](auto x){ return std::sqrt(x); }); break;
+          case Pow2:      unarySame(a,ca,ro,co,n,[](auto x){ return pow2(x); }); break;
+          case Pow3:      unarySame(a,ca,ro,co,n,[](auto x){ return pow3(x); }); break;
+          case Pow4:      unarySame(a,ca,ro,co,n,[](auto x){ return pow4(x); }); break;
+          case Pow5:      unarySame(a,ca,ro,co,n,[](auto x){ return pow5(x); }); break;
+          case Pow6:      unarySame(a,ca,ro,co,n,[](auto x){ return pow6(x); }); break;
+          case Pow7:      unarySame(a,ca,ro,co,n,[](auto x){ return pow7(x); }); break;
+          case Pow8:      unarySame(a,ca,ro,co,n,[](auto x){ return pow8(x); }); break;
+          case Conj:      unarySame(a,ca,ro,co,n,[](auto x){ return FusedOps::conj(x); }); break;
+          case Abs:       unaryReal(a,ca,ro,n,[](auto x){ return std::abs(x); }); break;
+          case Arg:       unaryReal(a,ca,ro,n,[](auto x){ return std::arg(x); }); break;
+          case Real:      unaryReal(a,ca,ro,n,[](auto x){ return std::real(x); }); break;
+          case Imag:      unaryReal(a,ca,ro,n,[](auto x){ return std::imag(x); }); break;
+          case Asin:      unaryRealOnly(a,ro,n,[](double x){ return std::asin(x); }); break;
+          case Acos:      unaryRealOnly(a,ro,n,[](double x){ return std::acos(x); }); break;
+          case Atan:      unaryRealOnly(a,ro,n,[](double x){ return std::atan(x); }); break;
+          case Ceil:      unaryRealOnly(a,ro,n,[](double x){ return std::ceil(x); }); break;
+          case Floor:     unaryRealOnly(a,ro,n,[](double x){ return std::floor(x); }); break;
+        }
+        ca = resultType(info,ca,false);
+      }
+      else
+      {
+        for( int k=1; k<nargs; k++ )
+        {
+          const Slot &b = stack[sp+k];
+          bool cb = cx_stack[sp+k];
+          switch( op )
+          {
+            case Subtract:  binaryPromote(a,ca,b,cb,ro,co,n,[](auto x,auto y){ return x-y; }); break;
+            case Divide:    binaryPromote(a,ca,b,cb,ro,co,n,[](auto x,auto y){ return x/y; }); break;
+            case Pow:       binaryPromote(a,ca,b,cb,ro,co,n,[](auto x,auto y){ return std::pow(x,y); }); break;
+            case ToComplex: binaryToComplex(a,b,co,n,[](double x,double y){ return cplx(x,y); }); break;
+            case Polar:     binaryToComplex(a,b,co,n,[](double x,double y){ return std::polar(x,y); }); break;
+            case Atan2:     binaryRealOnly(a,b,ro,n,[](double x,double y){ return std::atan2(x,y); }); break;
+            case FMod:      binaryRealOnly(a,b,ro,n,[](double x,double y){ return std::fmod(x,y); }); break;
+          }
+          ca = resultType(info,ca,cb);
+        }
+      }
+      sp++;
+    }
+    // copy result of chunk to output
+    if( cx_out )
+      std::copy(stack[0].c,stack[0].c+n,reinterpret_cast<cplx *>(result.begin<dcomplex>())+i0);
+    else
+      std::copy(stack[0].r,stack[0].r+n,result.begin<double>()+i0);
+  }
+  return result;
+}
+
+} // namespace Meq
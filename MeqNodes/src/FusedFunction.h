@@ -0,0 +1,123 @@
+//# FusedFunction.h: evaluates a chain of elementwise functions in one pass
+//#
+//# Copyright (C) 2002-2007
+//# ASTRON (Netherlands Foundation for Research in Astronomy)
+//# and The MeqTree Foundation
+//# P.O.Box 2, 7990 AA Dwingeloo, The Netherlands, seg@astron.nl
+//#
+//# This program is free software; you can redistribute it and/or modify
+//# it under the terms of the GNU General Public License as published by
+//# the Free Software Foundation; either version 2 of the License, or
+//# (at your option) any later version.
+//#
+//# This program is distributed in the hope that it will be useful,
+//# but WITHOUT ANY WARRANTY; without even the implied warranty of
+//# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+//# GNU General Public License for more details.
+//#
+//# You should have received a copy of the GNU General Public License
+//# along with this program; if not, write to the Free Software
+//# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+//#
+//# $Id$
+
+#ifndef MEQNODES_FUSEDFUNCTION_H
+#define MEQNODES_FUSEDFUNCTION_H
+    
+#include <MEQ/Function.h>
+
+#include <MeqNodes/TID-MeqNodes.h>
+#pragma aidgroup MeqNodes
+#pragma types #Meq::FusedFunction
+
+// The comments below are used to automatically generate a default
+// init-record for the class 
+
+//defrec begin MeqFusedFunction
+//  A MeqFusedFunction evaluates a chain of elementwise function nodes
+//  (Add, Multiply, Sin, Exp, ToComplex, etc.) in a single pass over its
+//  child values, without making a temporary Vells for every intermediate
+//  node. Missing child data is handled as by the unfused nodes: Add and
+//  Multiply skip missing arguments, other operations of a missing argument
+//  are missing. Fused nodes are normally created by the TDL fusion pass (see
+//  Settings.fuse_elementwise), which replaces the top node of each chain
+//  with a MeqFusedFunction, and the chain's inputs become its children.
+//  The three fields below form the fused expression in postfix order, and
+//  must be of the same length.
+//field: function_class []
+//  Class names of the fused nodes (e.g. "MeqSin"). An empty string stands
+//  for a child value.
+//field: child_index []
+//  For every empty entry in function_class: the index of the child (0-based).
+//  Ignored for other entries.
+//field: num_children []
+//  For every class entry in function_class: the number of children the
+//  original node had, i.e. the number of values it takes from the stack.
+//  Ignored for other entries.
+//defrec end
+
+namespace Meq {    
+
+const HIID FFunctionClass = AidFunction|AidClass;
+const HIID FChildIndex    = AidChild|AidIndex;
+const HIID FNumChildren   = AidNum|AidChildren;
+
+class FusedFunction : public Function
+{
+public:
+  FusedFunction();
+
+  virtual ~FusedFunction();
+
+  virtual TypeId objectType() const
+    { return TpMeqFusedFunction; }
+
+protected:
+  virtual void setStateImpl (DMI::Record::Ref &rec,bool initializing);
+
+  // makes planes where the fused expression is missing as a whole empty
+  virtual int getResult (Result::Ref &resref,
+                         const std::vector<Result::Ref> &childres,
+                         const Request &req,bool newreq);
+
+  // merges the flags of the children that contribute to the result
+  virtual void evaluateFlags (Vells::Ref &out,const Request &req,const LoShape &shape,
+                              const vector<const VellSet *> &pvs);
+
+  // Evaluates the fused expression, a chunk of elements at a time
+  virtual Vells evaluate (const Request&, const LoShape&,
+			  const vector<const Vells*>& values);
+
+private:
+  // one step of the compiled program: either pushes a child value onto
+  // the stack (op=0, arg=child index), or applies an operation to the
+  // top arg values of the stack
+  typedef struct
+  {
+    int op;
+    int arg;
+  } Instruction;
+
+  void compile (const vector<string> &classes,const vector<int> &child_index,
+                const vector<int> &num_children);
+
+  // finds the children contributing to the result, given which children
+  // are missing and which are null. Returns false if the result is missing
+  bool findContributors (vector<bool> &contrib,const vector<bool> &missing,
+                         const vector<bool> &null) const;
+
+  // current expression, as given by the state fields
+  vector<string> classes_;
+  vector<int> child_index_;
+  vector<int> num_children_;
+
+  vector<Instruction> program_;
+  
+  // max stack depth needed by program
+  int max_depth_;
+};
+
+
+} // namespace Meq
+
+#endif
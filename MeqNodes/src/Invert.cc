@@ -30,7 +30,10 @@ namespace Meq {
 
 //##ModelId=400E53550241
 Invert::Invert()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E53550242
 Invert::~Invert()
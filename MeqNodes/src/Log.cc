@@ -30,7 +30,10 @@ namespace Meq {
 
 //##ModelId=400E53550241
 Log::Log()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E53550242
 Log::~Log()
@@ -30,7 +30,9 @@ namespace Meq
 //##ModelId=400E530A0105
 MatrixInvert22::MatrixInvert22()
  : Function(1)
-{}
+{
+  allowSharedResults();
+}
 
 //##ModelId=400E530A0106
 MatrixInvert22::~MatrixInvert22()
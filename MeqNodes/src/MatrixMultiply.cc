@@ -30,7 +30,9 @@ namespace Meq
 //##ModelId=400E530A0105
 MatrixMultiply::MatrixMultiply()
  : Function(-2) // at least 1 child expected
-{}
+{
+  allowSharedResults();
+}
 
 //##ModelId=400E530A0106
 MatrixMultiply::~MatrixMultiply()
@@ -31,6 +31,7 @@ namespace Meq {
 Max::Max ()
 {
   allowMissingData();
+  allowSharedResults();
 }
   
   
@@ -31,6 +31,7 @@ namespace Meq {
 Mean::Mean ()
 {
   allowMissingData();
+  allowSharedResults();
 }
 
 
@@ -38,8 +39,24 @@ Mean::Mean ()
 Vells Mean::evaluate (const Request&,const LoShape &shape,
 		     const vector<const Vells*>& values)
 {
+  // if children are factors, reduce their product (or sum)
+  if( isFactored() )
+  {
+    FactoredVells fv(FactoredVells::Operation(factor_oper_));
+    makeFactors(fv,values);
+    // flagged points have to be skipped, so expand the operand
+    if( fv.hasDataFlags() )
+    {
+      Vells operand = fv.expand();
+      if( hasReductionAxes() )
+        return apply(VellsMath::mean,operand,VellsFullFlagMask);
+      else
+        return mean(operand,VellsFullFlagMask);
+    }
+    return fv.mean(reduction_axes_);
+  }
   // if dealing with a single child, reduce
-  if( values.size() == 1 )
+  else if( values.size() == 1 )
   {
     if( hasReductionAxes() )  // reduce along axes 
       return apply(VellsMath::mean,*values[0],flagmask_[0]);
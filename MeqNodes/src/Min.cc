@@ -31,6 +31,7 @@ namespace Meq {
 Min::Min ()
 {
   allowMissingData();
+  allowSharedResults();
 }
 
   
@@ -30,6 +30,8 @@ namespace Meq {
 Multiply::Multiply()
 {
   allowMissingData();
+  allowInPlace();
+  allowSharedResults();
 }
 
 //##ModelId=400E530A0106
@@ -39,7 +39,7 @@ public:
   // with multiple children
   NElements ()
     : ReductionFunction(1)
-  {}
+  { allowSharedResults(); }
 
   virtual TypeId objectType() const
   { return TpMeqNElements; }
@@ -30,7 +30,10 @@ namespace Meq {
 
 //##ModelId=400E53550241
 Negate::Negate()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E53550242
 Negate::~Negate()
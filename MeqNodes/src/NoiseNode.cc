@@ -31,8 +31,7 @@ namespace Meq {
 
 NoiseNode::NoiseNode (int nchildren,const HIID *labels,int nmandatory)
 : TensorFunction(nchildren,labels,nmandatory)
-{
-}
+{}
   
   
 void NoiseNode::setStateImpl (DMI::Record::Ref &rec,bool initializing)
@@ -26,6 +26,7 @@
 #include <MeqNodes/ParmTableUtils.h>
 #include <MeqNodes/CasaParmTable.h>
 #include <MEQ/FastParmTable.h>
+#include <MEQ/MappedParmTable.h>
 
 namespace Meq {
 
@@ -42,15 +43,19 @@ ParmTable* ParmTableUtils::openTable (const string& tablename,int type)
   }
   // determine type of table to open
   int len = tablename.length();
-#ifdef HAVE_FASTPARMTABLE
   ParmTable *tab;
-  if( len>5 && ( !tablename.compare(len-4,4,".mep") || 
-                 !tablename.compare(len-5,5,".mep/") ) )
+  // read-only memory-mapped tables
+  if( len>5 && !tablename.compare(len-5,5,".mmep") )
+    tab = new MappedParmTable(tablename);
+#ifdef HAVE_FASTPARMTABLE
+  else if( len>5 && ( !tablename.compare(len-4,4,".mep") || 
+                      !tablename.compare(len-5,5,".mep/") ) )
     tab = new CasaParmTable(tablename);
   else
     tab = new FastParmTable(tablename);
 #else
-  ParmTable *tab = new CasaParmTable(tablename);
+  else
+    tab = new CasaParmTable(tablename);
 #endif
   open_tables_[tablename] = tab;
   return tab;
@@ -31,7 +31,10 @@ namespace Meq {
 
 //##ModelId=400E535502BF
 Polar::Polar()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E535502C0
 Polar::~Polar()
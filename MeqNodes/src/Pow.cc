@@ -32,7 +32,10 @@ namespace Meq {
 
 //##ModelId=400E53540382
 Pow::Pow()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E53540383
 Pow::~Pow()
@@ -29,7 +29,10 @@ using namespace Meq::VellsMath;
 namespace Meq {    
 
 Pow2::Pow2()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 Pow2::~Pow2()
 {}
@@ -29,7 +29,10 @@ using namespace Meq::VellsMath;
 namespace Meq {    
 
 Pow3::Pow3()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 Pow3::~Pow3()
 {}
@@ -29,7 +29,10 @@ using namespace Meq::VellsMath;
 namespace Meq {    
 
 Pow4::Pow4()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 Pow4::~Pow4()
 {}
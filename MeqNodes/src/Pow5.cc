@@ -29,7 +29,10 @@ using namespace Meq::VellsMath;
 namespace Meq {    
 
 Pow5::Pow5()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 Pow5::~Pow5()
 {}
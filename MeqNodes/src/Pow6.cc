@@ -29,7 +29,10 @@ using namespace Meq::VellsMath;
 namespace Meq {    
 
 Pow6::Pow6()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 Pow6::~Pow6()
 {}
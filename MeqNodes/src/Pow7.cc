@@ -29,7 +29,10 @@ using namespace Meq::VellsMath;
 namespace Meq {    
 
 Pow7::Pow7()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 Pow7::~Pow7()
 {}
@@ -29,7 +29,10 @@ using namespace Meq::VellsMath;
 namespace Meq {    
 
 Pow8::Pow8()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 Pow8::~Pow8()
 {}
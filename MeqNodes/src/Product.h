@@ -37,7 +37,7 @@ class Product : public ReductionFunction
 public:
   Product ()
     : ReductionFunction(1)
-  {}
+  { allowSharedResults(); }
 
   virtual TypeId objectType() const
   { return TpMeqProduct; }
@@ -30,7 +30,10 @@ namespace Meq {
 
 //##ModelId=400E53550241
 Real::Real()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E53550242
 Real::~Real()
@@ -29,16 +29,31 @@
 namespace Meq {    
 
 const HIID FReductionAxes = AidReduction|AidAxes;
+const HIID FFactorOper = AidFactor|AidOper;
 
 //##ModelId=400E53550241
 ReductionFunction::ReductionFunction (int nchildren)
 : Function(nchildren),
-  has_axes_ids_(false)
+  has_axes_ids_(false),
+  factor_oper_(-1)
 {}
 
 void ReductionFunction::setStateImpl (DMI::Record::Ref& rec, bool initializing)
 {
   Function::setStateImpl(rec,initializing);
+  // get factor operation
+  if( rec[FFactorOper].exists() )
+  {
+    string oper = rec[FFactorOper].as<string>();
+    if( oper.empty() )
+      factor_oper_ = -1;
+    else if( oper == "multiply" )
+      factor_oper_ = FactoredVells::PRODUCT;
+    else if( oper == "add" )
+      factor_oper_ = FactoredVells::SUM;
+    else
+      NodeThrow1("illegal "+FFactorOper.toString()+"="+oper+" state field");
+  }
   // get reduction axes
   if( rec[FReductionAxes].exists() )
   {
@@ -68,7 +83,7 @@ void ReductionFunction::setStateImpl (DMI::Record::Ref& rec, bool initializing)
     }
     if( !reduction_axes_.empty() || !reduction_axes_ids_.empty() )
     {
-      FailWhen(numChildren()>1,"cannot use reduction axes when multiple children are present");
+      FailWhen(numChildren()>1 && !isFactored(),"cannot use reduction axes when multiple children are present");
     }
   }
 }
@@ -156,90 +171,106 @@ Vells ReductionFunction::apply (VellsMath::UnaryRdFuncWS func,const Vells &invel
   return out;
 }
       
-void ReductionFunction::evaluateFlags (Vells::Ref &out,const Request &req,const LoShape &shape,const vector<const VellSet *> &pvs)
+void ReductionFunction::makeFactors (FactoredVells &fv,const vector<const Vells*> &values)
 {
-  // if no reduction axes are present...
+  // missing children are skipped
+  for( uint i=0; i<values.size(); i++ )
+    if( values[i] )
+      fv.add(*values[i],flagmask_[i]);
+}
+
+void ReductionFunction::collapseFlags (Vells::Ref &out,const Vells &flagvells,VellsFlagType flagmask)
+{
+  // no reduction axes: reduce to a single scalar
   if( !hasReductionAxes() )
   {
-    // with multiple children, we reduce along the "child" axis,
-    // so only flag the output if all the inputs are flagged
-    if( pvs.size() > 1 )
+    VellsFlagType tot_flags = isAllFlagged(flagvells,flagmask);
+    // if we have accumulated a flag, merge it in
+    if( tot_flags )
     {
-      VellsFlagType totflagmask = 0;
-      // temp flag object, each bit #i will be 1 if child has its flag set
-      Vells flagged(makeLoShape(1),totflagmask);  
-      for( uint i=0; i<pvs.size(); i++ )
-      {
-        if( flagmask_[i] && pvs[i] && !pvs[i]->isNull() && pvs[i]->hasDataFlags() )
-        { 
-          totflagmask |= flagmask_[i];
-          Vells vs_flagged;
-          Vells masked_flags = pvs[i]->dataFlags()&flagmask_[i];
-          // whereEq() will return 1 if all flags are ==0
-          if( masked_flags.whereEq(vs_flagged,VellsFlagType(0),0,1<<i) != 1 )
-            flagged |= vs_flagged;
-        }
-      }
-      // any flags at all considered?
-      if( totflagmask )
-      {
-        // now find the points that were flagged for ALL children,
-        // and assign totflags to them.
-        Vells::Ref realflags(new Vells);
-        if( flagged.whereEq(realflags(),(1<<pvs.size())-1,totflagmask,0) >=0 )
-        if( out.valid() )
-          Vells::mergeFlags(out,*realflags,VellsFullFlagMask);
-        else
-          out = realflags;
-      }
+      Vells::Ref flagref(new Vells(makeLoShape(1),tot_flags,true));
+      if( out.valid() )
+        Vells::mergeFlags(out,*flagref,tot_flags);
+      else
+        out = flagref;
     }
-    // single child: reduce to a single scalar
-    else
+    return;
+  }
+  // create slicer and output flags
+  Vells::Ref outflag_ref;
+  ConstVellsSlicer0 slicer;
+  makeVellsSlicer(outflag_ref,slicer,flagvells);
+  Vells & flags = outflag_ref();
+  // now iterate over the output and over the slicer,
+  VellsFlagType *pflag = flags.begin<VellsFlagType>();
+  VellsFlagType tot_flags = 0;
+  for( ; pflag != flags.end<VellsFlagType>(); pflag++ )
+  {
+    DbgAssert(slicer.valid());
+    // output flag is set only if all of the current slice is flagged
+    tot_flags |= *pflag = isAllFlagged(slicer.vells(),flagmask);
+    slicer.incr();
+  }
+  // have we flagged anything at all in the output? assign flags then
+  if( tot_flags )
+    Vells::mergeFlags(out,flags,flagmask);
+}
+      
+void ReductionFunction::evaluateFlags (Vells::Ref &out,const Request &req,const LoShape &shape,const vector<const VellSet *> &pvs)
+{
+  // if children are factors, the operand is flagged wherever any of 
+  // them is, so merge their flags and collapse that
+  if( isFactored() )
+  {
+    Vells::Ref flags;
+    for( uint i=0; i<pvs.size(); i++ )
+      if( pvs[i] && flagmask_[i] && pvs[i]->hasDataFlags() )
+        Vells::mergeFlags(flags,pvs[i]->dataFlags(),flagmask_[i]);
+    if( flags.valid() )
+      collapseFlags(out,*flags,VellsFullFlagMask);
+  }
+  // with multiple children and no reduction axes, we reduce along the
+  // "child" axis, so only flag the output if all the inputs are flagged
+  else if( !hasReductionAxes() && pvs.size() > 1 )
+  {
+    VellsFlagType totflagmask = 0;
+    // temp flag object, each bit #i will be 1 if child has its flag set
+    Vells flagged(makeLoShape(1),totflagmask);  
+    for( uint i=0; i<pvs.size(); i++ )
     {
-      VellsFlagType tot_flags = 0;
-      for( uint i=0; i<pvs.size(); i++ )
-        if( pvs[i] && flagmask_[i] && pvs[i]->hasDataFlags() )
-          tot_flags |= isAllFlagged(pvs[i]->dataFlags(),flagmask_[i]);
-      // if we have accumulated a flag, merge it in
-      if( tot_flags )
-      {
-        Vells::Ref flagref(new Vells(makeLoShape(1),tot_flags,true));
-        if( out.valid() )
-          Vells::mergeFlags(out,*flagref,tot_flags);
-        else
-          out = flagref;
+      if( flagmask_[i] && pvs[i] && !pvs[i]->isNull() && pvs[i]->hasDataFlags() )
+      { 
+        totflagmask |= flagmask_[i];
+        Vells vs_flagged;
+        Vells masked_flags = pvs[i]->dataFlags()&flagmask_[i];
+        // whereEq() will return 1 if all flags are ==0
+        if( masked_flags.whereEq(vs_flagged,VellsFlagType(0),0,1<<i) != 1 )
+          flagged |= vs_flagged;
       }
     }
+    // any flags at all considered?
+    if( totflagmask )
+    {
+      // now find the points that were flagged for ALL children,
+      // and assign totflags to them.
+      Vells::Ref realflags(new Vells);
+      if( flagged.whereEq(realflags(),(1<<pvs.size())-1,totflagmask,0) >=0 )
+      if( out.valid() )
+        Vells::mergeFlags(out,*realflags,VellsFullFlagMask);
+      else
+        out = realflags;
+    }
   }
-  // else collapse flags along the reduction axes (we may safely assume a
-  // single child due to the check in setStateImpl() above)
-  else
+  // else collapse flags of the single child (we may safely assume a single
+  // child when reduction axes are present, due to the check in 
+  // setStateImpl() above)
+  else if( !pvs.empty() )
   {
     DbgAssert(pvs.size()==1);
     VellsFlagType flagmask = flagmask_[0];
-    if( !flagmask || !pvs[0] )
-      return;
-    const VellSet & vs = *pvs[0];
-    if( !vs.hasDataFlags() )
+    if( !flagmask || !pvs[0] || !pvs[0]->hasDataFlags() )
       return;
-    // create slicer and output flags
-    Vells::Ref outflag_ref;
-    ConstVellsSlicer0 slicer;
-    makeVellsSlicer(outflag_ref,slicer,vs.dataFlags());
-    Vells & flags = outflag_ref();
-    // now iterate over the output and over the slicer,
-    VellsFlagType *pflag = flags.begin<VellsFlagType>();
-    VellsFlagType tot_flags = 0;
-    for( ; pflag != flags.end<VellsFlagType>(); pflag++ )
-    {
-      DbgAssert(slicer.valid());
-      // output flag is set only if all of the current slice is flagged
-      tot_flags |= *pflag = isAllFlagged(slicer.vells(),flagmask);
-      slicer.incr();
-    }
-    // have we flagged anything at all in the output? assign flags then
-    if( tot_flags )
-      Vells::mergeFlags(out,flags,flagmask);
+    collapseFlags(out,pvs[0]->dataFlags(),flagmask);
   }
 }
 
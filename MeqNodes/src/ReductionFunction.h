@@ -26,10 +26,11 @@
 #include <MEQ/Function.h>
 #include <MEQ/VellsSlicerWithFlags.h>
 #include <MEQ/VellsSlicer.h>
+#include <MEQ/FactoredVells.h>
 
 #include <MeqNodes/TID-MeqNodes.h>
 
-#pragma aid Reduction Axes
+#pragma aid Reduction Axes Factor Oper
 
 namespace Meq {    
 
@@ -42,6 +43,10 @@ public:
   bool hasReductionAxes () const
   { return !reduction_axes_.empty(); }
 
+  // true if children are factors of a single operand (see factor_oper_ below)
+  bool isFactored () const
+  { return factor_oper_ >= 0; }
+
 protected:
   // flags can be collapsed along the reduction axes
   virtual void evaluateFlags (Vells::Ref &,const Request &,const LoShape &,const vector<const VellSet*>&);
@@ -53,6 +58,13 @@ protected:
                          const std::vector<Result::Ref> &childres,
                          const Request &req,bool newreq);
 
+  // helper method: given a flag vells, collapses it along the reduction
+  // axes (or to a single value) and merges the result into out
+  void collapseFlags (Vells::Ref &out,const Vells &flags,VellsFlagType flagmask);
+
+  // helper method: collects child values into a FactoredVells
+  void makeFactors (FactoredVells &fv,const vector<const Vells*> &values);
+
   // helper method: checks if a flag vells is fully flagged with a given mask,
   // returns mask itself if so, or 0 if at least one point is not flagged
   VellsFlagType isAllFlagged (const Vells &flagvells,VellsFlagType mask);
@@ -81,6 +93,12 @@ protected:
   // indices of the reduction axes -- guaranteed to be filled in by the time
   // evaluate() is called
   std::vector<int> reduction_axes_;
+
+  // if >=0, the operand is not a child, but the product (FactoredVells::PRODUCT)
+  // or sum (FactoredVells::SUM) of all children, and is reduced without
+  // being expanded where possible. Set via the factor_oper field, as
+  // "multiply" or "add".
+  int factor_oper_;
 };
 
 
@@ -30,7 +30,9 @@ namespace Meq {
 
 Rms::Rms()
  : ReductionFunction(1)
-{}
+{
+  allowSharedResults();
+}
 
 Rms::~Rms()
 {}
@@ -31,7 +31,10 @@ namespace Meq {
 
 //##ModelId=400E53550241
 Sin::Sin()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E53550242
 Sin::~Sin()
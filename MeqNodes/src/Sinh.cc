@@ -30,7 +30,10 @@ namespace Meq {
 
 //##ModelId=400E530500C3
 Sinh::Sinh()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E530500C4
 Sinh::~Sinh()
@@ -112,6 +112,13 @@ const HIID FIterations = AidIterations;
 const HIID FMetricsArray  = AidMetrics|AidArray;
 const HIID FDebugArray  = AidDebug|AidArray;
 
+// per-iteration timings
+const HIID FTiming          = AidTiming;
+const HIID FAccumulate      = AidAccumulate;
+const HIID FAccumulateTotal = AidAccumulate|AidTotal;
+const HIID FSolve           = AidSolve;
+const HIID FUpdate          = AidUpdate;
+
 // solver events (published depending on debug level)
 const HIID FSolverBegin = AidSolver|AidBegin;
 const HIID FSolverIter  = AidSolver|AidIter;
@@ -140,8 +147,7 @@ Solver::Solver()
   max_num_iter_     (3),
   conv_quota_       (0.8),
   debug_lvl_        (DefaultDebugLevel),
-  parm_group_       (AidParm),
-  strides_          (0)
+  parm_group_       (AidParm)
 {
   // set ddefault settings
   settings_.use_svd       = true;
@@ -157,16 +163,17 @@ Solver::Solver()
   // enable multithreading by default if available
   enableMultiThreadedPolling();
   mt_solve_ = true;
+  // the solver itself never runs in single precision
+  double_precision_only_ = true;
 
   interrupt_ = false;
   write_debug_= false;
+  fill_queue_closed_ = wt_fill_loop_ = false;
 }
 
 //##ModelId=400E53550261
 Solver::~Solver()
 {
-  if( strides_ )
-    delete [] strides_;
   stopWorkerThreads();
 }
 
@@ -416,6 +423,10 @@ int Solver::populateSpidMap (const DMI::Record &spidmap_rec,const Cells &cells)
   else
     psolver_tiling_ = &( iter->second );
   }
+  // number the tilings, so that equation fillers can keep their own copies
+  int itiling = 0;
+  for( TilingMap::iterator iter = tilings_.begin(); iter != tilings_.end(); iter++ )
+    iter->second.index = itiling++;
   // allocate required number of subsolvers
   subsolvers_.resize(numSubtiles() * numSolveGroups());
   // now for each spid tiling, figure out what solver tile a given spid
@@ -547,28 +558,92 @@ inline bool isvalid (double num)
 inline bool isvalid (dcomplex num)
 { return isvalid(creal(num)) && isvalid(cimag(num)); }
 
+// Sets up one equation filler for this thread and one per worker thread.
+// Worker fillers get space for partial equations; these are allocated
+// (by equationSink()) for subsolvers that they actually see equations for.
+void Solver::initFillers ()
+{
+  fillers_.resize(worker_threads_.size()+1);
+  for( uint i=0; i<fillers_.size(); i++ )
+  {
+    EquationFiller &filler = fillers_[i];
+    filler.direct = !i;
+    filler.sgd.resize(numSolveGroups());
+    for( int sg=0; sg<numSolveGroups(); sg++ )
+    {
+      filler.sgd[sg].uk_index.resize(num_unknowns_);
+      filler.sgd[sg].deriv_real.resize(num_unknowns_);
+      filler.sgd[sg].deriv_imag.resize(num_unknowns_);
+    }
+    filler.strides_data.resize((num_spids_+4)*Axis::MaxAxis);
+    filler.tilings.resize(tilings_.size());
+    for( TilingMap::const_iterator iter = tilings_.begin(); iter != tilings_.end(); iter++ )
+      filler.tilings[iter->second.index] = iter->second;
+    filler.partial.clear();
+    filler.partial.resize(filler.direct ? 0 : numSubsolvers());
+    filler.neq.assign(numSubsolvers(),0);
+    filler.num_equations = 0;
+  }
+}
+
+inline casacore::LSQFit & Solver::equationSink (EquationFiller &filler,int iss,int neq)
+{
+  Subsolver &ss = subsolvers_[iss];
+  filler.num_equations += neq;
+  if( filler.direct )
+  {
+    ss.neq += neq;
+    return ss.solver;
+  }
+  casacore::LSQFit &partial = filler.partial[iss];
+  if( !filler.neq[iss] && partial.nUnknowns() != uint(ss.nuk) )
+    partial.set(ss.nuk);
+  filler.neq[iss] += neq;
+  return partial;
+}
+
+// Merges the partial equations of the worker fillers into a subsolver.
+// Each subsolver is merged by whichever thread solves it, so this needs
+// no locking.
+void Solver::mergeEquations (int iss)
+{
+  Subsolver &ss = subsolvers_[iss];
+  for( uint i=1; i<fillers_.size(); i++ )
+  {
+    EquationFiller &filler = fillers_[i];
+    if( filler.neq[iss] )
+    {
+      FailWhen(!ss.solver.merge(filler.partial[iss]),
+               ssprintf("failed to merge equations of subsolver %d",iss));
+      ss.neq += filler.neq[iss];
+      filler.partial[iss].reset();
+      filler.neq[iss] = 0;
+    }
+  }
+}
+
 // This is a helper function for fillEquations(). Note that this function
 // encapsulates the only difference in the code between the double
 // and the complex case. This allows us to have a single templated
 // definition of fillEquations() below which works for both cases.
 template<typename T>
-inline void Solver::fillEqVectors (int itile,int npert,SpidInfo *pspi[],
+inline void Solver::fillEqVectors (EquationFiller &,int itile,int npert,SpidInfo *pspi[],
       const T &,const std::vector<Vells::ConstStridedIterator<T> > &,double)
 {
   STATIC_CHECK(0,unsupported_template_type_for_fillEqVectors);
 }
 
 template<>
-inline void Solver::fillEqVectors (int itile,int npert,SpidInfo *pspi[],
+inline void Solver::fillEqVectors (EquationFiller &filler,int itile,int npert,SpidInfo *pspi[],
       const double &diff,const std::vector<Vells::ConstStridedIterator<double> > &deriv_iter,double weight)
 {
   bool valid = isvalid(diff);
   for( int i=0; i<numSolveGroups(); i++ )
-    sgd_[i].nderiv = 0;
+    filler.sgd[i].nderiv = 0;
   // fill vectors of derivatives for each unknown
   for( int i=0; i<npert && valid; i++ )
   {
-    SolveGroupData &sgd = sgd_[pspi[i]->solvegroup];
+    SolveGroupData &sgd = filler.sgd[pspi[i]->solvegroup];
     valid &= isvalid( sgd.deriv_real[sgd.nderiv] = *deriv_iter[i] );
     sgd.uk_index[sgd.nderiv] = pspi[i]->ssuki[itile];
     sgd.nderiv++;
@@ -586,16 +661,14 @@ inline void Solver::fillEqVectors (int itile,int npert,SpidInfo *pspi[],
   }
   for( int sg=0; sg<numSolveGroups(); sg++ )
   {
-    SolveGroupData &sgd = sgd_[sg];
+    SolveGroupData &sgd = filler.sgd[sg];
     if( sgd.nderiv )
     {
-      Subsolver &ss = *psubsolver(itile,sg);
-      if( !ss.converged )
+      int iss = subsolverIndex(itile,sg);
+      if( !subsolvers_[iss].converged )
       {
         // add equation to solver
-        ss.solver.makeNorm(sgd.nderiv,&(sgd.uk_index[0]),&(sgd.deriv_real[0]),weight,diff);
-        ss.neq++;
-        num_equations_++;
+        equationSink(filler,iss,1).makeNorm(sgd.nderiv,&(sgd.uk_index[0]),&(sgd.deriv_real[0]),weight,diff);
       }
     }
   }
@@ -604,7 +677,7 @@ inline void Solver::fillEqVectors (int itile,int npert,SpidInfo *pspi[],
 
 // Specialization for complex case: each value produces two equations
 template<>
-inline void Solver::fillEqVectors (int itile,int npert,SpidInfo *pspi[],
+inline void Solver::fillEqVectors (EquationFiller &filler,int itile,int npert,SpidInfo *pspi[],
       const dcomplex &diff,const std::vector<Vells::ConstStridedIterator<dcomplex> > &deriv_iter,double weight)
 {
   double re_diff = creal(diff);
@@ -612,11 +685,11 @@ inline void Solver::fillEqVectors (int itile,int npert,SpidInfo *pspi[],
   // valid flag checks for inf or nan in equations
   bool valid = isvalid(re_diff) && isvalid(im_diff);
   for( int i=0; i<numSolveGroups(); i++ )
-    sgd_[i].nderiv = 0;
+    filler.sgd[i].nderiv = 0;
   // fill vectors of derivatives for each unknown
   for( int i=0; i<npert && valid; i++ )
   {
-    SolveGroupData &sgd = sgd_[pspi[i]->solvegroup];
+    SolveGroupData &sgd = filler.sgd[pspi[i]->solvegroup];
     valid &= isvalid( sgd.deriv_real[sgd.nderiv] = creal(*deriv_iter[i]) );
     valid &= isvalid( sgd.deriv_imag[sgd.nderiv] = cimag(*deriv_iter[i]) );
     sgd.uk_index[sgd.nderiv] = pspi[i]->ssuki[itile];
@@ -631,35 +704,34 @@ inline void Solver::fillEqVectors (int itile,int npert,SpidInfo *pspi[],
         ::Debug::getDebugStream()<<pspi[i]->ssuki[itile]<<" ";
       ::Debug::getDebugStream()<<"contains NANs or INFs, omitting\n";
     }
-    num_invalid++;
+    filler.num_invalid++;
     return;
   }
   // add equation to solvers
   for( int sg=0; sg<numSolveGroups(); sg++ )
   {
-    SolveGroupData &sgd = sgd_[sg];
+    SolveGroupData &sgd = filler.sgd[sg];
     if( sgd.nderiv )
     {
-      Subsolver &ss = *psubsolver(itile,sg);
-      if( !ss.converged )
+      int iss = subsolverIndex(itile,sg);
+      if( !subsolvers_[iss].converged )
       {
-        ss.solver.makeNorm(sgd.nderiv,&(sgd.uk_index[0]),&(sgd.deriv_real[0]),weight,re_diff);
-        ss.solver.makeNorm(sgd.nderiv,&(sgd.uk_index[0]),&(sgd.deriv_imag[0]),weight,im_diff);
-        ss.neq += 2;
-        num_equations_ += 2;
+        casacore::LSQFit &solver = equationSink(filler,iss,2);
+        solver.makeNorm(sgd.nderiv,&(sgd.uk_index[0]),&(sgd.deriv_real[0]),weight,re_diff);
+        solver.makeNorm(sgd.nderiv,&(sgd.uk_index[0]),&(sgd.deriv_imag[0]),weight,im_diff);
       }
       else
-        num_converged++;
+        filler.num_converged++;
     }
   }
 }
 
 template<typename T>
-void Solver::fillEquations (const VellSet &vs)
+void Solver::fillEquations (EquationFiller &filler,const VellSet &vs,int ichild)
 {
   int npert = vs.numSpids();
   FailWhen(npert>num_spids_,ssprintf("child %d returned %d spids, but only "
-            "%d were reported during spid discovery",cur_child_,npert,num_spids_));
+            "%d were reported during spid discovery",ichild,npert,num_spids_));
   const Vells &diffval = vs.getValue();
   // set pweight to point to the weight Vells, else to Unity
   const Vells * pweight = vs.hasDataWeights() ? &( vs.dataWeights() ) : &( Vells::Unity() );
@@ -701,11 +773,15 @@ void Solver::fillEquations (const VellSet &vs)
   shapes[2] = &( diffval.flagShape() ); // returns null shape if no flags
   shapes[3] = &( pweight->shape() );
   int j=4;
+  // the filler has its own copies of the tilings, since their counters
+  // are updated as we go
+  std::vector<Tiling> &tilings = filler.tilings;
   // deactivate all tilings, then reactivate the ones for active spids
-  for( TilingMap::iterator iter = tilings_.begin(); iter != tilings_.end(); iter++ )
-    iter->second.active = false;
+  for( uint i=0; i<tilings.size(); i++ )
+    tilings[i].active = false;
   // activate the solver's tiling
-  psolver_tiling_->activate();
+  Tiling &solver_tiling = tilings[psolver_tiling_->index];
+  solver_tiling.activate();
   // go over derivatives, fill in shapes, get pointers to tilings and such
   Tiling *   ptiling[npert];    // shorthand pointers to SpidInfo...
   SpidInfo * pspi[npert];       //    ...and TilingInfo per derivative
@@ -722,30 +798,31 @@ void Solver::fillEquations (const VellSet &vs)
       cerr<<"\n";
     }*/
     FailWhen(iter == spids_.end(),ssprintf("child %d returned spid %d that was "
-             "not reported during spid discovery",cur_child_,spid));
+             "not reported during spid discovery",ichild,spid));
     pspi[i]     = &( iter->second );
-    (ptiling[i] = pspi[i]->ptiling)->activate();
+    (ptiling[i] = &tilings[pspi[i]->ptiling->index])->activate();
     // get shape of derivative
     shapes[j] = &( vs.getPerturbedValue(i).shape() );
   }
   // compute output shape (the union of all input shapes), and
   // strides for all vells
-  Vells::computeStrides(outshape,strides_,npert+4,shapes,"Solver::getResult");
+  Vells::Strides *strides = filler.strides();
+  Vells::computeStrides(outshape,strides,npert+4,shapes,"Solver::getResult");
   int outrank = outshape.size();
   // create strided iterators for all vells
-  Vells::ConstStridedIterator<T> diff_iter(diffval,strides_[1]);
-  Vells::ConstStridedFlagIterator flag_iter(diffval,strides_[2]);
-  Vells::ConstStridedIterator<double> weight_iter(*pweight,strides_[3]);
+  Vells::ConstStridedIterator<T> diff_iter(diffval,strides[1]);
+  Vells::ConstStridedFlagIterator flag_iter(diffval,strides[2]);
+  Vells::ConstStridedIterator<double> weight_iter(*pweight,strides[3]);
   std::vector<Vells::ConstStridedIterator<T> > deriv_iter(npert);
   j=4;
   for( int i=0; i<npert; i++,j++ )
-    deriv_iter[i] = Vells::ConstStridedIterator<T>(vs.getPerturbedValue(i),strides_[j]);
+    deriv_iter[i] = Vells::ConstStridedIterator<T>(vs.getPerturbedValue(i),strides[j]);
   // create counter for output shape
   Vells::DimCounter counter(outshape);
   // now start generating equations. repeat while counter is valid
   // (we break out below, when incrementing the counter)
   int nfill=0,niter=0;
-  num_invalid=num_converged=0;
+  filler.num_invalid = filler.num_converged = 0;
   while( true )
   {
     niter++;
@@ -753,7 +830,7 @@ void Solver::fillEquations (const VellSet &vs)
     if( !(*flag_iter&flag_mask_) && *weight_iter > 0 )
     {
       nfill++;
-      fillEqVectors(psolver_tiling_->cur_tile,npert,pspi,*diff_iter,deriv_iter,*weight_iter);
+      fillEqVectors(filler,solver_tiling.cur_tile,npert,pspi,*diff_iter,deriv_iter,*weight_iter);
     }
     // increment counter and all iterators
     int ndim = counter.incr();
@@ -765,9 +842,9 @@ void Solver::fillEquations (const VellSet &vs)
     for( int ipert=0; ipert<npert; ipert++ )
       deriv_iter[ipert].incr(ndim);
     // now for each tiling in use, advance its counters
-    for( TilingMap::iterator iter = tilings_.begin(); iter != tilings_.end(); iter++ )
+    for( uint i=0; i<tilings.size(); i++ )
     {
-      Tiling &ti = iter->second;
+      Tiling &ti = tilings[i];
       // note that ndim tells us how many dimensions from the END of the
       // output hypercube have been incremented. So the outer incremented
       // dimension is N-ndim, so this is what we pass to Tiling::advance()
@@ -778,7 +855,7 @@ void Solver::fillEquations (const VellSet &vs)
 //  if( !num_equations_ )
 //  {
 //    cerr<<"No equations: "<<niter<<" points iterated, "<<nfill<<"fill calls\n";
-//    cerr<<"Invalid/converged fills:"<<num_invalid<<" "<<num_converged<<endl;
+//    cerr<<"Invalid/converged fills:"<<filler.num_invalid<<" "<<filler.num_converged<<endl;
 //  }
 }
 
@@ -975,18 +1052,12 @@ int Solver::getResult (Result::Ref &resref,
   // how many subsolvers need to converge
   need_conv_ = std::min(numSubsolvers(),int(ceil(numSubsolvers()*conv_quota_)));
   num_conv_ = 0;
-  // resize temporaries used in fillEquations()
-  sgd_.resize(numSolveGroups());
-  for( int i=0; i<numSolveGroups(); i++ )
-  {
-    sgd_[i].uk_index.resize(num_unknowns_);
-    sgd_[i].deriv_real.resize(num_unknowns_);
-    sgd_[i].deriv_imag.resize(num_unknowns_);
-  }
-  // ISO C++ won't allow a vector of Strides, hence this old-style kludge
-  if( strides_ )
-    delete [] strides_;
-  strides_ = new Vells::Strides[num_spids_+4];
+  // set up per-thread temporaries used in fillEquations()
+  initFillers();
+  // per-iteration timings of the accumulate, solve and update stages
+  std::vector<double> time_accumulate,time_accumulate_total,time_solve,time_update;
+  LOFAR::NSTimer accum_timer,solve_timer,update_timer;
+  const double cycles_to_sec = 1e-6/LOFAR::NSTimer::cpuSpeedInMHz();
   // OK, now create the "real" request object. This will be modified from
   // iteration to iteration, so we keep it attached to reqref and rely on COW
   reqref <<= new Request(request.cells());
@@ -1013,6 +1084,14 @@ int Solver::getResult (Result::Ref &resref,
     reqref().setId(rqid);
     reqref().setNextId(next_rqid);
     num_equations_ = 0;
+    for( uint i=0; i<fillers_.size(); i++ )
+    {
+      fillers_[i].num_equations = 0;
+      fillers_[i].timer.reset();
+    }
+    accum_timer.reset();
+    solve_timer.reset();
+    update_timer.reset();
     // start async child poll
     timers().getresult.stop();
     setExecState(CS_ES_POLLING);
@@ -1020,45 +1099,80 @@ int Solver::getResult (Result::Ref &resref,
     children().startAsyncPoll(*reqref,currentRequestDepth()+1);
     if( forest().abortFlag() )
       return RES_ABORT;
+    // with worker threads available, equations are filled by the workers
+    // (and by this thread, once all children have returned)
+    bool mt_fill = !worker_threads_.empty();
+    if( mt_fill )
+      activateFillWorkers();
     int rescode;
     Result::Ref child_res;
     int nch_returned=0;
     int nvs_returned=0;
     // wait for child results until all have been polled (await will return -1 when this is the case)
     std::list<Result::Ref> child_fails;  // any fails accumulated here
-    while( (cur_child_ = children().awaitChildResult(rescode,child_res,*reqref)) >= 0 )
+    try
     {
-      nch_returned++;
-      if( forest().abortFlag() )
-        return RES_ABORT;
-      // tell child to hold cache if it doesn't depend on iteration
-      children().getChild(cur_child_).holdCache(!(rescode&iter_depmask_));
-      // skip children with fails or missing data
-      if( rescode&(RES_FAIL|RES_MISSING|RES_WAIT) )
-        continue;
-      // has the child asked us to wait?
-      if( rescode&RES_WAIT )  // this never happens, so ok to return for now
-        return rescode;
-      // treat each vellset in the result independently
-      for( int ivs = 0; ivs < child_res->numVellSets(); ivs++ )
+      while( (cur_child_ = children().awaitChildResult(rescode,child_res,*reqref)) >= 0 )
       {
-        const VellSet &vs = child_res->vellSet(ivs);
-        // ignore failed or null vellsets
-        if( vs.isFail() || vs.isNull() )
+        nch_returned++;
+        if( forest().abortFlag() )
+          break;
+        // tell child to hold cache if it doesn't depend on iteration
+        children().getChild(cur_child_).holdCache(!(rescode&iter_depmask_));
+        // skip children with fails or missing data
+        if( rescode&(RES_FAIL|RES_MISSING|RES_WAIT) )
           continue;
-        nvs_returned++;
-        timers().getresult.start();
-        if( vs.getValue().isReal() )
-          fillEquations<double>(vs);
-        else
-          fillEquations<dcomplex>(vs);
-        timers().getresult.stop();
-      }
-    } // end of while loop over children
+        // treat each vellset in the result independently
+        for( int ivs = 0; ivs < child_res->numVellSets(); ivs++ )
+        {
+          const VellSet &vs = child_res->vellSet(ivs);
+          // ignore failed or null vellsets
+          if( vs.isFail() || vs.isNull() )
+            continue;
+          nvs_returned++;
+          if( mt_fill )
+          {
+            queueEquations(child_res,ivs,cur_child_);
+            continue;
+          }
+          timers().getresult.start();
+          accum_timer.start();
+          fillers_[0].timer.start();
+          if( vs.getValue().isReal() )
+            fillEquations<double>(fillers_[0],vs,cur_child_);
+          else
+            fillEquations<dcomplex>(fillers_[0],vs,cur_child_);
+          fillers_[0].timer.stop();
+          accum_timer.stop();
+          timers().getresult.stop();
+        }
+      } // end of while loop over children
+    }
+    catch( ... )
+    {
+      if( mt_fill )
+        finishFillWorkers(true);
+      throw;
+    }
     timers().children.stop();
     if( forest().abortFlag() )
+    {
+      if( mt_fill )
+        finishFillWorkers(true);
       return RES_ABORT;
+    }
     setExecState(CS_ES_EVALUATING);
+    // fill whatever is still queued, and wait for the workers to finish
+    if( mt_fill )
+    {
+      timers().getresult.start();
+      accum_timer.start();
+      finishFillWorkers();
+      accum_timer.stop();
+      timers().getresult.stop();
+    }
+    for( uint i=0; i<fillers_.size(); i++ )
+      num_equations_ += fillers_[i].num_equations;
     // **for debug purposes, count number of converged solvers
 //    int nc1=0;
 //    for( int i=0; i<numSubsolvers(); i++ )
@@ -1086,6 +1200,7 @@ int Solver::getResult (Result::Ref &resref,
     num_conv_ = 0;
     // call all subsolvers and count how many have converged
     // use mt solving if enabled, and if >1 subsolver has not yet converged
+    solve_timer.start();
     if( !worker_threads_.empty() && nremain > 1 )
     {
       num_conv_ = 0;
@@ -1096,11 +1211,13 @@ int Solver::getResult (Result::Ref &resref,
       for( int i=0; i<numSubsolvers(); i++ )
       {
         Subsolver &ss = subsolvers_[i];
+        mergeEquations(i);
         if( ss.solve(cur_iter_) )
           num_conv_++;
         cdebug(5)<<"subsolver "<<i<<" fit is "<<ss.fit<<", converged "<<ss.converged<<endl;
       }
     }
+    solve_timer.stop();
     cdebug(4)<<num_conv_<<" subsolvers have converged ("<<need_conv_<<" needed)\n";
     converged = num_conv_ >= need_conv_;
 //    nc1=0;
@@ -1109,11 +1226,23 @@ int Solver::getResult (Result::Ref &resref,
 //        nc1++;
 //    cerr<<rqid.toString()<<" iter "<<cur_iter_<<" end: "<<nc1<<" "<<num_conv_<<" subsolvers have converged\n";
     // collect incremental solutions
+    update_timer.start();
     for( int i=0; i<numSubsolvers(); i++ )
       subsolvers_[i].copySolutions(incr_solutions,cur_iter_);
     // fill in updates in request object
     fillRider(reqref,do_save_funklets_&&(converged || interrupt_ || (cur_iter_ >= max_num_iter_-1)),converged);
     //fillRider(reqref,do_save_funklets_,converged);
+    update_timer.stop();
+    // Timings, in seconds. The accumulate time is the wall time spent
+    // filling equations; the accumulate total adds up the time spent by
+    // every thread, so total/accumulate gives the effective parallelism.
+    double accum_total = 0;
+    for( uint i=0; i<fillers_.size(); i++ )
+      accum_total += fillers_[i].timer.totalTime();
+    time_accumulate.push_back(accum_timer.totalTime()*cycles_to_sec);
+    time_accumulate_total.push_back(accum_total*cycles_to_sec);
+    time_solve.push_back(solve_timer.totalTime()*cycles_to_sec);
+    time_update.push_back(update_timer.totalTime()*cycles_to_sec);
     // fill in metrics and debug info
     DMI::Vec * pmetvec = 0;
     if( metricsList.valid() )
@@ -1148,6 +1277,11 @@ int Solver::getResult (Result::Ref &resref,
       evrec[FRank] = sumrank;
       evrec[FFit] = sumfit/numSubsolvers();
       evrec[FChi0] = sumchi0/numSubsolvers();
+      DMI::Record &timing = evrec[FTiming].replace() <<= new DMI::Record;
+      timing[FAccumulate]      = time_accumulate.back();
+      timing[FAccumulateTotal] = time_accumulate_total.back();
+      timing[FSolve]           = time_solve.back();
+      timing[FUpdate]          = time_update.back();
       // attach more info with higher debug levels
       if( debug_lvl_ >= 1 && pmetvec )
         evrec[FMetrics] <<= pmetvec;
@@ -1156,7 +1290,14 @@ int Solver::getResult (Result::Ref &resref,
     }
     // stick metrics and debug records into solver result
     if( metricsList.valid() )
+    {
       solveResult()[FMetrics].replace() = metricsList;
+      DMI::Record &timing = solveResult()[FTiming].replace() <<= new DMI::Record;
+      timing[FAccumulate]      = time_accumulate;
+      timing[FAccumulateTotal] = time_accumulate_total;
+      timing[FSolve]           = time_solve;
+      timing[FUpdate]          = time_update;
+    }
     if( debugList.valid() )
       solveResult()[FDebug].replace() = debugList;
     // stick solver result into node state
@@ -1559,7 +1700,7 @@ void Solver::startWorkerThreads ()
   if( nt<2 )
     return;
   // start workers
-  wt_flush_tables_ = wt_solve_loop_ = false;
+  wt_flush_tables_ = wt_solve_loop_ = wt_fill_loop_ = false;
   wt_num_active_ = 0;
   cdebug(0)<<"starting "<<nt-1<<" worker threads\n";
   worker_threads_.resize(nt-1);
@@ -1607,7 +1748,6 @@ void Solver::activateSubsolverWorkers ()
 {
   // init queue and clear error list
   Thread::Mutex::Lock lock(worker_cond_);
-  Thread::Mutex::Lock lock1(worker_exit_cond_);
   cdebug(3)<<"T"<<Thread::self()<<" activating workers"<<endl;
   wt_num_ss_ = 0;
   wt_exceptions_.clear();
@@ -1619,26 +1759,118 @@ void Solver::activateSubsolverWorkers ()
   // go into our own loop to start processing subsolvers
   processSolversLoop(lock);
   lock.release();
-  // wait for worker threads to become inactive
-  bool active = true;
-  while( active )
+  waitForWorkers();
+  // if any exceptions have accumulated, throw them
+  if( !wt_exceptions_.empty() )
+    throw wt_exceptions_;
+}
+
+// Waits for all worker threads to become inactive
+void Solver::waitForWorkers ()
+{
+  Thread::Mutex::Lock lock(worker_exit_cond_);
+  while( true )
   {
-    worker_exit_cond_.wait();
-    // if amny thread is still active, flag will be re-raised
-    active = false;
+    bool active = false;
     for( uint i=0; i<wt_active_.size(); i++ )
       if( wt_active_[i] )
       {
         active = true;
         break;
       }
+    if( !active )
+      break;
+    worker_exit_cond_.wait();
   }
   cdebug(3)<<"T"<<Thread::self()<<" all workers finished"<<endl;
-  // if any exceptions have accumulated, throw them
-  if( !wt_exceptions_.empty() )
+}
+
+// Activates all worker threads to fill equations from the fill queue.
+void Solver::activateFillWorkers ()
+{
+  Thread::Mutex::Lock lock(worker_cond_);
+  cdebug(3)<<"T"<<Thread::self()<<" activating fill workers"<<endl;
+  fill_queue_.clear();
+  fill_queue_closed_ = false;
+  wt_exceptions_.clear();
+  wt_fill_loop_ = true;
+  wt_num_active_ = worker_threads_.size();
+  wt_active_.assign(wt_active_.size(),true);
+  worker_cond_.broadcast();
+}
+
+// Puts a VellSet on the fill queue, and wakes up a worker to process it
+void Solver::queueEquations (const Result::Ref &res,int ivs,int ichild)
+{
+  Thread::Mutex::Lock lock(worker_cond_);
+  FillJob job;
+  job.res = res;
+  job.ivs = ivs;
+  job.ichild = ichild;
+  fill_queue_.push_back(job);
+  worker_cond_.signal();
+}
+
+// Closes the fill queue, and processes whatever remains on it in this
+// thread too. Returns when all workers are done. Any exceptions generated
+// by the workers are rethrown from here, unless discard is true, in which
+// case the queue is cleared and the exceptions are ignored.
+void Solver::finishFillWorkers (bool discard)
+{
+  Thread::Mutex::Lock lock(worker_cond_);
+  if( discard )
+    fill_queue_.clear();
+  fill_queue_closed_ = true;
+  worker_cond_.broadcast();
+  if( !discard )
+    processFillLoop(lock,fillers_[0]);
+  wt_fill_loop_ = false;
+  lock.release();
+  waitForWorkers();
+  if( discard )
+    wt_exceptions_.clear();
+  else if( !wt_exceptions_.empty() )
     throw wt_exceptions_;
 }
 
+// Fills equations from queued VellSets until the queue is closed and
+// empty. On entry, lock is a lock on worker_cond_.
+void Solver::processFillLoop (Thread::Mutex::Lock &lock,EquationFiller &filler)
+{
+  cdebug(3)<<"T"<<Thread::self()<<" fill loop started"<<endl;
+  while( true )
+  {
+    while( fill_queue_.empty() && !fill_queue_closed_ )
+      worker_cond_.wait();
+    if( fill_queue_.empty() )
+      break;
+    FillJob job = fill_queue_.front();
+    fill_queue_.pop_front();
+    // release lock while filling
+    lock.release();
+    filler.timer.start();
+    try
+    {
+      const VellSet &vs = job.res->vellSet(job.ivs);
+      if( vs.getValue().isReal() )
+        fillEquations<double>(filler,vs,job.ichild);
+      else
+        fillEquations<dcomplex>(filler,vs,job.ichild);
+      filler.timer.stop();
+    }
+    catch( std::exception &exc )
+    {
+      filler.timer.stop();
+      lock.lock(worker_cond_);
+      wt_exceptions_.add(exc);
+      continue;
+    }
+    // relock worker_cond_
+    lock.lock(worker_cond_);
+  }
+  cdebug(3)<<"T"<<Thread::self()<<" fill loop finished"<<endl;
+}
+
 // If a worker thread is available, wakes it up to flush parm tables
 // Otherwise flushes table directly in here.
 void Solver::flushTablesInWorkerThread ()
@@ -1673,7 +1905,8 @@ void Solver::processSolversLoop (Thread::Mutex::Lock &lock)
     // it on the inside, when we go to process a subsolver
     // grab a non-converged subsolver
     cdebug(3)<<"T"<<Thread::self()<<" grabbing subsolver "<<wt_num_ss_<<endl;
-    Subsolver &ss = subsolvers_[wt_num_ss_++];
+    int iss = wt_num_ss_++;
+    Subsolver &ss = subsolvers_[iss];
     // if solver is converged, grab the next one (but do clear its solution vector)
     if( ss.converged )
     {
@@ -1688,6 +1921,7 @@ void Solver::processSolversLoop (Thread::Mutex::Lock &lock)
     bool converged = false;
     try
     {
+      mergeEquations(iss);
       converged = ss.solve(cur_iter_);
     }
     // break out on error
@@ -1715,8 +1949,8 @@ void * Solver::workerLoop (int wt_num)
   Thread::Mutex::Lock lock(worker_cond_);
   while( true )
   {
-    // wait on condition variable until awoken with active subsolvers,
-    // or with worker threads being stopped
+    // wait on condition variable until awoken with active subsolvers
+    // or equations to fill, or with worker threads being stopped
     while( mt_solve_ && !wt_active_[wt_num] && !wt_flush_tables_ )
       worker_cond_.wait();
     // stop condition
@@ -1733,6 +1967,9 @@ void * Solver::workerLoop (int wt_num)
     // do a solving loop
     if( wt_solve_loop_ )
       processSolversLoop(lock);
+    // or a loop filling equations
+    else if( wt_fill_loop_ && wt_active_[wt_num] )
+      processFillLoop(lock,fillers_[wt_num+1]);
     if( wt_active_[wt_num] )
     {
       // release lock, lock exit condition variable, mark ourselves as inactive
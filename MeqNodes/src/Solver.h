@@ -29,6 +29,7 @@
 #include <casacore/scimath/Fitting/LSQaips.h>
 #include <TimBase/BlitzToAips.h>
 #include <set>
+#include <deque>
 
 #pragma types #Meq::Solver
 
@@ -36,7 +37,7 @@
 #pragma aid Converged Array Convergence Quota Tiling Tilings Super Size Stride
 #pragma aid Total SS Uk Unknown Unknowns Spid Set Stride Map Colin LM Factor MT
 #pragma aid Begin End Deriv Balanced Equations Ready String
-#pragma aid Debug File Interrupt Solution Flush Tables
+#pragma aid Debug File Interrupt Solution Flush Tables Timing Accumulate
 
 // The comments below are used to automatically generate a default
 // init-record for the class
@@ -129,11 +130,13 @@ private:
   // SpidMap) from a spidmap record returned by spid discovery.
   int populateSpidMap (const DMI::Record &spidmap_rec,const Cells &cells);
 
-  // this method is called from getResult() to fill solver equations
-  // from the given VellSet. Templated because double and dcomplex values
-  // are treated differently.
+  class EquationFiller;
+
+  // this method is called from getResult() (or a worker thread) to fill
+  // solver equations from the given VellSet of child #ichild. Templated
+  // because double and dcomplex values are treated differently.
   template<typename T>
-  void fillEquations (const VellSet &vs);
+  void fillEquations (EquationFiller &filler,const VellSet &vs,int ichild);
 
   // this method is called from getResult() to fill in a request rider
   // using the current solution
@@ -185,7 +188,7 @@ private:
 
   int             cur_iter_;    // current iteration
 
-  // # of child whose result is currently being processed
+  // # of child whose result is currently being received
   int cur_child_;
 
   typedef VellSet::SpidType SpidType;
@@ -262,6 +265,7 @@ private:
       DimVector        tile_size;     // tile size per axis       (0 if axis not defined)
       DimVector        tile_stride;   // tile stride per axis (how many tiles to skip when going to next tile along this axis, 0 if not defined)
       int              total_tiles;   // total number of tiles
+      int              index;         // index of tiling in tilings_ (see EquationFiller)
 
       // these data members change as we advance over a hypercube
       DimVector        dimcount;      // dimension counter, updated during equation filling
@@ -275,11 +279,12 @@ private:
       std::vector<int> super_tile;
 
       Tiling ()
-      : total_tiles(0)
+      : total_tiles(0),index(0)
       {};
 
       // creates a tiling for the given tile sizes and the given hypercube shape
       Tiling (const DimVector &tsz,const DimVector &shape)
+      : index(0)
       { init(tsz,shape); }
 
       // initializes, given tile sizes and hypercube shape
@@ -422,8 +427,8 @@ private:
 
   ParmUkMap parm_uks_;
 
-  // temporary arrays used when filling equations, we keep them here
-  // as members for convenience, and to minimize reallocations
+  // temporary arrays used when filling equations, we keep them in the
+  // EquationFiller for convenience, and to minimize reallocations
   typedef struct
   {
     int nderiv;
@@ -432,9 +437,42 @@ private:
     std::vector<int> uk_index;
   }
   SolveGroupData;
-  std::vector<SolveGroupData> sgd_;
 
-  Vells::Strides      *strides_;
+  // Per-thread state for filling equations. Filler 0 belongs to the node's
+  // own thread and adds equations to the subsolvers directly. Every worker
+  // thread has a filler of its own, which adds equations to partial normal
+  // equations per subsolver. These are merged into the subsolvers by
+  // mergeEquations() before solving.
+  class EquationFiller
+  {
+    public:
+      bool direct;                        // add equations to subsolvers directly
+      std::vector<SolveGroupData> sgd;    // temporaries per solve group
+      std::vector<int> strides_data;      // space for num_spids_+4 Vells::Strides
+      std::vector<Tiling> tilings;        // own copies of tilings_, by Tiling::index
+      std::vector<casacore::LSQFit> partial; // partial equations per subsolver
+      std::vector<int> neq;               // # of equations in partial
+      int num_equations;                  // # of equations added this iteration
+      int num_invalid;                    // # of equations omitted (NANs or INFs)
+      int num_converged;                  // # of equations for converged subsolvers
+      LOFAR::NSTimer timer;               // time spent filling this iteration
+
+      // ISO C++ won't allow a vector of Strides, hence this kludge
+      Vells::Strides * strides ()
+      { return reinterpret_cast<Vells::Strides*>(&strides_data[0]); }
+  };
+
+  std::vector<EquationFiller> fillers_;
+
+  // sets up one filler per thread, called at the start of a solution
+  void initFillers ();
+
+  // returns LSQ object to which a filler adds equations for subsolver iss,
+  // and counts neq equations against that subsolver
+  casacore::LSQFit & equationSink (EquationFiller &filler,int iss,int neq);
+
+  // merges partial equations of all fillers into subsolver iss
+  void mergeEquations (int iss);
 
   int numSolveGroups () const
   { return solvegroups_.size(); }
@@ -451,11 +489,14 @@ private:
   // Returns subsolver associated with given tile and subgroup
   // Caller can assume that subsolvers for subsequent tiles are adjacent.
   Subsolver * psubsolver (int itile,int solvegroup)
-  { return &(subsolvers_[solvegroup*numSubtiles() + itile]); }
+  { return &(subsolvers_[subsolverIndex(itile,solvegroup)]); }
+
+  int subsolverIndex (int itile,int solvegroup) const
+  { return solvegroup*numSubtiles() + itile; }
 
   // helper function for fillEquations() to fill a particular subsolver
   template<typename T>
-  inline void fillEqVectors (int itile,int npert,SpidInfo *pspi[],
+  inline void fillEqVectors (EquationFiller &filler,int itile,int npert,SpidInfo *pspi[],
         const T &diff,const std::vector<Vells::ConstStridedIterator<T> > &deriv_iter,
         double weight);
 
@@ -486,12 +527,41 @@ private:
   // activates a worker thread to flush parm tables
   void flushTablesInWorkerThread ();
 
+  // Equations can be filled by worker threads while child results are
+  // still coming in. activateFillWorkers() wakes up all workers, and
+  // queueEquations() queues a VellSet for them. finishFillWorkers()
+  // fills what remains on the queue in this thread, waits for the workers
+  // to finish, and rethrows any exceptions they raised. If discard is true,
+  // the queue is cleared instead.
+  void activateFillWorkers ();
+  void queueEquations (const Result::Ref &res,int ivs,int ichild);
+  void finishFillWorkers (bool discard=false);
+
+  // Fills equations from the queue in a loop, until the queue is empty and
+  // closed. Lock is a lock on worker_cond_, must be held when calling this
+  // function (and will also be held when it returns).
+  void processFillLoop (Thread::Mutex::Lock &lock,EquationFiller &filler);
+
+  // waits for all workers to become inactive
+  void waitForWorkers ();
+
+  // queued VellSets, given as result, vellset # and child #
+  typedef struct
+  {
+    Result::Ref res;
+    int ivs;
+    int ichild;
+  } FillJob;
+  std::deque<FillJob> fill_queue_;
+  bool fill_queue_closed_;  // flag: nothing more will be queued
+
 
   int wt_num_ss_;         // number of subsolvers taken by workers
 
     // condition var to signal worker threads to wake up
   Thread::Condition worker_cond_;
   bool wt_solve_loop_;    // flag: worker was woken to call processSolversLoop()
+  bool wt_fill_loop_;     // flag: worker was woken to call processFillLoop()
   bool wt_flush_tables_;  // flag: worker was woken to call ParmTableUtils::flushTables();
 
   // structure of per-worker-thread info, passed during Thread::create()
@@ -512,11 +582,6 @@ private:
   //for writing debug output
   std::string debug_filename_;
   bool write_debug_;
-
-
-  // added these during debugging
-  int num_invalid;
-  int num_converged;
 };
 
 
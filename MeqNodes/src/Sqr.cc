@@ -31,7 +31,10 @@ namespace Meq {
 
 //##ModelId=400E5355027D
 Sqr::Sqr()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E5355027E
 Sqr::~Sqr()
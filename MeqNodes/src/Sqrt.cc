@@ -31,7 +31,10 @@ namespace Meq {
 
 //##ModelId=400E5355028C
 Sqrt::Sqrt()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E5355028D
 Sqrt::~Sqrt()
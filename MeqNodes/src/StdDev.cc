@@ -31,6 +31,7 @@ namespace Meq {
 StdDev::StdDev()
  : ReductionFunction(1)
 {
+  allowSharedResults();
 }
 
 StdDev::~StdDev()
@@ -29,7 +29,10 @@ namespace Meq {
 //##ModelId=400E5355029C
 Subtract::Subtract()
  : Function(-2) // at least one child expected
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E5355029D
 Subtract::~Subtract()
@@ -28,11 +28,33 @@ using namespace Meq::VellsMath;
 
 namespace Meq {    
 
+void Sum::setStateImpl (DMI::Record::Ref &rec,bool initializing)
+{
+  ReductionFunction::setStateImpl(rec,initializing);
+  // only factors can be summed over as a group
+  FailWhen(numChildren()!=1 && !isFactored(),"exactly one child expected, unless factor_oper is set");
+}
 
 //##ModelId=400E53550246
 Vells Sum::evaluate (const Request&,const LoShape &shape,
 		     const vector<const Vells*>& values)
 {
+  // if children are factors, reduce their product (or sum)
+  if( isFactored() )
+  {
+    FactoredVells fv(FactoredVells::Operation(factor_oper_));
+    makeFactors(fv,values);
+    // flagged points have to be skipped, so expand the operand
+    if( fv.hasDataFlags() )
+    {
+      Vells operand = fv.expand();
+      if( hasReductionAxes() )
+        return apply(VellsMath::sum,operand,shape,VellsFullFlagMask);
+      else
+        return sum(operand,shape,VellsFullFlagMask);
+    }
+    return fv.sum(reduction_axes_,shape);
+  }
   Assert( values.size() == 1 );
   if( hasReductionAxes() )  // reduce along axes 
     return apply(VellsMath::sum,*values[0],shape,flagmask_[0]);
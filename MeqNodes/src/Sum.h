@@ -35,9 +35,10 @@ namespace Meq {
 class Sum : public ReductionFunction
 {
 public:
+  // a single child, unless factor_oper is set
   Sum ()
-    : ReductionFunction(1)
-  {}
+    : ReductionFunction(-1)
+  { allowSharedResults(); }
 
   virtual TypeId objectType() const
   { return TpMeqSum; }
@@ -46,6 +47,9 @@ public:
   virtual Vells evaluate (const Request&,const LoShape &,
 	                  		  const vector<const Vells*>& values);
   
+protected:
+  // checks that there is a single child, unless factor_oper is set
+  virtual void setStateImpl (DMI::Record::Ref &rec,bool initializing);
 };
 
 
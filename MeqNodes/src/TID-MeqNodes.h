@@ -692,6 +692,25 @@ namespace Meq { class Functional; };
               };
             };
 #endif
+#ifndef _defined_id_TpMeqFusedFunction
+#define _defined_id_TpMeqFusedFunction 1
+const DMI::TypeId TpMeqFusedFunction(-1790);      // from FusedFunction.h:31
+const int TpMeqFusedFunction_int = -1790;
+namespace Meq { class FusedFunction; };
+            namespace DMI {
+              template<>
+              class DMIBaseTypeTraits<Meq::FusedFunction> : public TypeTraits<Meq::FusedFunction>
+              {
+                public:
+                enum { isContainable = true };
+                enum { typeId = TpMeqFusedFunction_int };
+                enum { TypeCategory = TypeCategories::DYNAMIC };
+                enum { ParamByRef = true, ReturnByRef = true };
+                typedef const Meq::FusedFunction & ContainerReturnType;
+                typedef const Meq::FusedFunction & ContainerParamType;
+              };
+            };
+#endif
 #ifndef _defined_id_TpMeqGaussNoise
 #define _defined_id_TpMeqGaussNoise 1
 const DMI::TypeId TpMeqGaussNoise(-1449);         // from /home/oms/LOFAR/Timba/MeqNodes/src/GaussNoise.h:31
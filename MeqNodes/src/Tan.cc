@@ -30,7 +30,10 @@ namespace Meq {
 
 //##ModelId=400E53550241
 Tan::Tan()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E53550242
 Tan::~Tan()
@@ -30,7 +30,10 @@ namespace Meq {
 
 //##ModelId=400E53550241
 Tanh::Tanh()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E53550242
 Tanh::~Tanh()
@@ -31,7 +31,10 @@ namespace Meq {
 
 //##ModelId=400E535502BF
 ToComplex::ToComplex()
-{}
+{
+  allowInPlace();
+  allowSharedResults();
+}
 
 //##ModelId=400E535502C0
 ToComplex::~ToComplex()
@@ -25,10 +25,12 @@
 
 namespace Meq {    
 
+const HIID FFactorGroupSize = AidFactor|AidGroup|AidSize;
 
 //##ModelId=3F86886E028F
 WSum::WSum()
-  : weights(1,1.)
+  : weights(1,1.),
+    factor_group_size(1)
 {
 }
 
@@ -40,25 +42,39 @@ void WSum::setStateImpl (DMI::Record::Ref &rec,bool initializing)
 {
   Function::setStateImpl(rec,initializing);
   
+  bool changed = false;
+  if( rec[FFactorGroupSize].get(factor_group_size,initializing) )
+  {
+    if( factor_group_size < 1 || numChildren()%factor_group_size )
+      NodeThrow1(FFactorGroupSize.toString()+" must divide the number of children");
+    changed = true;
+  }
   if( rec[FWeights].get_vector(weights) )
   {
     // empty vector -- use [1.]
     if( weights.empty() )
       weights.resize(1,1.);
-    
-    // ensure we have same # of weights as children, fill in 0. for missing weights
-    if( weights.size() > 1 )
-    {
-      weights.resize(numChildren(),0.0);
-      // disable children with 0 weight
-      for( int i=0; i<numChildren(); i++ )
-        children().enableChild(i,weights[i]!=0.);
-    }
-    else // single weight given, enable all children
-    {
-      for( int i=0; i<numChildren(); i++ )
-        children().enableChild(i);
-    }
+    changed = true;
+  }
+  if( changed )
+    enableChildren();
+}
+
+void WSum::enableChildren ()
+{
+  int nterms = numChildren()/factor_group_size;
+  // ensure we have same # of weights as terms, fill in 0. for missing weights
+  if( weights.size() > 1 )
+  {
+    weights.resize(nterms,0.0);
+    // disable children of terms with 0 weight
+    for( int i=0; i<numChildren(); i++ )
+      children().enableChild(i,weights[i/factor_group_size]!=0.);
+  }
+  else // single weight given, enable all children
+  {
+    for( int i=0; i<numChildren(); i++ )
+      children().enableChild(i);
   }
 }
 
@@ -71,6 +87,26 @@ Vells WSum::evaluate (const Request& req, const LoShape& shape,
   if( values.empty() || nrw<=0 )
     return Vells(0.);
   
+  // products of factors: expand and accumulate one term at a time
+  if( factor_group_size > 1 )
+  {
+    Vells result(0.);
+    int nterms = values.size()/factor_group_size;
+    for( int i=0; i<nterms; i++ )
+    {
+      double w = allsame ? weights[0] : weights[i];
+      if( w == 0. )
+        continue;
+      FactoredVells term;
+      for( int j=0; j<factor_group_size; j++ )
+        if( values[i*factor_group_size+j] )
+          term.add(*values[i*factor_group_size+j]);
+      if( term.numFactors() )
+        result += term.expand(w);
+    }
+    return result;
+  }
+  
   Vells result;
   if( weights[0] != 0. )
     result = (*values[0])*weights[0];
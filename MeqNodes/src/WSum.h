@@ -26,11 +26,12 @@
     
 #include <MEQ/Function.h>
 #include <MEQ/MeqVocabulary.h>
+#include <MEQ/FactoredVells.h>
 
 #include <MeqNodes/TID-MeqNodes.h>
 #pragma aidgroup MeqNodes
 #pragma types #Meq::WSum
-#pragma aid Weights
+#pragma aid Weights Factor Group Size
 
 
 namespace Meq {    
@@ -59,9 +60,16 @@ protected:
   virtual Vells evaluate (const Request&, const LoShape&,
                           const vector<const Vells*>& values);
 
+  // enables or disables children according to their weights
+  void enableChildren ();
                          
   std::vector<double> weights;
 
+  // if >1, children are taken in consecutive groups of this size, and the
+  // weighted terms are the products of each group. Products are expanded 
+  // one term at a time, so the full products are never held all at once.
+  int factor_group_size;
+
 };
 
 
@@ -121,7 +121,7 @@ const int AppState_Debug   = -( AidDebug.id() );
 
 //##ModelId=3F5F195E0140
 MeqServer::MeqServer()
-    : forest_serial(1)
+    : batch_created_(0),forest_serial(1)
 {
   if( mqs_ )
     Throw1("A singleton MeqServer has already been created");
@@ -333,13 +333,23 @@ void MeqServer::createNode (DMI::Record::Ref &out,DMI::Record::Ref &initrec)
   out[FForestChanged] = incrementForestSerial();
 }
 
+// A forest may be sent in one batch, or streamed as a number of chunks.
+// In the latter case, every chunk but the last has init=F, and the nodes
+// are only initialized once the last chunk (init=T) has been received.
+// The optional total field gives the number of nodes in the whole stream,
+// and is used to report progress.
 void MeqServer::createNodeBatch (DMI::Record::Ref &out,DMI::Record::Ref &in)
 {
   setState(AidConstructing);
   script_name_ = in[AidScript|AidName].as<string>("");
   DMI::Container &batch = in[AidBatch].as_wr<DMI::Container>();
   int nn = batch.size();
-  postMessage(ssprintf("creating %d nodes, please wait",nn));
+  bool init = in[AidInit].as<bool>(true);
+  int total = in[AidTotal].as<int>(0);
+  if( total )
+    postMessage(ssprintf("creating nodes %d to %d of %d",batch_created_+1,batch_created_+nn,total));
+  else
+    postMessage(ssprintf("creating %d nodes, please wait",nn));
   cdebug(2)<<"batch-creating "<<nn<<" nodes";
   for( int i=0; i<nn; i++ )
   {
@@ -357,6 +367,15 @@ void MeqServer::createNodeBatch (DMI::Record::Ref &out,DMI::Record::Ref &in)
       postError(exc);
     }
   }
+  batch_created_ += nn;
+  // more chunks to come? Then we're done for now
+  if( !init )
+  {
+    out[AidMessage] = ssprintf("created %d nodes so far",batch_created_);
+    return;
+  }
+  nn = batch_created_;
+  batch_created_ = 0;
   // if no errors, initialize
   if( !forest.numInitErrors() )
   {
@@ -379,7 +398,28 @@ void MeqServer::createNodeBatch_Mpi (DMI::Record::Ref &out,DMI::Record::Ref &in)
 {
   setState(AidConstructing);
   script_name_ = in[AidScript|AidName].as<string>("");
-  DMI::Container &batch = in[AidBatch].as_wr<DMI::Container>();
+  DMI::Container *pbatch = &( in[AidBatch].as_wr<DMI::Container>() );
+  // remote processors create and initialize their nodes in one go, so
+  // the chunks of a streamed batch are collected until the last one arrives
+  bool init = in[AidInit].as<bool>(true);
+  if( !init || pending_batch_.valid() )
+  {
+    if( !pending_batch_.valid() )
+      pending_batch_ <<= new DMI::List;
+    for( int i=0; i<pbatch->size(); i++ )
+    {
+      ObjRef ref;
+      (*pbatch)[i].detach(&ref);
+      pending_batch_().addBack(ref);
+    }
+    if( !init )
+    {
+      out[AidMessage] = ssprintf("received %d nodes so far",pending_batch_->size());
+      return;
+    }
+    pbatch = pending_batch_.dewr_p();
+  }
+  DMI::Container &batch = *pbatch;
   int nn = batch.size();
   postMessage(ssprintf("creating %d nodes, please wait",nn));
   cdebug(2)<<"splitting up nodes among MPI processors"<<endl;
@@ -452,6 +492,7 @@ void MeqServer::createNodeBatch_Mpi (DMI::Record::Ref &out,DMI::Record::Ref &in)
   ObjRef ref;
   for( int i=1; i<nproc; i++ )
     replies[i].await(ref);
+  pending_batch_.detach();
   // form a response message
   out[AidMessage] = ssprintf("created %d nodes",nn);
   out[FForestChanged] = incrementForestSerial();
@@ -1242,7 +1283,7 @@ DMI::Record::Ref MeqServer::executeCommand (const HIID &cmdid,DMI::Record::Ref &
     int sz = exec_queue_.size();
     exec_queue_.push_back(qe);
     exec_cond_.broadcast();
-    if( sz && post_results )
+    if( sz && post_results && !qe.silent )
       postMessage(ssprintf("queueing %s command (%d)",cmdid.toString('.').c_str(),sz));
     lock.release();
     // return empty result
@@ -27,6 +27,7 @@
 #define MEQSERVER_SRC_MEQSERVER_H_HEADER_INCLUDED_D338579D
  
 #include <DMI/Events.h>
+#include <DMI/List.h>
 #include <MEQ/Forest.h>
 #include <AppAgent/EventChannel.h>
 #include <MeqServer/AID-MeqServer.h>
@@ -228,6 +229,13 @@ class MeqServer : public DMI::EventRecepient
     
     // current script name
     string script_name_;
+    
+    // number of nodes created so far by a streamed Create.Node.Batch
+    int batch_created_;
+    #ifdef HAVE_MPI
+    // node specs collected from a streamed Create.Node.Batch (MPI only)
+    DMI::List::Ref pending_batch_;
+    #endif
     // current session name
     string session_name_;
     
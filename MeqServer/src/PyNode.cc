@@ -127,10 +127,12 @@ int PyNodeImpl::getResult (Result::Ref &resref,
   PyObjectRef args_tuple = PyTuple_New(childres.size()+1);
   // convert request
   PyTuple_SET_ITEM(*args_tuple,0,convertRequest(request)); // SET_ITEM steals the new ref
-  // add child results
+  // add child results. Values are passed as read-only views of the C++
+  // data, so that Python code can't modify cached results
   for( uint i=0; i<childres.size(); i++ )
   {
-    PyObjectRef chres = OctoPython::pyFromDMI(*childres[i],OctoPython::FL_SHAREDATA);
+    PyObjectRef chres = OctoPython::pyFromDMI(*childres[i],
+                          OctoPython::FL_SHAREDATA|OctoPython::FL_READONLY);
     PyTuple_SET_ITEM(*args_tuple,i+1,chres.steal()); // SET_ITEM steals our ref
   }
   // call get_result() method
@@ -139,6 +141,8 @@ int PyNodeImpl::getResult (Result::Ref &resref,
   // else extract return value
   // by default we treat retval as a Result object
   PyObject * pyobj_result = *retval;
+  // references to the result held by us (via retval), see below
+  int result_refs = 1;
   // ...but it can also be a tuple of (Result,retcode)...
   if( PySequence_Check(*retval) && !PyMapping_Check(*retval) )
   {
@@ -146,15 +150,18 @@ int PyNodeImpl::getResult (Result::Ref &resref,
       Throw("Python-side get_result() returned an ill-formed value");
     PyFailWhen(!PyArg_ParseTuple(*retval,"(Oi)",&pyobj_result,&retcode),
                 "Python-side get_result() returned an ill-formed value");
+    result_refs = Py_REFCNT(*retval) == 1 ? 1 : 0;
   }
   // None corresponds to empty result
   if( pyobj_result == Py_None )
     resref <<= new Result;
-  // ...else convert to result object
+  // ...else convert to result object. If the Python side kept no
+  // references to the result, arrays in it created with meq.vells() 
+  // are handed over without a copy
   else
   {
     ObjRef objref;
-    OctoPython::pyToDMI(objref,pyobj_result);
+    OctoPython::pyToDMI(objref,pyobj_result,TypeId(0),0,0,result_refs);
     FailWhen(!objref || objref->objectType() != TpMeqResult,
         "Python-side get_result() did not return a valid Result object");
     resref = objref;
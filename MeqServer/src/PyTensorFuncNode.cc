@@ -162,6 +162,8 @@ void PyTensorFuncImpl::setStateImpl (DMI::Record::Ref &rec,bool initializing)
 PyTensorFuncNode::PyTensorFuncNode()
  : impl_(this)
 {
+  // python code may keep state of its own, so results are not shared
+  shareable_results_ = false;
 }
 
 PyTensorFuncNode::~PyTensorFuncNode()
@@ -44,6 +44,11 @@ class PyNode (object):
   """Base class for implementing PyNodes. This class runs on the
   kernel side. Provides interface to the C++ node object, plus various
   helpful methods.
+  Child results are passed to get_result() with their values as read-only
+  views of the C++ data, so that cached results can't be modified; copy 
+  a value before changing it. Such views, and arrays created with 
+  meq.vells() that are not referenced elsewhere, are returned to C++ 
+  without a copy.
   """;
   def __init__ (self,name,node_baton):
     from Timba import meqserver_interface
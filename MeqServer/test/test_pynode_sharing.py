@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# standard preamble
+#
+#% $Id$
+#
+#
+# Copyright (C) 2002-2007
+# The MeqTree Foundation &
+# ASTRON (Netherlands Foundation for Research in Astronomy)
+# P.O.Box 2, 7990 AA Dwingeloo, The Netherlands
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>,
+# or write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+# Benchmarks the passing of large complex tiles through PyNodes.
+# Child values reach get_result() as read-only views of the C++ data. A
+# PyNode that returns such a view, or a new array created with meq.vells(),
+# hands it to C++ without a copy, while one that returns a private numpy
+# copy goes through the copying path.
+#
+# Run via: meqtree-pipeliner.py test_pynode_sharing.py =_tdl_job_bench
+
+from Timba.TDL import *
+from Timba import pynode
+from Timba.Meq import meq
+
+import numpy
+import time
+
+Settings.forest_state.cache_policy = 1;
+
+TDLCompileOption("num_time","Number of timeslots per tile",[1000,5000,10000],more=int);
+TDLCompileOption("num_freq","Number of channels per tile",[256,1024,4096],more=int);
+TDLCompileOption("num_tiles","Number of tiles",[10,100],more=int);
+
+class PySharedPassThrough (pynode.PyNode):
+  """returns the child's value as is: shared in both directions""";
+  def get_result (self,request,child):
+    value = child.vellsets[0].value;
+    return meq.result(meq.vellset(value),request.cells);
+
+class PyVellsScale (pynode.PyNode):
+  """returns twice the child's value in a new meq.vells(): handed over
+  without a copy""";
+  def get_result (self,request,child):
+    value = child.vellsets[0].value;
+    out = meq.complex_vells(value.shape);
+    numpy.multiply(value,2,out=out);
+    return meq.result(meq.vellset(out),request.cells);
+
+class PyCopyPassThrough (pynode.PyNode):
+  """returns a private copy of the child's value: copied on the way back""";
+  def get_result (self,request,child):
+    value = numpy.array(child.vellsets[0].value).view(type(child.vellsets[0].value));
+    return meq.result(meq.vellset(value),request.cells);
+
+def _define_forest (ns,**kwargs):
+  # a complex time-freq tile
+  ns.vis << Meq.ToComplex(Meq.Time,Meq.Freq);
+  ns.shared << PySharedPassThrough.Node(children=[ns.vis]);
+  ns.scaled << PyVellsScale.Node(children=[ns.vis]);
+  ns.copied << PyCopyPassThrough.Node(children=[ns.vis]);
+
+def _run (mqs,node):
+  domain = meq.gen_domain(time=[0,num_time],freq=[1e+8,1.1e+8]);
+  cells = meq.gen_cells(domain,num_time=num_time,num_freq=num_freq);
+  t0 = time.time();
+  for i in range(num_tiles):
+    request = meq.request(cells,rqtype='ev',rqid=meq.requestid(domain_id=i));
+    mqs.execute(node,request,wait=True);
+  return (time.time()-t0)/num_tiles;
+
+def _tdl_job_bench (mqs,parent,**kw):
+  nbytes = num_time*num_freq*16;
+  print("=== %dx%d complex tiles (%.1f MB each), %d tiles"%(num_time,num_freq,nbytes/1e+6,num_tiles));
+  dt_copy = _run(mqs,'copied');
+  dt_shared = _run(mqs,'shared');
+  dt_scaled = _run(mqs,'scaled');
+  print("=== copying path: %.3fs per tile"%dt_copy);
+  print("=== sharing path: %.3fs per tile"%dt_shared);
+  print("=== new meq.vells(): %.3fs per tile"%dt_scaled);
+
+if __name__ == '__main__':
+  ns = NodeScope();
+  _define_forest(ns);
+  # resolves nodes
+  ns.Resolve();
@@ -195,13 +195,51 @@ static Base * createSubclass (PyObject *pyobj)
   return pbase;
 }
 
+// -----------------------------------------------------------------------
+// Exclusive ownership
+// Writable arrays backed by a DMI block can be handed over to C++ without
+// a copy only if no other Python object can reach them. Callers of the
+// pyToXXX() functions pass in the number of references to the object that
+// they hold (owner_refs); the object is exclusively owned if it has no 
+// others. Items of an exclusively owned container are fetched as new refs,
+// so they are exclusively owned if they have exactly ItemRefs references.
+// -----------------------------------------------------------------------
+static const int ItemRefs = 2;
+
+static inline bool isOwned (PyObject *obj,int owner_refs)
+{
+  return owner_refs && Py_REFCNT(obj) == owner_refs;
+}
+
 // -----------------------------------------------------------------------
 // pyToRecord
 // -----------------------------------------------------------------------
-int pyToRecord (DMI::Record::Ref &rec,PyObject *pyobj)
+// dmi.records only check the contents of their list and tuple fields
+// when validate() is called. This is done here, for the outermost record
+// being converted (validate() itself descends into nested records).
+// The GIL is held throughout, so a plain counter is enough to tell
+// outermost from nested records.
+static int record_depth = 0;
+
+class RecordDepth
+{
+  public:
+    RecordDepth ()  { record_depth++; }
+    ~RecordDepth () { record_depth--; }
+};
+
+int pyToRecord (DMI::Record::Ref &rec,PyObject *pyobj,int owner_refs)
 {
   string objstr = 
       Debug(3) ? "PyToRecord("+ObjStr(pyobj)+"): " : string();
+  if( !record_depth && PyObject_HasAttrString(pyobj,"validate") )
+  {
+    PyObjectRef res = PyObject_CallMethod(pyobj,const_cast<char*>("validate"),NULL); // new ref
+    if( !res )
+      throwErrorOpt(Type,"record failed to validate");
+  }
+  RecordDepth depth;
+  int item_refs = isOwned(pyobj,owner_refs) ? ItemRefs : 0;
   int num_original = PyMapping_Length(pyobj);
   int num_assigned = 0;
   cdebug(3)<<objstr<<"converting mapping of "<<num_original<<" items\n";
@@ -235,8 +273,13 @@ int pyToRecord (DMI::Record::Ref &rec,PyObject *pyobj)
       cdebug(4)<<objstr<<"skipping key " <<keystr<<" ("<<ikey<<"): not a HIID"<<endl;
       continue;
     }
-    // attempt to convert value to DMI object
-    PyObjectRef pyval = PyMapping_GetItemString(pyobj,const_cast<char*>(keystr.c_str())); // new ref
+    // attempt to convert value to DMI object. For dicts, look at the
+    // raw value so that unresolved lazy refs are passed on as is
+    PyObjectRef pyval;
+    if( PyDict_Check(pyobj) )
+      pyval << PyDict_GetItem(pyobj,*py_key); // borrowed ref
+    else
+      pyval = PyMapping_GetItemString(pyobj,const_cast<char*>(keystr.c_str())); // new ref
     if( !pyval )
     {
       cdebug(4)<<objstr<<"skipping key " <<keystr<<" ("<<ikey<<"): failed to get value"<<endl;
@@ -247,7 +290,7 @@ int pyToRecord (DMI::Record::Ref &rec,PyObject *pyobj)
     ObjRef ref;
     try 
     { 
-      pyToDMI(ref,*pyval); 
+      pyToDMI(ref,*pyval,TypeId(0),0,0,item_refs); 
       rec().add(id,ref,DMI::REPLACE);
       cdebug(4)<<objstr<<"assigned value for key " <<keystr<<" ("<<ikey<<")\n";
       num_assigned++;
@@ -301,11 +344,83 @@ static int typeIdToNumarray (TypeId tid)
   }
 }
 
+// -----------------------------------------------------------------------
+// Shared array data
+// NumPy arrays that view the data block of a DMI::NumArray get a capsule
+// holding a ref to the block installed as their base object. This keeps
+// the data alive for as long as any view exists, and makes the block
+// copy-on-write on the C++ side. Such arrays are converted back into 
+// NumArrays by attaching to the block rather than copying the data.
+// -----------------------------------------------------------------------
+static const char * BlockCapsuleName = "dmi.blockref";
+
+static void deleteBlockCapsule (PyObject *capsule)
+{
+  delete static_cast<BlockRef*>(PyCapsule_GetPointer(capsule,BlockCapsuleName));
+}
+
+// returns the block ref backing a NumPy array, by walking its chain
+// of bases. Returns 0 if the array does not view a DMI data block, or
+// if any other array views the block, i.e. if the bases or the capsule
+// have other references.
+static const BlockRef * findSharedBlock (PyArrayObject *pyarr)
+{
+  PyObject *base = PyArray_BASE(pyarr);
+  while( base && PyArray_Check(base) )
+  {
+    // intermediate views must start at the same data 
+    if( PyArray_DATA(reinterpret_cast<PyArrayObject*>(base)) != PyArray_DATA(pyarr) ||
+        Py_REFCNT(base) != 1 )
+      return 0;
+    base = PyArray_BASE(reinterpret_cast<PyArrayObject*>(base));
+  }
+  if( !base || !PyCapsule_IsValid(base,BlockCapsuleName) || Py_REFCNT(base) != 1 )
+    return 0;
+  return static_cast<const BlockRef*>(PyCapsule_GetPointer(base,BlockCapsuleName));
+}
+
+// makes a NumArray attach to the shared block viewed by pyarr.
+// On the C++ side the block is shared copy-on-write, so C++ writes never
+// reach the Python view. Python-side writes can't be made copy-on-write,
+// so a view is only shared if Python can't write to the block later: it
+// must be the only array viewing the block, and be either read-only (as
+// are child values passed to PyNodes) or exclusively owned (see above).
+// In the latter case nothing in Python can reach the data, so it is
+// handed over to C++, and the array and its bases are made read-only for
+// good measure.
+// Returns false if the view can't be shared (writable and reachable from 
+// elsewhere, sharing the block with other arrays, or not covering the
+// whole block, i.e. a reshaped or sliced view), in which case the data
+// must be copied.
+static bool attachSharedBlock (DMI::NumArray &arr,PyArrayObject *pyarr,
+                               TypeId tid,const LoShape &shape,bool owned)
+{
+  bool writable = PyArray_ISWRITEABLE(pyarr);
+  if( ( writable && !owned ) || !PyArray_ISCARRAY_RO(pyarr) )
+    return false;
+  const BlockRef *pblock = findSharedBlock(pyarr);
+  if( !pblock )
+    return false;
+  arr.attachBlock(*pblock);
+  if( arr.elementType() != tid || arr.shape() != shape ||
+      arr.getConstDataPtr() != PyArray_DATA(pyarr) )
+    return false;
+  if( writable )
+  {
+    PyObject *obj = reinterpret_cast<PyObject*>(pyarr);
+    for( ; obj && PyArray_Check(obj); obj = PyArray_BASE(reinterpret_cast<PyArrayObject*>(obj)) )
+      PyArray_CLEARFLAGS(reinterpret_cast<PyArrayObject*>(obj),NPY_ARRAY_WRITEABLE);
+  }
+  return true;
+}
+
 // -----------------------------------------------------------------------
 // pyToArray
 // -----------------------------------------------------------------------
-int pyToArray (DMI::NumArray::Ref &arref,PyObject *pyobj)
+int pyToArray (DMI::NumArray::Ref &arref,PyObject *pyobj,int owner_refs)
 {
+  // check ownership before we take a ref of our own below
+  bool owned = isOwned(pyobj,owner_refs);
   // create output NumArray 
   DMI::NumArray &arr = arref <<= createSubclass<DMI::NumArray>(pyobj);
   // make array object with guaranteed C-array properties. This takes
@@ -327,6 +442,15 @@ int pyToArray (DMI::NumArray::Ref &arref,PyObject *pyobj)
     shape[0] = 1;
   TypeId tid = numarrayToTypeId(PyArray_TYPE(*pyarr_ref));
   ulong nb = PyArray_NBYTES(*pyarr_ref);
+  // arrays viewing a DMI data block are attached to without a copy, if
+  // Python can't write to them later
+  if( ndim && attachSharedBlock(arr,reinterpret_cast<PyArrayObject*>(*pyarr_ref),tid,shape,
+                                owned && *pyarr_ref == pyobj) )
+  {
+    cdebug(3)<<"pyToArray("<<ObjStr(pyobj)<<": type "<<tid<<", shape "<<shape<<", shared data block\n";
+    arr.validateContent(true);
+    return 1;
+  }
   // init DMI::NumArray
   cdebug(3)<<"pyToArray("<<ObjStr(pyobj)<<": type "<<tid<<", shape "<<shape<<", "<<nb<<" bytes\n";
   arr.init(tid,shape,DMI::NOZERO);
@@ -383,7 +507,7 @@ TypeId pyToDMI_Type (PyObject *obj)
 // (b) pvec0!=0: object is part of a vec. Insert into pvec0 at position
 //     pvec_pos, and ignore objref. Throw exception on type mismatch.
 // -----------------------------------------------------------------------
-int pyToDMI (ObjRef &objref,PyObject *obj,TypeId objtype,DMI::Vec *pvec0,int pvec_pos)
+int pyToDMI (ObjRef &objref,PyObject *obj,TypeId objtype,DMI::Vec *pvec0,int pvec_pos,int owner_refs)
 {
   string objstr = 
       Debug(3) ? "PyToDMI("+ObjStr(obj)+"): " : string();
@@ -397,6 +521,17 @@ int pyToDMI (ObjRef &objref,PyObject *obj,TypeId objtype,DMI::Vec *pvec0,int pve
       objref.detach();
     return 1;
   }
+  // a lazy ref that was never resolved still holds the original 
+  // object, so attach that instead of converting it back and forth
+  if( !pvec0 && PyObject_TypeCheck(obj,&PyLazyObjRefType) )
+  {
+    LazyObjRef *lazy_ref = (LazyObjRef*)obj;
+    if( lazy_ref->field.valid() )
+      objref.copy(lazy_ref->field.ref());
+    else
+      objref.detach();
+    return 1;
+  }
   // dmi_supported_types =
   // (int,long,float,complex,str,hiid,array_class,record,message);
   // this is really a switch calling different kinds of object builders
@@ -474,7 +609,7 @@ int pyToDMI (ObjRef &objref,PyObject *obj,TypeId objtype,DMI::Vec *pvec0,int pve
           break;
     case TpDMIRecord_int:
           { DMI::Record::Ref rec;
-          pyToRecord(rec,obj);
+          pyToRecord(rec,obj,owner_refs);
           if( pvec0 )
             pvec0->put(pvec_pos,rec);
           else
@@ -482,7 +617,7 @@ int pyToDMI (ObjRef &objref,PyObject *obj,TypeId objtype,DMI::Vec *pvec0,int pve
           } break;
     case TpDMINumArray_int:
           { DMI::NumArray::Ref arr;
-          pyToArray(arr,obj);
+          pyToArray(arr,obj,owner_refs);
           if( pvec0 )
             pvec0->put(pvec_pos,arr);
           else
@@ -502,6 +637,7 @@ int pyToDMI (ObjRef &objref,PyObject *obj,TypeId objtype,DMI::Vec *pvec0,int pve
     // and use a DMI::Vec if so, or a DMI::List if not.
     case TpDMIVec_int:
         { int len = PySequence_Size(obj);
+          int item_refs = isOwned(obj,owner_refs) ? ItemRefs : 0;
           // for sequences of the same non-dynamic type, use a DMI::Vec
           // for all other sequences use a DMI::List
           // scan through list to determine item type
@@ -556,7 +692,7 @@ int pyToDMI (ObjRef &objref,PyObject *obj,TypeId objtype,DMI::Vec *pvec0,int pve
               cdebug(4)<<objstr<<"converting seq element "<<i<<endl;
               PyObjectRef item = PySequence_ITEM(obj,i); // new ref
               ObjRef itemref; 
-              pyToDMI(itemref,*item);
+              pyToDMI(itemref,*item,TypeId(0),0,0,item_refs);
               plist->addBack(itemref);
             }
           }
@@ -574,7 +710,7 @@ int pyToDMI (ObjRef &objref,PyObject *obj,TypeId objtype,DMI::Vec *pvec0,int pve
               cdebug(4)<<objstr<<"converting seq element "<<i<<endl;
               PyObjectRef item = PySequence_ITEM(obj,i); // new ref
               ObjRef dum;
-              pyToDMI(dum,*item,seqbasetype,pvec,i);  // this mode causes an insert into vector
+              pyToDMI(dum,*item,seqbasetype,pvec,i,item_refs);  // this mode causes an insert into vector
             }
           }
           // check if we're actually an item in a DMI::Vec
@@ -766,6 +902,7 @@ PyObject * pyFromRecord (const DMI::Record &dr,int flags)
     // copy field and flags to lazy ref
     lazy_ref->field = iter.field();
     lazy_ref->flags = flags;
+    lazy_ref->hash_valid = 0;
     // Dict takes its own ref
     PyDict_SetItemString(*pyrec,const_cast<char*>(idstr.c_str()),*item);
   }
@@ -773,6 +910,65 @@ PyObject * pyFromRecord (const DMI::Record &dr,int flags)
   return ~pyrec; // return new ref, stealing from ours
 }
 
+// -----------------------------------------------------------------------
+// createArrayView
+// creates a NumPy array of class pycls (or a plain array, if 0) holding
+// the contents of a DMI::NumArray. With FL_SHAREDATA, the NumPy array
+// views the NumArray's data, otherwise the data is copied.
+// -----------------------------------------------------------------------
+static PyObject * createArrayView (const DMI::NumArray &da,PyTypeObject *pycls,int flags)
+{
+  int rank = da.rank();
+  int typecode = typeIdToNumarray(da.elementType());
+  npy_intp dims[rank];
+  for( int i=0; i<rank; i++ )
+    dims[i] = da.shape()[i];
+  PyObjectRef pyarr;
+  void *arraydata = const_cast<void*>(da.getConstDataPtr());
+  // if creating a plain array, use SimpleNew
+  if( !pycls )
+  {
+    if( flags&FL_SHAREDATA )
+      pyarr = PyArray_SimpleNewFromData(rank,dims,typecode,arraydata);
+    else
+      pyarr = PyArray_SimpleNew(rank,dims,typecode);
+  }
+  else
+  {
+    // creating subclass of ndarray. Old way was to use dmi_coerce to change class later,
+    // but numpy doesn't allow this, so we use New instead
+    pyarr = PyArray_New(pycls,rank,dims,typecode,0,flags&FL_SHAREDATA ? arraydata : 0,
+                          0,0,0);
+  }
+  if( !pyarr )
+    throwErrorOpt(Runtime,"failed to create numpy array for "+da.objectType().toString());
+  PyArrayObject *parr = reinterpret_cast<PyArrayObject*>(*pyarr);
+  if( flags&FL_SHAREDATA )
+  {
+    // if the data lives in the NumArray's own block, give the view a ref 
+    // to the block, so that it stays valid after the NumArray goes away
+    if( da.hasOwnBlock() )
+    {
+      BlockRef *pblock = new BlockRef(da.dataBlock());
+      PyObject *capsule = PyCapsule_New(pblock,BlockCapsuleName,deleteBlockCapsule);
+      if( !capsule )
+      {
+        delete pblock;
+        throwErrorOpt(Runtime,"failed to create capsule for shared data block");
+      }
+      // SetBaseObject steals the ref to the capsule
+      if( PyArray_SetBaseObject(parr,capsule) < 0 )
+        throwErrorOpt(Runtime,"failed to set base object of shared array");
+    }
+    if( flags&FL_READONLY )
+      PyArray_CLEARFLAGS(parr,NPY_ARRAY_WRITEABLE);
+  }
+  // copy data to python array, if new data is created
+  else
+    memcpy(PyArray_DATA(parr),arraydata,PyArray_NBYTES(parr));
+  return ~pyarr; // steal our ref since we need to return a NEW REF
+}
+
 // -----------------------------------------------------------------------
 // pyFromArray
 // converts a DMI::NumArray to a NumPy array
@@ -820,35 +1016,38 @@ PyObject * pyFromArray (const DMI::NumArray &da,int flags)
       if( !realclass )
         throwErrorOpt(Runtime,"failed to call dmi_type() for "+objtype.toString());
     }
-    // create array
-    int typecode = typeIdToNumarray(da.elementType());
-    npy_intp dims[rank];
-    for( int i=0; i<rank; i++ )
-      dims[i] = da.shape()[i];
-    PyObjectRef pyarr;
-    void *arraydata = const_cast<void*>(da.getConstDataPtr());
-    // if creating a plain array, use SimpleNew
-    if( objtype == TpDMINumArray )
-    {
-      if( flags&FL_SHAREDATA )
-        pyarr = PyArray_SimpleNewFromData(rank,dims,typecode,arraydata);
-      else
-        pyarr = PyArray_SimpleNew(rank,dims,typecode);
-    }
-    else
-    {
-      // creating subclass of ndarray. Old way was to use dmi_coerce to change class later,
-      // but numpy doesn't allow this, so we use New instead
-      pyarr = PyArray_New(reinterpret_cast<PyTypeObject*>(*realclass),rank,dims,typecode,0,flags&FL_SHAREDATA ? arraydata : 0,
-                            0,0,0);
-      if( !pyarr )
-        throwErrorOpt(Runtime,"failed to create numpy array for "+objtype.toString());
-    }
-    // copy data to python array, if new data is created
-    if( !(flags&FL_SHAREDATA) )
-      memcpy(PyArray_DATA(*pyarr),arraydata,PyArray_NBYTES(*pyarr)); // new ref
-    return ~pyarr; // steal our ref since we need to return a NEW REF
+    return createArrayView(da,reinterpret_cast<PyTypeObject*>(*realclass),flags);
+  }
+}
+
+// -----------------------------------------------------------------------
+// newSharedArray
+// creates a NumPy array backed by a new DMI data block. Returning such 
+// an array to C++ (e.g. as the result of a PyNode) does not copy the data.
+// -----------------------------------------------------------------------
+PyObject * newSharedArray (PyObject *,PyObject *args)
+{
+  PyObject *pyshape;
+  int typenum;
+  if( !PyArg_ParseTuple(args,"Oi",&pyshape,&typenum) )
+    return NULL;
+  try
+  {
+    PyObjectRef seq = PySequence_Fast(pyshape,"shape must be a sequence"); // new ref
+    if( !seq )
+      throwErrorOpt(Type,"shape must be a sequence");
+    int ndim = PySequence_Fast_GET_SIZE(*seq);
+    if( ndim<1 || ndim>MaxLorrayRank )
+      throwError(Type,ssprintf("can't create array of rank %d",ndim));
+    LoShape shape(ndim|LoShape::SETRANK);
+    for( int i=0; i<ndim; i++ )
+      shape[i] = PyInt_AsLong(PySequence_Fast_GET_ITEM(*seq,i)); // borrowed ref
+    if( PyErr_Occurred() )
+      throwErrorOpt(Type,"shape must be a sequence of ints");
+    DMI::NumArray arr(numarrayToTypeId(typenum),shape);
+    return createArrayView(arr,0,FL_SHAREDATA);
   }
+  catchStandardErrors(NULL);
 }
 
 // -----------------------------------------------------------------------
@@ -25,6 +25,7 @@
 //
 
 #include <DMI/Record.h>
+#include <DMI/NumArray.h>
 #include <Python.h>
 #include "OctoPython.h"
 #include "AID-OctoPython.h"
@@ -62,7 +63,10 @@ LazyObjRef_new (PyTypeObject *type, PyObject *, PyObject *)
   self = (LazyObjRef *)type->tp_alloc(type, 0);
   // do a placement-new to initialize the Record::Field
   if( self != NULL ) 
+  {
     new( &(self->field) ) DMI::Record::Field;
+    self->hash_valid = 0;
+  }
 
   return (PyObject *)self;
 }
@@ -101,6 +105,276 @@ static PyObject * LazyObjRef_resolve (LazyObjRef* self)
   returnNone;
 }
 
+// -----------------------------------------------------------------------
+// describeField
+// returns a short description of the referenced object: the element type
+// and shape for arrays, the type and size for other containers. The
+// object is not converted to Python.
+// -----------------------------------------------------------------------
+static string describeField (LazyObjRef* self)
+{
+  if( !self->field.valid() )
+    return "None";
+  const BObj &obj = self->field.ref().deref();
+  const DMI::NumArray *parr = dynamic_cast<const DMI::NumArray*>(&obj);
+  if( parr )
+  {
+    string str = parr->elementType().toString() + "[";
+    for( int i=0; i<parr->rank(); i++ )
+      str += Debug::ssprintf(i?",%d":"%d",parr->shape()[i]);
+    return str + "]";
+  }
+  const DMI::Container *pcont = dynamic_cast<const DMI::Container*>(&obj);
+  if( pcont )
+    return obj.objectType().toString() + Debug::ssprintf("(%d)",pcont->size());
+  return obj.objectType().toString();
+}
+
+static PyObject * LazyObjRef_describe (LazyObjRef* self)
+{
+  try
+  {
+    return pyFromString(describeField(self));
+  }
+  catchStandardErrors(NULL);
+  returnNone;
+}
+
+static PyObject * LazyObjRef_repr (LazyObjRef* self)
+{
+  try
+  {
+    return pyFromString("<lazy_objref "+describeField(self)+">");
+  }
+  catchStandardErrors(NULL);
+  returnNone;
+}
+
+// -----------------------------------------------------------------------
+// content_hash
+// returns a 64-bit FNV-1a hash of an array's type, shape and data,
+// computed on the C++ side. The hash is cached in the lazy ref.
+// Returns None for anything other than a numeric array.
+// Floating-point elements are hashed by value, consistently with
+// compare() below: -0 hashes the same as 0.
+// -----------------------------------------------------------------------
+static inline uint64_t fnvHash (uint64_t hash,const void *data,size_t size)
+{
+  const unsigned char *p = static_cast<const unsigned char*>(data);
+  for( const unsigned char *end = p+size; p<end; p++ )
+  {
+    hash ^= *p;
+    hash *= 1099511628211ULL;
+  }
+  return hash;
+}
+
+template<class T>
+static inline uint64_t fnvHashReal (uint64_t hash,const T *data,size_t n)
+{
+  for( size_t i=0; i<n; i++ )
+  {
+    T x = data[i] == 0 ? T(0) : data[i];
+    hash = fnvHash(hash,&x,sizeof(x));
+  }
+  return hash;
+}
+
+static const DMI::NumArray * fieldArray (LazyObjRef* self)
+{
+  if( !self->field.valid() )
+    return 0;
+  return dynamic_cast<const DMI::NumArray*>(&(self->field.ref().deref()));
+}
+
+// Only arrays of the numeric types supported by NumPy conversion can be
+// hashed and compared on the C++ side. Others (e.g. string arrays, whose
+// elements are std::string objects) must be resolved.
+static bool isNumericArray (const DMI::NumArray &arr)
+{
+  switch( arr.elementType().id() )
+  {
+    case Tpbool_int:      
+    case Tpuchar_int:     
+    case Tpshort_int:     
+    case Tpint_int:       
+    case Tpfloat_int:     
+    case Tpdouble_int:    
+    case Tpfcomplex_int:  
+    case Tpdcomplex_int:  
+      return true;
+    default:
+      return false;
+  }
+}
+
+static bool computeHash (LazyObjRef* self)
+{
+  if( self->hash_valid )
+    return true;
+  const DMI::NumArray *parr = fieldArray(self);
+  if( !parr || !isNumericArray(*parr) )
+    return false;
+  uint64_t hash = 14695981039346656037ULL;
+  int tid = parr->elementType().id();
+  hash = fnvHash(hash,&tid,sizeof(tid));
+  for( int i=0; i<parr->rank(); i++ )
+  {
+    int n = parr->shape()[i];
+    hash = fnvHash(hash,&n,sizeof(n));
+  }
+  const void *data = parr->getConstDataPtr();
+  size_t n = parr->shape().product();
+  switch( tid )
+  {
+    case Tpfloat_int:
+      hash = fnvHashReal(hash,static_cast<const float*>(data),n);
+      break;
+    case Tpfcomplex_int:
+      hash = fnvHashReal(hash,static_cast<const float*>(data),n*2);
+      break;
+    case Tpdouble_int:
+      hash = fnvHashReal(hash,static_cast<const double*>(data),n);
+      break;
+    case Tpdcomplex_int:
+      hash = fnvHashReal(hash,static_cast<const double*>(data),n*2);
+      break;
+    default:
+      hash = fnvHash(hash,data,n*parr->elementSize());
+  }
+  self->hash = hash;
+  self->hash_valid = 1;
+  return true;
+}
+
+static PyObject * LazyObjRef_content_hash (LazyObjRef* self)
+{
+  try
+  {
+    if( computeHash(self) )
+      return PyLong_FromUnsignedLongLong(self->hash);
+  }
+  catchStandardErrors(NULL);
+  returnNone;
+}
+
+// -----------------------------------------------------------------------
+// compareFields
+// compares two lazy refs on the C++ side. Returns 1 if equal, 0 if not,
+// or -1 if this can't be decided without converting them to Python.
+// Arrays are compared by value, the way NumPy's == does: NaNs are never
+// equal, -0 equals 0. Arrays of different types or shapes are left to 
+// NumPy, since it will convert and broadcast them.
+// -----------------------------------------------------------------------
+template<class T>
+static inline bool equalValues (const void *a,const void *b,size_t n)
+{
+  const T *pa = static_cast<const T*>(a), *pb = static_cast<const T*>(b);
+  for( size_t i=0; i<n; i++ )
+    if( !(pa[i] == pb[i]) )
+      return false;
+  return true;
+}
+
+static int compareFields (LazyObjRef *a,LazyObjRef *b)
+{
+  if( !a->field.valid() || !b->field.valid() )
+    return a->field.valid() == b->field.valid();
+  const DMI::NumArray *pa = fieldArray(a), *pb = fieldArray(b);
+  if( !pa || !pb )
+  {
+    if( &(a->field.ref().deref()) == &(b->field.ref().deref()) )
+      return 1;
+    return -1;
+  }
+  if( !isNumericArray(*pa) || pa->elementType() != pb->elementType() || 
+      pa->shape() != pb->shape() )
+    return -1;
+  // use cached hashes to reject early, if we have them
+  if( a->hash_valid && b->hash_valid && a->hash != b->hash )
+    return 0;
+  const void *da = pa->getConstDataPtr(), *db = pb->getConstDataPtr();
+  size_t n = pa->shape().product();
+  switch( pa->elementType().id() )
+  {
+    case Tpfloat_int:     return equalValues<float>(da,db,n);
+    case Tpfcomplex_int:  return equalValues<float>(da,db,n*2);
+    case Tpdouble_int:    return equalValues<double>(da,db,n);
+    case Tpdcomplex_int:  return equalValues<double>(da,db,n*2);
+    default:              return !memcmp(da,db,n*pa->elementSize());
+  }
+}
+
+static PyObject * LazyObjRef_compare (LazyObjRef* self,PyObject *args)
+{
+  PyObject *other;
+  if( !PyArg_ParseTuple(args,"O",&other) )
+    return NULL;
+  try
+  {
+    if( PyObject_TypeCheck(other,&PyLazyObjRefType) )
+    {
+      int res = compareFields(self,(LazyObjRef*)other);
+      if( res >= 0 )
+        return PyBool_FromLong(res);
+    }
+  }
+  catchStandardErrors(NULL);
+  returnNone;
+}
+
+static PyObject * LazyObjRef_richcompare (PyObject *a,PyObject *b,int op)
+{
+  if( ( op == Py_EQ || op == Py_NE ) &&
+      PyObject_TypeCheck(a,&PyLazyObjRefType) && 
+      PyObject_TypeCheck(b,&PyLazyObjRefType) )
+  {
+    try
+    {
+      int res = compareFields((LazyObjRef*)a,(LazyObjRef*)b);
+      if( res >= 0 )
+        return PyBool_FromLong(op == Py_EQ ? res : !res);
+    }
+    catchStandardErrors(NULL);
+  }
+  Py_INCREF(Py_NotImplemented);
+  return Py_NotImplemented;
+}
+
+// -----------------------------------------------------------------------
+// hash
+// a hash consistent with richcompare above: numeric arrays hash by
+// content, since they compare by value. Anything else is only ever equal
+// to a lazy ref to the same object (or to itself), so it hashes by the
+// address of that object. All invalid refs compare equal, and hash to 0.
+// -----------------------------------------------------------------------
+#if PY_MAJOR_VERSION >= 3
+typedef Py_hash_t LazyObjRefHash;
+#else
+typedef long LazyObjRefHash;
+#endif
+
+static LazyObjRefHash LazyObjRef_hash (LazyObjRef* self)
+{
+  try
+  {
+    uint64_t hash;
+    if( !self->field.valid() )
+      return 0;
+    if( !computeHash(self) )
+    {
+      const BObj *pobj = &(self->field.ref().deref());
+      hash = fnvHash(14695981039346656037ULL,&pobj,sizeof(pobj));
+    }
+    else
+      hash = self->hash;
+    LazyObjRefHash res = LazyObjRefHash(hash ^ (hash>>32));
+    // -1 is reserved for errors
+    return res == -1 ? -2 : res;
+  }
+  catchStandardErrors(-1);
+  return -1;
+}
 
 // -----------------------------------------------------------------------
 // members/data structures init
@@ -109,6 +383,13 @@ static PyObject * LazyObjRef_resolve (LazyObjRef* self)
 static PyMethodDef LazyObjRef_methods[] = {
     {"resolve",     (PyCFunction)LazyObjRef_resolve, METH_NOARGS,
                   "resolves lazy ref into object, returns object" },
+    {"describe",    (PyCFunction)LazyObjRef_describe, METH_NOARGS,
+                  "returns a short description of the object, without resolving it" },
+    {"content_hash",(PyCFunction)LazyObjRef_content_hash, METH_NOARGS,
+                  "returns a hash of an array's contents, or None for other objects" },
+    {"compare",     (PyCFunction)LazyObjRef_compare, METH_VARARGS,
+                  "compares to another lazy ref without resolving either. Returns "
+                  "True or False, or None if the objects must be resolved to compare them" },
     {NULL}  /* Sentinel */
 };
 
@@ -122,11 +403,11 @@ PyTypeObject PyLazyObjRefType = {
     0,                         /*tp_getattr*/
     0,                         /*tp_setattr*/
     0,                         /*tp_compare*/
-    0,                         /*tp_repr*/
+    (reprfunc)LazyObjRef_repr, /*tp_repr*/
     0,                         /*tp_as_number*/
     0,                         /*tp_as_sequence*/
     0,                         /*tp_as_mapping*/
-    0,                         /*tp_hash */
+    (hashfunc)LazyObjRef_hash, /*tp_hash */
     0,                         /*tp_call*/
     0,                         /*tp_str*/
     0,                         /*tp_getattro*/
@@ -136,7 +417,7 @@ PyTypeObject PyLazyObjRefType = {
     "LazyObjRef objects",       /* tp_doc */
     0,		               /* tp_traverse */
     0,		               /* tp_clear */
-    0,		               /* tp_richcompare */
+    LazyObjRef_richcompare,    /* tp_richcompare */
     0,		               /* tp_weaklistoffset */
     0,		               /* tp_iter */
     0,		               /* tp_iternext */
@@ -57,11 +57,18 @@ namespace OctoPython
       PyObject_HEAD
       DMI::Record::Field field;
       int flags;
+      // cached content hash, see lazy_objref.content_hash()
+      uint64_t hash;
+      int hash_valid;
   } LazyObjRef;
   
   // error policy for data conversion functions
+  // FL_SHAREDATA: NumPy arrays view the data of DMI::NumArrays rather 
+  //    than copying it (copy-on-write on the C++ side). 
+  // FL_READONLY: with FL_SHAREDATA, the views are made read-only, so
+  //    that Python code can't modify the viewed C++ data.
   typedef enum { EP_THROW=1,EP_RETNULL=2,EP_CONV_ERROR=4,EP_ALL=7,
-                 FL_SHAREDATA=8 } ErrorPolicyAndFlags;
+                 FL_SHAREDATA=8,FL_READONLY=16 } ErrorPolicyAndFlags;
   
   // initializes octopython module -- can also be called from elsewhere
   // when embedding the interpreter
@@ -104,12 +111,21 @@ namespace OctoPython
   // Returns 1 on success, or throws an exception on 
   // error (if a Python exception is also raised, this will be a 
   // PythonException, otherwise another std::exception)
-  // The input object's ref count is untouched
+  // The input object's ref count is untouched.
+  // owner_refs is the number of references to the object held by the 
+  // caller. If the object has no others, writable arrays in it that are 
+  // backed by DMI data blocks are handed over to C++ without a copy.
   int pyToDMI     (ObjRef &objref,PyObject *obj,
-                   TypeId objtype=TypeId(0),DMI::Vec *pvec0=0,int pvec_pos=0);
-  int pyToRecord  (DMI::Record::Ref &rec,PyObject *pyobj);
-  int pyToArray   (DMI::NumArray::Ref &arr,PyObject *pyobj);
+                   TypeId objtype=TypeId(0),DMI::Vec *pvec0=0,int pvec_pos=0,
+                   int owner_refs=0);
+  int pyToRecord  (DMI::Record::Ref &rec,PyObject *pyobj,int owner_refs=0);
+  int pyToArray   (DMI::NumArray::Ref &arr,PyObject *pyobj,int owner_refs=0);
   int pyToMessage (Message::Ref &msg,PyObject *pyobj);
+  
+  // Creates a NumPy array backed by a DMI data block, so that it can be
+  // converted to a DMI::NumArray without copying. Python args are
+  // (shape,typenum). Returns _NEW REFERENCE_, or NULL on error.
+  PyObject * newSharedArray (PyObject *,PyObject *args);
   inline int pyToHIID   (HIID &id,PyObject *pyobj)
   { return convertSeqToHIID(id,pyobj); }
   
@@ -298,6 +298,51 @@ static PyObject * PyProxyWP_receive_all (PyProxyWP* self,PyObject *args)
   catchStandardErrors(NULL);
 }
 
+// -----------------------------------------------------------------------
+// receive_batch
+// waits for the queue to become non-empty (like receive()), then returns
+// the entire queue as a list, or None on timeout
+// -----------------------------------------------------------------------
+static PyObject * PyProxyWP_receive_batch (PyProxyWP* self,PyObject *args)
+{
+  double timeout=-1;
+  if( !PyArg_ParseTuple(args,"|d",&timeout) )
+    return NULL;
+  try
+  {
+    Message::Ref mref;
+    WPInterface &wp = self->wpref();
+    Thread::Mutex::Lock lock(wp.queueCondition());
+    while( wp.queue().empty() )
+    {
+      if( !wp.isRunning() )
+        returnError(NULL,OctoPython,"proxy wp no longer running");
+      // timeout>=0: return None if queue is empty
+      if( timeout>=0 )
+      {
+        if( timeout>0 )
+          wp.queueCondition().wait(timeout);
+        if( wp.queue().empty() )
+          returnNone;
+      }
+      else // timeout<0: wait indefinitely
+        wp.queueCondition().wait();
+    }
+    // drain the whole queue in one go
+    int n = wp.queue().size();
+    PyObjectRef pylist = PyList_New(n); // returns NEW REF
+    for( int i=0; i<n; i++ )
+    {
+      mref = wp.queue().front().mref;
+      wp.queue().pop_front();
+      // pyFromMessage() returns new ref, PyList_SET_ITEM steals it
+      PyList_SET_ITEM(*pylist,i,pyFromMessage(*mref));
+    }
+    return ~pylist;
+  }
+  catchStandardErrors(NULL);
+}
+
 
 // -----------------------------------------------------------------------
 // receive_threaded
@@ -394,6 +439,8 @@ static PyMethodDef PyProxyWP_methods[] = {
                   "receives message from queue" },
     {"receive_all", (PyCFunction)PyProxyWP_receive_all, METH_VARARGS,
                   "receives all messages from queue" },
+    {"receive_batch",(PyCFunction)PyProxyWP_receive_batch, METH_VARARGS,
+                  "waits for messages, then receives all messages from queue" },
     {"receive_threaded",(PyCFunction)PyProxyWP_receive_threaded, METH_VARARGS,
                   "receives message from queue (threaded version)" },
     {NULL}  /* Sentinel */
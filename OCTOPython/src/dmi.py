@@ -141,8 +141,149 @@ def make_hiid_list (x):
   elif isinstance(x,str):  # single string - to list
     return [hiid(x)];
   else: # treat everything else as a sequence of hiids or strings
-    return list(map(make_hiid,x)); 
-  
+    return list(map(make_hiid,x));
+
+#
+# === class hiid_mask_index ===
+# Maps hiid masks (which may contain "?" and "*" wildcards) to values, and
+# looks up all masks matching a given hiid by walking a trie of atoms.
+# Lookup cost depends on the length of the hiid and on the number of
+# matching masks, but not on the total number of masks in the index.
+#
+class hiid_mask_index (object):
+  """A dict-like container keyed by hiid masks. match(id) returns the
+  (mask,value) pairs of all masks matching the given hiid, using the same
+  rules as hiid.matches(), in the order in which the masks were inserted.
+  """;
+  AidAny = -1;         # "?": matches any one atom
+  AidWildcard = -2;    # "*": matches everything to the end
+
+  class _node (object):
+    __slots__ = ('children','exact','wild');
+    def __init__ (self):
+      self.children = {};   # atom -> _node
+      self.exact = [];      # masks ending at this node
+      self.wild  = [];      # masks with a "*" at this position
+
+  def __init__ (self):
+    self._root = self._node();
+    self._masks = {};       # mask -> [seqnum,value]
+    self._seq = 0;
+
+  def _split (self,mask):
+    """splits mask into path of atoms up to the first wildcard. Returns
+    path,is_wild. Everything after a wildcard is irrelevant to matching.""";
+    path = [];
+    for atom in tuple.__iter__(mask):
+      if atom == self.AidWildcard:
+        return path,True;
+      path.append(atom);
+    return path,False;
+
+  def __len__ (self):
+    return len(self._masks);
+  def __contains__ (self,mask):
+    return make_hiid(mask) in self._masks;
+  def __iter__ (self):
+    return iter(self._masks);
+  def keys (self):
+    return list(self._masks.keys());
+  def items (self):
+    return [ (mask,ent[1]) for mask,ent in self._masks.items() ];
+  def values (self):
+    return [ ent[1] for ent in self._masks.values() ];
+
+  def get (self,mask,default=None):
+    ent = self._masks.get(make_hiid(mask));
+    if ent is None:
+      return default;
+    return ent[1];
+  def __getitem__ (self,mask):
+    return self._masks[make_hiid(mask)][1];
+
+  def __setitem__ (self,mask,value):
+    mask = make_hiid(mask);
+    ent = self._masks.get(mask);
+    if ent is not None:
+      ent[1] = value;
+      return;
+    path,is_wild = self._split(mask);
+    node = self._root;
+    for atom in path:
+      child = node.children.get(atom);
+      if child is None:
+        child = node.children[atom] = self._node();
+      node = child;
+    (node.wild if is_wild else node.exact).append(mask);
+    self._masks[mask] = [self._seq,value];
+    self._seq += 1;
+
+  def setdefault (self,mask,default=None):
+    mask = make_hiid(mask);
+    ent = self._masks.get(mask);
+    if ent is not None:
+      return ent[1];
+    self[mask] = default;
+    return default;
+
+  def __delitem__ (self,mask):
+    mask = make_hiid(mask);
+    del self._masks[mask];
+    path,is_wild = self._split(mask);
+    # walk down, remembering the trail so that empty nodes can be pruned
+    trail = [];
+    node = self._root;
+    for atom in path:
+      trail.append((node,atom));
+      node = node.children[atom];
+    (node.wild if is_wild else node.exact).remove(mask);
+    while trail and not (node.children or node.exact or node.wild):
+      parent,atom = trail.pop();
+      del parent.children[atom];
+      node = parent;
+
+  def _collect (self,node,found):
+    """adds all masks at and below node (excluding node.wild) to found""";
+    found += node.exact;
+    for child in node.children.values():
+      found += child.wild;
+      self._collect(child,found);
+
+  def match (self,id):
+    """returns list of (mask,value) pairs for all masks matching id""";
+    found = [];
+    nodes = [self._root];
+    for atom in tuple.__iter__(id):
+      if not nodes:
+        break;
+      nextnodes = [];
+      for node in nodes:
+        # masks with a wildcard at this position match unconditionally
+        found += node.wild;
+        if atom == self.AidWildcard:
+          # id has a wildcard: everything from here on down matches
+          self._collect(node,found);
+        elif atom == self.AidAny:
+          nextnodes += list(node.children.values());
+        else:
+          child = node.children.get(atom);
+          if child is not None:
+            nextnodes.append(child);
+          child = node.children.get(self.AidAny);
+          if child is not None:
+            nextnodes.append(child);
+      if atom == self.AidWildcard:
+        nodes = [];
+        break;
+      nodes = nextnodes;
+    # nodes left over correspond to masks of the same length as id
+    for node in nodes:
+      found += node.exact;
+      found += node.wild;
+    if len(found) > 1:
+      found.sort(key=lambda mask:self._masks[mask][0]);
+    return [ (mask,self._masks[mask][1]) for mask in found ];
+
 #
 # === dmize_object() ===
 # Converts obj to DMI-compatible representation, or raises TypeError if this
@@ -219,13 +360,37 @@ class recdict (dict):
     return dict.__delitem__(self,key);
 
 
+# Cache of normalized hiid keys. Record keys are drawn from a small
+# vocabulary, so each hiid only needs to be converted to a string once.
+_hiid_key_cache = {};
+_hiid_key_cache_size = 10000;
+
+def _validate_value (value):
+  """checks that value and all its contents are DMI-compatible, raises 
+  TypeError otherwise. This is the deep check deferred by record.make_value().""";
+  if isinstance(value,record):
+    value.validate();
+  elif isinstance(value,(list,tuple)):
+    for item in value:
+      _validate_value(item);
+  elif not isinstance(value,lazy_objref):
+    dmize_object(value);
+
 class record (dict):
   """A record is a restricted dict that only allows specific kinds of keys
   (in this case strings, but this may be redefined in subclasses).
   Records also provide access to their elements via attributes, using the 
   conventional rec.field notation.
-  Field values are limited to dmizable objects.
+  Field values are limited to dmizable objects. The contents of list and
+  tuple values are only checked by validate(), which is called when the 
+  record is converted to C++.
+  Records have no per-instance __dict__ (attribute names map to fields 
+  anyway), so they can't carry attributes of their own, and can't be
+  weakly referenced. Use attr_record, or a subclass, where that is needed.
   """
+  # records are created in huge numbers, so don't give them a __dict__
+  __slots__ = ();
+
   def __init__ (self,_initdict_=[],_verbose_=0,**kwargs):
     # initialize from init dictionary and from kwargs, checking for valid keys
     if isinstance(_initdict_,dict):
@@ -246,34 +411,51 @@ class record (dict):
         if _verbose_>1: print(("adding %s=%s" % (key,value)));
     if _verbose_>0: print(("initialized",dict.__len__(self),"fields"));
   def copy (self):
+    # lazy refs are copied as is, so the copy does not resolve anything
     rec = record();
-    for (k,v) in list(self.items()):
-      rec[k] = v;
+    for (k,v) in dict.items(self):
+      dict.__setitem__(rec,k,v);
     return rec;
   # make_key: coerces value to legal key, throws TypeError if illegal
   # this version coerces to string keys, subclasses may redefine this to
   # use different kinds of keys
+  # Keys are interned, which makes subsequent dict lookups cheaper.
   def make_key (self,key): 
     "checks key for validity, returns key, raises TypeError if key is illegal";
+    if type(key) is str:
+      return six.moves.intern(key);
+    if isinstance(key,hiid):
+      skey = _hiid_key_cache.get(key);
+      if skey is None:
+        if len(_hiid_key_cache) >= _hiid_key_cache_size:
+          _hiid_key_cache.clear();
+        skey = _hiid_key_cache[key] = six.moves.intern(str(key));
+      return skey;
     return str(key);
   # make_value: coerces value to legal value, throws TypeError if illegal
-  # this version does nothing, subclasses may redefine this to do value checking
+  # this version accepts known types directly, and defers checking the contents 
+  # of sequences to validate(). Subclasses may redefine this to do value checking
   def make_value (self,value): 
     "checks value for validity, returns value, raises TypeError if illegal";
+    tp = type(value);
+    if tp is list or tp is tuple or tp in _dmi_typename_map:
+      return value;
     return dmize_object(value);
+  # validate: deep check of contents
+  def validate (self):
+    """checks that all fields, including the contents of lists and tuples, 
+    are DMI-compatible. Raises TypeError otherwise.""";
+    for key,value in dict.items(self):
+      try:
+        _validate_value(value);
+      except TypeError as info:
+        raise TypeError("field '%s': %s"%(key,info));
     
   # helper function to resolve all lazy refs in the record.
-  # various functions below that access the dict as a whole will require
-  # that all lazy refs are converted to real objects. This function
-  # accomplishes that task.
+  # This converts every lazy ref into a real object in one go.
   def _resolve_all_lazy_refs (self):
-    lazies = [pair for pair in getattr(dict, "iteritems", dict.items)(self) if isinstance(pair[1],lazy_objref)];
-    for key,ref in lazies:
-      try:
-	      item = ref.resolve();
-      except:
-	      item = sys.exc_info()[1];
-      dict.__setitem__(self,key,item);
+    for key,value in self.iteritems():
+      pass;
 
   # helper function to resolve a lazy ref to a real value, and replace
   # this in the record
@@ -283,29 +465,38 @@ class record (dict):
       dict.__setitem__(self,key,value);
     return value;
   
-  # items(): we need to resolve all lazy refs first
+  # iteritems(): lazy refs are resolved one at a time, as the iteration
+  # reaches them. A ref that fails to resolve is replaced by the exception.
+  def iteritems (self):
+    for key,value in list(dict.items(self)):
+      if isinstance(value,lazy_objref):
+        try:
+          value = value.resolve();
+        except:
+          value = sys.exc_info()[1];
+        dict.__setitem__(self,key,value);
+      yield key,value;
+  def itervalues (self):
+    for key,value in self.iteritems():
+      yield value;
+  # items() and values() return lists of resolved values
   def items (self):
-    self._resolve_all_lazy_refs();
-    return dict.items(self);
+    return list(self.iteritems());
   def values (self):  
-    self._resolve_all_lazy_refs();
-    return dict.items(self);
-  # itervalues(): we need to resolve all lazy refs first
-  def itervalues (self):
-    self._resolve_all_lazy_refs();
-    return getattr(dict, "itervalues", dict.items)(self);
-  # iteritems(): we need to resolve all lazy refs first
-  def iteritems (self):
-    self._resolve_all_lazy_refs();
-    return getattr(dict, "iteritems", dict.items)(self);
+    return list(self.itervalues());
+  # lazy_items() and lazy_values() leave lazy refs unresolved. Use these
+  # to look at a record (e.g. to print or compare it) without pulling
+  # every field over from C++.
+  def lazy_items (self):
+    return list(dict.items(self));
+  def lazy_values (self):
+    return list(dict.values(self));
   # __getattr__: dict contents are exposed as extra attributes, lazy refs resolved
+  # (this is only called when regular attribute lookup has failed)
   def __getattr__(self,name):
     if name.startswith('__'):
-      return dict.__getattr__(self,name);
-    # else try to access attribute anyway, to see if we have one
-    try: return dict.__getattr__(self,name);
-    except AttributeError: pass;
-    # if none found, go look for a dict key
+      raise AttributeError(name);
+    # go look for a dict key
     try:   key = self.make_key(name);
     except ValueError as info: raise AttributeError(info);
     # try string key, if not found, convert to hiid and back to string (to take care of
@@ -345,13 +536,18 @@ class record (dict):
       raise;
   # __getitem__: string names implicitly converted to HIIDs, lazy refs resolved
   def __getitem__(self,name):
-    return self.get(name,default=KeyError);
+    try: key = self.make_key(name);
+    except ValueError as info: raise TypeError(info);
+    value = dict.get(self,key,KeyError);
+    if value is KeyError:
+      raise KeyError("no such key: %s"%key);
+    if isinstance(value,lazy_objref):
+      return self.get(key);
+    return value;
   # __setitem__: check types, string names implicitly converted to HIIDs
   def __setitem__ (self,name,value):
     value = self.make_value(value);
-    try: name = self.make_key(name);
-    except TypeError as info: raise TypeError(info);
-    return dict.__setitem__(self,name,value);
+    return dict.__setitem__(self,self.make_key(name),value);
   # __contains__: string names implicitly converted to HIIDs
   def __contains__(self,name):
     try: 
@@ -359,16 +555,16 @@ class record (dict):
     except: 
       return False;
     # return map(lambda x:x.as_str('_'),self.keys());
-  # __str__: pretty-print
+  # __str__: pretty-print. Lazy refs are shown by type and shape.
   def __str__ (self):
-    dictiter = iter(list(self.items()));
+    dictiter = iter(self.lazy_items());
     items = [];
     for (key,value) in dictiter:
       items += ["%s=%s" % (key,str(value)) ];
-    return "{ " + string.join(items,', ') + " }";
-  # __repr__: official form
+    return "{ " + ', '.join(items) + " }";
+  # __repr__: official form. Lazy refs are shown by type and shape.
   def __repr__ (self):
-    dictiter = iter(list(self.items()));
+    dictiter = iter(self.lazy_items());
     items = [];
     for (key,value) in dictiter:
       items += [ "%s=%s" % (key,repr(value)) ];
@@ -403,6 +599,18 @@ class record (dict):
       try:
         if a is b:
           return True;
+        # lazy refs are compared on the C++ side if possible, and only
+        # resolved if that fails
+        if isinstance(a,lazy_objref) or isinstance(b,lazy_objref):
+          if isinstance(a,lazy_objref) and isinstance(b,lazy_objref):
+            eq = a.compare(b);
+            if eq is not None:
+              return eq;
+          if isinstance(a,lazy_objref):
+            a = a.resolve();
+          if isinstance(b,lazy_objref):
+            b = b.resolve();
+          return item_eq(a,b);
         if type(a) != type(b):
 ##          print 'type mismatch';
           return False;
@@ -434,11 +642,11 @@ class record (dict):
     if type(self) != type(other) or len(self) != len(other):
 ##      print 'type/len mismatch';
       return False;
-    for (key,a) in list(self.items()):
+    for (key,a) in self.lazy_items():
       if key not in other:
 ##        print 'key',key,'not in other';
         return False;
-      b = other[key];
+      b = dict.__getitem__(other,other.make_key(key));
 ##      print 'key',key,type(a),type(b);
       if not item_eq(a,b):
 ##        print 'key',key,'item_eq fails';
@@ -449,6 +657,14 @@ class record (dict):
 
 make_record = type_maker(record);
 
+class attr_record (record):
+  """A record that has a per-instance __dict__, for code that keeps
+  attributes of its own on a record (i.e. attributes with '__' names, as
+  all other names map to fields), or needs weak references to it. 
+  Python subclasses of record get a __dict__ the same way, unless they 
+  define __slots__ themselves.""";
+  pass;
+
 class dmilist (list):
   """A dmilist() is a list that is explicitly converted into a DMI::List
   type when passed to C++ (note that normal lists may be converted into a 
@@ -519,6 +735,21 @@ def is_array (x):
 def is_scalar (x):
   return isinstance(x,(int,float,complex));
 
+def shared_array (shape,dtype=arr_double):
+  """Returns a zero-filled array of the given shape and type. When running
+  with the octopython module, the array is backed by a DMI data block. 
+  If nothing else in Python refers to the array when it is passed to C++
+  (e.g. returned from a PyNode), the block is handed over without copying
+  the data, and the array becomes read-only. Otherwise the data is copied,
+  since NumPy can't make later writes to the array copy-on-write. Read-only
+  arrays are never copied.
+  """;
+  if isinstance(shape,int):
+    shape = (shape,);
+  if hasattr(Timba,'octopython'):
+    return Timba.octopython.new_shared_array(tuple(shape),np.dtype(dtype).num);
+  return Timba.array.zeros(shape,dtype);
+
 # this is a map of known DMI base classes and their corresponding DMI typenames
 # subtypes may be derived from these base classes
 _dmi_baseclasses = { dmilist:'DMIList',record:'DMIRecord',array_class:'DMINumArray' };
@@ -566,7 +797,9 @@ def dmi_type (name,baseclass=None):
       raise KeyError(name+" is not a known DMI type, and no base class supplied");
     for bc in list(_dmi_baseclasses.keys()):
       if issubclass(baseclass,bc):
-        globals()[name] = tp = type(name,(baseclass,),{});
+        # record subclasses are kept __dict__-less, like record itself
+        attrs = {'__slots__':()} if issubclass(baseclass,record) else {};
+        globals()[name] = tp = type(name,(baseclass,),attrs);
         _dmi_typename_map[tp] = name;
         _dmi_nametype_map[name.lower()] = tp;
         return tp;
@@ -629,6 +862,12 @@ except ImportError:
   class lazy_objref (object):
     def resolve (self):
       return None;
+    def describe (self):
+      return "None";
+    def content_hash (self):
+      return None;
+    def compare (self,other):
+      return None;
   
 #
 # self-test code follows
@@ -686,6 +925,14 @@ def __test_records():
   try: rec1.d = {}; # plain dicts not supported
   except Exception as info: print(("got exception:",info));
   else: raise RuntimeError('exception should have been raised');
+  print("setting an attribute of a plain record, expecting exception");
+  try: rec1.__extra__ = 1;
+  except AttributeError as info: print(("got exception:",info));
+  else: raise RuntimeError('exception should have been raised');
+  rec4 = attr_record(a=0);
+  rec4.__extra__ = 1;
+  if rec4.__extra__ != 1 or list(rec4.keys()) != ['a']:
+    raise RuntimeError('attr_record attribute error');
   print(('rec1.field_names():',rec1.field_names()));
   print(('rec1.repr():',repr(rec1)));
   print('------------- initializing non-strict record from dict -------------');
@@ -703,10 +950,44 @@ def __test_messages():
   print(msg1);
   print(msg2);
 
+def __bench_mask_index(nmasks=10000,nlookups=1000):
+  import time
+  import random
+  print("Benchmarking hiid_mask_index with %d masks"%nmasks);
+  rnd = random.Random(1);
+  # masks look like node-state whenevers: "Node.State.<n>.*", plus some "?"s
+  masks = [];
+  for i in range(nmasks):
+    mask = [-100,-101,i,rnd.choice((-1,-2,i%7)),-2];
+    masks.append(hiid(mask));
+  index = hiid_mask_index();
+  t0 = time.time();
+  for m in masks:
+    index.setdefault(m,[]).append(m);
+  print("  insert: %.3fs"%(time.time()-t0));
+  ids = [ hiid([-100,-101,rnd.randrange(nmasks),rnd.randrange(7),-3]) for i in range(nlookups) ];
+  t0 = time.time();
+  nmatch = 0;
+  for id in ids:
+    nmatch += len(index.match(id));
+  dt_index = time.time()-t0;
+  print("  indexed lookup: %.3fms per message (%d matches)"%(dt_index*1000/nlookups,nmatch));
+  # compare to linear scan (as done previously by proxy_wp), on a subset
+  nscan = max(1,nlookups//20);
+  t0 = time.time();
+  nmatch0 = 0;
+  for id in ids[:nscan]:
+    nmatch0 += len([ m for m in masks if id.matches(m) ]);
+  dt_scan = time.time()-t0;
+  print("  linear scan:    %.3fms per message"%(dt_scan*1000/nscan));
+  if nmatch0 != sum([ len(index.match(id)) for id in ids[:nscan] ]):
+    raise RuntimeError('hiid_mask_index and linear scan disagree');
+
 if __name__ == "__main__":
   # print some aids
   print(("Number of known AIDs: ",len(Timba.octopython.aid_map),len(Timba.octopython.aid_rmap)));
   __test_hiids();
   __test_records();
   __test_messages();
+  __bench_mask_index();
   
@@ -123,6 +123,9 @@ def stop ():
 class proxy_wp(octopython.proxy_wp,verbosity):
   "represents an OCTOPUSSY connection endpoint (i.e. WorkProcess)"
   
+  # if True, event_loop() receives and dispatches messages in batches
+  batch_events = True;
+
   class whenever_handler(object):
     """wrapper for a message handler to be registered vith the whenever
     function""";
@@ -155,7 +158,11 @@ class proxy_wp(octopython.proxy_wp,verbosity):
     _dprint(1,"initializing");
     # registered whenevers
     self._we_ids   = {};  # dict of whenevers (for exact matches)
-    self._we_masks = {};  # list of whenevers (for mask lookups)
+    self._we_masks = hiid_mask_index();  # index of whenevers (for mask lookups)
+    # masks of events that may be coalesced within a batch
+    self._coalesce_masks = hiid_mask_index();
+    # messages received in a batch but not yet dispatched
+    self._backlog = [];
 
   def send (self,msg,to,payload=None,priority=0):
     "sends message to recepient";
@@ -268,32 +275,72 @@ class proxy_wp(octopython.proxy_wp,verbosity):
       # clear one-shots, and remove list if it becomes empty
       if welist and not self._clear_oneshots(welist):
         del self._we_ids[msg.msgid];
-      # check the masks list
-      for mask,welist in list(self._we_masks.items()):
-        if msg.msgid.matches(mask):
-          _dprintf(3,"found %d mask whenevers for %s\n",len(welist),mask);
-          pending_list += welist;
-          if welist and not self._clear_oneshots(welist):
-            del self._we_masks[mask];
+      # check the masks index
+      for mask,welist in self._we_masks.match(msg.msgid):
+        _dprintf(3,"found %d mask whenevers for %s\n",len(welist),mask);
+        pending_list += welist;
+        if welist and not self._clear_oneshots(welist):
+          del self._we_masks[mask];
     finally:
       self.resume_events();
     _dprintf(3,"firing %d matched whenevers\n",len(pending_list));
     for we in pending_list:
       we.fire(msg);
       
+  def coalesce_events (self,mask):
+    """marks events matching 'mask' as coalescable: when several such
+    events arrive in the same batch, only the last one is dispatched.
+    Events are considered to be duplicates if they come from the same sender
+    and their msgids are identical up to the first "*" of the mask, so e.g. 
+    with a mask of "a.b.?.*", "a.b.1.x" and "a.b.1.y" are coalesced, while 
+    "a.b.1.x" and "a.b.2.x" are not.
+    """;
+    mask = make_hiid(mask);
+    path,is_wild = self._coalesce_masks._split(mask);
+    self._coalesce_masks[mask] = len(path);
+
+  def _coalesce_batch (self,msgs,await_=()):
+    """removes all but the last one of each group of coalescable events
+    in a batch of messages. Messages matching an await_ mask are kept.""";
+    if len(msgs) < 2 or not self._coalesce_masks:
+      return msgs;
+    keys = [None]*len(msgs);
+    latest = {};
+    for i,msg in enumerate(msgs):
+      for mask,keylen in self._coalesce_masks.match(msg.msgid):
+        for aw in await_:
+          if aw.matches(msg.msgid):
+            break;
+        else:
+          keys[i] = key = (mask,tuple(msg.msgid)[:keylen],
+                           tuple(getattr(msg,'from',())));
+          latest[key] = i;
+        break;
+    if len(latest) == len([ k for k in keys if k is not None ]):
+      return msgs;
+    _dprintf(3,"coalescing %d events in batch of %d\n",
+             len([ k for k in keys if k is not None ])-len(latest),len(msgs));
+    return [ msg for i,msg in enumerate(msgs)
+             if keys[i] is None or latest[keys[i]] == i ];
+
+  def _take_backlog (self):
+    msgs = self._backlog;
+    self._backlog = [];
+    return msgs;
+
   # poll_pending_events()
   # Calls receive() in a continuous loop, processes events by invoking
   # their whenever handlers.
   def poll_pending_events (self):
       try:  
         _dprint(3,"going into receive_all()");
-        msgs = self.receive_all();
+        msgs = self._take_backlog() + (self.receive_all() or []);
       except octopython.OctoPythonError as value:
         _dprint(1,"exiting on receive error:",value);
         return None;
       # dispatch all messages
       if msgs:
-        for msg in msgs:
+        for msg in self._coalesce_batch(msgs):
           self._dispatch_whenevers(msg);
     
   # event_loop()
@@ -303,44 +350,61 @@ class proxy_wp(octopython.proxy_wp,verbosity):
   # await_ mask is received (returns message).
   # If timeout (in seconds) is supplied, returns None after it has expired.
   # Otherwise loop indefinitely, or until the C++ ProxyWP has exited
-  def event_loop (self,await_=[],timeout=None):
+  def event_loop (self,await_=[],timeout=None,batch=None):
     """runs event loop for this WP -- calls receive() to fetch messages,
     dispatches whenevers, discards messages not matching a whenever. 'await_'
     may be set to one or more msgids, in this case the method will  exit when a
     matching message is received. 'timeout' may be used to specify a time
     limit, use None to loop indefinitely (or until the C++ WP has  exited). If
     timeout=0, processes all pending messages and returns. 
+    If 'batch' is True, all queued messages are received in one go and 
+    dispatched as a group, with coalescable events (see coalesce_events())
+    reduced to the latest one. The default is given by self.batch_events.
     """;
 
     # convert await_ argument to list of hiids
     await_ = make_hiid_list(await_);
+    if batch is None:
+      batch = self.batch_events;
     _dprint(1,"running event loop, timeout",timeout,"await",await_);
 
     if timeout is None: 
       endtime = 1e+40; # quite long enough...
     else:
       endtime = time.time() + timeout;
-    while self.num_pending() or time.time() <= endtime:
+    while self._backlog or self.num_pending() or time.time() <= endtime:
       try:  
-        _dprint(3,"going into receive()");
         if timeout is None:
           to = -1;
         else:
           to = max(0,endtime - time.time());
-        msg = self.receive(to);
+        if self._backlog:
+          msgs = self._take_backlog();
+        elif batch:
+          _dprint(3,"going into receive_batch()");
+          msgs = self.receive_batch(to);
+        else:
+          _dprint(3,"going into receive()");
+          msgs = self.receive(to);
+          msgs = msgs and [msgs];
       except octopython.OctoPythonError as value:
         _dprint(1,"exiting on receive error:",value);
         return None;
-      # msg=None probably indicates timeout, go back up to check
-      if msg is None:
+      # msgs=None probably indicates timeout, go back up to check
+      if not msgs:
         continue;
-      # got message, process it
-      self._dispatch_whenevers(msg);
-      # check for a match in the await-list
-      for aw in await_:
-        if aw.matches(msg.msgid):
-          _dprintf(3,"matches await %s, returning\n",aw);
-          return msg;
+      if batch:
+        msgs = self._coalesce_batch(msgs,await_);
+      # got messages, process them
+      for i,msg in enumerate(msgs):
+        self._dispatch_whenevers(msg);
+        # check for a match in the await-list
+        for aw in await_:
+          if aw.matches(msg.msgid):
+            _dprintf(3,"matches await %s, returning\n",aw);
+            # keep the rest of the batch for the next call
+            self._backlog = msgs[i+1:] + self._backlog;
+            return msg;
     # end of while-loop, if we dropped out, it's a timeout, return None
     return None
 
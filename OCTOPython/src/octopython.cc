@@ -278,6 +278,8 @@ static PyMethodDef OctoMethods[] = {
                     "converts hiid-type sequence to string" },
     { "hiid_matches", hiid_matches, METH_VARARGS, 
                     "tests if two hiids match" },
+    { "new_shared_array",newSharedArray,METH_VARARGS,
+                    "creates array backed by a DMI data block" },
     { "start_reflector",start_reflector,METH_VARARGS,
                     "starts a RelectorWP (usually for testing)" },
     {NULL, NULL}    
@@ -139,6 +139,10 @@ class multiapp_proxy (verbosity):
     self._pwp.whenever('gw.remote.down.*',self._remote_down_handler,subscribe=True);
     # subscribe to process status
     self._pwp.whenever('process.status.*',self._process_stat_handler,subscribe=True);
+    # node status events carry no payload, so within a batch only the latest
+    # status of each node needs to be dispatched
+    for prefix in self._rcv_prefix,self._rcv_prefix_debug:
+      self._pwp.coalesce_events(prefix+"node.status.?.*");
     
     # setup state
     self._verbose_events = True;
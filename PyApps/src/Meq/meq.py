@@ -376,8 +376,11 @@ def shape (arg0=None,*args,**kw):
 def _vells (shape,typecode,value=None):
   """Creates a Meq::Vells of the given shape.""";
   if isinstance(value,(type(None),bool,int,float,complex)):
-    arr = _vells_type.__new__(_vells_type,shape=shape,dtype=typecode);
-    arr.fill(value or 0);
+    # allocate in a DMI block, so that the vells can be handed over to C++
+    # without a copy
+    arr = shared_array(shape,typecode).view(_vells_type);
+    if value:
+      arr.fill(value);
   else:
     arr = _vells_type.__new__(_vells_type,shape=shape,dtype=typecode,buffer=value);
   #print arr,type(arr);
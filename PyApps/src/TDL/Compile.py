@@ -39,7 +39,10 @@ import traceback
 import os
 import os.path
 import inspect
+import itertools
+import hashlib
 import six
+from six.moves import cPickle
 if six.PY3:
   from importlib import reload
   import importlib.machinery
@@ -56,6 +59,14 @@ _tdlmodlist = [];
 _prior_compile_modules = set();
 # this is the currently imported filename
 _current_filename = None;
+# if set, resolved node definitions are cached in this directory, and reused
+# as long as the script, its imported modules and the TDL options stay the same
+forest_cache_dir = os.environ.get('MEQTREES_FOREST_CACHE') or None;
+# bump this when the layout of cache entries changes
+_FOREST_CACHE_VERSION = 2;
+# TDL settings that do not affect the resolved forest, and so are left out of
+# the cache key
+_FOREST_CACHE_IGNORED_SETTINGS = ('forest_state','node_batch_size');
 
 
 def _update_modlist ():
@@ -185,6 +196,148 @@ def import_tdl_module (filename, text=None, config=0):
     # re-raise as a CumulativeError
     raise TDL.CumulativeError(*ns.GetErrors());
 
+def _create_node_batch (mqs,script_name,initrecs):
+  """Sends node definitions (a list of init-records) to the kernel. Forests 
+  of up to Settings.node_batch_size nodes are sent as a single 
+  Create.Node.Batch command. Bigger forests are streamed in chunks of that 
+  size: all but the last chunk are sent with init=False, so the kernel 
+  creates their nodes straight away, but only initializes the forest once 
+  the last one is in.
+  """;
+  num_nodes = len(initrecs);
+  chunk = Timba.TDL.Settings.node_batch_size or num_nodes;
+  if num_nodes <= chunk:
+    mqs.meq('Create.Node.Batch',
+        record(script_name=script_name,batch=list(initrecs)));
+    return;
+  _dprint(1,"streaming",num_nodes,"nodes in chunks of",chunk);
+  for start in range(0,num_nodes,chunk):
+    last = start+chunk >= num_nodes;
+    mqs.meq('Create.Node.Batch',
+        record(script_name=script_name,init=last,total=num_nodes,
+        batch=initrecs[start:start+chunk]),
+        silent=not last);
+
+def _file_digest (path):
+  """Returns MD5 digest of file contents, or None if file can't be read""";
+  try:
+    infile = open(path,'rb');
+  except IOError:
+    return None;
+  try:
+    return hashlib.md5(infile.read()).hexdigest();
+  finally:
+    infile.close();
+
+def _tdlmod_dependencies ():
+  """Returns list of (path,digest) tuples for the source files of all
+  modules in _tdlmodlist""";
+  paths = set();
+  for name in _tdlmodlist:
+    path = getattr(sys.modules.get(name),'__file__',None);
+    if not path:
+      continue;
+    if path.endswith('.pyc') or path.endswith('.pyo'):
+      path = path[:-1];
+    if path.endswith('.py'):
+      paths.add(os.path.abspath(path));
+  return [ (path,_file_digest(path)) for path in sorted(paths) ];
+
+def _tdl_settings ():
+  """Returns sorted list of (name,value) tuples for all TDL settings that
+  affect the resolved forest""";
+  return sorted([ (name,value) for name,value in vars(Timba.TDL.Settings).items()
+                  if not name.startswith('_') and name not in _FOREST_CACHE_IGNORED_SETTINGS
+                  and not inspect.ismodule(value) and not callable(value) ]);
+
+def _forest_cache_file (tdlmod,filename,text,define_args):
+  """Returns name of forest cache entry for this script, given the current
+  compile-time option settings, TDL settings and the arguments to 
+  _define_forest(). Returns None if caching is disabled, or if the script 
+  has opted out by setting _tdl_no_forest_cache = True.
+  Runtime options are not part of the key: they can't affect the forest,
+  since a script whose _define_forest() creates or changes runtime options
+  is never cached (see _define_side_effects() below).
+  """;
+  if not forest_cache_dir or getattr(tdlmod,'_tdl_no_forest_cache',False):
+    return None;
+  key = hashlib.sha1();
+  key.update(("%d %s %s\n"%(_FOREST_CACHE_VERSION,sys.version,os.path.abspath(filename))).encode('utf-8'));
+  key.update(text.encode('utf-8') if isinstance(text,six.text_type) else text);
+  values = [];
+  for item in TDLOptions.get_compile_options():
+    item.collect_values(values);
+  args = [ (name,value) for name,value in define_args.items() if name != 'parent' ];
+  key.update(repr((sorted(values),sorted(args),_tdl_settings())).encode('utf-8'));
+  return os.path.join(forest_cache_dir,key.hexdigest()+'.forest');
+
+def _define_state (tdlmod):
+  """Returns a snapshot of the state that _define_forest() may change
+  besides the forest itself: the runtime menu, the list of TDL jobs, and the
+  globals of the script module. Used with _define_side_effects().""";
+  return (list(TDLOptions.get_runtime_options()),TDLOptions.get_all_jobs(),dict(vars(tdlmod)));
+
+def _define_side_effects (tdlmod,state0):
+  """Compares the current state to a snapshot taken by _define_state() 
+  before calling _define_forest(). Returns a description of the first side 
+  effect found, or None if there are none. Forests of scripts with side 
+  effects can't be cached, since a cache hit skips _define_forest().""";
+  runtime0,jobs0,globals0 = state0;
+  runtime = TDLOptions.get_runtime_options();
+  if len(runtime) != len(runtime0) or [ 1 for a,b in zip(runtime,runtime0) if a is not b ]:
+    return "runtime options or menus were defined";
+  if TDLOptions.get_all_jobs() != jobs0:
+    return "TDL jobs were defined";
+  for name,value in vars(tdlmod).items():
+    if name not in globals0 or globals0[name] is not value:
+      return "global '%s' was set"%name;
+  return None;
+
+def _forest_cache_load (cache_file):
+  """Loads a forest cache entry. Returns tuple of (initrecs,num_roots,forest_state),
+  or None if the entry does not exist, can't be read, or if any of the modules 
+  it depends on have changed.""";
+  try:
+    infile = open(cache_file,'rb');
+  except IOError:
+    return None;
+  try:
+    try:
+      entry = cPickle.load(infile);
+    except Exception:
+      _dprint(0,"error reading forest cache",cache_file,", ignoring it:",sys.exc_info()[1]);
+      return None;
+  finally:
+    infile.close();
+  for path,digest in entry['dependencies']:
+    if _file_digest(path) != digest:
+      _dprint(1,"forest cache",cache_file,"is stale:",path,"has changed");
+      return None;
+  return (entry['initrecs'],entry['num_roots'],entry['forest_state']);
+
+def _forest_cache_save (cache_file,initrecs,num_roots,forest_state):
+  """Writes a forest cache entry. Errors are reported but otherwise ignored.""";
+  entry = dict(dependencies=_tdlmod_dependencies(),
+               initrecs=initrecs,num_roots=num_roots,forest_state=forest_state);
+  tmpfile = "%s.%d.tmp"%(cache_file,os.getpid());
+  try:
+    if not os.path.isdir(forest_cache_dir):
+      os.makedirs(forest_cache_dir);
+    outfile = open(tmpfile,'wb');
+    try:
+      cPickle.dump(entry,outfile,cPickle.HIGHEST_PROTOCOL);
+    finally:
+      outfile.close();
+    # rename is atomic, so concurrent pipelines never see half-written entries
+    os.rename(tmpfile,cache_file);
+    _dprint(1,"saved",len(initrecs),"node definitions to forest cache",cache_file);
+  except Exception:
+    _dprint(0,"error writing forest cache",cache_file,":",sys.exc_info()[1]);
+    try:
+      os.unlink(tmpfile);
+    except OSError:
+      pass;
+
 def run_forest_definition (mqs,filename,tdlmod,text,
                            parent=None,wait=True,
                            predef_args={},define_args={},postdef_args={}):
@@ -200,10 +353,19 @@ def run_forest_definition (mqs,filename,tdlmod,text,
     define_args: dict of extra arguments for _define_forest()
     postdef_args: dict of extra arguments for _tdl_postdefine()
 
+  If forest_cache_dir is set, the resolved node definitions are cached there.
+  A later run of the same script with the same compile-time options, TDL 
+  settings and unchanged modules then sends the cached definitions to the 
+  meqserver, without calling _define_forest() at all. Forests are not cached
+  if _define_forest() defines runtime options, menus or jobs, or sets any
+  globals of the script. Scripts that rely on other side effects of 
+  _define_forest() (e.g. changing objects in place) must set 
+  _tdl_no_forest_cache = True to disable caching.
+
   Return value:
     a tuple of (module,ns,message), where module is the newly-imported
-    TDL module, ns is a NodeScope object, and message is an
-    informational message.
+    TDL module, ns is a NodeScope object (empty if the forest came from
+    the cache), and message is an informational message.
 
   Exceptions thrown:
     Any compilation error results in an exception. This is always
@@ -243,38 +405,59 @@ def run_forest_definition (mqs,filename,tdlmod,text,
         args.update(predef_result);
     else:
       args = {};
-    # call the define function
-    define_func(ns,**args);
-    _update_modlist();
-    # resolve the nodescope
-    ns.Resolve();
-    # do we have an error list? show it
-    errlist = ns.GetErrors();
-    if errlist:
-      raise TDL.CumulativeError(*errlist);
-    allnodes = ns.AllNodes();
-    num_nodes = len(allnodes);
-    # no nodes? return
-    if not num_nodes:
-      return (tdlmod,ns,"TDL script successfully compiled, but no nodes were defined.");
+    # check the forest cache: on a hit, the define and resolve steps are skipped
+    cache_file = mqs is not None and _forest_cache_file(tdlmod,filename,text,args);
+    cached = cache_file and _forest_cache_load(cache_file);
+    if cached:
+      initrecs,num_roots,fst = cached;
+      Timba.TDL.Settings.forest_state = fst;
+      num_nodes = len(initrecs);
+      _dprint(1,"loaded",num_nodes,"node definitions from forest cache",cache_file);
+    else:
+      # call the define function
+      state0 = cache_file and _define_state(tdlmod);
+      define_func(ns,**args);
+      _update_modlist();
+      if cache_file:
+        side_effect = _define_side_effects(tdlmod,state0);
+        if side_effect:
+          _dprint(1,"not caching forest:",side_effect,"by _define_forest()");
+          cache_file = None;
+      # resolve the nodescope
+      ns.Resolve();
+      # do we have an error list? show it
+      errlist = ns.GetErrors();
+      if errlist:
+        raise TDL.CumulativeError(*errlist);
+      allnodes = ns.AllNodes();
+      num_nodes = len(allnodes);
+      # no nodes? return
+      if not num_nodes:
+        return (tdlmod,ns,"TDL script successfully compiled, but no nodes were defined.");
+      initrecs = [ nr.initrec() for nr in allnodes.values() ];
+      num_roots = len(ns.RootNodes());
+      fst = getattr(Timba.TDL.Settings,'forest_state',record());
+      if cache_file:
+        _forest_cache_save(cache_file,initrecs,num_roots,fst);
     # try to run stuff
     if mqs is not None:
       meqds.clear_forest();
       # is a forest state defined? send it on then
-      fst = getattr(Timba.TDL.Settings,'forest_state',record());
       # add in source code
       fst.tdl_source = record(**{os.path.basename(filename):text});
       mqs.meq('Set.Forest.State',record(state=fst,get_forest_status=0));
-      if num_nodes:
-        mqs.meq('Create.Node.Batch',
-            record(script_name=os.path.basename(filename),
-            batch=[nr.initrec() for nr in iter(allnodes.values())]));
-#        mqs.meq('Init.Node.Batch',record(name=list(ns.RootNodes().iterkeys())),wait=wait);
-        msg = """TDL script successfully compiled. %d node definitions
-  (of which %d are root nodes) sent to meqserver.""" \
-          % (num_nodes,len(ns.RootNodes()));
-      else:
-        msg = "TDL script successfully compiled, but no nodes were defined.";
+      _create_node_batch(mqs,os.path.basename(filename),initrecs);
+#      mqs.meq('Init.Node.Batch',record(name=list(ns.RootNodes().iterkeys())),wait=wait);
+      msg = """TDL script successfully compiled. %d node definitions
+  (of which %d are root nodes) sent to meqserver.""" % (num_nodes,num_roots);
+      if cached:
+        msg += "\nNode definitions were loaded from the forest cache.";
+      num_fused = len([ rec for rec in initrecs if rec.get('class') == 'MeqFusedFunction' ]);
+      if num_fused:
+        msg += "\n%d elementwise chains were fused."%num_fused;
+      num_factored = len([ rec for rec in initrecs if rec.get('factor_oper') or rec.get('factor_group_size',1) > 1 ]);
+      if num_factored:
+        msg += "\n%d reductions of products were factored."%num_factored;
     else:
       msg = "TDL script successfully compiled, %d nodes were defined."%num_nodes;
 
@@ -27,7 +27,32 @@ from Timba import dmi
 
 # This file contains initial TDL settings
 
+# If False, nodes without parents are deleted at resolve time, unless they
+# are in a node group such as ns.ROOT, or are sinks, spigots or the VisDataMux.
+# A node that is only held by a script variable is deleted as well, so add 
+# such nodes to ns.ROOT (or another node group) to keep them. At TDL debug
+# verbosity 3 and above, deleted nodes that are still referenced from 
+# elsewhere are reported.
 orphans_are_roots = True;
 
+# number of node definitions sent to the kernel per Create.Node.Batch
+# command. Bigger forests are streamed in chunks of this size, so that the
+# kernel can create nodes while the rest are still being sent. 0 sends the
+# whole forest in one go.
+node_batch_size = 10000;
+
+# if True, chains of elementwise function nodes (Add, Multiply, Sin, Exp,
+# ToComplex, etc.) are collapsed into single MeqFusedFunction nodes when the
+# forest is resolved. Only the top node of every chain remains in the forest, so
+# intermediate nodes of a chain can't be published or have breakpoints set.
+fuse_elementwise = False;
+
+# if True, Mean, Sum and WSum nodes of products (e.g. a per-channel bandpass
+# times a per-timeslot gain) take over the factors of the product as their
+# children when the forest is resolved, and reduce the product without
+# expanding it into a full time-freq grid. As with fusion, the absorbed 
+# Multiply nodes no longer exist in the forest.
+factor_reductions = False;
+
 forest_state = dmi.record();
 
@@ -29,9 +29,11 @@ from Timba import utils
 import Timba.TDL.Settings
 
 import sys
+import types
 import weakref
 import gc
 import traceback
+import time
 import re
 import os.path
 import copy
@@ -470,7 +472,7 @@ class _NodeStub (object):
             "nodeindex",
             "_initrec","_name_stack","_bind_stack","_debuginfo","_basenode",
             "_must_define_stack","_must_define_by",
-            "_proc","_multiproc","_search_cookie" );
+            "_proc","_multiproc","_search_cookie","_uses" );
   class Parents (weakref.WeakValueDictionary):
     """The Parents class is used to manage a weakly-reffed dictionary of the
     node's parents. We only redefine it as a class to implement __copy__
@@ -497,7 +499,14 @@ class _NodeStub (object):
     self.kwquals = kwquals;
     self.classname = None;
     self.parents = self.Parents();
-    self._basenode = basenode;
+    # number of uses of the node other than by parents: one per node group 
+    # or repository list (sinks, spigots, processor assignments, mux) that 
+    # holds it. Parents are not counted here, since the weak parent map can
+    # lose entries behind our back when a parent is garbage-collected. Nodes 
+    # with no parents and no uses are orphans.
+    self._uses = 0;
+    # weakref, so that derived nodes don't keep their basenode from being orphaned
+    self._basenode = basenode and weakref.ref(basenode);
     self._initrec = None;         # uninitialized node
     self._proc = None;
     # figure out source location from where node was defined.
@@ -519,6 +528,14 @@ class _NodeStub (object):
     return self;
   def __deepcopy__ (self,memo):
     return self;
+  def _add_parent (self,parent):
+    """Enters parent into the node's parent map.""";
+    if self.name in self.scope._repository._absorbed:
+      raise ChildError("node '%s' was absorbed into another node when the forest was resolved, and can't be used as a child"%self.name);
+    self.parents[parent.name] = parent;
+  def _remove_parent (self,name):
+    """Removes the named parent from the node's parent map.""";
+    self.parents.pop(name,None);
   def bind (self,arg,*args,**kwargs):
     """The bind() method is an alternative form of <<. If called with
     a str as the first argument, it is assumed to be a classname, and a
@@ -566,7 +583,8 @@ class _NodeStub (object):
       # and child list
       initrec = nodedef.initrec;
       if self.initialized():
-        if initrec != self._initrec or \
+        if ( initrec is not self._initrec and 
+              _definition_fields(initrec) != _definition_fields(self._initrec) ) or \
               children != self.children or \
               stepchildren != self.stepchildren:
           _dprint(1,'old definition',self._initrec);
@@ -588,21 +606,26 @@ class _NodeStub (object):
         # add ourselves to parent list
         for (lbl,child) in self.children + self.stepchildren:
           if child is not None:
-            child.parents[self.name] = self;
+            child._add_parent(self);
         # set init record and add ourselves to repository
         # if creating sink or spigot, mark that we need a VisDataMux
         if self.classname == 'MeqSink':
           self.scope._repository._sinks.append(self);
+          self._uses += 1;
         elif self.classname == 'MeqSpigot':
           self.scope._repository._spigots.append(self);
+          self._uses += 1;
         # if creating a VisDataMux explicitly, mark that we have one
         elif self.classname == 'MeqVisDataMux':
-          self.scope._repository._have_vdm = self;
+          self.scope._repository._set_vdm(self);
         self._initrec = initrec;
         # get processor keyword, add to list of processor assignments
         proc = self._proc = initrec.get('proc',None);
         if proc is not None:
           self.scope._repository._proc_assignment.setdefault(proc,[]).append(self);
+          self._uses += 1;
+        # assign nodeindex and finalize the init-record
+        self.scope._repository._finalize_node(self);
       # success
       self._bind_stack = this_stack;
       return self;
@@ -746,12 +769,12 @@ class _NodeStub (object):
     errors for all the basenodes of the current node. If no basenodes found, returns
     None""";
     chain = [];
-    basenode = self._basenode;
+    basenode = self._basenode and self._basenode();
     _dprint(5,"_get_definition_chain: basenode is",basenode and basenode.name);
     while basenode:
       chain.append(basenode._name_stack.make_error(NamedHere,
                       "possibly derived from node '%s'"%basenode.name,append_callstack=False));
-      basenode = basenode._basenode;
+      basenode = basenode._basenode and basenode._basenode();
       _dprint(5,"_get_definition_chain: basenode is",basenode and basenode.name);
     return chain;
 
@@ -803,7 +826,8 @@ class _NodeStub (object):
     # add ourselves to parent list
     for num,child in children:
       if child is not None:
-        child.parents[self.name] = self;
+        child._add_parent(self);
+    self.scope._repository._touch(self);
     return self;
   # add_stepchildren(...)    adds stepchildren to node
   def add_stepchildren (self,*args):
@@ -816,7 +840,8 @@ class _NodeStub (object):
       self.stepchildren.append((len(self.stepchildren),node));
     # add ourselves to parent list
     for num,child in stepchildren:
-      child.parents[self.name] = self;
+      child._add_parent(self);
+    self.scope._repository._touch(self);
     return self;
   def family (self):
     """Returns the node's "family": i.e. all (initialized) nodes which have
@@ -903,6 +928,12 @@ class NodeGroup (dict):
 #       if nodedef.error:
 #         raise nodedef.error;
 #       node = nodedef.autodefine(self);
+    # group membership counts as a use of the node
+    old = dict.get(self,node.name);
+    if old is not node:
+      if old is not None:
+        old._uses -= 1;
+      node._uses += 1;
     dict.__setitem__(self,node.name,node);
     return node;
   def __contains__ (self,node):
@@ -911,6 +942,27 @@ class NodeGroup (dict):
     try: return dict.__contains__(self,node.name);
     except AttributeError: return False;
 
+# fields of the init-record that are filled in by the repository, rather
+# than given by the node definition
+_ResolvedFields = ('name','nodeindex','node_description','children','step_children','parents');
+
+def _definition_fields (initrec):
+  """returns a copy of an init-record without the fields filled in by the 
+  repository. Used to compare node definitions.""";
+  rec = initrec.copy();
+  for field in _ResolvedFields:
+    rec.pop(field,None);
+  return rec;
+
+# classes of elementwise function nodes that may be fused into a
+# MeqFusedFunction (see _NodeRepository._fuse_elementwise()). As in the
+# unfused nodes, a fused MeqAdd or MeqMultiply skips operands with missing data
+_FusibleClasses = frozenset([ "Meq"+name for name in 
+  ("Add","Multiply","Subtract","Divide","Pow","ToComplex","Polar","Atan2","FMod",
+   "Negate","Invert","Sin","Cos","Tan","Sinh","Cosh","Tanh","Exp","Log","Sqrt",
+   "Sqr","Pow2","Pow3","Pow4","Pow5","Pow6","Pow7","Pow8","Conj",
+   "Asin","Acos","Atan","Ceil","Floor","Abs","Fabs","Arg","Real","Imag") ]);
+
 _MODULE_FILENAME = Timba.utils.extract_stack()[-1][0];
 _MODULE_DIRNAME = os.path.dirname(_MODULE_FILENAME);
 
@@ -939,51 +991,276 @@ class _NodeRepository (dict):
     self._proc_assignment = {};
     # used during recursive searches
     self._search_cookie = 0;
+    # nodeindices are assigned as nodes are bound
+    self._next_nodeindex = 1;
+    # names of node stubs that have not been bound yet
+    self._unbound = set();
+    # names of nodes that have been bound, or had their children or parents
+    # changed, since the last resolve()
+    self._changed = set();
+    # stubs of nodes absorbed by _factor_reductions() or _fuse_elementwise()
+    self._absorbed = {};
+    # (pass,seconds) timings of the last resolve()
+    self.resolve_timings = [];
 
   def nodeStub (self,name,*args,**kwargs):
     """If the named node stub exists in the repository, returns it.
     Else creates a new _NodeStub with the given arguments, adds it to the repository,
-    and returns it.
+    and returns it. Stubs of absorbed nodes are returned as they are (see _absorb()).
     """;
     try:
       return self[name];
     except KeyError:
+      absorbed = self._absorbed.get(name);
+      if absorbed is not None:
+        return absorbed;
       nodestub = self[name] = _NodeStub(name,*args,**kwargs);
+      self._unbound.add(name);
       return nodestub;
 
+  def _finalize_node (self,node):
+    """Called when a node stub is bound. Assigns a nodeindex, fills in the
+    name and description fields of the init-record, and marks the node 
+    as changed for the next resolve().
+    """;
+    # the init-record may be shared with another node (when the same NodeDef
+    # is bound twice), in which case we need our own copy
+    if 'nodeindex' in node._initrec:
+      node._initrec = node._initrec.copy();
+    node.nodeindex = node._initrec.nodeindex = self._next_nodeindex;
+    self._next_nodeindex += 1;
+    node._initrec.node_description = ':'.join(map(str,[node.name,node.classname,node._debuginfo]));
+    node._initrec.name = node.name;
+    self._unbound.discard(node.name);
+    self._touch(node);
+
+  def _set_vdm (self,node):
+    """Sets (or clears, if node is None) the VisDataMux of the repository.
+    Being the mux counts as a use of the node.""";
+    if self._have_vdm is not node:
+      if self._have_vdm:
+        self._have_vdm._uses -= 1;
+      if node:
+        node._uses += 1;
+      self._have_vdm = node;
+
+  def _touch (self,node):
+    """Marks a node and its children (whose parent lists have changed)
+    as changed since the last resolve().""";
+    self._changed.add(node.name);
+    for (lbl,child) in node.children + node.stepchildren:
+      if child is not None:
+        self._changed.add(child.name);
+
   def deleteOrphan (self,name):
-    """recursively deletes orphaned branches""";
+    """Deletes an orphaned node, then goes on to delete those of its children
+    that have been orphaned in turn. Returns True if the node was deleted
+    (or already gone), or False if it is not an orphan.""";
+    children = self._deleteIfOrphan(name);
+    if children is None:
+      return False;
+    # walk down the tree with an explicit stack, as branches can be very deep
+    while children:
+      grandchildren = self._deleteIfOrphan(children.pop());
+      if grandchildren:
+        children += grandchildren;
+    return True;
+
+  def _deleteIfOrphan (self,name):
+    """Helper for deleteOrphan(). Deletes the named node if it is a true 
+    orphan, i.e. has no parents and no uses (see _NodeStub._uses): it is
+    not held by a node group or by the repository's lists. References from 
+    the user's script don't count, so a node held only by a script variable
+    is deleted too. Returns a list of the names of its children if it was 
+    deleted, an empty list if it was already gone, or None if it is not an 
+    orphan.""";
     node = self.get(name,None);
     if not node:  # already deleted
-      return True;
+      return [];
+    if node.parents:
+      _dprint(3,"node",name,"has parents, skipping");
+      return None;
+    if node._uses > 0:
+      _dprint(3,"node",name,"has",node._uses,"uses, is now a true root");
+      self._roots[name] = node;
+      return None;
+    _dprint(3,"deleting orphan node",name);
     # unqualified name: delete from scope dictionary too
     if not ( node.quals or node.kwquals ):
       try: delattr(node.scope,node.name.split('::')[-1]);
       except AttributeError: pass;
-    # get refcount of this node. True orphans will only have 2:
-    # ourselves, and the local 'node' symbol.
-    refcount = len(gc.get_referrers(node));
-    if refcount > 2:
-      _dprint(3,"node",name,"has",refcount,"refs to it, skipping");
-      if _dbg.verbose > 4:
-        for r in gc.get_referrers(node):
-          _dprint(5,'referrer:',type(r),getattr(r,'__name__',''),getattr(r,'f_lineno',''));
-      if not node.parents:
-        _dprint(3,"node",name,"is now a true root");
-        self._roots[name] = node;
-      return False;
-    _dprint(3,"deleting orphan node",name);
+    # in debug mode, report nodes that are only kept alive from outside the
+    # repository (e.g. by script variables). Asking the garbage collector 
+    # scans the whole heap, so it's very slow for big trees.
+    if _dbg.verbose > 2:
+      referrers = [ r for r in gc.get_referrers(node)
+                    if r is not self and r is not self._roots
+                    and not isinstance(r,types.FrameType) ];
+      if referrers:
+        _dprint(3,"node",name,"is still referenced by",len(referrers),
+                  "objects outside the repository, but has no parents and is not in a node group, so it is deleted");
+        if _dbg.verbose > 4:
+          for r in referrers:
+            _dprint(5,'referrer:',type(r),getattr(r,'__name__',''),getattr(r,'f_lineno',''));
     # get list of children names (don't wanna hold refs to them because
-    # it interferes with the orphaning)
-    children = [x[1] and x[1].name for x in node.children] + [x[1] and x[1].name for x in node.stepchildren];
+    # it interferes with the orphaning), and remove us from their parent maps
+    children = [ ch.name for lbl,ch in node.children + node.stepchildren if ch is not None ];
+    for lbl,ch in node.children + node.stepchildren:
+      if ch is not None:
+        ch._remove_parent(name);
     del self[name];
-    node = None;
+    self._roots.pop(name,None);
+    node = ch = None;
+    # children have lost a parent
+    self._changed.update(children);
     if children:
       _dprint(3,"checking potentially orphaned children: ",children);
-      for ch in children:
-        if ch:
-          self.deleteOrphan(ch);
-    return True;
+    return children;
+
+  def _absorb (self,node):
+    """Removes a node absorbed into another one by _factor_reductions() or
+    _fuse_elementwise() from the repository. Unlike a deleted orphan, the 
+    node stays in its scope, and nodeStub() keeps returning its stub, so 
+    scripts looking it up by name get the same stub they may already hold,
+    rather than a new unbound one. The stub can't be made a child of other
+    nodes though, since the node no longer exists in the forest.""";
+    del self[node.name];
+    self._roots.pop(node.name,None);
+    self._absorbed[node.name] = node;
+
+  def _factor_reductions (self,changed):
+    """Lets Mean, Sum and WSum nodes reduce products of their inputs
+    without expanding them. A Mean or Sum of a single Multiply (or Add) 
+    node takes over that node's children as factors (by setting 
+    factor_oper), and a WSum of Multiply nodes with equal numbers of 
+    children takes over all their children in groups (by setting
+    factor_group_size). Multiply and Add nodes are only absorbed if they
+    have no other parents, and their definitions have no fields beyond the
+    class. Absorbed nodes are removed from the repository (see _absorb()).
+    Names of changed nodes are added to 'changed'. Returns the number of 
+    rewritten nodes.
+    """;
+    def absorbable (node):
+      return node.classname in ("MeqMultiply","MeqAdd") and len(node.parents) == 1 and \
+             len(node.children) > 1 and not node.stepchildren and \
+             list(_definition_fields(node._initrec).keys()) == ['class'] and \
+             not [ ch for lbl,ch in node.children if ch is None ];
+    def reducible (node):
+      return node.initialized() and node.classname in ("MeqMean","MeqSum","MeqWSum") and \
+             not node.stepchildren and not [ ch for lbl,ch in node.children if ch is None ] and \
+             'flag_mask' not in node._initrec and 'factor_oper' not in node._initrec and \
+             'factor_group_size' not in node._initrec;
+    count = 0;
+    for node in [ node for node in self.values() if reducible(node) ]:
+      terms = [ ch for lbl,ch in node.children ];
+      if not terms or len(set([ ch.name for ch in terms ])) != len(terms) or \
+          [ ch for ch in terms if not absorbable(ch) ]:
+        continue;
+      if node.classname == "MeqWSum":
+        group_size = len(terms[0].children);
+        if [ ch for ch in terms if ch.classname != "MeqMultiply" or len(ch.children) != group_size ]:
+          continue;
+      elif len(terms) != 1:
+        continue;
+      _dprint(3,"factoring",[ch.name for ch in terms],"into",node.name);
+      # remove absorbed nodes, and detach all factors from their old parents
+      factors = [];
+      for term in terms:
+        for lbl,ch in term.children:
+          ch._remove_parent(term.name);
+          factors.append(ch);
+        self._absorb(term);
+        changed.discard(term.name);
+      # make factors the children of the reduction node
+      node.children = _NodeDef.ChildList(factors);
+      node.children._resolved = True;
+      for ch in factors:
+        ch._add_parent(node);
+      initrec = node._initrec = node._initrec.copy();
+      if node.classname == "MeqWSum":
+        initrec.factor_group_size = group_size;
+      else:
+        initrec.factor_oper = 'multiply' if terms[0].classname == "MeqMultiply" else 'add';
+      self._touch(node);
+      count += 1;
+    changed.update(self._changed);
+    self._changed = set();
+    return count;
+
+  def _fuse_elementwise (self,changed):
+    """Collapses chains of elementwise function nodes into MeqFusedFunction
+    nodes. A node is absorbed into its parent if both are elementwise
+    functions, the node has no other parents, and its definition has no
+    fields beyond the class. The top node of each chain becomes a
+    MeqFusedFunction (keeping its name, and hence any breakpoints or
+    publishing set on it), and the inputs of the chain become its children.
+    Absorbed nodes are removed from the repository (see _absorb()). Names of
+    changed nodes are added to 'changed'. Returns the number of fused chains.
+    """;
+    def eligible (node):
+      return node.classname in _FusibleClasses and not node.stepchildren and \
+             'flag_mask' not in node._initrec and 'integrated' not in node._initrec and \
+             not [ ch for lbl,ch in node.children if ch is None ];
+    def absorbable (node):
+      if not eligible(node) or len(node.parents) != 1 or \
+          list(_definition_fields(node._initrec).keys()) != ['class']:
+        return False;
+      parent = list(node.parents.values())[0];
+      return eligible(parent) and \
+             len([ ch for lbl,ch in parent.children if ch is node ]) == 1;
+    tops = [ node for node in self.values() if node.initialized() and eligible(node) 
+             and not absorbable(node) and [ ch for lbl,ch in node.children if absorbable(ch) ] ];
+    for top in tops:
+      # walk the chain in postfix order, with an explicit stack as chains 
+      # can be very deep
+      classes = [];
+      child_index = [];
+      num_children = [];
+      leaves = [];
+      leaf_index = {};
+      absorbed = [];
+      stack = [(top,False)];
+      while stack:
+        node,expanded = stack.pop();
+        if expanded:
+          classes.append(node.classname);
+          child_index.append(0);
+          num_children.append(len(node.children));
+        elif node is top or absorbable(node):
+          if node is not top:
+            absorbed.append(node);
+          stack.append((node,True));
+          stack += [ (ch,False) for lbl,ch in reversed(node.children) ];
+        else:
+          if node.name not in leaf_index:
+            leaf_index[node.name] = len(leaves);
+            leaves.append(node);
+          classes.append('');
+          child_index.append(leaf_index[node.name]);
+          num_children.append(0);
+      _dprint(3,"fusing",len(absorbed),"nodes into",top.name);
+      # remove absorbed nodes, and detach all inputs from their old parents
+      for node in [top] + absorbed:
+        for lbl,ch in node.children:
+          ch._remove_parent(node.name);
+      for node in absorbed:
+        self._absorb(node);
+        changed.discard(node.name);
+      node = None;
+      # turn top node into a fused function of the inputs
+      top.children = _NodeDef.ChildList(leaves);
+      top.children._resolved = True;
+      for leaf in leaves:
+        leaf._add_parent(top);
+      initrec = top._initrec = top._initrec.copy();
+      top.classname = initrec['class'] = 'MeqFusedFunction';
+      initrec.function_class = classes;
+      initrec.child_index = child_index;
+      initrec.num_children = num_children;
+      self._touch(top);
+    changed.update(self._changed);
+    self._changed = set();
+    return len(tops);
 
   def rootmap (self):
     try: return self._roots;
@@ -1172,15 +1449,26 @@ class _NodeRepository (dict):
     cleanup_orphans: If True, then all orphan nodes are deleted.
                      If False, all orphans will be treated as root nodes.
     This will also create a VisDataMux as needed.
+    Nodes receive their nodeindex and init-record fields as they are bound,
+    so only nodes that were bound or changed since the last resolve() are 
+    checked here. The time taken by each pass is recorded in 
+    self.resolve_timings, as a list of (pass,seconds) tuples.
     """;
-    uninit = [];
     orphans = [];
-    self._roots = {};
+    if not hasattr(self,'_roots'):
+      self._roots = {};
+    timings = self.resolve_timings = [];
+    pass_start = [time.time()];
+    def end_of_pass (label):
+      t = time.time();
+      timings.append((label,t-pass_start[0]));
+      _dprintf(1,"resolve: %s pass took %.3fs\n",label,t-pass_start[0]);
+      pass_start[0] = t;
     # create mux if needed.
     if self._sinks or self._spigots:
       if not self._have_vdm:
-        self._have_vdm = self._root_scope.VisDataMux << \
-          _Meq.VisDataMux(children={'pre':None,'post':None,'start':None});
+        self._set_vdm(self._root_scope.VisDataMux << \
+          _Meq.VisDataMux(children={'pre':None,'post':None,'start':None}));
       # now assign sinks and spigots to vdm, unless they already have a
       # vdm parent
       self._have_vdm.add_children(*[ node for node in self._sinks
@@ -1189,7 +1477,7 @@ class _NodeRepository (dict):
         if 'MeqVisDataMux' not in [ p.classname for p in node.parents.values() ] ]);
     else: # no vdm needed. So release ref to it even if explicitly created,
       # to ensure it is orphaned or kept as needed elsewhere.
-      self._have_vdm = None;
+      self._set_vdm(None);
     ## finalize MPI processor assignments, if any were specified
     if self._proc_assignment:
       # for each explicitly specified processor assignment, go
@@ -1210,69 +1498,89 @@ class _NodeRepository (dict):
             dup = child(P=proc);
             if not dup.initialized():
               dup << child.duplicate();
-            child = dup;
             # assign new child node
             if ich < len(node.children):
-              node.children[ich] = label,child;
+              node.children[ich] = label,dup;
             else:
-              node.stepchildren[ich-len(node.children)] = label,child;
+              node.stepchildren[ich-len(node.children)] = label,dup;
+            dup._add_parent(node);
+            if not [ ch for lbl,ch in node.children + node.stepchildren if ch is child ]:
+              child._remove_parent(node.name);
+            child = dup;
+            self._touch(node);
             recursive_proc_assign(child,proc);
       # call function above on all "root" processor assignments
       for proc,nodelist in self._proc_assignment.items():
         for node in nodelist:
           recursive_proc_assign(node,proc);
-    # now go through node list, weed out uninitialized nodes, finalize
-    # parents and children, etc.
-    current_nodeindex = 1;
-    for (name,node) in self.items():
-      if not node.initialized():
-        uninit.append(name);
+    end_of_pass("mux");
+    # now go through the changed nodes, check their children, and 
+    # look for roots
+    changed = self._changed;
+    self._changed = set();
+    for name in changed:
+      node = self.get(name,None);
+      if node is None or not node.initialized():
+        continue;
+      # no parents? add to roots or to suspected orphans
+      if not node.parents:
+        if cleanup_orphans:
+          orphans.append(name);
+        else:
+          self._roots[name] = node;
       else:
-        # no parents? add to roots or to suspected orphans
-        if not node.parents:
-          if cleanup_orphans:
-            orphans.append(name);
-          else:
-            self._roots[name] = node;
-        for (i,ch) in node.children:
-          if ch is not None and not ch.initialized():
-            self.add_error(
-              ch._name_stack.make_error(UninitializedNode,
-                                "node '%s' not initialized"%ch.name,
-                                 nested=ch._get_definition_chain()));
-            if node._name_stack != ch._name_stack:
-              self.add_error(node._name_stack.make_error(UninitializedNode,
-                                "...node '%s' used in this context"%ch.name));
-        # make copy of initrec if needed
-        if hasattr(node._initrec,'name'):
-          node._initrec = node._initrec.copy();
-        # finalize the init-record by adding node name and children
-        node.nodeindex = node._initrec.nodeindex = current_nodeindex;
-        current_nodeindex += 1;
-        node._initrec.node_description = ':'.join(map(str, [name, node.classname, node._debuginfo]));
-        node._initrec.name = node.name;
-        _dprint(3,'checked node',node.name,'nodeindex',node.nodeindex);
-        ch = None; # relinquish ref to node, otherwise orphan collection is confused
+        self._roots.pop(name,None);
+      for (i,ch) in node.children:
+        if ch is not None and not ch.initialized():
+          self.add_error(
+            ch._name_stack.make_error(UninitializedNode,
+                              "node '%s' not initialized"%ch.name,
+                               nested=ch._get_definition_chain()));
+          if node._name_stack != ch._name_stack:
+            self.add_error(node._name_stack.make_error(UninitializedNode,
+                              "...node '%s' used in this context"%ch.name));
+      _dprint(3,'checked node',node.name,'nodeindex',node.nodeindex);
+      ch = None; # relinquish ref to node, otherwise orphan collection is confused
     node = None;  # relinquish ref to node, otherwise orphan collection is confused
+    end_of_pass("check");
     # now check for accumulated errors
     if len(self._errors):
       _dprint(1,len(self._errors),"errors reported");
       raise CumulativeError(*self._errors);
-    _dprint(1,"found",len(uninit),"uninitialized nodes");
+    _dprint(1,"found",len(self._unbound),"uninitialized nodes");
     _dprint(1,"found",len(orphans) or len(self._roots),"roots");
-    if uninit:
-      _dprint(3,"uninitialized:",uninit);
-      for name in uninit:
+    if self._unbound:
+      _dprint(3,"uninitialized:",self._unbound);
+      for name in self._unbound:
         del self[name];
+      self._unbound = set();
     # clean up potential orphans: if deleteOrphan() returns False, then node is
     # not really an orphan, so we move it to the roots group instead
     len0 = len(self);
     if cleanup_orphans:
       list(map(self.deleteOrphan,orphans));
     _dprint(1,len0 - len(self),"orphans were deleted,",len(self._roots),"roots remain");
+    end_of_pass("orphans");
+    # children of deleted orphans have lost parents, so they're changed as well
+    changed.update(self._changed);
+    self._changed = set();
+    # let reductions take over products of their inputs, if enabled. This
+    # goes before fusion, which would otherwise absorb the products.
+    if Timba.TDL.Settings.factor_reductions:
+      self.num_factored_reductions = self._factor_reductions(changed);
+      _dprint(1,self.num_factored_reductions,"reductions were factored");
+      end_of_pass("factoring");
+    # fuse chains of elementwise functions, if enabled
+    if Timba.TDL.Settings.fuse_elementwise:
+      self.num_fused_chains = self._fuse_elementwise(changed);
+      _dprint(1,self.num_fused_chains,"elementwise chains were fused");
+      end_of_pass("fusion");
     # now that all nodeindices have been assigned, do another loop to resolve
     # the children specifications and replace them with node indices
-    for node in self.values():
+    for name in changed:
+      node = self.get(name,None);
+      if node is None:
+        continue;
       if node.children.is_dict:
         children = dmi.record([(label,getattr(child,'nodeindex',-1))
                                   for label,child in node.children]);
@@ -1286,6 +1594,10 @@ class _NodeRepository (dict):
       # assign parent list
       if node.parents:
         node._initrec.parents = [ parent.nodeindex for parent in node.parents.values() ];
+      else:
+        node._initrec.pop('parents',None);
+    node = None;
+    end_of_pass("children");
       
     # print roots in debug mode
     if _dbg.verbose > 3:
@@ -1295,6 +1607,7 @@ class _NodeRepository (dict):
     _dprint(1,len(self),"total nodes in repository");
     if _dbg.verbose>4:
       _dprint(5,"nodes remaining:",list(self.keys()));
+    _dprint(1,"resolved",len(changed),"changed nodes in %.3fs"%sum([t for p,t in timings]));
 
 class NodeScope (object):
   def __init__ (self,name=None,parent=None,test=False,quals=[],kwquals={}):
@@ -0,0 +1,47 @@
+#!/usr/bin/python
+
+#
+#% $Id$ 
+#
+#
+# Copyright (C) 2002-2007
+# The MeqTree Foundation & 
+# ASTRON (Netherlands Foundation for Research in Astronomy)
+# P.O.Box 2, 7990 AA Dwingeloo, The Netherlands
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>,
+# or write to the Free Software Foundation, Inc., 
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+# Exports a parmtable to the read-only memory-mapped format. Parm nodes
+# open a table in this format if its name ends in .mmep.
+
+import sys
+from optparse import OptionParser
+
+if __name__ == '__main__':
+  parser = OptionParser(usage="""%prog: [options] source_table dest_table.mmep""",
+                        description="Exports a parmtable to the memory-mapped format.");
+  (options,args) = parser.parse_args();
+  if len(args) != 2:
+    parser.error("incorrect number of arguments");
+  source,dest = args;
+  if not dest.endswith(".mmep"):
+    print("Warning: %s does not end in .mmep, Parm nodes will not recognize it as a mapped table"%dest);
+
+  from Timba import parmtables
+  parmtables.export_mapped(source,dest);
+  tab = parmtables.MappedParmTable(dest);
+  print("Exported %d parms over %d domains to %s"%(len(tab.name_list()),len(tab.domain_list()),dest));
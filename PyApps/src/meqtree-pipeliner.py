@@ -2,13 +2,259 @@
 # -*- coding: utf-8 -*-
 
 import traceback
+import sys
+import os
+import os.path
+import re
+import time
+
+re_load_config    	= re.compile("^\[(.+)\]$");
+re_load_config1   	= re.compile("^@(.+)$");
+re_set_config     	= re.compile("^([^=]+)=(.*)$");
+re_compile_script 	= re.compile("^(.*\.py)(\[(.*)\])?$");
+re_compile_script1  = re.compile("^(.*\.py)(@(.*))?$");
+re_run_job        	= re.compile("^=(.*)$");
+
+class PipelineState (object):
+  """Keeps track of what has been compiled into a meqserver kernel. In batch
+  mode, this lets a kernel be reused from one dataset to the next.""";
+  def __init__ (self):
+    self.module = None;
+    self.script = None;
+    self.text = None;
+    # values of compile-time options the current forest was defined with
+    self.compile_values = None;
+
+def compile_option_values ():
+  from Timba.TDL import TDLOptions
+  values = [];
+  for item in TDLOptions.get_compile_options():
+    item.collect_values(values);
+  return values;
+
+def compile_for_dataset (mqs,state,script,config,dataset):
+  """Compiles script into the kernel, retargeted at a dataset.
+  'dataset' is an (option,value) tuple. The script is only imported the
+  first time around; after that, the forest is redefined if a compile-time
+  option has changed (e.g. because the dataset option is a compile-time one),
+  and left in place otherwise. Returns an informational message.""";
+  from Timba.TDL import Compile
+  from Timba.TDL import TDLOptions
+  if state.module is None or script != state.script:
+    state.module,state.text = Compile.import_tdl_module(script,config=config);
+    state.script = script;
+    state.compile_values = None;
+  name,value = dataset;
+  print(("### Setting option %s=%s"%(name,value)));
+  TDLOptions.set_option(name,value,save=False,strict=True,from_str=True);
+  values = compile_option_values();
+  if values == state.compile_values:
+    return "compile-time options unchanged, reusing the forest already in the meqserver";
+  module,ns,msg = Compile.run_forest_definition(mqs,script,state.module,state.text);
+  state.compile_values = values;
+  return msg;
+
+def run_commands (mqs,commands,state,dataset=None,saveconf=None,errors=None):
+  """Runs a list of pipeliner commands against the given meqserver.
+  If dataset is an (option,value) tuple, scripts are compiled via
+  compile_for_dataset() above. If saveconf is a (config,filename,section)
+  tuple, options are saved there before each job. Job failures are reported,
+  and appended to the errors list if one is given.""";
+  from Timba.TDL import Compile
+  from Timba.TDL import TDLOptions
+
+  loaded_options = False;
+  script = state.script;
+
+  # now parse commands
+  for cmd in commands:
+
+    load_match = re_load_config.match(cmd) or re_load_config1.match(cmd);
+    set_match  = re_set_config.match(cmd);
+    compile_match = re_compile_script.match(cmd) or re_compile_script1.match(cmd);
+    job_match = re_run_job.match(cmd);
+
+    if load_match:
+      section = load_match.group(1);
+      print(("### Loading config section",section));
+      TDLOptions.init_options(section,save=False);
+      loaded_options = True;
+
+    elif set_match:
+      if not loaded_options:
+        raise RuntimeError("Config section not yet specified");
+      name,value = set_match.groups();
+      print(("### Setting option %s=%s"%(name,value)));
+      TDLOptions.set_option(name,value,save=False,from_str=True);
+
+    elif compile_match:
+      script,dum,section = compile_match.groups(None);
+      print(("### Compiling",script));
+      if not loaded_options and not section:
+        # this mode reloads default config section
+        print("### (using options from default section)");
+        config = 0;
+      else:
+        # this mode uses explicit section, or None if section is not specified
+        if section:
+          print(("""### (using options from config section "%s")"""%section));
+        else:
+          section = None;
+          print("### (using previously set options)");
+        config = section;
+      if dataset is None:
+        state.module,ns,msg = Compile.compile_file(mqs,script,config=config);
+        state.script = script;
+      else:
+        msg = compile_for_dataset(mqs,state,script,config,dataset);
+      print(("### ",msg));
+
+    elif job_match:
+      module = state.module;
+      if not module:
+        print("### Error: please specify a script before any TDL jobs");
+        raise RuntimeError("TDL job specified before script");
+      job = job_match.group(1);
+      if saveconf:
+        conf,saveconffile,savesect = saveconf;
+        sect = savesect or ( script and os.path.splitext(os.path.basename(script))[0] ) or "default"
+        print(("### Saving options to %s [%s]" % (saveconffile, sect)))
+        if sect.lower() != "default" and not conf.has_section(sect):
+            conf.add_section(sect)
+        TDLOptions.save_to_config(conf,sect)
+        conf.rewrite(saveconffile)
+      print(("### Running TDL job \"%s\""%job));
+      try:
+        func = TDLOptions.get_job_func(job);
+      except NameError:
+        func = getattr(module,job,None);
+        if not func:
+          print("### Error: no job such job found. Perhaps it is not available with this option set?")
+          print("### Currently available jobs are:""");
+          for name,job_id in TDLOptions.get_all_jobs():
+            print(("### '%s' (id: %s)"%(name,job_id)));
+          raise NameError("No such TDL job: '%s'"%job);
+      try:
+        sys.stdout.flush();
+        sys.stderr.flush();
+        res = func(mqs,None,wait=True);
+        print(("### Job result:",res));
+      except:
+        print("### Job terminated with exception:")
+        traceback.print_exc();
+        if errors is not None:
+          errors.append("job %s: %s"%(job,sys.exc_info()[1]));
+
+  print("### No more commands");
+
+def start_meqserver (options):
+  from Timba.Apps import meqserver
+  print("### Starting meqserver");
+  return meqserver.default_mqs(wait_init=10,extra=["-mt",str(options.mt)]+(["-python_memprof"] if options.memprof else []));
+
+def batch_worker (kernel,options,commands,datasets,results):
+  """Runs in a child process. Starts a meqserver kernel, then takes datasets
+  off the 'datasets' queue and runs the commands for each one, until a None
+  is received. For each dataset, a dict of timings and errors is put on the
+  'results' queue.""";
+  from Timba.Apps import meqserver
+  from Timba.TDL import TDLOptions
+  TDLOptions.enable_save_config(False);
+  TDLOptions.config.read(options.config);
+  TDLOptions.config.set_save_filename(None);
+  mqs = start_meqserver(options);
+  state = PipelineState();
+  try:
+    while True:
+      dataset = datasets.get();
+      if dataset is None:
+        break;
+      print(("### [kernel %d] Processing dataset %s"%(kernel,dataset)));
+      mqs.get_error_log();
+      errors = [];
+      t0 = time.time();
+      try:
+        run_commands(mqs,commands,state,dataset=(options.dataset_option,dataset),errors=errors);
+      except:
+        traceback.print_exc();
+        errors.append("%s: %s"%(sys.exc_info()[0].__name__,sys.exc_info()[1]));
+      dt = time.time() - t0;
+      if not mqs.current_server:
+        errors.append("meqserver died");
+      else:
+        errors += [ "meqserver: %s"%(err[1],) for err in mqs.get_error_log() ];
+      results.put(dict(dataset=dataset,kernel=kernel,time=dt,errors=errors));
+      # a dead kernel can't take any more datasets, leave them to the others
+      if not mqs.current_server:
+        print(("### [kernel %d] The meqserver appears to have died on us, giving up"%kernel));
+        return;
+  finally:
+    try:
+      meqserver.stop_default_mqs();
+    except:
+      traceback.print_exc();
+
+def run_batch (options,commands,datasets):
+  """Distributes datasets over a pool of worker processes, each with its own
+  persistent meqserver kernel. Returns list of result dicts, one per dataset
+  that was processed.""";
+  import multiprocessing
+  from six.moves import queue
+  # meqserver and octopussy can't be shared across a fork(), so each worker
+  # starts its own, and the parent process never starts one
+  ctx = multiprocessing.get_context('fork') if hasattr(multiprocessing,'get_context') else multiprocessing;
+  taskq = ctx.Queue();
+  resultq = ctx.Queue();
+  npool = max(1,min(options.pool,len(datasets)));
+  for ds in datasets:
+    taskq.put(ds);
+  for i in range(npool):
+    taskq.put(None);
+  print(("### Processing %d datasets with a pool of %d meqserver(s)"%(len(datasets),npool)));
+  workers = [ ctx.Process(target=batch_worker,args=(i,options,commands,taskq,resultq)) for i in range(npool) ];
+  for w in workers:
+    w.start();
+  results = [];
+  while len(results) < len(datasets):
+    try:
+      res = resultq.get(timeout=1);
+    except queue.Empty:
+      if not any([ w.is_alive() for w in workers ]):
+        break;
+      continue;
+    print(("### [kernel %d] Dataset %s done in %.1fs%s"%(res['kernel'],res['dataset'],res['time'],
+                                  ", %d error(s)"%len(res['errors']) if res['errors'] else "")));
+    results.append(res);
+  for w in workers:
+    w.join();
+  return results;
+
+def print_batch_summary (datasets,results):
+  """Prints per-dataset timings and the aggregated error log. Returns number of
+  datasets that failed or were not processed.""";
+  done = dict([ (res['dataset'],res) for res in results ]);
+  nfail = 0;
+  print("### Batch summary:");
+  for ds in datasets:
+    res = done.get(ds);
+    if res is None:
+      print(("###   %s: not processed"%ds));
+      nfail += 1;
+    else:
+      print(("###   %s: %.1fs on kernel %d, %s"%(ds,res['time'],res['kernel'],
+                  "%d error(s)"%len(res['errors']) if res['errors'] else "ok")));
+      nfail += bool(res['errors']);
+  if nfail:
+    print(("### %d of %d dataset(s) had problems. Error log follows:"%(nfail,len(datasets))));
+    for res in results:
+      for (i,err) in enumerate(res['errors']):
+        print(("###   %s %03d: %s"%(res['dataset'],i,err)));
+  return nfail;
 
 if __name__ == '__main__':
 
   import Timba
   import Timba.utils
-  import sys
-  import os.path
 
   #
   # setup some standard command-line option parsing
@@ -29,6 +275,11 @@ Runs TDL scripts in batch mode. <commands> are interpreted as follows:
     or "scriptname.py@section"
 
     "=job":                   run specified TDL job (by name or job_id or method name)
+
+If --datasets is given, the commands are run once per listed dataset, with the option named by
+--dataset-option set to the dataset before compiling. Datasets are shared out over a pool of
+--pool meqservers. Each of these keeps its compiled forest, and only redefines it if a
+compile-time option has changed.
 """);
   parser.add_option("-c","--config",dest="config",type="string",
                     help="configuration file to use (default batch.tdlconf)");
@@ -36,6 +287,14 @@ Runs TDL scripts in batch mode. <commands> are interpreted as follows:
                     help="save final configuration (after all command-line arguments have been applied) to config file and section")
   parser.add_option("--mt",dest="mt",type="int",
                     help="number of threads to run in meqserver (default 1)");
+  parser.add_option("--forest-cache",dest="forest_cache",type="string",metavar="DIR",
+                    help="cache compiled forests in DIR, and reuse them when the script and options are unchanged");
+  parser.add_option("--datasets",dest="datasets",type="string",metavar="FILE",
+                    help="batch mode: run the commands for every dataset listed in FILE (one per line)");
+  parser.add_option("--dataset-option",dest="dataset_option",type="string",metavar="OPTION",
+                    help="batch mode: option that selects the dataset (default ms_sel.msname)");
+  parser.add_option("-j","--pool",dest="pool",type="int",
+                    help="batch mode: number of meqservers to run in parallel (default 1)");
   parser.add_option("--memprof",action="store_true",
                     help="enables memory profiling. Requires the Python memory_profiler package.");
   parser.add_option("-d", "--debug",dest="debug",type="string",action="append",metavar="Context=Level",
@@ -44,7 +303,7 @@ Runs TDL scripts in batch mode. <commands> are interpreted as follows:
                     help="(for debugging Python code) sets verbosity level of the named Python context. May be used multiple times.");
   parser.add_option("-t", "--trace",dest="trace",action="store_true",
                     help="(for debugging Python code) enables line tracing of Python statements");
-  parser.set_defaults(mt=1,config="batch.tdlconf");
+  parser.set_defaults(mt=1,config="batch.tdlconf",dataset_option="ms_sel.msname",pool=1);
 
   (options, rem_args) = parser.parse_args();
 
@@ -66,119 +325,49 @@ Runs TDL scripts in batch mode. <commands> are interpreted as follows:
     context,level = opt[:2];
     Timba.utils.verbosity.set_verbosity_level(context,int(level));
 
+  if not os.path.exists(options.config):
+    print(("Config file %s doesn't exist"%options.config));
+    sys.exit(1);
 
-  # start meqserver
-  from Timba.Apps import meqserver
   from Timba.TDL import Compile
   from Timba.TDL import TDLOptions
   TDLOptions.enable_save_config(False);
-  print("### Starting meqserver");
-  mqs = meqserver.default_mqs(wait_init=10,extra=["-mt",str(options.mt)]+(["-python_memprof"] if options.memprof else []));
+  if options.forest_cache:
+    Compile.forest_cache_dir = options.forest_cache;
+
+  # batch mode: hand over to a pool of worker processes
+  if options.datasets:
+    datasets = [ line.strip() for line in open(options.datasets) ];
+    datasets = [ ds for ds in datasets if ds and not ds.startswith('#') ];
+    if options.save_config:
+      print("### --save-config is ignored when processing multiple datasets");
+    results = run_batch(options,rem_args,datasets);
+    retcode = 1 if print_batch_summary(datasets,results) else 0;
+    print(("### All your batch are belong to us. Bye!" if not retcode else "### All your batch are not belong to us, returning with error code"));
+    sys.exit(retcode);
+
+  # start meqserver
+  from Timba.Apps import meqserver
+  mqs = start_meqserver(options);
 
   retcode = 0;
   # use a try...finally block to exit meqserver cleanly at the end
   try:
-    if not os.path.exists(options.config):
-      print(("Config file %s doesn't exist"%options.config));
-      sys.exit(1);
-      
     print(("### Attaching to configuration file",options.config));
     TDLOptions.config.read(options.config);
     # disable the writing-out of configuration
     TDLOptions.config.set_save_filename(None);
     # but save it manually
+    saveconf = None;
     if options.save_config:
       if ':' in options.save_config:
         saveconffile, savesect = options.save_config.rsplit(':',1)
       else:
         saveconffile = options.save_config
         savesect = None
-      saveconf = TDLOptions.OptionConfigParser()
-
-    import re
-    re_load_config    	= re.compile("^\[(.+)\]$");
-    re_load_config1   	= re.compile("^@(.+)$");
-    re_set_config     	= re.compile("^([^=]+)=(.*)$");
-    re_compile_script 	= re.compile("^(.*\.py)(\[(.*)\])?$");
-    re_compile_script1  = re.compile("^(.*\.py)(@(.*))?$");
-    re_run_job        	= re.compile("^=(.*)$");
-
-    loaded_options = False;
-    module = None;
-
-    script = None
-
-    # now parse commands
-    for cmd in rem_args:
-
-      load_match = re_load_config.match(cmd) or re_load_config1.match(cmd);
-      set_match  = re_set_config.match(cmd);
-      compile_match = re_compile_script.match(cmd) or re_compile_script1.match(cmd);
-      job_match = re_run_job.match(cmd);
-
-      if load_match:
-        section = load_match.group(1);
-        print(("### Loading config section",section));
-        TDLOptions.init_options(section,save=False);
-        loaded_options = True;
-
-      elif set_match:
-        if not loaded_options:
-          raise RuntimeError("Config section not yet specified");
-        name,value = set_match.groups();
-        print(("### Setting option %s=%s"%(name,value)));
-        TDLOptions.set_option(name,value,save=False,from_str=True);
-
-      elif compile_match:
-        script,dum,section = compile_match.groups(None);
-        print(("### Compiling",script));
-        if not loaded_options and not section:
-          # this mode reloads default config section
-          print("### (using options from default section)");
-          module,ns,msg = Compile.compile_file(mqs,script);
-        else:
-          # this mode uses explicit section, or None if section is not specified
-          if section:
-            print(("""### (using options from config section "%s")"""%section));
-          else:
-            section = None;
-            print("### (using previously set options)");
-          module,ns,msg = Compile.compile_file(mqs,script,config=section);
-        print(("### ",msg));
-
-      elif job_match:
-        if not module:
-          print("### Error: please specify a script before any TDL jobs");
-          raise RuntimeError("TDL job specified before script");
-        job = job_match.group(1);
-        if options.save_config:
-          sect = savesect or ( script and os.path.splitext(os.path.basename(script))[0] ) or "default" 
-          print(("### Saving options to %s [%s]" % (saveconffile, sect)))
-          if sect.lower() != "default" and not saveconf.has_section(sect): 
-              saveconf.add_section(sect)
-          TDLOptions.save_to_config(saveconf,sect)
-          saveconf.rewrite(saveconffile)
-        print(("### Running TDL job \"%s\""%job));
-        try:
-          func = TDLOptions.get_job_func(job);
-        except NameError:
-          func = getattr(module,job,None);
-          if not func:
-            print("### Error: no job such job found. Perhaps it is not available with this option set?")
-            print("### Currently available jobs are:""");
-            for name,job_id in TDLOptions.get_all_jobs():
-              print(("### '%s' (id: %s)"%(name,job_id)));
-            raise NameError("No such TDL job: '%s'"%job);
-        try:
-          sys.stdout.flush();
-          sys.stderr.flush();
-          res = func(mqs,None,wait=True);
-          print(("### Job result:",res));
-        except:
-          print("### Job terminated with exception:")
-          traceback.print_exc();
-
-          print("### No more commands");
+      saveconf = (TDLOptions.OptionConfigParser(),saveconffile,savesect);
+
+    run_commands(mqs,rem_args,PipelineState(),saveconf=saveconf);
 
   ### Cleanup time
   except:
@@ -194,7 +383,7 @@ Runs TDL scripts in batch mode. <commands> are interpreted as follows:
       if mqs.num_errors():
         print(("### meqserver reported %d error(s) during the run:"%mqs.num_errors()));
         for (i,err) in enumerate(mqs.get_error_log()):
-          print(("###   %03d: %s"%(i,err[1])));   
+          print(("###   %03d: %s"%(i,err[1])));
         retcode = 1
       print("### Stopping the meqserver");
     # this halts the meqserver
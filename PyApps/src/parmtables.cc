@@ -25,9 +25,13 @@
 
 #include <OCTOPython/OctoPython.h>
 #include <MEQ/FastParmTable.h>
+#include <MEQ/MappedParmTable.h>
 #include <MEQ/Domain.h>
+#include <MEQ/Polc.h>
+#include <numpy/ndarrayobject.h>
 
 #include <set>
+#include <fnmatch.h>
 
 namespace ParmTables
 {
@@ -64,6 +68,279 @@ inline std::string sdebug (int=0) { return "MeqUtils"; }
 
 static int dum = aidRegistry_Meq();
 
+// -----------------------------------------------------------------------
+// Bulk funklet access
+// get_funklet_arrays() returns all funklets of a set of parms as a tuple of
+// (names,funklets,coeff): the list of parm names, a numpy record array
+// with one record per funklet (fields as below), and a flat array of all
+// coefficients. The coefficients of funklet f are
+//    coeff[f.coeff_index:f.coeff_index+f.ncoeff].reshape(f.shape[:f.coeff_rank])
+// put_funklet_arrays() takes the same tuple back. Per-axis fields are
+// parmtables.MaxAxis wide.
+// -----------------------------------------------------------------------
+typedef enum
+{
+  FF_PARM,          // index into list of parm names
+  FF_DBID,          // funklet DbId (domain index, for FastParmTables)
+  FF_CLASS,         // funklet class, e.g. MeqPolc
+  FF_DEFINED,       // bitmask of axes defined in domain
+  FF_START,         // domain start/end, per axis
+  FF_END,
+  FF_RANK,          // number of axes of variability
+  FF_AXIS,          // axes of variability, their offsets and scales
+  FF_OFFSET,
+  FF_SCALE,
+  FF_PERTURBATION,
+  FF_WEIGHT,
+  FF_COEFF_RANK,    // rank and shape of coefficient array
+  FF_SHAPE,
+  FF_COEFF_INDEX,   // offset of coefficients in coeff array
+  FF_NCOEFF,        // number of coefficients
+  NumFunkletFields
+} FunkletField;
+
+static const int MaxClassName = 32;
+
+static const struct { const char *name; int typecode; bool per_axis; }
+funklet_fields[NumFunkletFields] = {
+  { "parm",         NPY_INT32,  false },
+  { "dbid",         NPY_INT32,  false },
+  { "class",        NPY_STRING, false },
+  { "defined",      NPY_INT32,  false },
+  { "start",        NPY_DOUBLE, true  },
+  { "end",          NPY_DOUBLE, true  },
+  { "rank",         NPY_INT32,  false },
+  { "axis",         NPY_INT32,  true  },
+  { "offset",       NPY_DOUBLE, true  },
+  { "scale",        NPY_DOUBLE, true  },
+  { "perturbation", NPY_DOUBLE, false },
+  { "weight",       NPY_DOUBLE, false },
+  { "coeff_rank",   NPY_INT32,  false },
+  { "shape",        NPY_INT32,  true  },
+  { "coeff_index",  NPY_INT64,  false },
+  { "ncoeff",       NPY_INT32,  false }
+};
+
+template<class T>
+static inline T * columnData (PyObjectRef &col)
+{ return static_cast<T*>(PyArray_DATA(reinterpret_cast<PyArrayObject*>(*col))); }
+
+static PyObject * getFunkletArrays (ParmTable &table,const char *pattern)
+{
+  // find matching parms and read their funklets
+  std::vector<string> allnames,names;
+  if( table.getNames(allnames) < 0 )
+    Throw("get_funklet_arrays(): table does not support listing its parms");
+  for( uint i=0; i<allnames.size(); i++ )
+    if( !fnmatch(pattern,allnames[i].c_str(),0) )
+      names.push_back(allnames[i]);
+  Domain all(-HUGE_VAL,HUGE_VAL,-HUGE_VAL,HUGE_VAL);
+  std::vector<std::vector<Funklet::Ref> > funklets(names.size());
+  npy_intp nfunk = 0, ncoeff = 0;
+  for( uint ip=0; ip<names.size(); ip++ )
+  {
+    table.getFunklets(funklets[ip],names[ip],all);
+    nfunk += funklets[ip].size();
+    for( uint i=0; i<funklets[ip].size(); i++ )
+      ncoeff += funklets[ip][i]->ncoeff();
+  }
+  // allocate columns
+  PyObjectRef columns[NumFunkletFields];
+  for( int ifld=0; ifld<NumFunkletFields; ifld++ )
+  {
+    npy_intp dims[2] = { nfunk,Axis::MaxAxis };
+    int typecode = funklet_fields[ifld].typecode;
+    if( typecode == NPY_STRING )
+      columns[ifld] = PyArray_New(&PyArray_Type,1,dims,typecode,NULL,NULL,MaxClassName,0,NULL);
+    else
+      columns[ifld] = PyArray_ZEROS(funklet_fields[ifld].per_axis ? 2 : 1,dims,typecode,0);
+    if( !columns[ifld] )
+      throwErrorOpt(Runtime,"failed to allocate funklet array");
+  }
+  PyObjectRef coeff = PyArray_SimpleNew(1,&ncoeff,NPY_DOUBLE);
+  if( !coeff )
+    throwErrorOpt(Runtime,"failed to allocate coefficient array");
+  double *pcoeff = columnData<double>(coeff);
+  // fill columns
+  npy_intp row = 0, icoeff = 0;
+  for( uint ip=0; ip<names.size(); ip++ )
+    for( uint i=0; i<funklets[ip].size(); i++,row++ )
+    {
+      const Funklet &funklet = *funklets[ip][i];
+      const Domain &dom = funklet.domain();
+      const int MA = Axis::MaxAxis;
+      columnData<int32_t>(columns[FF_PARM])[row] = ip;
+      columnData<int32_t>(columns[FF_DBID])[row] = funklet.getDbId();
+      strncpy(columnData<char>(columns[FF_CLASS])+row*MaxClassName,
+              funklet.objectType().toString().c_str(),MaxClassName);
+      int32_t defined = 0;
+      for( int iaxis=0; iaxis<MA; iaxis++ )
+        if( dom.isDefined(iaxis) )
+        {
+          defined |= 1<<iaxis;
+          columnData<double>(columns[FF_START])[row*MA+iaxis] = dom.start(iaxis);
+          columnData<double>(columns[FF_END])[row*MA+iaxis] = dom.end(iaxis);
+        }
+      columnData<int32_t>(columns[FF_DEFINED])[row] = defined;
+      int rank = funklet.rank();
+      columnData<int32_t>(columns[FF_RANK])[row] = rank;
+      for( int j=0; j<rank; j++ )
+      {
+        columnData<int32_t>(columns[FF_AXIS])[row*MA+j] = funklet.getAxis(j);
+        columnData<double>(columns[FF_OFFSET])[row*MA+j] = funklet.getOffset(j);
+        columnData<double>(columns[FF_SCALE])[row*MA+j] = funklet.getScale(j);
+      }
+      columnData<double>(columns[FF_PERTURBATION])[row] = funklet.getPerturbation();
+      columnData<double>(columns[FF_WEIGHT])[row] = funklet.getWeight();
+      columnData<int64_t>(columns[FF_COEFF_INDEX])[row] = icoeff;
+      if( funklet.ncoeff() )
+      {
+        const DMI::NumArray &carr = funklet.coeff();
+        // the coefficient array was sized from ncoeff() above, so a funklet
+        // whose coeff() disagrees with it can't be copied
+        int nc = funklet.ncoeff();
+        if( int(carr.size()) != nc || carr.elementType() != Tpdouble )
+          Throw(Debug::ssprintf("get_funklet_arrays(): funklet %d of parm %s has %d coefficients of type %s, expected %d doubles",
+                int(i),names[ip].c_str(),int(carr.size()),carr.elementType().toString().c_str(),nc));
+        int crank = std::min(int(carr.rank()),MA);
+        columnData<int32_t>(columns[FF_COEFF_RANK])[row] = crank;
+        for( int j=0; j<crank; j++ )
+          columnData<int32_t>(columns[FF_SHAPE])[row*MA+j] = carr.shape()[j];
+        columnData<int32_t>(columns[FF_NCOEFF])[row] = nc;
+        memcpy(pcoeff+icoeff,carr.getConstDataPtr(),nc*sizeof(double));
+        icoeff += nc;
+      }
+    }
+  // make record array from columns
+  PyObjectRef numpy = PyImport_ImportModule("numpy");
+  if( !numpy )
+    throwErrorOpt(Runtime,"failed to import numpy");
+  PyObjectRef rec = PyObject_GetAttrString(*numpy,"rec");
+  PyObjectRef fromarrays = PyObject_GetAttrString(*rec,"fromarrays");
+  PyObjectRef collist = PyList_New(NumFunkletFields);
+  string fieldnames;
+  for( int ifld=0; ifld<NumFunkletFields; ifld++ )
+  {
+    PyList_SET_ITEM(*collist,ifld,columns[ifld].new_ref());
+    fieldnames += string(ifld?",":"") + funklet_fields[ifld].name;
+  }
+  PyObjectRef args = Py_BuildValue("(O)",*collist);
+  PyObjectRef kwargs = Py_BuildValue("{s:s}","names",fieldnames.c_str());
+  PyObjectRef recarr = PyObject_Call(*fromarrays,*args,*kwargs);
+  if( !recarr )
+    throwErrorOpt(Runtime,"failed to create funklet record array");
+  PyObjectRef namelist = PyList_New(names.size());
+  for( uint i=0; i<names.size(); i++ )
+    PyList_SET_ITEM(*namelist,i,PyString_FromString(names[i].c_str()));
+  return Py_BuildValue("(OOO)",*namelist,*recarr,*coeff);
+}
+
+// returns a contiguous array of the named field of the funklet records
+static PyObjectRef getFunkletField (PyObject *funklets,int ifld,npy_intp nfunk)
+{
+  PyObjectRef item = PyMapping_GetItemString(funklets,const_cast<char*>(funklet_fields[ifld].name));
+  if( !item )
+    throwErrorOpt(Value,string("funklet records have no field ")+funklet_fields[ifld].name);
+  int typecode = funklet_fields[ifld].typecode;
+  int nd = funklet_fields[ifld].per_axis ? 2 : 1;
+  // (string columns keep their own itemsize)
+  PyObjectRef col = PyArray_FROMANY(*item,typecode,nd,nd,NPY_ARRAY_CARRAY_RO|
+                                    (typecode == NPY_STRING ? 0 : NPY_ARRAY_FORCECAST));
+  if( !col )
+    throwErrorOpt(Value,string("can't convert funklet field ")+funklet_fields[ifld].name);
+  PyArrayObject *arr = reinterpret_cast<PyArrayObject*>(*col);
+  if( PyArray_DIM(arr,0) != nfunk || ( nd == 2 && PyArray_DIM(arr,1) != Axis::MaxAxis ) )
+    throwErrorOpt(Value,string("funklet field ")+funklet_fields[ifld].name+" has wrong shape");
+  return col;
+}
+
+static void putFunkletArrays (ParmTable &table,PyObject *pynames,PyObject *funklets,PyObject *pycoeff)
+{
+  // get names
+  PyObjectRef namelist = PySequence_List(pynames);
+  if( !namelist )
+    throwErrorOpt(Value,"put_funklet_arrays(): first argument must be a list of names");
+  std::vector<string> names(PyList_GET_SIZE(*namelist));
+  for( uint i=0; i<names.size(); i++ )
+  {
+    PyObjectRef str = PyObject_Str(PyList_GET_ITEM(*namelist,i));
+    names[i] = PyString_AsString(*str);
+  }
+  // get columns
+  npy_intp nfunk = PyObject_Length(funklets);
+  if( nfunk < 0 )
+    throwErrorOpt(Value,"put_funklet_arrays(): second argument must be an array of funklet records");
+  PyObjectRef columns[NumFunkletFields];
+  for( int ifld=0; ifld<NumFunkletFields; ifld++ )
+    columns[ifld] = getFunkletField(funklets,ifld,nfunk);
+  int classlen = PyArray_ITEMSIZE(reinterpret_cast<PyArrayObject*>(*columns[FF_CLASS]));
+  PyObjectRef coeff = PyArray_FROMANY(pycoeff,NPY_DOUBLE,1,1,NPY_ARRAY_CARRAY_RO|NPY_ARRAY_FORCECAST);
+  if( !coeff )
+    throwErrorOpt(Value,"put_funklet_arrays(): third argument must be a 1D array of coefficients");
+  npy_intp ncoeff = PyArray_DIM(reinterpret_cast<PyArrayObject*>(*coeff),0);
+  const double *pcoeff = columnData<double>(coeff);
+  // check that we can make all the funklets before writing any of them
+  const int MA = Axis::MaxAxis;
+  for( npy_intp row=0; row<nfunk; row++ )
+  {
+    string cls(columnData<char>(columns[FF_CLASS])+row*classlen,classlen);
+    cls = cls.substr(0,cls.find('\0'));
+    if( !cls.empty() && cls != "MeqPolc" )
+      throwError(Value,Debug::ssprintf("funklet %d: can't write funklets of class %s",int(row),cls.c_str()));
+    int ip = columnData<int32_t>(columns[FF_PARM])[row];
+    int rank = columnData<int32_t>(columns[FF_RANK])[row];
+    int crank = columnData<int32_t>(columns[FF_COEFF_RANK])[row];
+    int64_t ic = columnData<int64_t>(columns[FF_COEFF_INDEX])[row];
+    int nc = columnData<int32_t>(columns[FF_NCOEFF])[row];
+    int nshape = 1;
+    for( int j=0; j<crank && j<MA; j++ )
+      nshape *= columnData<int32_t>(columns[FF_SHAPE])[row*MA+j];
+    if( ip < 0 || ip >= int(names.size()) )
+      throwError(Value,Debug::ssprintf("funklet %d: parm index %d out of range",int(row),ip));
+    if( rank < 0 || rank > MaxPolcRank || crank < 1 || crank > MaxPolcRank || 
+        nshape != nc || ic < 0 || ic+nc > ncoeff )
+      throwError(Value,Debug::ssprintf("funklet %d: inconsistent rank, shape or coefficient index",int(row)));
+    // a polc takes its rank from its coefficients (see Polc::Polc()), with
+    // a single coefficient giving rank 0. The rank column may add further 
+    // axes of variability, but can't drop any.
+    int coeff_rank = ( crank == 1 && nc == 1 ) ? 0 : crank;
+    if( rank < coeff_rank )
+      throwError(Value,Debug::ssprintf("funklet %d: rank %d is lower than the rank %d of its coefficients",int(row),rank,coeff_rank));
+  }
+  // funklets are written as polcs
+  for( npy_intp row=0; row<nfunk; row++ )
+  {
+    Domain domain;
+    int32_t defined = columnData<int32_t>(columns[FF_DEFINED])[row];
+    for( int iaxis=0; iaxis<MA; iaxis++ )
+      if( defined&(1<<iaxis) )
+        domain.defineAxis(iaxis,columnData<double>(columns[FF_START])[row*MA+iaxis],
+                                columnData<double>(columns[FF_END])[row*MA+iaxis]);
+    int crank = columnData<int32_t>(columns[FF_COEFF_RANK])[row];
+    LoShape shape(std::vector<int>(columnData<int32_t>(columns[FF_SHAPE])+row*MA,
+                                   columnData<int32_t>(columns[FF_SHAPE])+row*MA+crank));
+    DMI::NumArray *parr = new DMI::NumArray(Tpdouble,shape);
+    memcpy(parr->getDataPtr(),pcoeff+columnData<int64_t>(columns[FF_COEFF_INDEX])[row],
+           shape.product()*sizeof(double));
+    Funklet::Ref funkref;
+    funkref <<= new Polc(parr,columnData<int32_t>(columns[FF_AXIS])+row*MA,
+                    columnData<double>(columns[FF_OFFSET])+row*MA,
+                    columnData<double>(columns[FF_SCALE])+row*MA,
+                    columnData<double>(columns[FF_PERTURBATION])[row],
+                    columnData<double>(columns[FF_WEIGHT])[row]);
+    // add any axes given by the rank column beyond those of the coefficients
+    int rank = columnData<int32_t>(columns[FF_RANK])[row];
+    for( int j=funkref->rank(); j<rank; j++ )
+      funkref().setAxis(j,columnData<int32_t>(columns[FF_AXIS])[row*MA+j],
+                          columnData<double>(columns[FF_OFFSET])[row*MA+j],
+                          columnData<double>(columns[FF_SCALE])[row*MA+j]);
+    funkref().setDomain(domain);
+    funkref().setDbId(columnData<int32_t>(columns[FF_DBID])[row]);
+    table.putCoeff(names[columnData<int32_t>(columns[FF_PARM])[row]],*funkref);
+  }
+  table.flush();
+}
+
 #ifdef HAVE_FASTPARMTABLE
 
 typedef struct 
@@ -322,6 +599,25 @@ static PyObject * PyFPT_get_funklet (PyFPT* self,PyObject *args)
   returnNone;
 }
 
+// -----------------------------------------------------------------------
+// updateDomainList()
+// putCoeff() may have created new domains: appends them to our domain list
+// -----------------------------------------------------------------------
+static void updateDomainList (PyFPT *self,uint ndom0)
+{
+  if( !self->domain_list )
+    return;
+  const FastParmTable::DomainList &domlist = self->table->domainList();
+  for( uint i=ndom0; i<domlist.size(); i++ )
+  {
+    Domain::Ref domref;
+    domlist[i].makeDomain(domref);
+    ObjRef ref = domref;
+    PyObjectRef pydom = pyFromDMI(ref);
+    PyList_Append(*self->domain_list,*pydom);
+  }
+}
+
 // -----------------------------------------------------------------------
 // put_funklet()
 // stores funklet
@@ -342,25 +638,50 @@ static PyObject * PyFPT_put_funklet (PyFPT* self,PyObject *args)
     const Funklet &funklet = ref.as<Funklet>();
     uint ndom0 = self->table->domainList().size();
     self->table->putCoeff(name,funklet);
-    // we may have created a new domain: update our domain list
-    if( self->domain_list )
-    {
-      const FastParmTable::DomainList &domlist = self->table->domainList();
-      for( uint i=ndom0; i<domlist.size(); i++ )
-      {
-        Domain::Ref domref;
-        domlist[i].makeDomain(domref);
-        ObjRef ref = domref;
-        PyObjectRef pydom = pyFromDMI(ref);
-        PyList_Append(*self->domain_list,*pydom);
-      }
-    }
+    updateDomainList(self,ndom0);
     returnNone;
   }
   catchStandardErrors(NULL);
   returnNone;
 }
 
+// -----------------------------------------------------------------------
+// get_funklet_arrays()
+// returns (names,funklets,coeff) for all parms matching a pattern,
+// see getFunkletArrays() above
+// -----------------------------------------------------------------------
+static PyObject * PyFPT_get_funklet_arrays (PyFPT* self,PyObject *args)
+{
+  char *pattern = const_cast<char*>("*");
+  if( !PyArg_ParseTuple(args,"|s",&pattern) )
+    return NULL;
+  try
+  {
+    return getFunkletArrays(*self->table,pattern);
+  }
+  catchStandardErrors(NULL);
+  returnNone;
+}
+
+// -----------------------------------------------------------------------
+// put_funklet_arrays()
+// stores funklets given as (names,funklets,coeff) arrays
+// -----------------------------------------------------------------------
+static PyObject * PyFPT_put_funklet_arrays (PyFPT* self,PyObject *args)
+{
+  PyObject *names,*funklets,*coeff;
+  if( !PyArg_ParseTuple(args,"OOO",&names,&funklets,&coeff) )
+    return NULL;
+  try
+  {
+    uint ndom0 = self->table->domainList().size();
+    putFunkletArrays(*self->table,names,funklets,coeff);
+    updateDomainList(self,ndom0);
+  }
+  catchStandardErrors(NULL);
+  returnNone;
+}
+
 // -----------------------------------------------------------------------
 // delete_funklet()
 // deletes one funklet (by name/domain), or all funklets by name
@@ -406,6 +727,17 @@ static PyMethodDef PyFPT_methods[] = {
     {"put_funklet",(PyCFunction)PyFPT_put_funklet, METH_VARARGS,
                   "put_funklet(name,funklet): "
                   "stores a new funklet in the table." },
+    {"get_funklet_arrays",(PyCFunction)PyFPT_get_funklet_arrays, METH_VARARGS,
+                  "get_funklet_arrays([pattern]): "
+                  "returns (names,funklets,coeff) for all parms matching the pattern. "
+                  "funklets is a record array with one record per funklet (fields "
+                  "'parm' (index into names), 'dbid', 'class', 'defined', 'start', "
+                  "'end', 'rank', 'axis', 'offset', 'scale', 'perturbation', 'weight', "
+                  "'coeff_rank', 'shape', 'coeff_index', 'ncoeff'), coeff is a flat "
+                  "array of all coefficients." },
+    {"put_funklet_arrays",(PyCFunction)PyFPT_put_funklet_arrays, METH_VARARGS,
+                  "put_funklet_arrays(names,funklets,coeff): "
+                  "stores polcs given in the form returned by get_funklet_arrays()." },
     {"delete_funklet",(PyCFunction)PyFPT_delete_funklet, METH_VARARGS,
                   "delete_funklet(name[,domain_index]): "
                   "deletes a funklet. If domain_index is not given, deletes all " 
@@ -457,10 +789,385 @@ PyTypeObject PyFPTType = {
 
 #endif // HAVE_FASTPARMTABLE
 
+// -----------------------------------------------------------------------
+// MappedParmTable interface
+// -----------------------------------------------------------------------
+typedef struct 
+{
+    PyObject_HEAD
+    PyObjectRef domain_list;
+    MappedParmTable *table;
+} PyMPT;
+
+static void
+PyMPT_dealloc(PyMPT* self)
+{
+  if( self->table )
+    delete self->table;
+  self->domain_list.detach();
+  Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+static PyObject *
+PyMPT_new (PyTypeObject *type, PyObject *, PyObject *)
+{
+  PyMPT *self = (PyMPT *)type->tp_alloc(type, 0);
+  if( self != NULL )
+    self->table = 0;
+  return (PyObject *)self;
+}
+
+static int
+PyMPT_init(PyMPT *self, PyObject *args, PyObject *)
+{
+  char * tablename;
+  if( !PyArg_ParseTuple(args,"s",&tablename) )
+    return -1;
+  try
+  {
+    self->table = new MappedParmTable(tablename);
+  }
+  catchStandardErrors(-1);
+  return 0;
+}
+
+// Makes a read-only numpy array viewing the table's mapped data. The
+// array holds a ref to the table object, which keeps the mapping alive.
+static PyObject * mappedArray (PyMPT *self,int nd,npy_intp *dims,npy_intp *strides,
+                               int typecode,const void *data)
+{
+  PyObject *arr = PyArray_New(&PyArray_Type,nd,dims,typecode,strides,
+                              const_cast<void*>(data),0,0,NULL);
+  if( !arr )
+    throwErrorOpt(Runtime,"failed to create numpy array");
+  Py_INCREF(self);
+  // SetBaseObject steals the ref to the table object
+  if( PyArray_SetBaseObject(reinterpret_cast<PyArrayObject*>(arr),(PyObject*)self) < 0 )
+  {
+    Py_DECREF(arr);
+    throwErrorOpt(Runtime,"failed to set base object of mapped array");
+  }
+  return arr;
+}
+
+// array of one field (NPY_DOUBLE or NPY_INT32) of nrec records, with an
+// optional trailing dimension of n values
+template<class T>
+static PyObject * recordArray (PyMPT *self,const T *records,int nrec,
+                               const void *field,int typecode,int n=0)
+{
+  npy_intp dims[2] = { nrec,n };
+  npy_intp strides[2] = { sizeof(T),typecode == NPY_DOUBLE ? sizeof(double) : sizeof(int32_t) };
+  return mappedArray(self,n?2:1,dims,strides,typecode,field);
+}
+
+// -----------------------------------------------------------------------
+// name_list()
+// returns list of parm names in table
+// -----------------------------------------------------------------------
+static PyObject * PyMPT_name_list (PyMPT* self)
+{
+  try
+  {
+    int nparms = self->table->numParms();
+    PyObjectRef namelist = PyList_New(nparms);
+    for( int i=0; i<nparms; i++ )
+      PyList_SET_ITEM(*namelist,i,
+          PyString_FromString(self->table->parmName(self->table->parmRecord(i))));
+    return ~namelist;
+  }
+  catchStandardErrors(NULL);
+  returnNone;
+}
+
+// -----------------------------------------------------------------------
+// domain_list()
+// creates (if needed) and returns list of domains in table
+// -----------------------------------------------------------------------
+static PyObject * PyMPT_domain_list (PyMPT * self)
+{
+  try
+  {
+    if( !self->domain_list )
+    {
+      int ndom = self->table->numDomains();
+      PyObjectRef pylist = PyList_New(ndom);
+      for( int i=0; i<ndom; i++ )
+      {
+        Domain::Ref domref;
+        self->table->getDomain(domref,i);
+        ObjRef ref = domref;
+        PyList_SET_ITEM(*pylist,i,pyFromDMI(ref));
+      }
+      self->domain_list = pylist;
+    }
+    return self->domain_list.new_ref();
+  }
+  catchStandardErrors(NULL);
+  returnNone;
+}
+
+// -----------------------------------------------------------------------
+// domain_arrays()
+// returns dict of arrays viewing the domain records
+// -----------------------------------------------------------------------
+static PyObject * PyMPT_domain_arrays (PyMPT * self)
+{
+  try
+  {
+    int ndom = self->table->numDomains();
+    const MappedParmTable::DomainRecord *recs = &(self->table->domainRecord(0));
+    PyObjectRef dict = PyDict_New();
+    PyObjectRef start = recordArray(self,recs,ndom,recs->start,NPY_DOUBLE,Axis::MaxAxis);
+    PyObjectRef end = recordArray(self,recs,ndom,recs->end,NPY_DOUBLE,Axis::MaxAxis);
+    PyObjectRef defined = recordArray(self,recs,ndom,&recs->defined,NPY_INT32);
+    PyDict_SetItemString(*dict,"start",*start);
+    PyDict_SetItemString(*dict,"end",*end);
+    PyDict_SetItemString(*dict,"defined",*defined);
+    return ~dict;
+  }
+  catchStandardErrors(NULL);
+  returnNone;
+}
+
+// -----------------------------------------------------------------------
+// funklet_arrays()
+// returns dict of arrays viewing the funklets of one parm
+// -----------------------------------------------------------------------
+static PyObject * PyMPT_funklet_arrays (PyMPT* self,PyObject *args)
+{
+  char *name;
+  if( !PyArg_ParseTuple(args,"s",&name) )
+    return NULL;
+  try
+  {
+    const MappedParmTable::ParmRecord *parm = self->table->findParm(name);
+    if( !parm )
+      Throw(string("funklet_arrays(): no parm '")+name+"' in table");
+    int nfunk = parm->nfunk;
+    const MappedParmTable::FunkletRecord *recs = self->table->funkletRecords(*parm);
+    PyObjectRef dict = PyDict_New();
+    PyObjectRef arr;
+    arr = recordArray(self,recs,nfunk,&recs->domain,NPY_INT32);
+    PyDict_SetItemString(*dict,"domain",*arr);
+    arr = recordArray(self,recs,nfunk,&recs->type,NPY_INT32);
+    PyDict_SetItemString(*dict,"type",*arr);
+    arr = recordArray(self,recs,nfunk,recs->offset,NPY_DOUBLE,2);
+    PyDict_SetItemString(*dict,"offset",*arr);
+    arr = recordArray(self,recs,nfunk,recs->scale,NPY_DOUBLE,2);
+    PyDict_SetItemString(*dict,"scale",*arr);
+    arr = recordArray(self,recs,nfunk,&recs->perturbation,NPY_DOUBLE);
+    PyDict_SetItemString(*dict,"perturbation",*arr);
+    arr = recordArray(self,recs,nfunk,&recs->weight,NPY_DOUBLE);
+    PyDict_SetItemString(*dict,"weight",*arr);
+    // domain boundaries are copied out, in order of funklets
+    npy_intp dims[2] = { nfunk,Axis::MaxAxis };
+    PyObjectRef start = PyArray_SimpleNew(2,dims,NPY_DOUBLE);
+    PyObjectRef end = PyArray_SimpleNew(2,dims,NPY_DOUBLE);
+    double *pstart = static_cast<double*>(PyArray_DATA(reinterpret_cast<PyArrayObject*>(*start)));
+    double *pend = static_cast<double*>(PyArray_DATA(reinterpret_cast<PyArrayObject*>(*end)));
+    for( int i=0; i<nfunk; i++ )
+    {
+      // records are used directly below, so check them first
+      self->table->checkFunkletRecord(recs[i]);
+      const MappedParmTable::DomainRecord &dom = self->table->domainRecord(recs[i].domain);
+      memcpy(pstart+i*Axis::MaxAxis,dom.start,sizeof(dom.start));
+      memcpy(pend+i*Axis::MaxAxis,dom.end,sizeof(dom.end));
+    }
+    PyDict_SetItemString(*dict,"start",*start);
+    PyDict_SetItemString(*dict,"end",*end);
+    // coefficients: if all arrays have the same shape, these are evenly
+    // spaced, and we can make a single array of nfunk x shape. Otherwise
+    // make a list of per-funklet arrays (None for non-polc funklets)
+    PyObjectRef coeff;
+    if( parm->rank >= 0 )
+    {
+      int rank = parm->rank;
+      npy_intp cdims[3] = { nfunk };
+      npy_intp cstrides[3] = { npy_intp(parm->coeff_stride) };
+      for( int i=rank; i>0; i-- )
+      {
+        cdims[i] = parm->shape[i-1];
+        cstrides[i] = i<rank ? cstrides[i+1]*cdims[i+1] : sizeof(double);
+      }
+      coeff = mappedArray(self,rank+1,cdims,cstrides,NPY_DOUBLE,
+                          self->table->data(parm->coeff));
+    }
+    else
+    {
+      coeff = PyList_New(nfunk);
+      for( int i=0; i<nfunk; i++ )
+      {
+        const MappedParmTable::FunkletRecord &rec = recs[i];
+        if( rec.type == MappedParmTable::PolcBlock )
+        {
+          npy_intp cdims[2] = { rec.shape[0],rec.shape[1] };
+          npy_intp cstrides[2] = { rec.rank>1 ? rec.shape[1]*npy_intp(sizeof(double)) : npy_intp(sizeof(double)),
+                                   sizeof(double) };
+          PyList_SET_ITEM(*coeff,i,mappedArray(self,rec.rank,cdims,cstrides,NPY_DOUBLE,
+                                               self->table->data(rec.coeff)));
+        }
+        else
+        {
+          Py_INCREF(Py_None);
+          PyList_SET_ITEM(*coeff,i,Py_None);
+        }
+      }
+    }
+    PyDict_SetItemString(*dict,"coeff",*coeff);
+    return ~dict;
+  }
+  catchStandardErrors(NULL);
+  returnNone;
+}
+
+// -----------------------------------------------------------------------
+// get_funklets_for_domain()
+// returns a list of funklets overlapping a domain
+// -----------------------------------------------------------------------
+static PyObject * PyMPT_get_funklets_for_domain (PyMPT* self,PyObject *args)
+{
+  PyObject *pydom;
+  char *name;
+  if( !PyArg_ParseTuple(args,"sO",&name,&pydom) )
+    return NULL;
+  try
+  {
+    ObjRef ref;
+    pyToDMI(ref,pydom);
+    if( !ref.valid() || ref->objectType() != TpMeqDomain )
+      Throw("get_funklets_from_domain(): second argument must be a valid domain record");
+    const Domain &domain = ref.as<Domain>();
+    std::vector<Funklet::Ref> funks;
+    int nfunk = self->table->getFunklets(funks,name,domain);
+    PyObjectRef funklist = PyList_New(nfunk);
+    for( int i=0; i<nfunk; i++ )
+      PyList_SET_ITEM(*funklist,i,pyFromDMI(funks[i]));
+    return ~funklist;
+  }
+  catchStandardErrors(NULL);
+  returnNone;
+}
+
+static PyObject * PyMPT_get_funklet_arrays (PyMPT* self,PyObject *args)
+{
+  char *pattern = const_cast<char*>("*");
+  if( !PyArg_ParseTuple(args,"|s",&pattern) )
+    return NULL;
+  try
+  {
+    return getFunkletArrays(*self->table,pattern);
+  }
+  catchStandardErrors(NULL);
+  returnNone;
+}
+
+static PyMethodDef PyMPT_methods[] = {
+    {"name_list",(PyCFunction)PyMPT_name_list, METH_NOARGS,
+                  "return a sorted list of parm names in the table" },
+    {"domain_list",(PyCFunction)PyMPT_domain_list, METH_NOARGS,
+                  "return a list of domains in the table" },
+    {"domain_arrays",(PyCFunction)PyMPT_domain_arrays, METH_NOARGS,
+                  "return a dict of read-only arrays viewing the domains: "
+                  "'start' and 'end' (ndomains x naxes) and 'defined' (bitmask)" },
+    {"funklet_arrays",(PyCFunction)PyMPT_funklet_arrays, METH_VARARGS,
+                  "funklet_arrays(name): "
+                  "return a dict of read-only arrays viewing the funklets of a parm, "
+                  "in order of domain index: 'domain', 'type', 'offset', 'scale', "
+                  "'perturbation', 'weight', 'coeff', plus copies of the domain "
+                  "'start' and 'end'. If all funklets have the same coefficient "
+                  "shape, 'coeff' is an nfunklets x shape array, else a list of "
+                  "arrays." },
+    {"get_funklets_for_domain", (PyCFunction)PyMPT_get_funklets_for_domain, METH_VARARGS,
+                  "get_funklets_for_domain(name,domain): "
+                  "gets all funklets overlapping the given domain." },
+    {"get_funklet_arrays",(PyCFunction)PyMPT_get_funklet_arrays, METH_VARARGS,
+                  "get_funklet_arrays([pattern]): "
+                  "returns (names,funklets,coeff) for all parms matching the pattern, "
+                  "as for FastParmTable.get_funklet_arrays()." },
+    {NULL}  /* Sentinel */
+};
+
+PyTypeObject PyMPTType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "parmtables.MappedParmTable",      /*tp_name*/
+    sizeof(PyMPT),          /*tp_basicsize*/
+    0,                          /*tp_itemsize*/
+    (destructor)PyMPT_dealloc, /*tp_dealloc*/
+    0,                         /*tp_print*/
+    0,                         /*tp_getattr*/
+    0,                         /*tp_setattr*/
+    0,                         /*tp_compare*/
+    0,                         /*tp_repr*/
+    0,                         /*tp_as_number*/
+    0,                         /*tp_as_sequence*/
+    0,                         /*tp_as_mapping*/
+    0,                         /*tp_hash */
+    0,                         /*tp_call*/
+    0,                         /*tp_str*/
+    0,                         /*tp_getattro*/
+    0,                         /*tp_setattro*/
+    0,                         /*tp_as_buffer*/
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE, /*tp_flags*/
+    "MappedParmTable interface (read-only)",       /* tp_doc */
+    0,		               /* tp_traverse */
+    0,		               /* tp_clear */
+    0,		               /* tp_richcompare */
+    0,		               /* tp_weaklistoffset */
+    0,		               /* tp_iter */
+    0,		               /* tp_iternext */
+    PyMPT_methods,         /* tp_methods */
+    0,                         /* tp_members */
+    0,                         /* tp_getset */
+    0,                         /* tp_base */
+    0,                         /* tp_dict */
+    0,                         /* tp_descr_get */
+    0,                         /* tp_descr_set */
+    0,                         /* tp_dictoffset */
+    (initproc)PyMPT_init,  /* tp_init */
+    0,                         /* tp_alloc */
+    PyMPT_new,             /* tp_new */
+};
+
+// -----------------------------------------------------------------------
+// export_mapped()
+// writes a table out as a MappedParmTable
+// -----------------------------------------------------------------------
+static PyObject * export_mapped (PyObject *,PyObject *args)
+{
+  char *source,*dest;
+  if( !PyArg_ParseTuple(args,"ss",&source,&dest) )
+    return NULL;
+  try
+  {
+    string srcname(source);
+    int len = srcname.length();
+    if( len>5 && !srcname.compare(len-5,5,".mmep") )
+    {
+      MappedParmTable table(srcname);
+      MappedParmTable::exportTable(dest,table);
+    }
+    else
+    {
+#ifdef HAVE_FASTPARMTABLE
+      FastParmTable table(srcname,false);
+      MappedParmTable::exportTable(dest,table);
+#else
+      Throw("export_mapped(): FastParmTable support not built in");
+#endif
+    }
+  }
+  catchStandardErrors(NULL);
+  returnNone;
+}
+
 // -----------------------------------------------------------------------
 // Module initialization
 // -----------------------------------------------------------------------
 static PyMethodDef ParmTableMethods[] = {
+    { "export_mapped",export_mapped,METH_VARARGS,
+                  "export_mapped(source,dest): "
+                  "writes the parmtable source out as a memory-mapped table dest" },
     { NULL, NULL, 0, NULL} };       /* Sentinel */
 
 
@@ -477,6 +1184,19 @@ PyObject* initParmTablesModule ()
     INITERROR;
   }
 
+  // import the numpy API, for MappedParmTable arrays
+  if( _import_array() < 0 )
+  {
+    PyErr_Print();
+    Throw("import of numpy module failed");
+    INITERROR;
+  }
+
+  if( PyType_Ready(&PyMPTType) < 0 ) {
+    Throw("failed to register MappedParmTable datatype");
+    INITERROR;
+  }
+
   #ifdef HAVE_FASTPARMTABLE
     if( PyType_Ready(&PyFPTType) < 0 ) {
       Throw("failed to register FastParmTable datatype");
@@ -520,6 +1240,9 @@ PyObject* initParmTablesModule ()
   #ifdef HAVE_FASTPARMTABLE
     PyModule_AddObject(module, "FastParmTable",(PyObject *)&PyFPTType); // steals ref
   #endif
+  PyModule_AddObject(module, "MappedParmTable",(PyObject *)&PyMPTType); // steals ref
+  // width of the per-axis fields of funklet arrays
+  PyModule_AddIntConstant(module,"MaxAxis",Axis::MaxAxis);
   
   // drop out on error
   if( PyErr_Occurred() ) {
@@ -0,0 +1,109 @@
+# standard preamble
+#
+#% $Id$
+#
+#
+# Copyright (C) 2002-2007
+# The MeqTree Foundation &
+# ASTRON (Netherlands Foundation for Research in Astronomy)
+# P.O.Box 2, 7990 AA Dwingeloo, The Netherlands
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>,
+# or write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+
+# Benchmarks multithreaded execution of a wide tree: thousands of small
+# subtrees under a single Add. Reports the wall time per request, and the
+# thread pool statistics: work orders taken, orders stolen from other
+# threads' queues, total time that worker threads spent idle, and how many
+# orders ran on the same thread as for the previous request (affine) or
+# on a different one (nonaffine). Set mt_tiling=1 to turn on tile affinity.
+#
+# Run for a single thread count via:
+#     meqtree-pipeliner.py --mt N mt_scaling_bench.py =_tdl_job_bench
+# or for 1..N threads (one meqserver per thread count) via:
+#     python mt_scaling_bench.py N [option=value ...]
+
+from Timba.TDL import *
+from Timba.Meq import meq
+
+import os
+import re
+import sys
+import time
+
+Settings.forest_state.cache_policy = 1;
+
+TDLCompileOption("num_children","Number of subtrees under root",[1000,4000,10000],more=int);
+TDLCompileOption("num_time","Number of timeslots per request",[10,100,1000],more=int);
+TDLCompileOption("num_freq","Number of channels per request",[16,64,256],more=int);
+TDLCompileOption("num_requests","Number of requests to time",[10,100],more=int);
+TDLCompileOption("mt_tiling","Keep subtrees on the same thread across requests",False);
+
+def _define_forest (ns,**kwargs):
+  Settings.forest_state.mt_tiling = bool(mt_tiling);
+  t = ns.t << Meq.Time;
+  f = ns.f << Meq.Freq;
+  terms = [ ns.term(i) << Meq.Sin(t*(i+1))*Meq.Cos(f*(1e-8*(i+1))) for i in range(num_children) ];
+  ns.root << Meq.Add(*terms);
+
+def _mt_stats (mqs):
+  """returns the thread pool stats (threads,orders,stolen,idle,affine,nonaffine) from the forest state""";
+  fst = mqs.meq('Get.Forest.State',record(),wait=True).forest_state;
+  return list(getattr(fst,'mt_stats',[0,0,0,0,0,0]));
+
+def _tdl_job_bench (mqs,parent,**kw):
+  domain = meq.gen_domain(time=[0,1],freq=[1e+8,1.1e+8]);
+  cells = meq.gen_cells(domain,num_time=num_time,num_freq=num_freq);
+  # first request is not timed, it creates the worker threads
+  mqs.execute('root',meq.request(cells,rqtype='ev',rqid=meq.requestid(domain_id=0)),wait=True);
+  st0 = _mt_stats(mqs);
+  t0 = time.time();
+  for i in range(1,num_requests+1):
+    request = meq.request(cells,rqtype='ev',rqid=meq.requestid(domain_id=i));
+    mqs.execute('root',request,wait=True);
+  dt = (time.time()-t0)/num_requests;
+  st1 = _mt_stats(mqs);
+  print("=== mt_bench threads=%d wall=%.4f orders=%d stolen=%d idle=%.3f affine=%d nonaffine=%d"%(st1[0],dt,
+        st1[1]-st0[1],st1[2]-st0[2],st1[3]-st0[3],st1[4]-st0[4],st1[5]-st0[5]));
+
+def _scan (max_threads,options):
+  """runs the benchmark under meqtree-pipeliner for 1..max_threads threads""";
+  import subprocess
+  import tempfile
+  script = os.path.abspath(__file__);
+  # the pipeliner insists on a config file, so give it an empty one
+  conf = tempfile.NamedTemporaryFile(mode='w',suffix='.tdlconf');
+  print("%8s %12s %8s %10s %10s %10s %10s %10s"%("--mt","s/request","speedup","orders","stolen","idle,s","affine","nonaffine"));
+  wall1 = None;
+  for nthr in range(1,max_threads+1):
+    cmd = [ "meqtree-pipeliner.py","-c",conf.name,"--mt",str(nthr) ] + options + [ script,"=_tdl_job_bench" ];
+    output = subprocess.run(cmd,stdout=subprocess.PIPE,universal_newlines=True).stdout;
+    match = re.search(r"=== mt_bench (.*)$",output,re.M);
+    if not match:
+      print("%8d benchmark failed, output follows:\n%s"%(nthr,output));
+      continue;
+    stats = dict([ kv.split('=') for kv in match.group(1).split() ]);
+    wall = float(stats['wall']);
+    wall1 = wall1 or wall;
+    print("%8d %12.4f %8.2f %10s %10s %10s %10s %10s"%(nthr,wall,wall1/wall,stats['orders'],stats['stolen'],stats['idle'],
+                                                    stats['affine'],stats['nonaffine']));
+
+if __name__ == '__main__':
+  if len(sys.argv) < 2:
+    print("usage: python %s max_threads [option=value ...]"%sys.argv[0]);
+    sys.exit(2);
+  _scan(int(sys.argv[1]),sys.argv[2:]);
@@ -0,0 +1,130 @@
+# standard preamble
+#
+#% $Id$
+#
+#
+# Copyright (C) 2002-2007
+# The MeqTree Foundation &
+# ASTRON (Netherlands Foundation for Research in Astronomy)
+# P.O.Box 2, 7990 AA Dwingeloo, The Netherlands
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>,
+# or write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+
+# Benchmarks bulk funklet access (get_funklet_arrays/put_funklet_arrays)
+# against the per-funklet path (get_funklet/put_funklet) on a table of
+# tiled solutions: num_parms parms, each with a polc on every cell of a
+# num_time x num_freq grid of domains. Run via:
+#     python parmtable_bulk_bench.py [num_parms [num_time [num_freq]]]
+
+from Timba import parmtables
+
+import numpy
+import os
+import shutil
+import sys
+import time
+
+def _make_arrays (num_parms,num_time,num_freq,shape=(3,2)):
+  """Makes the (names,funklets,coeff) arrays for a table of tiled polcs"""
+  names = [ "parm:%d"%i for i in range(num_parms) ];
+  ndom = num_time*num_freq;
+  nfunk = num_parms*ndom;
+  ncoeff = shape[0]*shape[1];
+  itime,ifreq = numpy.divmod(numpy.arange(ndom),num_freq);
+  # per-axis fields must be exactly MaxAxis wide
+  naxis = parmtables.MaxAxis;
+  axis = numpy.zeros(naxis,dtype=numpy.int32);
+  axis[:2] = [0,1];
+  coeff_shape = numpy.zeros(naxis,dtype=numpy.int32);
+  coeff_shape[:2] = shape;
+  funklets = numpy.rec.fromarrays([
+      numpy.repeat(numpy.arange(num_parms,dtype=numpy.int32),ndom),   # parm
+      numpy.tile(numpy.arange(ndom,dtype=numpy.int32),num_parms),     # dbid
+      numpy.array(['MeqPolc']*nfunk,dtype='S32'),                     # class
+      numpy.full(nfunk,3,dtype=numpy.int32),                          # defined
+      numpy.zeros((nfunk,naxis)),                                     # start
+      numpy.zeros((nfunk,naxis)),                                     # end
+      numpy.full(nfunk,2,dtype=numpy.int32),                          # rank
+      numpy.tile(axis,(nfunk,1)),                                     # axis
+      numpy.zeros((nfunk,naxis)),                                     # offset
+      numpy.ones((nfunk,naxis)),                                      # scale
+      numpy.full(nfunk,1e-6),                                         # perturbation
+      numpy.ones(nfunk),                                              # weight
+      numpy.full(nfunk,2,dtype=numpy.int32),                          # coeff_rank
+      numpy.tile(coeff_shape,(nfunk,1)),                              # shape
+      numpy.arange(nfunk,dtype=numpy.int64)*ncoeff,                   # coeff_index
+      numpy.full(nfunk,ncoeff,dtype=numpy.int32) ],                   # ncoeff
+    names='parm,dbid,class,defined,start,end,rank,axis,offset,scale,'
+          'perturbation,weight,coeff_rank,shape,coeff_index,ncoeff');
+  for i in range(num_parms):
+    sl = slice(i*ndom,(i+1)*ndom);
+    funklets.start[sl,0] = itime;
+    funklets.end[sl,0]   = itime+1;
+    funklets.start[sl,1] = 1e8 + ifreq*1e6;
+    funklets.end[sl,1]   = 1e8 + (ifreq+1)*1e6;
+  coeff = numpy.random.standard_normal(nfunk*ncoeff);
+  return names,funklets,coeff;
+
+def _new_table (name):
+  if os.path.exists(name):
+    shutil.rmtree(name) if os.path.isdir(name) else os.unlink(name);
+  return parmtables.FastParmTable(name,True);
+
+def _timed (func,*args):
+  t0 = time.time();
+  result = func(*args);
+  return time.time()-t0,result;
+
+def _per_funklet_read (tab):
+  funks = [];
+  for name,idom,dom in tab.funklet_list():
+    funks.append((name,tab.get_funklet(name,idom)));
+  return funks;
+
+def _per_funklet_write (tabname,funks):
+  tab = _new_table(tabname);
+  for name,funk in funks:
+    tab.put_funklet(name,funk);
+  # closing the table flushes it
+  del tab;
+
+def bench (num_parms=100,num_time=50,num_freq=10):
+  names,funklets,coeff = _make_arrays(num_parms,num_time,num_freq);
+  print("%d parms, %d funklets, %d coefficients"%(len(names),len(funklets),len(coeff)));
+  tab = _new_table("bulk_bench.fmep");
+  dt,dum = _timed(tab.put_funklet_arrays,names,funklets,coeff);
+  print("put_funklet_arrays:     %8.3fs"%dt);
+  t_bulk_put = dt;
+  dt,result = _timed(tab.get_funklet_arrays);
+  print("get_funklet_arrays:     %8.3fs"%dt);
+  t_bulk_get = dt;
+  # check the round trip
+  names1,funklets1,coeff1 = result;
+  if sorted(names1) != sorted(names) or len(funklets1) != len(funklets) or \
+      not numpy.allclose(numpy.sort(coeff1),numpy.sort(coeff)):
+    print("WARNING: funklets read back do not match funklets written");
+  dt,funks = _timed(_per_funklet_read,tab);
+  print("get_funklet, per funklet: %6.3fs   (bulk is %.1fx faster)"%(dt,dt/max(t_bulk_get,1e-9)));
+  dt,dum = _timed(_per_funklet_write,"bulk_bench1.fmep",funks);
+  print("put_funklet, per funklet: %6.3fs   (bulk is %.1fx faster)"%(dt,dt/max(t_bulk_put,1e-9)));
+  del tab;
+  for name in ("bulk_bench.fmep","bulk_bench1.fmep"):
+    shutil.rmtree(name) if os.path.isdir(name) else os.unlink(name);
+
+if __name__ == '__main__':
+  bench(*[ int(x) for x in sys.argv[1:] ]);
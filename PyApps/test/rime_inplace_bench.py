@@ -0,0 +1,108 @@
+# standard preamble
+#
+#% $Id$
+#
+#
+# Copyright (C) 2002-2007
+# The MeqTree Foundation &
+# ASTRON (Netherlands Foundation for Research in Astronomy)
+# P.O.Box 2, 7990 AA Dwingeloo, The Netherlands
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>,
+# or write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+
+
+# Benchmarks in-place evaluation of functions (the use_child_vells forest
+# option) on a typical RIME tree: for every baseline, a chain of scalar
+# Jones terms G_p E_p K_p conj(K_q) conj(E_q) conj(G_q), with per-station
+# terms built up from Time and Freq via elementwise math. Each request is
+# run with use_child_vells off and on, and the script reports the wall time
+# per request, and the number of Vells data blocks allocated per request
+# (from the memory pool stats). Each block is at least one cells' worth of
+# doubles, so the difference gives a lower bound on the memory traffic
+# saved.
+#
+# Run via:
+#     meqtree-pipeliner.py rime_inplace_bench.py =_tdl_job_bench
+
+from Timba.TDL import *
+from Timba.Meq import meq
+
+import math
+import time
+
+Settings.forest_state.cache_policy = 1;
+
+TDLCompileOption("num_stations","Number of stations",[7,14,27],more=int);
+TDLCompileOption("num_time","Number of timeslots per request",[10,100,1000],more=int);
+TDLCompileOption("num_freq","Number of channels per request",[16,64,256],more=int);
+TDLCompileOption("num_requests","Number of requests to time",[10,100],more=int);
+
+def _define_forest (ns,**kwargs):
+  t = ns.t << Meq.Time;
+  f = ns.f << Meq.Freq;
+  for p in range(num_stations):
+    # G: slowly varying complex gain
+    ns.G(p) << Meq.Polar(1+0.01*Meq.Sin(t*(0.1*(p+1))),Meq.Cos(t*(0.05*(p+1))));
+    # E: beam-like amplitude pattern, depends on time and frequency
+    ns.E(p) << Meq.Exp(-Meq.Sqr(Meq.Sin(t*(0.01*(p+1)))*(f*1e-8)));
+    # K: phase term, exp(i*2*pi*f*tau(t)/c)
+    tau = ns.tau(p) << (p+1)*1e-3*Meq.Cos(t*(1e-4*(p+1)));
+    ns.K(p) << Meq.Exp(Meq.ToComplex(0,tau*f*(2*math.pi/3e+8)));
+  vis = [];
+  for p in range(num_stations):
+    for q in range(p+1,num_stations):
+      vis.append(ns.vis(p,q) << Meq.Multiply(ns.G(p),ns.E(p),ns.K(p),
+                        Meq.Conj(ns.K(q)),ns.E(q),Meq.Conj(ns.G(q))));
+  ns.root << Meq.Add(*vis);
+
+def _forest_state (mqs):
+  return mqs.meq('Get.Forest.State',record(),wait=True).forest_state;
+
+def _vells_allocated (mqs):
+  """returns the number of Vells data blocks allocated so far""";
+  fst = _forest_state(mqs);
+  try:
+    return fst.profiling_stats.vells[0];
+  except AttributeError:
+    return 0;
+
+def _run (mqs,cells,use_child_vells,rqid0):
+  mqs.meq('Set.Forest.State',record(state=record(use_child_vells=use_child_vells)),wait=True);
+  # first request is not timed
+  mqs.execute('root',meq.request(cells,rqtype='ev',rqid=meq.requestid(domain_id=rqid0)),wait=True);
+  nalloc0 = _vells_allocated(mqs);
+  t0 = time.time();
+  for i in range(1,num_requests+1):
+    request = meq.request(cells,rqtype='ev',rqid=meq.requestid(domain_id=rqid0+i));
+    mqs.execute('root',request,wait=True);
+  dt = (time.time()-t0)/num_requests;
+  nalloc = (_vells_allocated(mqs)-nalloc0)/num_requests;
+  return dt,nalloc;
+
+def _tdl_job_bench (mqs,parent,**kw):
+  domain = meq.gen_domain(time=[0,1],freq=[1e+8,1.1e+8]);
+  cells = meq.gen_cells(domain,num_time=num_time,num_freq=num_freq);
+  cellsize = num_time*num_freq*8;
+  print("%16s %12s %14s %12s"%("use_child_vells","s/request","blocks/request","MB/request"));
+  results = [];
+  for flag in (False,True):
+    dt,nalloc = _run(mqs,cells,flag,len(results)*(num_requests+1));
+    results.append((dt,nalloc));
+    print("%16s %12.4f %14d %12.1f"%(flag,dt,nalloc,nalloc*cellsize/1e+6));
+  (dt0,n0),(dt1,n1) = results;
+  print("=== rime_bench speedup=%.2f blocks_saved=%d mb_saved=%.1f"%(dt0/dt1,n0-n1,(n0-n1)*cellsize/1e+6));
@@ -0,0 +1,112 @@
+# standard preamble
+#
+#% $Id$ 
+#
+#
+# Copyright (C) 2002-2007
+# The MeqTree Foundation & 
+# ASTRON (Netherlands Foundation for Research in Astronomy)
+# P.O.Box 2, 7990 AA Dwingeloo, The Netherlands
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>,
+# or write to the Free Software Foundation, Inc., 
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+
+# Times the compilation of a large TDL forest: node definition, repository
+# resolution, and the dmi.record operations that dominate both.
+#
+# Run via: python tdl_forest_bench.py [num_nodes]
+#     or: python tdl_forest_bench.py scaling
+# The latter times orphan cleanup for forests of 10k, 100k and 1M nodes.
+
+from Timba.TDL import *
+from Timba import dmi
+
+import sys
+import time
+
+def _define_forest (ns,num_nodes=100000,orphan_fraction=0,**kwargs):
+  """defines a forest of roughly num_nodes nodes: a number of
+  station-like chains of Parms feeding Multiply/Add nodes, hanging
+  off a single root. If orphan_fraction>0, that fraction of the chains 
+  is left unconnected, to be cleaned up as orphans. Returns the root node.
+  """;
+  nchain = 100;
+  nstat = max(num_nodes//(nchain*3),1);
+  roots = [];
+  for st in range(nstat):
+    prev = ns.t0(st) << Meq.Time;
+    for i in range(nchain):
+      parm = ns.parm(st,i) << Meq.Parm(0,node_groups='Parm',tags="solvable");
+      prod = ns.prod(st,i) << parm*prev;
+      prev = ns.sum(st,i) << Meq.Add(prod,parm,prev);
+    roots.append(prev);
+  nroots = len(roots) - int(len(roots)*orphan_fraction);
+  return ns.root << Meq.Composer(children=roots[:nroots]);
+
+def _bench_records (niter=1000000):
+  """times the record micro-operations used by TDL and meqds""";
+  rec = dmi.record(a=1,b=2.,c="x");
+  t0 = time.time();
+  for i in range(niter):
+    rec.name = "node";
+    rec['nodeindex'] = i;
+  t1 = time.time();
+  for i in range(niter):
+    x = rec.name;
+    y = rec['nodeindex'];
+  t2 = time.time();
+  for i in range(niter//10):
+    r = dmi.record(name="node",nodeindex=i,children=[1,2,3]);
+  t3 = time.time();
+  print("record setattr+setitem: %.3fus"%((t1-t0)/niter*1e+6));
+  print("record getattr+getitem: %.3fus"%((t2-t1)/niter*1e+6));
+  print("record construction:    %.3fus"%((t3-t2)/(niter//10)*1e+6));
+
+def _bench_forest (num_nodes=100000):
+  t0 = time.time();
+  ns = NodeScope();
+  root = _define_forest(ns,num_nodes=num_nodes);
+  t1 = time.time();
+  ns.Resolve();
+  t2 = time.time();
+  print("%d nodes defined in %.2fs"%(len(ns.AllNodes()),t1-t0));
+  print("resolved in %.2fs"%(t2-t1));
+  for label,dt in ns.Repository().resolve_timings:
+    print("  %s pass: %.2fs"%(label,dt));
+  print("total %.2fs, %.1fus per node"%(t2-t0,(t2-t0)/len(ns.AllNodes())*1e+6));
+
+def _bench_orphans (sizes=(10000,100000,1000000)):
+  """times orphan cleanup for forests of different sizes, with a tenth
+  of each forest orphaned""";
+  Settings.orphans_are_roots = False;
+  for num_nodes in sizes:
+    ns = NodeScope();
+    # unconnected nodes are only kept if they're in a node group
+    ns.ROOT << _define_forest(ns,num_nodes=num_nodes,orphan_fraction=.1);
+    num0 = len(ns.AllNodes());
+    ns.Resolve();
+    timings = dict(ns.Repository().resolve_timings);
+    print("%d nodes: %d orphans deleted in %.2fs (resolve total %.2fs)"%(num0,
+          num0-len(ns.AllNodes()),timings['orphans'],sum(timings.values())));
+
+if __name__ == '__main__':
+  if len(sys.argv) > 1 and sys.argv[1] == 'scaling':
+    _bench_orphans();
+  else:
+    num_nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 100000;
+    _bench_records();
+    _bench_forest(num_nodes);
@@ -0,0 +1,112 @@
+# standard preamble
+#
+#% $Id$ 
+#
+#
+# Copyright (C) 2002-2007
+# The MeqTree Foundation & 
+# ASTRON (Netherlands Foundation for Research in Astronomy)
+# P.O.Box 2, 7990 AA Dwingeloo, The Netherlands
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>,
+# or write to the Free Software Foundation, Inc., 
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+# Checks that Mean, Sum and WSum nodes reducing a product (or sum) of 
+# factors (factor_oper, factor_group_size) give the same results as the
+# same nodes reducing the expanded operand, with and without reduction
+# axes and flags.
+
+from Timba.TDL import *
+from Timba.Meq import meq
+
+import numpy
+
+Settings.forest_state.cache_policy = 100;
+
+# Make sure our test nodes are not cleaned up
+Settings.orphans_are_roots = True;
+
+# names of (factored,expanded) node pairs to compare
+_pairs = [];
+
+def _define_forest (ns,**kwargs):
+  """define_forest() is a standard TDL name. When a forest script is
+  loaded by, e.g., the browser, this method is automatically called to
+  define the forest. The 'ns' argument is a NodeScope object in which
+  the forest is to be defined, usually this is simply the global scope.
+  """;
+  del _pairs[:];
+  # time-only and freq-only factors, one of them flagged where it's <0
+  ns.a << Meq.Sin(Meq.Time)+2;
+  ns.b << Meq.Cos(Meq.Freq);
+  ns.bfl << Meq.ZeroFlagger(ns.b,oper='LT',flag_bit=1);
+  ns.c << Meq.Exp(Meq.Time);
+  ns.d << Meq.Sqr(Meq.Freq);
+  axes_list = [ ('',{}),('t',dict(reduction_axes=(0,))),
+                ('f',dict(reduction_axes=(1,))),('tf',dict(reduction_axes=(0,1))) ];
+  for nodeclass in ("Mean","Sum"):
+    for oper,binop in ("multiply",Meq.Multiply),("add",Meq.Add):
+      for flagged in False,True:
+        b = ns.bfl if flagged else ns.b;
+        operand = ns.operand(oper,flagged) << binop(ns.a,b);
+        for axes,kw in axes_list:
+          name = "%s_%s%s"%(nodeclass.lower(),oper,"_fl" if flagged else "");
+          fact = ns[name]('factored',axes) << Meq[nodeclass](ns.a,b,factor_oper=oper,**kw);
+          exp  = ns[name]('expanded',axes) << Meq[nodeclass](operand,**kw);
+          _pairs.append((fact.name,exp.name));
+  for flagged in False,True:
+    b = ns.bfl if flagged else ns.b;
+    name = "wsum_fl" if flagged else "wsum";
+    fact = ns[name]('factored') << Meq.WSum(ns.a,b,ns.c,ns.d,weights=[2.,-3.],factor_group_size=2);
+    exp = ns[name]('expanded') << Meq.WSum(ns.a*b,ns.c*ns.d,weights=[2.,-3.]);
+    _pairs.append((fact.name,exp.name));
+
+def _compare_results (name,res,res0):
+  """Compares result res of a factored reduction to result res0 of the
+  expanded one. Raises an AssertionError if they differ.""";
+  vs,vs0 = res.vellsets[0],res0.vellsets[0];
+  assert numpy.shape(vs.value) == numpy.shape(vs0.value),"%s: result shapes differ"%name;
+  assert numpy.allclose(vs.value,vs0.value),"%s: values differ"%name;
+  flags,flags0 = getattr(vs,'flags',None),getattr(vs0,'flags',None);
+  assert (flags is None) == (flags0 is None),"%s: flags present in only one result"%name;
+  if flags0 is not None:
+    assert numpy.array_equal(flags,flags0),"%s: flags differ"%name;
+
+def _test_forest (mqs,parent,**kwargs):
+  """test_forest() is a standard TDL name. When a forest script is
+  loaded by, e.g., the browser, and the "test" option is set to true,
+  this method is automatically called after define_forest() to run a 
+  test on the forest. The 'mqs' argument is a meqserver proxy object.
+  """;
+  dom = meq.gen_domain(time=(0,6),freq=(1,7));
+  cells = meq.gen_cells(dom,num_freq=20,num_time=30);
+  request = meq.request(cells,rqtype='ev');
+  for fact,exp in _pairs:
+    res = mqs.execute(fact,request,wait=True).result;
+    res0 = mqs.execute(exp,request,wait=True).result;
+    _compare_results(fact,res,res0);
+  print(len(_pairs),"factored reductions match their expanded versions");
+
+# this is the testing branch, executed when the script is run directly
+# via 'python script.py'
+
+if __name__ == '__main__':
+#  from Timba.Meq import meqds 
+  Timba.TDL._dbg.set_verbose(5);
+  ns = NodeScope();
+  _define_forest(ns);
+  # resolves nodes
+  ns.Resolve();
@@ -1,4 +1,5 @@
 from Timba import parmtables
+import numpy
 
 # open table
 tab = parmtables.FastParmTable('test.fmep');
@@ -54,3 +55,60 @@ print("============ funklets in new table:",len(tab1.funklet_list()));
 tab1.delete_funklet('z');
 print("============ funklets in new table:",len(tab1.funklet_list()));
 
+
+# Export the table to the memory-mapped format. Mapped tables are read-only,
+# and can be opened by a Parm node just like other tables (use a .mmep name).
+parmtables.export_mapped('test.fmep','test.mmep');
+mtab = parmtables.MappedParmTable('test.mmep');
+print("============ parms in mapped table:",mtab.name_list());
+print("============ domains in mapped table:",len(mtab.domain_list()));
+funks = mtab.get_funklets_for_domain('x',domain);
+print("============ overlapping funklets for 'x':",len(funks));
+
+# The mapped table must hold the same coefficients as the original. Domain
+# indices differ between the two tables, so funklets are matched by domain.
+def same_domain (a,b):
+  return all([ numpy.allclose(a[axis],b[axis]) for axis in ('time','freq') ]);
+for name,idx,dom in funklist:
+  coeff = numpy.asarray(tab.get_funklet(name,idx).coeff);
+  match = [ f for f in mtab.get_funklets_for_domain(name,dom) if same_domain(f.domain,dom) ];
+  assert len(match) == 1,"%s: %d funklets for domain %d in mapped table, expected 1"%(name,len(match),idx);
+  assert numpy.array_equal(numpy.asarray(match[0].coeff),coeff),\
+    "%s: coefficients for domain %d differ in mapped table"%(name,idx);
+print("============ mapped table coefficients match for",len(funklist),"funklets");
+
+# funklet_arrays() returns numpy arrays viewing the table directly. If all
+# funklets of a parm have the same shape, 'coeff' is one array of
+# nfunklets x shape. 'start' and 'end' give the domain of each funklet.
+arrs = mtab.funklet_arrays('x');
+print("============ coefficients of 'x':",arrs['coeff']);
+print("============ time domains of 'x':",arrs['start'][:,0],arrs['end'][:,0]);
+
+# get_funklet_arrays()/put_funklet_arrays() copy all funklets of a table in
+# one go. Copy the table, and check that the copy reads back the same.
+names,funklets,coeff = tab.get_funklet_arrays();
+tab2 = parmtables.FastParmTable('test2.fmep');
+tab2.put_funklet_arrays(names,funklets,coeff);
+names2,funklets2,coeff2 = tab2.get_funklet_arrays();
+assert sorted(names2) == sorted(names),"parm names differ in copied table";
+assert len(funklets2) == len(funklets),"%d funklets in copied table, expected %d"%(len(funklets2),len(funklets));
+for name in names:
+  f = funklets[funklets.parm == names.index(name)];
+  f2 = funklets2[funklets2.parm == names2.index(name)];
+  assert numpy.array_equal(numpy.sort(f.rank),numpy.sort(f2.rank)),"%s: ranks differ in copied table"%name;
+assert numpy.allclose(numpy.sort(coeff2),numpy.sort(coeff)),"coefficients differ in copied table";
+print("============ copied",len(funklets),"funklets with put_funklet_arrays()");
+
+# the rank column may not be lower than the rank of the coefficients
+bad = funklets.copy();
+bad.rank[:] = 0;
+bad.ncoeff[:] = 2;
+bad.coeff_rank[:] = 1;
+bad.shape[:,0] = 2;
+bad.coeff_index[:] = 0;
+try:
+  tab2.put_funklet_arrays(names,bad,numpy.zeros(2));
+except ValueError as exc:
+  print("============ rank below coefficient rank rejected:",exc);
+else:
+  raise AssertionError("put_funklet_arrays() accepted a rank below the coefficient rank");
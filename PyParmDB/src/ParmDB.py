@@ -58,6 +58,34 @@ class Parmdb:
             funklets = getValues(self._db,name,domain,parentId);
         #print "funklets",funklets;
         return funklets;
+
+    # record fields returned by getFunkletArrays(), same as for
+    # parmtables.FastParmTable.get_funklet_arrays()
+    _funklet_fields = ('parm','dbid','class','defined','start','end','rank',
+                       'axis','offset','scale','perturbation','weight',
+                       'coeff_rank','shape','coeff_index','ncoeff');
+
+    def getFunkletArrays(self,pattern="*"):
+        """Returns all funklets of the parms matching pattern as a tuple of
+        (names,funklets,coeff). funklets is a numpy record array with
+        one record per funklet, coeff is a flat array of all coefficients.
+        The coefficients of funklet f are
+          coeff[f.coeff_index:f.coeff_index+f.ncoeff].reshape(f.shape[:f.coeff_rank])
+        and f.parm is the index of its parm in names. This is much faster
+        than calling getFunklets() for each parm, as no funklet records
+        are made."""
+        if not self._db:
+            print("no db opened, try reopen")
+            return;
+        import numpy
+        result = getFunkletArrays(self._db,pattern);
+        if result is None:
+            return None;
+        names,columns,coeff = result;
+        columns['class'] = numpy.array(['MeqFunklet']*len(columns['parm']),dtype='S32');
+        funklets = numpy.rec.fromarrays([columns[f] for f in self._funklet_fields],
+                                        names=','.join(self._funklet_fields));
+        return names,funklets,coeff;
         
     def reopen(self,name="test",type="aips"):
         self._name=name;
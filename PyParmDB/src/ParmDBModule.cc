@@ -30,6 +30,7 @@
 #include "MEQ/Funklet.h"
 #include "MEQ/Domain.h"
 #include "MEQ/Axis.h"
+#include <numpy/arrayobject.h>
 
 #include <iostream>
 
@@ -353,6 +354,122 @@ static PyObject * GetRange_wrapper(PyObject *pSelf,
   return OctoPython::pyFromDMI(resultdomain);
   
 }
+
+
+// getFunkletArrays: returns all funklets of the parms matching a pattern as
+// a tuple of (names,columns,coeff): the list of parm names, a dict of
+// per-funklet arrays (see Timba.ParmDB.Parmdb.getFunkletArrays for the
+// layout), and a flat array of all coefficients. The columns are filled
+// directly from the ParmValues, without making funklet records.
+static PyObject * GetFunkletArrays_wrapper(PyObject *pSelf,
+                                           PyObject *pArgs)
+{
+  PyObject *pyParmDB;
+  char *pattern;
+  int ok = PyArg_ParseTuple(pArgs,"Os",&pyParmDB,&pattern);
+  if(!ok) {
+    return NULL;
+  }
+  void * temp = PyCObject_AsVoidPtr(pyParmDB);
+  LOFAR::ParmDB::ParmDB * thisDB = static_cast<LOFAR::ParmDB::ParmDB *>(temp);
+
+  vector<string> names;
+  vector<vector<ParmValue> > values;
+  npy_intp nfunk=0,ncoeff=0;
+  try{
+    names = thisDB->getNames(pattern,LOFAR::ParmDB::ParmDBRep::UseNormal);
+    values.resize(names.size());
+    for(uint ip=0;ip<names.size();ip++){
+      ParmValueSet result = thisDB->getValues(names[ip],ParmDomain(),-1,
+                                              LOFAR::ParmDB::ParmDBRep::UseNormal);
+      values[ip] = result.getValues();
+      nfunk += values[ip].size();
+      for(uint i=0;i<values[ip].size();i++)
+        ncoeff += values[ip][i].rep().itsCoeff.size();
+    }
+  }
+  catch(...)
+    {
+      cout<<"an Exception occured while getting values for parms: "<<pattern<<endl;
+      Py_INCREF(Py_None);
+      return Py_None;
+    }
+
+  const int MA = Meq::Axis::MaxAxis;
+  npy_intp dims1[1] = { nfunk };
+  npy_intp dims2[2] = { nfunk,MA };
+  PyObject *parm         = PyArray_ZEROS(1,dims1,NPY_INT32,0);
+  PyObject *dbid         = PyArray_ZEROS(1,dims1,NPY_INT32,0);
+  PyObject *defined      = PyArray_ZEROS(1,dims1,NPY_INT32,0);
+  PyObject *start        = PyArray_ZEROS(2,dims2,NPY_DOUBLE,0);
+  PyObject *end          = PyArray_ZEROS(2,dims2,NPY_DOUBLE,0);
+  PyObject *rank         = PyArray_ZEROS(1,dims1,NPY_INT32,0);
+  PyObject *axis         = PyArray_ZEROS(2,dims2,NPY_INT32,0);
+  PyObject *offset       = PyArray_ZEROS(2,dims2,NPY_DOUBLE,0);
+  PyObject *scale        = PyArray_ZEROS(2,dims2,NPY_DOUBLE,0);
+  PyObject *perturbation = PyArray_ZEROS(1,dims1,NPY_DOUBLE,0);
+  PyObject *weight       = PyArray_ZEROS(1,dims1,NPY_DOUBLE,0);
+  PyObject *coeff_rank   = PyArray_ZEROS(1,dims1,NPY_INT32,0);
+  PyObject *shape        = PyArray_ZEROS(2,dims2,NPY_INT32,0);
+  PyObject *coeff_index  = PyArray_ZEROS(1,dims1,NPY_INT64,0);
+  PyObject *ncoeffs      = PyArray_ZEROS(1,dims1,NPY_INT32,0);
+  PyObject *coeff        = PyArray_ZEROS(1,&ncoeff,NPY_DOUBLE,0);
+  #define COLUMN(arr,type) static_cast<type*>(PyArray_DATA(reinterpret_cast<PyArrayObject*>(arr)))
+
+  npy_intp row=0,icoeff=0;
+  for(uint ip=0;ip<values.size();ip++)
+    for(uint i=0;i<values[ip].size();i++,row++){
+      const ParmValueRep &rep = values[ip][i].rep();
+      COLUMN(parm,int32_t)[row] = ip;
+      COLUMN(dbid,int32_t)[row] = rep.itsDBRowRef;
+      const std::vector<double> dstart = rep.itsDomain.getStart();
+      const std::vector<double> dend   = rep.itsDomain.getEnd();
+      int32_t mask = 0;
+      for(uint iaxis=0;iaxis<dstart.size() && iaxis<uint(MA);iaxis++){
+        mask |= 1<<iaxis;
+        COLUMN(start,double)[row*MA+iaxis] = dstart[iaxis];
+        COLUMN(end,double)[row*MA+iaxis] = dend[iaxis];
+      }
+      COLUMN(defined,int32_t)[row] = mask;
+      // as in ParmValueToFunklet(): time x freq funklets
+      COLUMN(rank,int32_t)[row] = 2;
+      COLUMN(axis,int32_t)[row*MA] = Meq::Axis::TIME;
+      COLUMN(axis,int32_t)[row*MA+1] = Meq::Axis::FREQ;
+      for(int j=0;j<2;j++){
+        COLUMN(offset,double)[row*MA+j] = rep.itsOffset[j];
+        COLUMN(scale,double)[row*MA+j] = rep.itsScale[j];
+      }
+      COLUMN(perturbation,double)[row] = rep.itsPerturbation;
+      COLUMN(weight,double)[row] = rep.itsWeight;
+      const vector<double> &cf = rep.itsCoeff;
+      const int nx=(rep.itsShape.size() && rep.itsShape[0]>0?rep.itsShape[0]:1);
+      const int ny=(rep.itsShape.size()>1 && rep.itsShape[1]>0?rep.itsShape[1]:1);
+      COLUMN(coeff_rank,int32_t)[row] = 2;
+      COLUMN(shape,int32_t)[row*MA] = nx;
+      COLUMN(shape,int32_t)[row*MA+1] = ny;
+      COLUMN(coeff_index,int64_t)[row] = icoeff;
+      COLUMN(ncoeffs,int32_t)[row] = cf.size();
+      //convert from column-major order, as in ParmValueToFunklet()
+      double *data = COLUMN(coeff,double) + icoeff;
+      for(uint k=0;k<cf.size();k++)
+        data[ny*(k%nx)+k/nx] = cf[k];
+      icoeff += cf.size();
+    }
+  #undef COLUMN
+
+  PyObject *nameList = PyList_New(names.size());
+  for(uint i=0;i<names.size();i++)
+    PyList_SetItem(nameList,i,Py_BuildValue("s",names[i].c_str()));
+  // "N" steals our references to the arrays
+  return Py_BuildValue("(N{s:N,s:N,s:N,s:N,s:N,s:N,s:N,s:N,s:N,s:N,s:N,s:N,s:N,s:N,s:N}N)",
+      nameList,
+      "parm",parm,"dbid",dbid,"defined",defined,"start",start,"end",end,
+      "rank",rank,"axis",axis,"offset",offset,"scale",scale,
+      "perturbation",perturbation,"weight",weight,
+      "coeff_rank",coeff_rank,"shape",shape,"coeff_index",coeff_index,
+      "ncoeff",ncoeffs,
+      coeff);
+}
  
 #endif
 
@@ -367,6 +484,8 @@ static PyMethodDef TableMethods[] = {
       "getvalues from db following name +infinite domain" },
     { "getRange", GetRange_wrapper, METH_VARARGS,
       "getrange from db following namepattern" },
+    { "getFunkletArrays", GetFunkletArrays_wrapper, METH_VARARGS,
+      "get all funklets of parms following namepattern, as arrays" },
     { NULL, NULL, 0, NULL}        /* Sentinel */
 
 };
@@ -375,5 +494,6 @@ PyMODINIT_FUNC
 initpyparmdb(void)
 {
     (void) Py_InitModule("pyparmdb", TableMethods);
+    import_array();
 }
 